@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+#
+# @file    benchmark-fast-path.py
+# @brief   Compare parsing times with and without the simple-statement fast path
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+#
+# Usage: benchmark-fast-path.py [FILE.m ...]
+#
+# Parses the given files or, by default, the MATLAB files in other/models/,
+# with the 'pyparsing' engine, once with the fast path for simple statements
+# (see matlab_parser/fastpath.py) turned off and once with it turned on.
+# Prints the time each took and the fraction of statements that took the
+# fast path.  Files that can't be parsed are skipped.
+
+from __future__ import print_function
+import os
+import sys
+import time
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '../../moccasin'))
+from matlab_parser import MatlabGrammar
+from matlab_parser.grammar_rules import GrammarRules
+
+
+def parse_time(text, fast):
+    GrammarRules._fast_path.enabled = fast
+    try:
+        start = time.time()
+        stats = MatlabGrammar().parse_string(text).parse_stats
+        return time.time() - start, stats
+    finally:
+        GrammarRules._fast_path.enabled = True
+
+
+def main(paths):
+    if not paths:
+        for dir, _, files in os.walk(os.path.join(here, '../../other/models')):
+            paths += [os.path.join(dir, f) for f in files if f.endswith('.m')]
+    print('{0:>8} {1:>10} {2:>10} {3:>7} {4:>6}  {5}'.format(
+        'bytes', 'slow (ms)', 'fast (ms)', 'speedup', 'fast', 'file'))
+    total_slow = total_fast = 0
+    statements = fast_statements = 0
+    for path in sorted(paths):
+        text = open(path).read()
+        try:
+            slow, _ = parse_time(text, False)
+            fast, stats = parse_time(text, True)
+        except Exception:
+            continue
+        total_slow += slow
+        total_fast += fast
+        statements += stats.statements
+        fast_statements += stats.fast_statements
+        print('{0:8d} {1:10.1f} {2:10.1f} {3:6.1f}x {4:5.0f}%  {5}'.format(
+            len(text), slow * 1000, fast * 1000, slow / fast,
+            stats.fast_fraction * 100, os.path.relpath(path)))
+    print('{0:>8} {1:10.1f} {2:10.1f} {3:6.1f}x {4:5.0f}%'.format(
+        'total', total_slow * 1000, total_fast * 1000, total_slow / total_fast,
+        100.0 * fast_statements / max(statements, 1)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
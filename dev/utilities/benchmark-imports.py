@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+#
+# @file    benchmark-imports.py
+# @brief   Check the time it takes to import MOCCASIN's packages
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+#
+# Usage: benchmark-imports.py [-n RUNS]
+#
+# Imports each of the packages below in a fresh Python process, RUNS times
+# (default: 10), and prints the median time the import took, not counting
+# the startup of Python itself.  Exits with status 1 if a median is over the
+# budget for the package.  The budgets are generous compared to the times on
+# a current machine, so that only real regressions (such as building the
+# PyParsing grammar at import time again) exceed them.
+#
+# It also reports whether PyParsing got imported, which it shouldn't be for
+# matlab_parser: the grammar is only built when something is parsed.
+
+from __future__ import print_function
+import getopt
+import os
+import subprocess
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+top  = os.path.abspath(os.path.join(here, '../..'))
+
+# Each entry is (statement, budget in seconds).
+
+_budgets = [
+    ('import moccasin.matlab_parser', 0.10),
+    ('import moccasin.converter',     0.30),
+]
+
+_probe = '''from __future__ import print_function
+import sys, time
+sys.path.append({0!r})
+start = time.time()
+{1}
+print(time.time() - start, 'pyparsing' in sys.modules)
+'''
+
+
+def measure(statement, runs):
+    times = []
+    for _ in range(runs):
+        code = _probe.format(os.path.join(top, 'moccasin'), statement)
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=top)
+        elapsed, pyparsing = output.decode('utf-8').split()
+        times.append(float(elapsed))
+    times.sort()
+    return times[len(times) // 2], pyparsing == 'True'
+
+
+def main(argv):
+    runs = 10
+    opts, _ = getopt.getopt(argv, 'n:')
+    for opt, value in opts:
+        if opt == '-n':
+            runs = int(value)
+    over = False
+    print('{0:<32} {1:>11} {2:>11}  {3}'.format(
+        'statement', 'median (ms)', 'budget (ms)', 'pyparsing imported'))
+    for statement, budget in _budgets:
+        median, pyparsing = measure(statement, runs)
+        print('{0:<32} {1:11.1f} {2:11.1f}  {3}{4}'.format(
+            statement, median * 1000, budget * 1000, pyparsing,
+            '  OVER BUDGET' if median > budget else ''))
+        over = over or median > budget
+    sys.exit(1 if over else 0)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+#
+# @file    benchmark-memory.py
+# @brief   Measure how much memory the results of parsing take
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+#
+# Usage: benchmark-memory.py [FILE.m ...]
+#
+# Parses the given files or, by default, the MATLAB files in other/models/,
+# with the 'descent' engine, keeping all the results, and prints the number
+# of nodes in them, the average number of bytes that a node takes (not
+# counting the values of its attributes, which are mostly other nodes or
+# shared strings), and how much the resident set size of the process grew
+# while parsing.  Files that can't be parsed are skipped.  The resident set
+# size is read from /proc, so that figure is only printed on Linux.
+
+from __future__ import print_function
+import gc
+import os
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '../../moccasin'))
+from matlab_parser import *
+
+
+def rss():
+    # Current resident set size in bytes, or None if it can't be found.
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def node_sizes(contexts):
+    # Number of nodes, and bytes taken by the nodes themselves.
+    count = size = 0
+    seen = set()
+    pending = [context.nodes for context in contexts]
+    while pending:
+        thing = pending.pop()
+        if isinstance(thing, (list, tuple)):
+            pending.extend(thing)
+        elif isinstance(thing, MatlabNode) and id(thing) not in seen:
+            seen.add(id(thing))
+            count += 1
+            size += sys.getsizeof(thing)
+            if hasattr(thing, '__dict__'):
+                size += sys.getsizeof(thing.__dict__)
+            pending.extend(getattr(thing, a) for a in type(thing)._visitable_attr
+                           if getattr(thing, a, None))
+    return count, size
+
+
+def main(paths):
+    if not paths:
+        for dir, _, files in os.walk(os.path.join(here, '../../other/models')):
+            paths += [os.path.join(dir, f) for f in files if f.endswith('.m')]
+    parser = MatlabGrammar()
+    gc.collect()
+    before = rss()
+    contexts = []
+    for path in sorted(paths):
+        try:
+            contexts.append(parser.parse_file(path, engine='descent'))
+        except Exception:
+            continue
+    gc.collect()
+    after = rss()
+    count, size = node_sizes(contexts)
+    print('{} files, {:,} nodes'.format(len(contexts), count))
+    print('bytes per node: {:.1f}'.format(float(size) / max(count, 1)))
+    if before is not None and after is not None:
+        print('parse RSS:      {:.1f} MB'.format((after - before) / 1048576.0))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+#
+# @file    benchmark-preprocessor.py
+# @brief   Compare the continuation preprocessor with the old PyParsing pass
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+#
+# Usage: benchmark-preprocessor.py [FILE.m ...]
+#
+# Times preprocess() from matlab_parser/preprocessor.py against the
+# PyParsing transformString() pass that MatlabGrammar used before it, on
+# the given files or, by default, on the MATLAB files in other/models/.
+# The old pass is reproduced here as it was.
+
+from __future__ import print_function
+import os
+import sys
+import timeit
+from pyparsing import CharsNotIn, Combine, LineEnd, LineStart, Literal, \
+    Optional
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '../../moccasin'))
+from matlab_parser.preprocessor import preprocess
+
+
+_continuation = Combine(Literal('...').leaveWhitespace()
+                        + Optional(CharsNotIn('\n\r\f'))
+                        + LineEnd() + LineStart())
+_continuation.setParseAction(lambda t: ' ')
+
+def old_preprocess(text):
+    return _continuation.transformString(text.replace('\r\n', '\n'))
+
+
+def main(paths):
+    if not paths:
+        for dir, _, files in os.walk(os.path.join(here, '../../other/models')):
+            paths += [os.path.join(dir, f) for f in files if f.endswith('.m')]
+    inputs = [(path, open(path).read()) for path in paths]
+    inputs.sort(key=lambda item: -len(item[1]))
+    print('{0:>8} {1:>10} {2:>10} {3:>7}  {4}'.format(
+        'bytes', 'old (ms)', 'new (ms)', 'speedup', 'file'))
+    total_old = total_new = 0
+    for path, text in inputs:
+        repeat = max(1, 20000 // (len(text) + 1))
+        old = min(timeit.repeat(lambda: old_preprocess(text), number=repeat,
+                                repeat=3)) / repeat
+        new = min(timeit.repeat(lambda: preprocess(text), number=repeat,
+                                repeat=3)) / repeat
+        total_old += old
+        total_new += new
+        print('{0:8d} {1:10.3f} {2:10.3f} {3:6.1f}x  {4}'.format(
+            len(text), old * 1000, new * 1000, old / new,
+            os.path.relpath(path)))
+    print('{0:>8} {1:10.3f} {2:10.3f} {3:6.1f}x'.format(
+        'total', total_old * 1000, total_new * 1000, total_old / total_new))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
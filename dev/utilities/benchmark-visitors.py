@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+#
+# @file    benchmark-visitors.py
+# @brief   Measure how fast MatlabNodeVisitor objects walk node trees
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+#
+# Usage: benchmark-visitors.py [FILE.m ...]
+#
+# Parses the given files or, by default, the MATLAB files in other/models/,
+# with the 'descent' engine, and then walks all the nodes with visitors
+# that call methods for node classes and for their superclasses, and with
+# the default walk.  Prints the nodes visited per second for each visitor,
+# and the number of visitor objects that can be created per second.  Files
+# that can't be parsed are skipped.
+
+from __future__ import print_function
+import copy
+import os
+import sys
+import timeit
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '../../moccasin'))
+from matlab_parser import *
+from matlab_parser.grammar import Disambiguator
+
+
+class Plain(MatlabNodeVisitor):
+    # Only the default walk.
+    pass
+
+
+class Counter(MatlabNodeVisitor):
+    # Counts the nodes that the default walk visits.
+    def __init__(self):
+        super(Counter, self).__init__()
+        self.count = 0
+
+    def _visit_parts(self, node):
+        if isinstance(node, MatlabNode):
+            self.count += 1
+        return super(Counter, self)._visit_parts(node)
+
+
+class Superclasses(MatlabNodeVisitor):
+    # Has methods for superclasses of most nodes, as the converter's do.
+    def visit_Reference(self, node):
+        return self.default_visit(node)
+
+    def visit_Primitive(self, node):
+        return node
+
+    def visit_Operator(self, node):
+        return self.default_visit(node)
+
+
+def main(paths):
+    if not paths:
+        for dir, _, files in os.walk(os.path.join(here, '../../other/models')):
+            paths += [os.path.join(dir, f) for f in files if f.endswith('.m')]
+    trees = []
+    for path in sorted(paths):
+        try:
+            trees.append(MatlabGrammar().parse_file(path, engine='descent').nodes)
+        except Exception:
+            continue
+    counter = Counter()
+    for nodes in trees:
+        counter.visit(copy.deepcopy(nodes))
+    print('{} files, {} nodes'.format(len(trees), counter.count))
+    print('{0:<14} {1:>14}'.format('visitor', 'nodes/s'))
+    parser = MatlabGrammar()
+    visitors = [('default walk', Plain()), ('superclasses', Superclasses()),
+                ('Disambiguator', Disambiguator(parser))]
+    for name, visitor in visitors:
+        copies = [copy.deepcopy(nodes) for nodes in trees]
+        def walk():
+            for nodes in copies:
+                visitor.visit(nodes)
+        elapsed = min(timeit.repeat(walk, number=1, repeat=5))
+        print('{0:<14} {1:14,.0f}'.format(name, counter.count / elapsed))
+    number = 2000
+    elapsed = min(timeit.repeat(lambda: Disambiguator(parser), number=number,
+                                repeat=5))
+    print('{0:<14} {1:14,.0f} created/s'.format('Disambiguator', number / elapsed))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+#
+# @file    profile-grammar.py
+# @brief   Report which rules of the grammar the parsing time goes into
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+#
+# Usage: profile-grammar.py [-s FIELD] [-n ROWS] [-j OUT.json] [FILE.m ...]
+#
+# Parses the given files or, by default, the MATLAB files in other/models/,
+# with the 'pyparsing' engine and a RuleProfile (see
+# matlab_parser/profiler.py), and prints the counts and times of the
+# grammar's rules over all the files, sorted by FIELD ('time' by default).
+# With -j, the profile is also written to OUT.json.  Files that can't be
+# parsed are skipped.
+
+from __future__ import print_function
+import argparse
+import os
+import sys
+
+here = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(here, '../../moccasin'))
+from matlab_parser import MatlabGrammar, RuleProfile
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Profile the grammar rules.')
+    parser.add_argument('-s', '--sort', default='time',
+                        help='field to sort the rules by')
+    parser.add_argument('-n', '--rows', type=int, default=30,
+                        help='number of rules to print')
+    parser.add_argument('-j', '--json', help='file to write the profile to')
+    parser.add_argument('paths', nargs='*')
+    args = parser.parse_args()
+    paths = args.paths
+    if not paths:
+        for dir, _, files in os.walk(os.path.join(here, '../../other/models')):
+            paths += [os.path.join(dir, f) for f in files if f.endswith('.m')]
+    profile = RuleProfile()
+    for path in sorted(paths):
+        try:
+            MatlabGrammar().parse_file(path, profile=profile)
+        except Exception:
+            print('Skipped {}'.format(path), file=sys.stderr)
+    print(profile.report(args.sort, args.rows))
+    if args.json:
+        with open(args.json, 'w') as f:
+            f.write(profile.to_json())
+
+
+if __name__ == '__main__':
+    main()
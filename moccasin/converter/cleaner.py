@@ -138,22 +138,15 @@ _ignorable = [
     ]
 
 
-class MatlabCleaner(MatlabNodeVisitor):
-    def __init__(self):
-        super(MatlabCleaner, self).__init__()
+class MatlabCleaner(MatlabPass):
+    # This is a MatlabPass (see matlab_parser/passes.py), so that it can be
+    # run in the same walk over the nodes as the passes that come after it.
 
+    # The arguments of calls and the parts of assignments are not looked at.
+    walks = {FunCall: [], Assignment: [], FunDef: ['body']}
 
-    def _push_context(self, newcontext):
-        self._context = newcontext
 
-
-    def _pop_context(self):
-        # Don't pop topmost context.
-        if self._context.parent and not self._context.topmost:
-            self._context = self._context.parent
-
-
-    def visit_Assignment(self, node):
+    def enter_Assignment(self, node, context):
         # Catches assignments where the RHS is a call to something ignorable.
         # The whole assignmet can be ignored in that case.
         rhs = node.rhs
@@ -161,8 +154,8 @@ class MatlabCleaner(MatlabNodeVisitor):
             and rhs.name.name in _ignorable):
             # Remove the assignment from the context too.
             if (isinstance(node.lhs, Identifier)
-                and node.lhs in self._context.assignments):
-                self._context.assignments.pop(node.lhs)
+                and node.lhs in context.assignments):
+                context.assignments.pop(node.lhs)
             return None
         if rhs is None:
             # This happens if something else has taken out the RHS already.
@@ -170,24 +163,22 @@ class MatlabCleaner(MatlabNodeVisitor):
         return node
 
 
-    def visit_FunCall(self, node):
+    def enter_FunCall(self, node, context):
         # This catches top-level calls to things like 'figure', 'plot', etc.
         if isinstance(node.name, Identifier) and node.name.name in _ignorable:
             return None
         return node
 
 
-    def visit_FunDef(self, node):
-        # Push the new function context.  Note that FunDef is unusual in having
-        # a node.context property -- other MatlabNodes don't.
-        self._push_context(node.context)
-        self._context.nodes = self.visit(self._context.nodes)
-        node.body = self._context.nodes
-        self._pop_context()
+    def leave_FunDef(self, node, context):
+        # The body has been walked in the function's context.  Note that
+        # FunDef is unusual in having a node.context property -- other
+        # MatlabNodes don't.
+        node.context.nodes = node.body
         return node
 
 
-    def visit_For(self, node):
+    def enter_For(self, node, context):
         # We could potentially handle simple loops like "for x in 1:n" if we
         # could determine the number of times the loop body should be
         # executed.  Right now, Moccasin is not smart enough to do that.
@@ -79,7 +79,6 @@
 
 from __future__ import print_function
 from libsbml import *
-from pyparsing import ParseException, ParseResults
 
 import getopt
 import glob
@@ -208,8 +207,9 @@ def sanity_check_matlab(parse_results):
                  'function passed to odeNN is not defined in this file')
 
 
-def clean_matlab(context, protected_context):
-    '''Remove MATLAB content we would ignore anyway.  This speeds up processing
+def prepare_matlab(context, protected_context, format):
+    '''Remove MATLAB content we would ignore anyway, and rewrite some
+    constructs into things we can use.  Removing content speeds up processing
     and prevents having to do more complicated checks later to figure out if
     variable are needed in the final output.'''
 
@@ -224,7 +224,7 @@ def clean_matlab(context, protected_context):
                 for elem in subscripts:
                     if isinstance(elem, Identifier):
                         assigned_vars.append(elem)
-        used_vars = [x for x in assigned_vars if MatlabFinder(context).find_use(x)]
+        used_vars = [x for x in assigned_vars if finder.find_use(x, context)]
         unused_vars = list(set(assigned_vars) - set(used_vars))
         for var in list(context.assignments.keys()):
             if var in unused_vars:
@@ -244,18 +244,18 @@ def clean_matlab(context, protected_context):
                 continue
             remove_unused_assignments(fcontext)
 
-    # Remove MATLAB content we can't do anything about, like plotting commands.
-    context.nodes = MatlabCleaner().visit(context.nodes)
+    # This is done in one walk over the nodes: remove MATLAB content we
+    # can't do anything about, like plotting commands; note which variables
+    # are used in what is left; and rewrite what is left.
+    finder = MatlabFinder(context)
+    passes = PassPipeline([MatlabCleaner(), finder,
+                           MatlabRewriter(context, format)])
+    context.nodes = passes.run(context.nodes, context)
     # Remove assignments to variables that are never used in the code.  (This
     # might happen if variables are only used for plotting purposes.)
     remove_unused_assignments(context)
 
 
-def rewrite_matlab(context, format):
-    '''Rewrite some constructs into things we can use.'''
-    context.nodes = MatlabRewriter(context, format).visit(context.nodes)
-
-
 def first_function_context(context):
     """If there is at least one function definition in the given context, it
     returns the topmost or first function's context.  If there are no function
@@ -301,12 +301,12 @@ def matlab_ode_call(context):
 
 def function_declaration(name, context, recursive=False):
     '''Finds and returns the FunDecl object for "name".'''
-    if context and name in context.functions:
-        return context.functions[name]
-    elif recursive and context.parent:
-        return function_declaration(name, context.parent, recursive)
-    else:
+    if not context:
         return None
+    elif recursive:
+        return context.lookup('functions', name)
+    else:
+        return context.functions.get(name)
 
 
 def assignment(thing, context, recursive=False):
@@ -314,16 +314,12 @@ def assignment(thing, context, recursive=False):
     Identifier and 'recursive' is non-False, looks up the Identifier's value
     recursively, until it gets something that's not an Identifier.
     '''
-    if thing in context.assignments:
-        value = context.assignments[thing]
-        if isinstance(value, Identifier) and recursive:
-            return assignment(value, context, recursive)
-        else:
-            return value
-    elif hasattr(context, 'parent') and context.parent:
-        return assignment(thing, context.parent)
-    else:
-        return None
+    value = context.lookup('assignments', thing)
+    seen = [thing]
+    while recursive and isinstance(value, Identifier) and value not in seen:
+        seen.append(value)
+        value = context.lookup('assignments', value)
+    return value
 
 
 def all_assignments(context):
@@ -379,11 +375,8 @@ def ref_name(name, context):
     searcher = MatlabRecognizer(context)
     # The principle here is that it wouldn't make sense for a model to assign
     # to time, so we only need to check if time is referenced in the RHS.
-    for lhs, rhs in context.assignments.items():
-        searcher.visit(rhs)
-        if searcher.found(name):
-            return True
-    return False
+    searcher.run(list(context.assignments.values()), context)
+    return bool(searcher.found(name))
 
 
 def func_from_handle(thing, context, underscores):
@@ -464,7 +457,7 @@ def create_array_function(thing, context, underscores):
 
 def constant_expression(node, context):
     tester = MatlabExprTester(context)
-    tester.visit(node)
+    tester.run(node, context)
     return tester.is_constant()
 
 
@@ -939,8 +932,7 @@ def create_raterule_model(parse_results, use_species=True, output_format="sbml",
 
     # Clean up the Matlab (e.g., to remove things that are not relevant) and
     # also rewrite some of the MATLAB to improve our ability to convert it.
-    clean_matlab(parse_results, function_context)
-    rewrite_matlab(parse_results, output_format)
+    prepare_matlab(parse_results, function_context, output_format)
 
     # Some users want their variables named based on info they write in
     # comments.  This complicates everything, because we have to rewrite
@@ -23,7 +23,6 @@
 import sys
 sys.path.append('..')
 from matlab_parser import *
-from collections import defaultdict
 
 # MatlabExprTester
 #
@@ -32,19 +31,21 @@ from collections import defaultdict
 # code is a general system that hopefully can be extended in the future for
 # other constructs if we ever need to do that.
 
-class MatlabExprTester(MatlabNodeVisitor):
+class MatlabExprTester(MatlabPass):
+    walks = {Reference: [], Definition: []}
+
     def __init__(self, context):
         super(MatlabExprTester, self).__init__()
         self._context = context
         self._is_constant = True
 
 
-    def visit_Reference(self, node):
+    def enter_Reference(self, node, context):
         self._is_constant = False
         return node
 
 
-    def visit_Definition(self, node):
+    def enter_Definition(self, node, context):
         self._is_constant = False
         return node
 
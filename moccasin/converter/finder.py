@@ -25,199 +25,124 @@ sys.path.append('..')
 from matlab_parser import *
 
 
-class MatlabFinder(MatlabNodeVisitor):
+# MatlabFinder
+#
+# Finds out which variables are used in the nodes of a context, counting
+# the functions defined inside it, but not the LHS of assignments.  The
+# uses of all the variables are noted in a single walk over the nodes, the
+# first time find_use() is called, unless the finder has already been run
+# in a PassPipeline (see matlab_parser/passes.py) together with other
+# passes.  A variable counts as used in every context around the one it
+# is used in.
+
+class MatlabFinder(MatlabPass):
+    walks = {FunCall: ['args'], FunDef: ['body'], Assignment: ['rhs'],
+             FlowControl: ['cond', 'expr', 'body'],
+             If: ['cond', 'body', 'elseif_tuples', 'else_body'],
+             Switch: ['cond', 'case_tuples', 'otherwise'],
+             StructRef: ['name'], AnonFun: ['body']}
+
     def __init__(self, context):
         super(MatlabFinder, self).__init__()
-        self._found = []
+        self._uses = None               # Context -> set of variables used.
         self._context = context
 
 
-    def _foundit(self):
-        self._found.append(self._sought)
+    def start(self, context):
+        if self._uses is None:
+            self._uses = {}
+
+
+    def _foundit(self, context, *things):
+        for thing in things:
+            if isinstance(thing, Identifier):
+                if context not in self._uses:
+                    self._uses[context] = set()
+                self._uses[context].add(thing)
 
 
-    def visit_FunCall(self, node):
-        if node.args and self._sought in node.args:
-            self._foundit()
-            return
-        else:
-            self.visit(node.args)
+    def enter_FunCall(self, node, context):
+        self._foundit(context, *(node.args or []))
+        return node
 
 
-    def visit_FunDef(self, node):
+    def leave_FunDef(self, node, context):
         # Need to be careful about scoping.  If there are inner functions,
         # then we do want to descend into them; if they're inner functions,
         # they will appear as FunDef objects in the body of this function, so
-        # visiting the body is all we need to do.  However, if there are
+        # walking the body is all we need to do.  However, if there are
         # local functions in the file, then they will not appear as FunDefs
         # in the body here, and we won't descend into them, and that's correct.
-        if node.body:
-            self.visit(node.body)
-
-
-    def visit_Assignment(self, node):
-        if node.rhs == self._sought:
-            self._foundit()
-            return
-        else:
-            self.visit(node.rhs)
-
-
-    def visit_Operator(self, node):
-        if hasattr(node, 'operand'):
-            if node.operand == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(node.operand)
-        if hasattr(node, 'left'):
-            if node.left == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(node.left)
-        if hasattr(node, 'right'):
-            if node.right == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(node.right)
-        if hasattr(node, 'middle'):
-            if node.middle == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(node.middle)
-
-
-    def visit_If(self, node):
-        if node.cond == self._sought:
-            self._foundit()
-            return
-        else:
-            self.visit(node.cond)
-        if node.body == self._sought:
-            self._foundit()
-            return
-        else:
-            self.visit(node.body)
-        if node.else_body == self._sought:
-            self._foundit()
-            return
-        else:
-            self.visit(node.else_body)
+        # What is used in the function is used in the context around it too.
+        if node.context in self._uses:
+            self._foundit(context, *self._uses[node.context])
+        return node
+
+
+    def enter_Assignment(self, node, context):
+        self._foundit(context, node.rhs)
+        return node
+
+
+    def enter_Operator(self, node, context):
+        self._foundit(context, *[getattr(node, attr) for attr in
+                                 ['operand', 'left', 'right', 'middle']
+                                 if hasattr(node, attr)])
+        return node
+
+
+    def enter_If(self, node, context):
+        self._foundit(context, node.cond, node.body, node.else_body)
         for else_cond, else_body in (node.elseif_tuples or []):
-            if else_cond == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(else_cond)
-            if else_body == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(else_body)
-
-
-    def visit_Switch(self, node):
-        if node.cond == self._sought:
-            self._foundit()
-            return
-        else:
-            self.visit(node.cond)
-        if node.otherwise == self._sought:
-            self._foundit()
-            return
-        else:
-            self.visit(node.otherwise)
+            self._foundit(context, else_cond, else_body)
+        return node
+
+
+    def enter_Switch(self, node, context):
+        self._foundit(context, node.cond, node.otherwise)
         for case_cond, case_body in (node.case_tuples or []):
-            if case_cond == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(case_cond)
-            if case_body == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(case_body)
-
-
-    def visit_FlowControl(self, node):
+            self._foundit(context, case_cond, case_body)
+        return node
+
+
+    def enter_FlowControl(self, node, context):
         # This handles the remaining flow control constructs like while & for.
-        if hasattr(node, 'cond'):
-            if node.cond == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(node.cond)
-        if hasattr(node, 'expr'):
-            if node.expr == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(node.expr)
-        if hasattr(node, 'body'):
-            if node.body == self._sought:
-                self._foundit()
-                return
-            else:
-                self.visit(node.body)
-
-
-    def visit_Array(self, node):
+        self._foundit(context, getattr(node, 'cond', None),
+                      getattr(node, 'expr', None), getattr(node, 'body', None))
+        return node
+
+
+    def enter_Array(self, node, context):
         for row in (node.rows or []):
-            for item in (row or []):
-                if item == self._sought:
-                    self._foundit()
-                    return
-                else:
-                    self.visit(item)
-
-
-    def visit_ArrayRef(self, node):
-        if node.name == self._sought:
-            self._foundit()
-            return
-        elif not isinstance(node.name, Identifier):
-            self.visit(node.name)
-        if node.args and self._sought in node.args:
-            self._foundit()
-            return
-        else:
-            self.visit(node.args)
-
-
-    def visit_Ambiguous(self, node):
-        if node.name == self._sought:
-            self._foundit()
-            return
-        elif not isinstance(node.name, Identifier):
-            self.visit(node.name)
-        if node.args and self._sought in node.args:
-            self._foundit()
-            return
-        else:
-            self.visit(node.args)
-
-
-    def visit_StructRef(self, node):
-        if node.name == self._sought:
-            self._foundit()
-            return
-        elif not isinstance(node.name, Identifier):
-            self.visit(node.name)
-
-
-    def visit_AnonFun(self, node):
-        if node.body == self._sought:
-            self._foundit()
-            return
-        else:
-            self.visit(node.body)
-
-
-    def find_use(self, var):
-        self._sought = var
-        self.visit(self._context.nodes)
-        return var in self._found
+            self._foundit(context, *(row or []))
+        return node
+
+
+    def enter_ArrayRef(self, node, context):
+        self._foundit(context, node.name, *(node.args or []))
+        return node
+
+
+    def enter_Ambiguous(self, node, context):
+        self._foundit(context, node.name, *(node.args or []))
+        return node
+
+
+    def enter_StructRef(self, node, context):
+        self._foundit(context, node.name)
+        return node
+
+
+    def enter_AnonFun(self, node, context):
+        self._foundit(context, node.body)
+        return node
+
+
+    def find_use(self, var, context=None):
+        """Returns True if `var` is used in the nodes of `context`, which
+        by default is the context the finder was created for."""
+        if self._uses is None:
+            self.run(self._context.nodes, self._context)
+        if context is None:
+            context = self._context
+        return var in self._uses.get(context, ())
@@ -23,7 +23,6 @@
 import sys
 sys.path.append('..')
 from matlab_parser import *
-from collections import defaultdict
 
 # MatlabRecognizer
 #
@@ -34,7 +33,11 @@ from collections import defaultdict
 #
 # FIXME: this is really specific to finding 't' for time right now.
 
-class MatlabRecognizer(MatlabNodeVisitor):
+class MatlabRecognizer(MatlabPass):
+    # We don't consider parameters of function definitions.  See also the
+    # comments in enter_Identifier() about the LHS of assignments.
+    walks = {FunDef: ['body', 'output'], Assignment: ['rhs']}
+
     def __init__(self, context):
         super(MatlabRecognizer, self).__init__()
         self._context = context
@@ -48,36 +51,13 @@ class MatlabRecognizer(MatlabNodeVisitor):
                                     for x in sublist]
 
 
-    def _push_context(self, newcontext):
-        self._context = newcontext
-
-
-    def _pop_context(self):
-        # Don't pop topmost context.
-        if self._context.parent and not self._context.topmost:
-            self._context = self._context.parent
-
-
-    def visit_FunDef(self, node):
-        # Push the new function context.  Note that FunDef is unusual in having
-        # a node.context property -- other MatlabNodes don't.
-        self._push_context(node.context)
-        # We don't consider parameters.
-        if node.body:
-            self.visit(node.body)
-        if node.output:
-            self.visit(node.output)
-        self._pop_context()
-        return node
-
-
-    def visit_Identifier(self, node):
-        if self._context.name and self._context.name in self._context.functions:
+    def enter_Identifier(self, node, context):
+        if context.name and context.name in context.functions:
             # Owing to how most people write the ODE functions, we don't
             # simply look for any reference to an identifier named 't'
             # because the ODE function definitions usually have 't' as their
             # first parameter.  So, ignore parameter names in function defs.
-            if node in self._context.functions[self._context.name].parameters:
+            if node in context.functions[context.name].parameters:
                 return node
         for key, value in self._identifier_mapping.items():
             if node.name in value:
@@ -86,21 +66,6 @@ class MatlabRecognizer(MatlabNodeVisitor):
         return node
 
 
-    def visit_Assignment(self, node):
-        # A model can't reassign time (what would that mean, anyway?), but
-        # the form of the ODE calls we are looking for typically have 't' in
-        # the LHS, like this:
-        #    [t, y] = ode45(@f, tspan, x0)
-        # This is not a reason to think that 't' is being used in the model.
-        # So, we purposefully only walk down the RHS of assignments.
-        #
-        # FIXME: this only is valid when we're looking for 't' for time!  If
-        # this class ever gets expanded to handle more things, then this code
-        # must be revised.
-        self.visit(node.rhs)
-        return node
-
-
     def found(self, key):
         if key not in self._identifier_mapping:
             return ValueError(key + ' is not a recognized variable')
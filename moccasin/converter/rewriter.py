@@ -35,7 +35,11 @@ from decimal import *
 # This also implements other transformations that may be necessary, such as
 # converting the format of numbers to something that XPP and Biocham can handle.
 
-class MatlabRewriter(MatlabNodeVisitor):
+class MatlabRewriter(MatlabPass):
+    # This is a MatlabPass (see matlab_parser/passes.py), so that it can be
+    # run in the same walk over the nodes as the passes that come before it.
+
+    walks = {FunCall: ['args'], FunDef: ['body']}
 
     def __init__(self, context, output_format):
         super(MatlabRewriter, self).__init__()
@@ -44,35 +48,23 @@ class MatlabRewriter(MatlabNodeVisitor):
         self._context = context
 
 
-    def _push_context(self, newcontext):
-        self._context = newcontext
-
-
-    def _pop_context(self):
-        # Don't pop topmost context.
-        if self._context.parent and not self._context.topmost:
-            self._context = self._context.parent
-
-
-    def visit_FunDef(self, node):
-        # Push the new function context.  Note that FunDef is unusual in having
-        # a node.context property -- other MatlabNodes don't.
-        self._push_context(node.context)
-        self._context.nodes = self.visit(self._context.nodes)
-        node.body = self._context.nodes
-        self._pop_context()
+    def leave_FunDef(self, node, context):
+        # The body has been walked in the function's context.  Note that
+        # FunDef is unusual in having a node.context property -- other
+        # MatlabNodes don't.
+        node.context.nodes = node.body
         return node
 
 
-    def visit_FunCall(self, node):
-        node.args = self.visit(node.args)
+    def leave_FunCall(self, node, context):
+        # The arguments have been rewritten by now.
         if isinstance(node.name, Identifier):
             methname = 'matlab_' + node.name.name
             meth = getattr(self, methname, None)
             return meth(node) if meth else node
 
 
-    def visit_Number(self, node):
+    def enter_Number(self, node, context):
         # Biocham seems unable to parse numbers in scientific notation in
         # some cases, and I haven't figured out what XPP is doing with
         # precision for numbers like 1.25e-7, which it displays as 0.000000.
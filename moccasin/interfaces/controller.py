@@ -55,7 +55,13 @@ class Controller():
     def parse_File(self , file_contents):
         '''Parses input file using Moccasin's parser.'''
         self.file_contents = file_contents
-        self.parse_results = self.parser.parse_string(self.file_contents)
+        if self.parse_results is not None:
+            # Most likely an edited version of the previous input.
+            self.parse_results = self.parser.reparse(self.parse_results,
+                                                     self.file_contents)
+        else:
+            self.parse_results = self.parser.parse_string(self.file_contents,
+                                                          incremental=True)
 
 
     def print_parsed_results(self):
@@ -24,11 +24,10 @@ from __future__ import print_function
 import plac
 import sys
 import os
+import time
 sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from controller import Controller
-
-# This prevents exceeding recursion depth in some cases.
-sys.setrecursionlimit(1500)
+from matlab_parser import MatlabGrammar, ParseCache, RuleProfile
 
 # -----------------------------------------------------------------------------
 # Main function - driver
@@ -93,6 +92,43 @@ def main(path, omit_comments=False, debug=False, use_equations=False,
         print("Error: {0}".format(err))
 
 
+def cache(prune=False, clear=False, directory=None, max_size=None):
+    '''Inspect or prune the on-disk cache of parsed MATLAB files.'''
+    parse_cache = ParseCache(directory, max_size)
+    if clear:
+        print('Removed {} entries.'.format(parse_cache.clear()))
+    elif prune:
+        print('Removed {} entries.'.format(parse_cache.prune()))
+    entries = parse_cache.entries()
+    print('Cache directory: {}'.format(parse_cache.directory))
+    print('Entries:         {}'.format(len(entries)))
+    print('Total size:      {} bytes (limit {} bytes)'.format(
+        sum(entry[1] for entry in entries), parse_cache.max_size))
+    if entries:
+        print('Last used:       {} (oldest), {} (newest)'.format(
+            time.ctime(entries[0][2]), time.ctime(entries[-1][2])))
+
+
+def explain_timing(path, lines=20, rules=False):
+    '''Show which lines of a MATLAB file take the parser the most time.'''
+    with open(path) as file:
+        contents = file.read()
+    profile = RuleProfile(positions=True)
+    start = time.time()
+    try:
+        MatlabGrammar().parse_string(contents, profile=profile)
+        outcome = 'Parsed'
+    except Exception:
+        outcome = 'Failed to parse'
+    print('{} {} in {:.1f} ms (with profiling).'.format(
+        outcome, path, (time.time() - start) * 1000))
+    print_header('The {} slowest lines'.format(lines))
+    print(profile.annotate(contents, lines))
+    if rules:
+        print_header('Grammar rules')
+        print(profile.report(limit=lines))
+
+
 # -----------------------------------------------------------------------------
 # Helper functions
 # -----------------------------------------------------------------------------
@@ -119,12 +155,32 @@ main.__annotations__ = dict(
     print_parse   = ('print extra debugging info about the interpreted MATLAB code', 'flag', 'x'),
 )
 
+cache.__annotations__ = dict(
+    prune         = ('remove least recently used entries down to the size limit',   'flag', 'p'),
+    clear         = ('remove all entries',                                          'flag', 'c'),
+    directory     = ('cache directory (default: $MOCCASIN_PARSE_CACHE_DIR or ~/.cache/moccasin/parse)', 'option', 'd'),
+    max_size      = ('size limit in bytes (default: 256 MB)',                       'option', 'm', int),
+)
+
+explain_timing.__annotations__ = dict(
+    path          = ('path to MATLAB input file'),
+    lines         = ('number of lines to show (default: 20)',                      'option', 'n', int),
+    rules         = ('also show the time spent in each rule of the grammar',       'flag', 'r'),
+)
+
+# Commands other than conversion, selected by the first argument.
+
+commands = {'cache': cache, 'explain-timing': explain_timing}
+
 # -----------------------------------------------------------------------------
 # Entry point
 # -----------------------------------------------------------------------------
 
 def cli_main():
     #The argument parser is inferred - it also deals with too few or too many func args
-    plac.call(main)
+    if len(sys.argv) > 1 and sys.argv[1] in commands:
+        plac.call(commands[sys.argv[1]], sys.argv[2:])
+    else:
+        plac.call(main)
 
 cli_main()
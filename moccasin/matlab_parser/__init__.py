@@ -22,5 +22,9 @@
 
 from .grammar import MatlabGrammar
 from .context import MatlabContext
+from .cache import ParseCache
+from .callgraph import CallGraph, CallSite, call_graph
+from .passes import MatlabPass, PassPipeline
+from .profiler import RuleProfile
 from .matlab import *
 from .functions import *
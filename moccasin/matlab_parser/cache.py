@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+#
+# @file    cache.py
+# @brief   Persistent on-disk cache of MATLAB parse results
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# ParseCache stores the MatlabContext objects produced by MatlabGrammar in
+# files on disk, so that parsing the same MATLAB input again only costs
+# reading one file.  It is used by MatlabGrammar when one is given to its
+# constructor, or when the environment variable MOCCASIN_PARSE_CACHE_DIR is
+# set (see MatlabGrammar.__init__()).
+#
+# The cache is content-addressed: the name of each file is a hash of the
+# MATLAB input together with everything else that can change the result,
+# namely the parsing engine, the source code of this package, the version
+# of PyParsing and the version of Python (which determines the pickle
+# format).  A changed input or a changed parser therefore simply misses the
+# cache; nothing ever needs to be invalidated.  The entries for inputs that
+# are no longer used are removed by pruning.
+#
+# Pruning keeps the total size of the files under max_size bytes, by
+# removing the entries that were used least recently.  An entry's time of
+# last use is the modification time of its file, which get() updates.
+# Listing the directory to add up the sizes of the files would make filling
+# the cache take time that grows with the square of the number of entries,
+# so a ParseCache does that once, and then keeps a running total of the
+# bytes it writes and removes.  The total doesn't count what other
+# processes write to the same directory, but pruning lists the directory
+# and starts the total afresh from what is really there.
+#
+# Entries are written to a temporary file first and then renamed over the
+# entry's file, so that an entry is never read half written, and several
+# processes (e.g., the workers of MatlabGrammar.parse_files()) can share
+# one cache.  Failing to write an entry (because the disk is full, or the
+# context can't be pickled) never makes a parse fail; the result is just
+# not cached.
+
+from __future__ import print_function
+import glob
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+
+
+# os.rename() doesn't replace an existing file on Windows; os.replace(),
+# which does, is not in Python 2.
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+# Helper functions.
+# .............................................................................
+
+_source_digest = []
+
+def _parser_digest():
+    # Hash of the source files of this package and the version of PyParsing,
+    # computed once.  (PyParsing is imported here rather than at the top, so
+    # that importing the package doesn't import it; see grammar_rules.py.)
+    if not _source_digest:
+        import pyparsing
+        digest = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(here, '*.py'))):
+            with open(path, 'rb') as file:
+                digest.update(file.read())
+        digest.update(pyparsing.__version__.encode('utf-8'))
+        _source_digest.append(digest.hexdigest())
+    return _source_digest[0]
+
+
+# ParseCache.
+# .............................................................................
+
+class ParseCache(object):
+    """On-disk cache of MatlabContext objects, keyed by the MATLAB input."""
+
+    _suffix = '.pickle'
+
+    _default_max_size = 256*1024*1024
+
+    def __init__(self, directory=None, max_size=None):
+        """Creates a cache in `directory`, which is created if necessary.
+        The default directory is the value of the environment variable
+        MOCCASIN_PARSE_CACHE_DIR, or ~/.cache/moccasin/parse if that is not
+        set.  `max_size` is the limit on the total size of the cache in
+        bytes (default: 256 MB).
+        """
+        if directory is None:
+            directory = (os.environ.get('MOCCASIN_PARSE_CACHE_DIR')
+                         or os.path.join('~', '.cache', 'moccasin', 'parse'))
+        self.directory = os.path.abspath(os.path.expanduser(directory))
+        self.max_size = self._default_max_size if max_size is None else max_size
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self._size = None               # Running total; see the notes above.
+
+
+    def key(self, input, engine):
+        """Returns the cache key for parsing `input` with `engine`."""
+        if not isinstance(input, bytes):
+            input = input.encode('utf-8')
+        digest = hashlib.sha256()
+        for part in [_parser_digest(), engine, str(sys.version_info[:2])]:
+            digest.update(part.encode('utf-8'))
+            digest.update(b'\0')
+        digest.update(input)
+        return digest.hexdigest()
+
+
+    def get(self, key):
+        """Returns the MatlabContext stored under `key`, or None."""
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                context = pickle.load(file)
+        except (IOError, OSError):
+            return None
+        except Exception:
+            # A damaged entry, e.g., from a disk that filled up.
+            self._remove(path)
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return context
+
+
+    def put(self, key, context):
+        """Stores `context` under `key`, then prunes the cache if needed.
+        Returns False if `context` could not be stored, e.g., because it
+        can't be pickled or the disk is full, and True otherwise."""
+        path = self._path(key)
+        try:
+            handle, temp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        except (IOError, OSError):
+            return False
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                pickle.dump(context, file, pickle.HIGHEST_PROTOCOL)
+                written = file.tell()
+            replaced = self._file_size(path)
+            _replace(temp, path)
+        except (pickle.PicklingError, RuntimeError, IOError, OSError):
+            self._remove(temp)
+            return False
+        except Exception:
+            self._remove(temp)
+            raise
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += written - replaced
+        if self._size > self.max_size:
+            self.prune()
+        return True
+
+
+    def entries(self):
+        """Returns a list of tuples (key, size in bytes, time of last use)
+        for the entries in the cache, least recently used first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self._suffix):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((name[:-len(self._suffix)], stat.st_size,
+                            stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry[2])
+
+
+    def size(self):
+        """Returns the total size of the entries in bytes."""
+        return sum(entry[1] for entry in self.entries())
+
+
+    def prune(self, max_size=None):
+        """Removes the least recently used entries until the total size is
+        at most `max_size` bytes (default: the cache's max_size).  Returns
+        the number of entries removed."""
+        if max_size is None:
+            max_size = self.max_size
+        entries = self.entries()
+        total = sum(entry[1] for entry in entries)
+        removed = 0
+        for key, size, used in entries:
+            if total <= max_size:
+                break
+            self._remove(self._path(key))
+            total -= size
+            removed += 1
+        self._size = total
+        return removed
+
+
+    def clear(self):
+        """Removes all entries.  Returns the number of entries removed."""
+        return self.prune(0)
+
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + self._suffix)
+
+
+    def _file_size(self, path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
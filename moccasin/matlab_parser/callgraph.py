@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+#
+# @file    callgraph.py
+# @brief   Index of the function calls in the contexts of a parse
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of the call graph
+# ----------------------------------
+#
+# Every MatlabContext has a dictionary `calls` mapping the names of the
+# functions called in that context to the lists of arguments of the calls.
+# To infer the types of the parameters of a function, the NodeTransformer
+# in grammar.py needs the calls of that function in the contexts around its
+# definition, and the calls that hand a FuncHandle to it to some other
+# function.  Looking for those in the dictionaries of every context, and
+# in every list of arguments, for every function definition, takes time
+# that grows with the square of the size of files with many functions.
+#
+# A CallGraph indexes the calls of all the contexts of an input by the name
+# of the function called (the callee), and by the names of the functions
+# whose handles are among the arguments.  The lists of arguments themselves
+# stay in the `calls` of the contexts; the index only says which contexts
+# to look in.  MatlabGrammar keeps the index up to date as it records and
+# drops calls, so the index and the dictionaries always agree, and it
+# answers its _get_direct_calls() and _get_indirect_calls() methods from
+# it, with the same results in the same order as searching the contexts.
+#
+# The CallGraph is the `call_graph` of the topmost MatlabContext of the
+# input, where it can also be used after the parse (for example, by the
+# converter) to find the calls of a function anywhere in the input without
+# walking the contexts.  For a topmost MatlabContext that has none, such as
+# one that was put together by hand, call_graph() builds it from the
+# contexts.
+
+from collections import defaultdict, namedtuple
+try:
+    from matlab import FuncHandle
+except:
+    from .matlab import FuncHandle
+
+
+# A call of `callee` with the list of arguments `args` in the MatlabContext
+# `context`.
+
+CallSite = namedtuple('CallSite', ['context', 'callee', 'args'])
+
+
+class CallGraph(object):
+    """Index of the function calls recorded in a MatlabContext and all the
+    contexts of the functions defined inside it."""
+
+    def __init__(self):
+        self._callers = {}              # Callee -> {context: True}
+        self._handles = {}              # Name -> {context: {callee: count}}
+        self._order   = {}              # Context -> (size, {child: rank})
+
+
+    @classmethod
+    def build(cls, context):
+        """Returns a CallGraph of the calls in `context` and the contexts
+        of the functions defined in it, at any depth."""
+        graph = cls()
+        contexts = [context]
+        while contexts:
+            context = contexts.pop()
+            for name, arglists in context.calls.items():
+                for args in arglists:
+                    graph._index(context, name, args)
+            contexts.extend(context.functions.values())
+        return graph
+
+
+    def callees(self):
+        """Returns a list of the names of the functions called anywhere."""
+        return [name for name, contexts in self._callers.items()
+                if any(context.calls.get(name) for context in contexts)]
+
+
+    def calls_of(self, name):
+        """Returns a list of CallSite objects for the calls of `name`
+        anywhere, in no particular order."""
+        return [CallSite(context, name, args)
+                for context in self._callers.get(name, [])
+                for args in context.calls.get(name, [])]
+
+
+    def handle_uses(self, name):
+        """Returns a list of CallSite objects for the calls, anywhere, that
+        have a handle to the function `name` among their arguments, in no
+        particular order."""
+        return [CallSite(context, callee, args)
+                for context, callees in self._handles.get(name, {}).items()
+                for callee in callees
+                for args in _with_handle(context.calls.get(callee), name)]
+
+
+    def direct_calls(self, name, context, anywhere=False):
+        """Returns the lists of arguments of the calls of `name` in
+        `context`, and if `anywhere` is True, in the contexts of the
+        functions defined in `context` other than `name` itself.  Calls
+        without arguments are left out."""
+        calls = []
+        children = []
+        for caller in self._callers.get(name, []):
+            if caller is context:
+                calls += caller.calls.get(name, [])
+            elif (anywhere and self._is_child(caller, context)
+                  and caller.name != name):
+                children.append(caller)
+        for child in self._in_order(children, context):
+            calls += child.calls.get(name, [])
+        return [args for args in calls if args]
+
+
+    def indirect_calls(self, name, context, anywhere=False):
+        """Returns a dictionary mapping the names of the functions called
+        with a handle to `name` among their arguments, in `context`, to the
+        lists of arguments of those calls (a list appears once for each
+        handle to `name` in it).  If `anywhere` is True, the calls in the
+        contexts of the functions defined in `context` are included, and
+        the calls of a callee in the last of those contexts that has any
+        replace those found before."""
+        uses = self._handles.get(name, {})
+        calls = defaultdict(list)
+        children = []
+        for caller in uses:
+            if caller is context:
+                calls.update(self._uses_in(caller, name, uses[caller]))
+            elif anywhere and self._is_child(caller, context):
+                children.append(caller)
+        for child in self._in_order(children, context):
+            calls.update(self._uses_in(child, name, uses[child]))
+        return calls
+
+
+    def add(self, context, name, args):
+        """Records a call of `name` with `args` in `context`."""
+        if name not in context.calls:
+            context.calls[name] = [args]
+        else:
+            context.calls[name].append(args)
+        self._index(context, name, args)
+
+
+    def remove(self, context, name, args):
+        """Removes the call of `name` with the list `args` itself (not an
+        equal list) from `context`.  Returns True if there was such a call.
+        The entry of `name` in context.calls is left in place even if it is
+        empty; see prune()."""
+        arglists = dict.get(context.calls, name)
+        for index, other in enumerate(arglists or []):
+            if other is args:
+                del arglists[index]
+                self._unindex_handles(context, name, args)
+                return True
+        return False
+
+
+    def drop(self, context, name):
+        """Removes all the calls of `name` from `context`, and returns the
+        lists of arguments of the calls removed, or None if there were
+        none."""
+        arglists = context.calls.pop(name, None)
+        for args in (arglists or []):
+            self._unindex_handles(context, name, args)
+        self._forget_caller(context, name)
+        return arglists
+
+
+    def prune(self, context, name):
+        """Removes the entry of `name` in context.calls if it is empty."""
+        if name in context.calls and not context.calls[name]:
+            del context.calls[name]
+            self._forget_caller(context, name)
+
+
+    def _index(self, context, name, args):
+        self._callers.setdefault(name, {})[context] = True
+        for arg in (args or []):
+            if isinstance(arg, FuncHandle):
+                callees = self._handles.setdefault(arg.name, {}).setdefault(context, {})
+                callees[name] = callees.get(name, 0) + 1
+
+
+    def _unindex_handles(self, context, name, args):
+        for arg in (args or []):
+            if isinstance(arg, FuncHandle):
+                uses = self._handles[arg.name]
+                callees = uses[context]
+                callees[name] -= 1
+                if not callees[name]:
+                    del callees[name]
+                    if not callees:
+                        del uses[context]
+                        if not uses:
+                            del self._handles[arg.name]
+
+
+    def _forget_caller(self, context, name):
+        callers = self._callers.get(name)
+        if callers and context in callers:
+            del callers[context]
+            if not callers:
+                del self._callers[name]
+
+
+    def _uses_in(self, context, name, callees):
+        calls = defaultdict(list)
+        for callee in callees:
+            calls[callee] += _with_handle(context.calls.get(callee), name)
+        return calls
+
+
+    def _is_child(self, context, parent):
+        # True if `context` is the context of a function defined in `parent`.
+        return (context.parent is parent and not context.topmost
+                and parent.functions.get(context.name) is context)
+
+
+    def _in_order(self, children, parent):
+        # Sorts the contexts of functions defined in `parent` in the order
+        # of parent.functions, which is the order in which searching the
+        # contexts would find them.  Functions are only ever added.
+        if len(children) < 2:
+            return children
+        size, ranks = self._order.get(parent, (None, None))
+        if size != len(parent.functions):
+            ranks = dict((child, rank) for rank, child
+                         in enumerate(parent.functions.values()))
+            self._order[parent] = (len(parent.functions), ranks)
+        return sorted(children, key=ranks.get)
+
+
+def call_graph(context):
+    """Returns the CallGraph of the input that `context`, a MatlabContext,
+    is part of, which is kept in the topmost context of the input."""
+    while context.parent and not context.topmost:
+        context = context.parent
+    if getattr(context, 'call_graph', None) is None:
+        context.call_graph = CallGraph.build(context)
+    return context.call_graph
+
+
+def _with_handle(arglists, name):
+    # The lists in `arglists` with a handle to `name`, once for each handle.
+    return [args for args in (arglists or []) for arg in (args or [])
+            if isinstance(arg, FuncHandle) and arg.name == name]
@@ -21,8 +21,10 @@
 # ------------------------------------------------------------------------- -->
 
 from __future__ import print_function
-import collections
-from pyparsing import ParseResults
+try:
+    from callgraph import CallGraph
+except:
+    from .callgraph import CallGraph
 
 
 # The ContextDict class makes it easier to create dictionary-like properties
@@ -32,28 +34,63 @@ from pyparsing import ParseResults
 # "obj.prop[key] = value".  This means that obj.prop has to be a custom class
 # that supports the operations.
 #
-# This next class def is based on http://stackoverflow.com/a/7760938/743730
+# Looking things up is done a great many times while the parser infers the
+# types of things, so a ContextDict is a plain dict: looking up a key costs
+# nothing more than it does in a dict.  Only the methods that modify it are
+# overridden, to keep the scoped views of MatlabContext objects in step (see
+# "Scoped lookups" below).
 
-class ContextDict(collections.MutableMapping, dict):
+_missing = object()
+
+
+class ContextDict(dict):
     """Class used to implement MatlabContext properties that are dictionaries."""
 
-    def __getitem__(self, key):
-        return dict.__getitem__(self, key)
+    def __init__(self, *args, **kwargs):
+        dict.__init__(self, *args, **kwargs)
+        self._dependents = {}           # Context -> name of its view.
+
+    def __reduce__(self):
+        # The views are not worth saving; they are made again when needed.
+        return (self.__class__, (dict(self),))
 
     def __setitem__(self, key, value):
-        dict.__setitem__(self, key, value)
+        if dict.get(self, key, _missing) is not value:
+            dict.__setitem__(self, key, value)
+            self._changed()
 
     def __delitem__(self, key):
         dict.__delitem__(self, key)
+        self._changed()
+
+    def pop(self, key, *default):
+        if key in self:
+            self._changed()
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._changed()
+        return item
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return dict.__getitem__(self, key)
 
-    def __iter__(self):
-        return dict.__iter__(self)
+    def update(self, *args, **kwargs):
+        dict.update(self, *args, **kwargs)
+        self._changed()
 
-    def __len__(self):
-        return dict.__len__(self)
+    def clear(self):
+        dict.clear(self)
+        self._changed()
 
-    def __contains__(self, x):
-        return dict.__contains__(self, x)
+    def _changed(self):
+        # Drops the views of the contexts that saw the old contents.
+        for context, table in self._dependents.items():
+            context._scopes.pop(table, None)
+        self._dependents.clear()
 
 
 class MatlabContext(object):
@@ -121,7 +158,36 @@ class MatlabContext(object):
       file:        If the contents of this context came from a file, the path
                    to the file.
 
-    Users can access via the normal x.propname approach.
+      parse_stats: In the topmost context, the PackratStats object holding
+                   the packrat cache statistics of the parse (hits, misses,
+                   evictions and peak_entries) and the number of statements
+                   parsed (statements, of which fast_statements took the
+                   fast path for simple statements), if the 'pyparsing'
+                   engine was used.  It is None if the 'descent' engine was used or
+                   if the results came from a ParseCache.
+
+      inference_passes: In the topmost context, the number of passes over
+                   the nodes that the inference of types took (see
+                   inference.py), or for input parsed in parts by
+                   MatlabGrammar.iter_parse(), the largest number any part
+                   took.
+
+      call_graph:  In the topmost context, the CallGraph object indexing the
+                   calls of this context and of all the functions defined in
+                   it (see callgraph.py).  Use callgraph.call_graph() to get
+                   it from any context; it is built on first use.  It is
+                   not pickled with the context, but built again when it
+                   is next used.
+
+      diagnostics: In the topmost context, the list of ParseError objects
+                   for the statements that could not be parsed, in the
+                   order of the input, when the input was parsed with
+                   recover=True.  The same objects are in the nodes in
+                   place of those statements.  Otherwise, the list is empty.
+
+    Users can access via the normal x.propname approach.  The methods
+    lookup() and scope() find functions, assignments and types the way the
+    parser does, in this context and the contexts around it.
 
     To make a copy of a Context object, use the Python 'copy' module.
 
@@ -129,6 +195,7 @@ class MatlabContext(object):
 
     def __init__(self, name=None, parent=None, nodes=None, parameters=[],
                  returns=[], pr=None, file=None, topmost=False):
+        self._scopes        = {}         # Table name -> view; see scope().
         self.topmost        = topmost    # Whether this is the top context.
         self.name           = name       # Name of this context.
         self.parameters     = parameters # Arg list, if this is a function.
@@ -138,6 +205,11 @@ class MatlabContext(object):
         self.nodes          = nodes      # The list of MatlabNode objects.
         self.parse_results  = pr         # The corresponding ParseResults obj.
         self.file           = file       # The path to the file, if any.
+        self.parse_stats    = None       # Packrat cache statistics, if any.
+        self.inference_passes = None     # Passes of the type inference.
+        self.diagnostics    = []         # Statements that couldn't be parsed.
+        self._call_graph    = None       # Index of calls, in the top context.
+        self._statements    = None       # For MatlabGrammar.reparse().
         self._functions     = ContextDict()
         self._assignments   = ContextDict()
         self._calls         = ContextDict()
@@ -157,6 +229,102 @@ class MatlabContext(object):
                         len(self._calls), parent_name, self.file)
 
 
+    # The scoped views, the call graph and the statements recorded for
+    # reparse() can all be large, and are left out when a context is
+    # pickled (e.g., by a ParseCache, or to send it back from a worker of
+    # MatlabGrammar.parse_files()).  The first two are rebuilt when they
+    # are needed; without the last, reparse() parses everything again.
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_scopes'] = {}
+        state['_call_graph'] = None
+        state['_statements'] = None
+        return state
+
+
+    @property
+    def call_graph(self):
+        if self._call_graph is None and self.topmost:
+            self._call_graph = CallGraph.build(self)
+        return self._call_graph
+
+
+    @call_graph.setter
+    def call_graph(self, graph):
+        self._call_graph = graph
+
+
+    # Scoped lookups.
+    #
+    # Something is looked up in a context the way the parser resolves
+    # names: in the context itself, then in its parent, and so on up to
+    # the topmost context.  Rather than walking up the contexts every time,
+    # scope() returns a dictionary holding all the entries of a table
+    # ('functions', 'assignments' or 'types') seen from a context, with the
+    # entries of inner contexts hiding those of outer ones.  It is made the
+    # first time it is needed and kept in _scopes.  The ContextDict of
+    # every context that went into it records that, and when one of them
+    # is modified, the view is dropped, to be made again on the next use.
+    # So is the view of a context whose parent changes.
+    #
+    # A context without a parent (the topmost one) needs no view: the
+    # dictionary itself is it.  lookup() looks in the context's own
+    # dictionary and then in the scope() of the parent, so looking
+    # something up in the context of a function defined at the top of a
+    # file takes two dictionary lookups, and copies nothing.
+    # .........................................................................
+
+    _tables = ('functions', 'assignments', 'types')
+
+    @property
+    def parent(self):
+        """The context containing this one, or None."""
+        return self._parent
+
+
+    @parent.setter
+    def parent(self, parent):
+        if parent is not self.__dict__.get('_parent', _missing):
+            self._parent = parent
+            for table in self._tables:
+                if '_' + table in self.__dict__:
+                    getattr(self, '_' + table)._changed()
+
+
+    def scope(self, table):
+        """Returns a dictionary of the entries of `table`, which is one of
+        'functions', 'assignments' and 'types', that are visible in this
+        context: its own, and those of the contexts containing it that it
+        doesn't hide.  The dictionary must not be modified."""
+        view = self._scopes.get(table)
+        if view is not None:
+            return view
+        own = getattr(self, '_' + table)
+        if self._parent is None:
+            return own
+        view = dict(self._parent.scope(table))
+        view.update(own)
+        context = self
+        while context is not None:
+            getattr(context, '_' + table)._dependents[self] = table
+            context = context._parent
+        self._scopes[table] = view
+        return view
+
+
+    def lookup(self, table, key, default=None):
+        """Returns the value of `key` in `table` (see scope()) in the
+        innermost context, starting from this one, that has it, or `default`
+        if none does."""
+        own = getattr(self, '_' + table)
+        if key in own:
+            return own[key]
+        if self._parent is None:
+            return default
+        return self._parent.scope(table).get(key, default)
+
+
     @property
     def functions(self):
         """Allows access to the 'functions' property as a dictionary."""
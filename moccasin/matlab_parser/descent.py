@@ -0,0 +1,1157 @@
+#!/usr/bin/env python
+#
+# @file    descent.py
+# @brief   Recursive-descent parsing engine for MATLAB input
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of the recursive-descent engine
+# ------------------------------------------------
+#
+# MatlabDescentParser is an alternative to the PyParsing grammar defined in
+# grammar_rules.py.  It is selected by calling MatlabGrammar.parse_string() or
+# MatlabGrammar.parse_file() with engine='descent'.  It produces MatlabNode
+# objects directly, without going through ParseResults, and its running
+# time grows linearly with the size of the input instead of depending on
+# PyParsing's packrat cache to avoid exponential behavior.
+#
+# The output of this engine must be identical to the output produced by the
+# PyParsing grammar, including for input that MATLAB itself would reject.
+# For that reason, the methods below follow the PyParsing grammar rule by
+# rule, and the comments in each method name the grammar object it stands
+# for.  Most of the subtle parts concern whitespace.  PyParsing skips the
+# whitespace characters defined for a given grammar element in front of
+# that element, and the grammar in grammar_rules.py relies on different
+# elements having different definitions of whitespace (in particular,
+# whether line breaks count as whitespace).  The methods below make the same skips
+# explicitly, using the following conventions:
+#
+# * Methods take a position in the input text and return either None (when
+#   the construct is not found at that position) or a tuple consisting of
+#   the result and the position just past the end of the construct.
+#
+# * Unless noted otherwise, a method does not skip whitespace at the
+#   position it is given; skipping whitespace in front of a construct is the
+#   responsibility of the caller, the same as in PyParsing.
+#
+# * Inside square brackets and braces, the PyParsing grammar uses versions
+#   of many elements that do not skip whitespace at all (see the discussion
+#   of _operand_in_array in grammar_rules.py).  Here, the methods concerned take a
+#   flag, `tight`, that turns off whitespace skipping in the same places.
+#
+# Terminals (numbers, strings, identifiers, keywords, comments and
+# transpose operators) come from the same TokenTable that the PyParsing
+# grammar uses, so both engines see the same tokens.  A handful of methods
+# are memoized, so that alternatives that start with the same construct
+# (e.g., an array access and a structure access) don't parse it again.
+#
+# The engine does not create contexts while it parses, because it may
+# parse a function definition and then discard it in favor of another
+# interpretation of the input.  Contexts are created in a separate pass
+# over the final list of nodes, in the same order as
+# MatlabGrammar._finish_statements() creates them for the PyParsing results.
+
+from __future__ import print_function
+import re
+try:
+    from lexer import NUMBER, STRING, IDENTIFIER, KEYWORD, OPERATOR, COMMENT, \
+        TokenTable
+    from expression import ExpressionParser
+    from prescan import chunk_starts, function_style, has_functions
+    from matlab import *
+except:
+    from .lexer import NUMBER, STRING, IDENTIFIER, KEYWORD, OPERATOR, COMMENT, \
+        TokenTable
+    from .expression import ExpressionParser
+    from .prescan import chunk_starts, function_style, has_functions
+    from .matlab import *
+
+
+# Exception classes
+# .............................................................................
+
+class MatlabDescentException(Exception):
+    """Raised when the input cannot be parsed.  The message uses the same
+    format as PyParsing's ParseException."""
+
+    def __init__(self, text, loc, msg):
+        self.loc = loc
+        self.msg = msg
+        self.lineno = text.count('\n', 0, loc) + 1
+        if loc < len(text) and text[loc] == '\n':
+            self.column = 1
+        else:
+            self.column = loc - text.rfind('\n', 0, loc)
+        super(MatlabDescentException, self).__init__(str(self))
+
+
+    def __str__(self):
+        return '{0} (at char {1}), (line:{2}, col:{3})'.format(
+            self.msg, self.loc, self.lineno, self.column)
+
+
+# Constants.
+# .............................................................................
+
+# Whitespace definitions used by different parts of the PyParsing grammar.
+
+_S = ' \t'                              # Whitespace within a line.
+_A = ' \t\n\r'                          # Any whitespace.
+_N = '\n\r'                             # Line breaks only.
+_T = ' \t\r'                            # Whitespace in front of a line end.
+
+# Operators after which whitespace indicates that an identifier followed
+# by whitespace is not a command-syntax function call (_most_ops).  Longer
+# operators come first, so that the first match is also the longest match,
+# as with PyParsing's "^" operator.
+
+_MOST_OPS     = ['&&', '||', '.*', './', '.\\', '.^', '<=', '>=', '==', '~=',
+                 ".'", '+', '-', '*', '/', '\\', '^', '<', '>', '&', '|', ':']
+
+# Characters that end a command-syntax argument (the CharsNotIn term).
+
+_CMD_ARG_RE   = re.compile(r'[^ ,;\t\n\r]+')
+_DASH_TERM_RE = re.compile(r'-[A-Za-z][A-Za-z0-9_]*')
+
+_TRANSPOSE_OPS = ("'", ".'")
+
+
+# MatlabDescentParser
+# .............................................................................
+
+class MatlabDescentParser(ExpressionParser):
+    """Recursive-descent parser producing the same MatlabNode objects as the
+    PyParsing grammar in MatlabGrammar.
+
+    `parser` is the MatlabGrammar object on whose behalf the parsing is
+    done; contexts for function definitions are created through it.
+    `disambiguator` is the MatlabNodeVisitor class used to resolve loop and
+    catch variables in the bodies of 'for' and 'try' statements.
+    """
+
+    def __init__(self, parser, disambiguator):
+        self._parser        = parser
+        self._disambiguator = disambiguator
+        self._tokens        = TokenTable()
+        self._text          = ''
+        self._len           = 0
+        self._memo          = {}
+        self._starts        = []
+        self._chunk         = 0
+
+
+    def parse(self, text):
+        """Parses the (already preprocessed) MATLAB `text` and returns the
+        list of MatlabNode objects for it.  Raises MatlabDescentException if
+        the text cannot be parsed."""
+        # PyParsing expands tabs before parsing, and so must we.
+        text = text.expandtabs()
+        self._text = text
+        self._len = len(text)
+        self._tokens.reset(text)
+        self._starts = chunk_starts(text)
+
+        # _matlab_file: the two styles of files differ in whether function
+        # definitions end with 'end'.  The longest match wins, and the first
+        # wins a tie.  A style that reaches the end can't be beaten, and
+        # the styles are the same if there are no function definitions.
+        # The style that function_style() guesses is tried first.
+        best = None
+        styles = (False, True)
+        if has_functions(text) and function_style(text):
+            styles = (True, False)
+        for deep in styles:
+            self._memo = {}
+            self._chunk = 1
+            nodes, end = self._stmt_list(0, deep, top=True)
+            if best is None or end > best[1] or (end == best[1] and not deep):
+                best = (nodes, end)
+            if end > self._len or not has_functions(text):
+                break
+        self._memo = {}
+
+        nodes, end = best
+        end = self._skip(end, _A)
+        if end < self._len:
+            raise MatlabDescentException(text, end, 'Expected end of text')
+        self._make_contexts(nodes)
+        return nodes
+
+
+    # Context creation.
+    # .........................................................................
+
+    def _make_contexts(self, nodes):
+        for node in nodes:
+            if isinstance(node, FunDef):
+                node.context = self._parser._save_function_definition(node)
+                self._parser._push_context(node.context)
+                self._make_contexts(node.body)
+                self._parser._pop_context()
+
+
+    # Low-level helpers.
+    # .........................................................................
+    #
+    # _skip(), _char() and _white() are inherited from ExpressionParser.
+
+    def _pre(self, pos, chars, tight):
+        return pos if tight else self._skip(pos, chars)
+
+
+    def _opt_white(self, pos, tight):
+        # Optional(_WHITE) that is not the first element of a sequence: line
+        # breaks in front of it are consumed even if no spaces follow.
+        pos = self._pre(pos, _N, tight)
+        return self._white(pos) or pos
+
+
+    def _eol(self, pos, tight=False):
+        # _EOL.  Like PyParsing's LineEnd, this matches the end of the text
+        # and returns a position one past it.
+        pos = self._pre(pos, _T, tight)
+        if pos < self._len:
+            if self._text[pos] == '\n':
+                return pos + 1
+            return None
+        elif pos == self._len:
+            return pos + 1
+        return None
+
+
+    def _token(self, pos, kind, values=None):
+        if pos >= self._len:
+            return None
+        token = self._tokens.token_at(self._text, pos, kind)
+        if token is None or (values and token.value not in values):
+            return None
+        return token
+
+
+    def _keyword(self, pos, *values):
+        token = self._token(pos, KEYWORD, values)
+        return token.end if token else None
+
+
+    def _identifier(self, pos):
+        # _id
+        token = self._token(pos, IDENTIFIER)
+        if token is None:
+            return None
+        return Identifier(name=token.value), token.end
+
+
+    def _string_value(self, token):
+        # Same conversion of escaped whitespace as MatlabToken.
+        value = token.value
+        if '\\' in value:
+            for escape, char in [(r'\t', '\t'), (r'\n', '\n'),
+                                 (r'\f', '\f'), (r'\r', '\r')]:
+                value = value.replace(escape, char)
+        return value
+
+
+    def _match_op(self, pos, ops):
+        text = self._text
+        for op in ops:
+            if text.startswith(op, pos):
+                return op
+        return None
+
+
+    # Comments and delimiters.
+    # .........................................................................
+
+    def _comment(self, pos, tight=False):
+        # _comment: a block comment, or a line comment followed by _EOL.
+        pos = self._pre(pos, _A, tight)
+        token = self._token(pos, COMMENT)
+        if token is None:
+            return None
+        text = self._text
+        if (text.startswith('%{', token.start)
+                and text.endswith('%}', token.start + 2, token.end)):
+            return Comment(content=token.value.lstrip(_A)), token.end
+        end = self._eol(token.end, tight)
+        if end is None:
+            return None
+        return Comment(content=token.value), end
+
+
+    def _noncontent(self, pos):
+        # _noncontent: returns (node or None, end).
+        q = self._skip(pos, _S)
+        if q < self._len and self._text[q] in ',;':
+            return None, q + 1
+        comment = self._comment(pos)
+        if comment:
+            return comment
+        end = self._eol(pos)
+        if end is not None:
+            return None, end
+        return None
+
+
+    # Expressions.
+    # .........................................................................
+    #
+    # Operators are handled by ExpressionParser (see expression.py), which
+    # calls _operand(), _expr() and _transpose() below.  `array` selects
+    # between _expr and _expr_in_array.
+
+    def _expr(self, pos, array=False):
+        # _expr and _expr_in_array.
+        pos = self._skip(pos, _A)
+        key = ('expr', pos, array)
+        if key in self._memo:
+            return self._memo[key]
+        result = self._expression(pos, array)
+        self._memo[key] = result
+        return result
+
+
+    def _transpose(self, pos):
+        # Transpose operators, which must follow the operand immediately.
+        token = self._token(pos, OPERATOR, _TRANSPOSE_OPS)
+        if token is None:
+            return None
+        return token.value, token.end
+
+
+    # Operands.
+    # .........................................................................
+
+    def _operand(self, pos, tight):
+        # _operand, or _operand_in_array if `tight`.
+        key = ('operand', pos, tight)
+        if key in self._memo:
+            return self._memo[key]
+        result = None
+        if tight:
+            if self._keyword(pos, 'end') is not None:
+                result = (Special(value='end'), self._keyword(pos, 'end'))
+            elif self._char(pos) == '~':
+                result = (Special(value='~'), pos + 1)
+        if result is None:
+            result = (self._funcall(pos, tight)
+                      or self._struct_access(pos, tight)
+                      or self._array_access(pos, tight)
+                      or self._cell_access(pos, tight)
+                      or self._bare_cell(pos, tight)
+                      or self._bare_array(pos, tight)
+                      or self._fun_handle(pos, tight)
+                      or self._ambiguous_id(pos, tight)
+                      or self._number(pos, tight)
+                      or self._string(pos, tight))
+        self._memo[key] = result
+        return result
+
+
+    def _number(self, pos, tight):
+        token = self._token(self._pre(pos, _A, tight), NUMBER)
+        if token is None:
+            return None
+        return Number(value=token.value), token.end
+
+
+    def _string(self, pos, tight):
+        token = self._token(self._pre(pos, _A, tight), STRING)
+        if token is None:
+            return None
+        return String(value=self._string_value(token)), token.end
+
+
+    def _ambiguous_id(self, pos, tight):
+        result = self._identifier(self._pre(pos, _A, tight))
+        if result is None:
+            return None
+        return Ambiguous(name=result[0], args=None), result[1]
+
+
+    def _funcall(self, pos, tight):
+        # _funcall_or_array, or _funcall_or_array_in_array if `tight`.
+        pos = self._pre(pos, _A, tight)
+        key = ('funcall', pos, tight)
+        if key in self._memo:
+            return self._memo[key]
+        result = None
+        name = self._longest([self._cell_access(pos, tight),
+                              self._simple_struct(pos, tight),
+                              self._identifier(self._pre(pos, _A, tight))])
+        if name is not None:
+            q = self._pre(name[1], _S, tight)
+            if self._char(q) == '(':
+                args, q = self._call_args(q + 1, tight)
+                q = self._pre(q, _S, tight)
+                if self._char(q) == ')':
+                    result = (Ambiguous(name=name[0], args=args), q + 1)
+        self._memo[key] = result
+        return result
+
+
+    def _call_args(self, pos, tight):
+        # _opt_arglist.  Returns (list of arguments, end).
+        pos = self._pre(pos, _A, tight)
+        first = self._expr(pos)
+        if first is None:
+            return [], pos
+        args = [first[0]]
+        end = first[1]
+        while True:
+            q = self._pre(end, _S, tight)
+            if self._char(q) != ',':
+                break
+            arg = self._expr(q + 1)
+            if arg is None:
+                break
+            args.append(arg[0])
+            end = arg[1]
+        return args, end
+
+
+    def _longest(self, results):
+        # PyParsing's "^": the longest match wins, and the first wins ties.
+        best = None
+        for result in results:
+            if result is not None and (best is None or result[1] > best[1]):
+                best = result
+        return best
+
+
+    def _struct_field(self, pos, tight):
+        # _struct_field.  Returns ((field, dynamic), end).
+        ident = self._identifier(self._pre(pos, _A, tight))
+        if ident is not None:
+            return (ident[0], False), ident[1]
+        q = self._pre(pos, _S, tight)
+        if self._char(q) == '(':
+            field = self._expr(q + 1)
+            if field is not None:
+                q = self._pre(field[1], _S, tight)
+                if self._char(q) == ')':
+                    return (field[0], True), q + 1
+        return None
+
+
+    def _struct_rest(self, base, pos, tight):
+        # The part of a structure reference that follows the base.
+        q = self._opt_white(pos, tight)
+        q = self._pre(q, _S, tight)
+        if self._char(q) != '.':
+            return None
+        q = self._opt_white(q + 1, tight)
+        field = self._struct_field(q, tight)
+        if field is None:
+            return None
+        (name, dynamic), end = field
+        return StructRef(name=base, field=name, dynamic=dynamic), end
+
+
+    def _simple_struct(self, pos, tight):
+        # _simple_struct
+        pos = self._pre(pos, _A, tight)
+        key = ('simple struct', pos, tight)
+        if key in self._memo:
+            return self._memo[key]
+        result = None
+        base = (self._array_access(pos, tight)
+                or self._identifier(self._pre(pos, _A, tight)))
+        if base is not None:
+            result = self._struct_rest(base[0], base[1], tight)
+        self._memo[key] = result
+        return result
+
+
+    def _struct_access(self, pos, tight):
+        # _struct_access
+        pos = self._pre(pos, _A, tight)
+        key = ('struct access', pos, tight)
+        if key in self._memo:
+            return self._memo[key]
+        result = None
+        simple = self._simple_struct(pos, tight)
+        if simple is not None:
+            # "_simple_struct + Optional(_WHITE) + FollowedBy(_DOT)"
+            q = self._opt_white(simple[1], tight)
+            if self._char(self._pre(q, _S, tight)) == '.':
+                simple = (simple[0], q)
+            else:
+                simple = None
+        base = self._longest([simple,
+                              self._fun_handle(pos, tight),
+                              self._funcall(pos, False),
+                              self._cell_access(pos, tight),
+                              self._array_access(pos, tight),
+                              self._identifier(self._pre(pos, _A, tight))])
+        if base is not None:
+            result = self._struct_rest(base[0], base[1], tight)
+        self._memo[key] = result
+        return result
+
+
+    def _array_access(self, pos, tight):
+        # _array_access
+        pos = self._pre(pos, _A, tight)
+        key = ('array access', pos, tight)
+        if key in self._memo:
+            return self._memo[key]
+        result = None
+        base = (self._cell_access(pos, tight)
+                or self._identifier(self._pre(pos, _A, tight)))
+        if base is not None:
+            q = self._pre(base[1], _S, tight)
+            if self._char(q) == '(':
+                q = self._pre(q + 1, _S, tight)
+                args, q = self._comma_subs(q, tight)
+                q = self._pre(q, _S, tight)
+                if self._char(q) == ')':
+                    node = ArrayRef(name=base[0], args=args, is_cell=False)
+                    result = (node, q + 1)
+        self._memo[key] = result
+        return result
+
+
+    def _cell_access(self, pos, tight):
+        # _cell_access: _cell_nested | _cell_base
+        pos = self._pre(pos, _A, tight)
+        key = ('cell access', pos, tight)
+        if key in self._memo:
+            return self._memo[key]
+        result = None
+        name = self._identifier(pos)
+        if name is not None:
+            args = self._cell_args(name[1], tight)
+            if args is not None:
+                node = ArrayRef(name=name[0], args=args[0], is_cell=True)
+                result = (node, args[1])
+                nested = self._cell_args(args[1], tight)
+                if nested is not None:
+                    node = ArrayRef(name=node, args=nested[0], is_cell=True)
+                    result = (node, nested[1])
+        self._memo[key] = result
+        return result
+
+
+    def _cell_args(self, pos, tight):
+        # "_LBRACE + _cell_args + _RBRACE".  Returns (subscripts, end).
+        q = self._pre(pos, _S, tight)
+        if self._char(q) != '{':
+            return None
+        q = self._pre(q + 1, _N, tight)
+        q = self._white(q) or q
+        q = self._pre(q, _S, tight)
+        args, q = self._comma_subs(q, tight)
+        q = self._opt_white(q, tight)
+        q = self._pre(q, _S, tight)
+        if self._char(q) != '}':
+            return None
+        return args, q + 1
+
+
+    def _bare_cell(self, pos, tight):
+        # _bare_cell
+        q = self._pre(pos, _S, tight)
+        if self._char(q) != '{':
+            return None
+        q = self._opt_white(q + 1, tight)
+        rows, q = self._rows(q, tight)
+        q = self._opt_white(q, tight)
+        q = self._pre(q, _S, tight)
+        if self._char(q) != '}':
+            return None
+        return Array(rows=rows, is_cell=True), q + 1
+
+
+    def _bare_array(self, pos, tight):
+        # _bare_array
+        q = self._pre(pos, _S, tight)
+        if self._char(q) != '[':
+            return None
+        rows, q = self._rows(q + 1, tight)
+        q = self._pre(q, _S, tight)
+        if self._char(q) != ']':
+            return None
+        return Array(rows=rows, is_cell=False), q + 1
+
+
+    def _fun_handle(self, pos, tight):
+        # _fun_handle: _named_handle | _anon_handle
+        pos = self._pre(pos, _A, tight)
+        if self._char(pos) != '@':
+            return None
+        name = self._identifier(self._pre(pos + 1, _A, tight))
+        if name is not None:
+            return FuncHandle(name=name[0]), name[1]
+        q = self._pre(pos + 1, _S, tight)
+        if self._char(q) != '(':
+            return None
+        q = self._pre(q + 1, _S, tight)
+        params = self._paramlist(q, tight)
+        if params is not None:
+            q = params[1]
+        q = self._pre(q, _S, tight)
+        if self._char(q) != ')':
+            return None
+        body = self._expr(q + 1)
+        if body is None:
+            return None
+        args = params[0] if params is not None else []
+        return AnonFun(args=args, body=body[0]), body[1]
+
+
+    def _one_param(self, pos, tight):
+        # _one_param
+        pos = self._pre(pos, _A, tight)
+        if self._char(pos) == '~':
+            return Special(value='~'), pos + 1
+        return self._identifier(pos)
+
+
+    def _paramlist(self, pos, tight):
+        # _paramlist.  Returns (list of parameters, end) or None.
+        param = self._one_param(pos, tight)
+        if param is None:
+            return None
+        params = [param[0]]
+        end = param[1]
+        while True:
+            q = self._pre(end, _S, tight)
+            if self._char(q) != ',':
+                break
+            param = self._one_param(q + 1, tight)
+            if param is None:
+                break
+            params.append(param[0])
+            end = param[1]
+        return params, end
+
+
+    # Array contents and subscripts.
+    # .........................................................................
+
+    def _one_sub(self, pos, tight):
+        # _one_sub
+        q = self._pre(pos, _S, tight)
+        if self._char(q) == ':':
+            return Special(value=':'), q + 1
+        result = self._expr(pos, True)
+        if result is not None:
+            return result
+        if self._char(q) == '(':
+            inner = self._expr(q + 1)
+            if inner is not None:
+                q = self._pre(inner[1], _S, tight)
+                if self._char(q) == ')':
+                    return inner[0], q + 1
+        return None
+
+
+    def _comma_subs(self, pos, tight):
+        # _comma_subs.  Always succeeds; returns (list of subscripts, end).
+        subs = []
+        sub = self._one_sub(pos, tight)
+        if sub is not None:
+            subs.append(sub[0])
+            pos = sub[1]
+        # PyParsing's ZeroOrMore keeps the line breaks it skips in front of
+        # the first repetition, even if the repetition doesn't match.
+        pos = self._pre(pos, _N, tight)
+        while True:
+            q = self._pre(pos, _N, tight)
+            q = self._white(q) or q
+            q = self._pre(q, _S, tight)
+            if self._char(q) != ',':
+                break
+            q = self._opt_white(q + 1, tight)
+            sub = self._one_sub(q, tight)
+            if sub is not None:
+                subs.append(sub[0])
+                q = sub[1]
+            pos = q
+        return subs, pos
+
+
+    def _space_subs(self, pos):
+        # _space_subs.  Only used in rows, where whitespace is significant.
+        sub = self._one_sub(pos, True)
+        if sub is None:
+            return None
+        subs = [sub[0]]
+        pos = sub[1]
+        while True:
+            q = self._white(pos)
+            if q is None:
+                break
+            sub = self._one_sub(q, True)
+            if sub is None:
+                break
+            subs.append(sub[0])
+            pos = sub[1]
+        return subs, pos
+
+
+    def _one_row(self, pos):
+        # _one_row.  Always succeeds, possibly with an empty row.
+        commas = self._comma_subs(pos, True)
+        spaces = self._space_subs(pos)
+        if spaces is not None and spaces[1] > commas[1]:
+            return spaces
+        return commas
+
+
+    def _row_sep(self, pos, tight):
+        # _row_sep.  Returns the end position, or None.
+        start = self._pre(pos, _N, tight)
+        start = self._white(start) or start
+        q = self._pre(start, _S, tight)
+        if self._char(q) == ';':
+            q = self._opt_white(q + 1, tight)
+            comment = self._comment(q, tight)
+            return comment[1] if comment else q
+        comment = self._comment(start, tight)
+        if comment is not None:
+            return comment[1]
+        return self._eol(pos, tight)
+
+
+    def _rows(self, pos, tight):
+        # _rows.  Returns (list of rows, end).  MATLAB drops empty rows.
+        q = self._pre(pos, _N, tight)
+        q = self._white(q) or q
+        rows = []
+        row, q = self._one_row(q)
+        rows.append(row)
+        while True:
+            r = self._pre(q, _S, tight)
+            sep = self._row_sep(r, tight)
+            if sep is None:
+                break
+            row, q = self._one_row(sep)
+            rows.append(row)
+        q = self._opt_white(q, tight)
+        return [row for row in rows if row], q
+
+
+    # Statements.
+    # .........................................................................
+
+    def _stmt_list(self, pos, deep=False, top=False, fun_defs=False):
+        # _stmt_list, _fun_body, and the two halves of _matlab_file.
+        # Returns (list of nodes, end).
+        nodes = []
+        while True:
+            if top:
+                self._next_chunk(pos)
+            candidates = []
+            if top or fun_defs:
+                candidates.append(self._fun_def(pos, deep))
+            candidates.append(self._stmt(pos))
+            candidates.append(self._shell_cmd(pos))
+            candidates.append(self._noncontent(pos))
+            item = self._longest(candidates)
+            if item is None:
+                return nodes, pos
+            node, pos = item
+            if node is not None:
+                nodes.append(node)
+
+
+    def _next_chunk(self, pos):
+        # The memo table is cleared whenever the parse moves on to a new
+        # top-level chunk of the input (see prescan.py).
+        starts = self._starts
+        if self._chunk < len(starts) and pos >= starts[self._chunk]:
+            self._memo = {}
+            while self._chunk < len(starts) and pos >= starts[self._chunk]:
+                self._chunk += 1
+
+
+    def _body(self, pos):
+        # Group(_stmt_list)
+        return self._stmt_list(self._skip(pos, _A))
+
+
+    def _stmt(self, pos):
+        # _stmt
+        pos = self._skip(pos, _A)
+        return (self._control_stmt(pos)
+                or self._scope_stmt(pos)
+                or self._assignment(pos)
+                or self._command_stmt(pos)
+                or self._standalone_expr(pos))
+
+
+    def _shell_cmd(self, pos):
+        # _shell_cmd
+        pos = self._skip(pos, _A)
+        if self._char(pos) != '!':
+            return None
+        eol = self._text.find('\n', pos + 1)
+        if eol < 0:
+            eol = self._len
+        cmd = self._text[pos + 1:eol]
+        end = self._eol(eol)
+        if end is None:
+            return None
+        backgrounded = cmd.strip().endswith('&')
+        if backgrounded:
+            cmd = cmd[:cmd.rfind('&') - 1]
+        return ShellCommand(command=cmd, background=backgrounded), end
+
+
+    def _scope_stmt(self, pos):
+        # _scope_stmt
+        token = self._token(pos, KEYWORD, ('persistent', 'global'))
+        if token is None:
+            return None
+        var = self._identifier(self._skip(token.end, _A))
+        if var is None:
+            return None
+        variables = [var[0]]
+        end = var[1]
+        while True:
+            q = self._white(end)
+            var = self._identifier(q) if q is not None else None
+            if var is None:
+                break
+            variables.append(var[0])
+            end = var[1]
+        return ScopeDecl(type=token.value, variables=variables), end
+
+
+    def _assignment(self, pos):
+        # _assignment: _other_assign | _simple_assign
+        lhs = (self._struct_access(pos, False)
+               or self._array_access(pos, False)
+               or self._cell_access(pos, False)
+               or self._bare_array(pos, False))
+        result = self._assignment_rest(lhs)
+        if result is None:
+            result = self._assignment_rest(self._identifier(pos))
+        return result
+
+
+    def _assignment_rest(self, lhs):
+        if lhs is None:
+            return None
+        q = self._skip(lhs[1], _S)
+        if self._char(q) != '=':
+            return None
+        rhs = self._expr(q + 1)
+        if rhs is None:
+            return None
+        return Assignment(lhs=lhs[0], rhs=rhs[0]), rhs[1]
+
+
+    def _command_stmt(self, pos):
+        # _funcall_cmd_style
+        name = self._identifier(pos)
+        if name is None or self._eol(name[1]) is not None:
+            return None
+        q = self._white(self._skip(name[1], _N))
+        if q is None or self._noncmd_arg_start(q):
+            return None
+        arg = self._cmd_arg(q)
+        if arg is None:
+            return None
+        args = [arg[0]]
+        end = arg[1]
+        while self._noncontent(end) is None:
+            arg = self._cmd_arg(self._opt_white(end, False))
+            if arg is None:
+                break
+            args.append(arg[0])
+            end = arg[1]
+        return FunCall(name=name[0], args=[String(value=x) for x in args]), end
+
+
+    def _noncmd_arg_start(self, pos):
+        # _noncmd_arg_start
+        q = self._skip(pos, _S)
+        if self._char(q) in ('=', '(', ',', ';'):
+            return True
+        op = self._match_op(q, _MOST_OPS)
+        if op is not None and self._white(self._skip(q + len(op), _N)):
+            return True
+        return self._comment(pos) is not None
+
+
+    def _cmd_arg(self, pos):
+        # _fun_cmd_arg.  Returns (string, end).
+        token = self._token(self._skip(pos, _A), STRING)
+        if token is not None:
+            return self._string_value(token), token.end
+        q = self._skip(pos, _S)
+        match = _DASH_TERM_RE.match(self._text, q)
+        if match:
+            return match.group(), match.end()
+        match = _CMD_ARG_RE.match(self._text, pos)
+        if match:
+            return match.group(), match.end()
+        return None
+
+
+    def _standalone_expr(self, pos):
+        # _standalone_expr
+        result = self._expr(pos)
+        if result is None or self._noncontent(result[1]) is None:
+            return None
+        return result
+
+
+    # Control statements.
+    # .........................................................................
+
+    def _control_stmt(self, pos):
+        # _control_stmt
+        token = self._token(pos, KEYWORD)
+        if token is None:
+            return None
+        kind = token.value
+        if kind in ('break', 'continue', 'return'):
+            return Branch(kind=kind), token.end
+        method = getattr(self, '_' + kind + '_stmt', None)
+        if method is None:
+            return None
+        return method(token.end)
+
+
+    def _end(self, pos):
+        return self._keyword(self._skip(pos, _A), 'end')
+
+
+    def _while_stmt(self, pos):
+        cond = self._expr(pos)
+        if cond is None:
+            return None
+        body, pos = self._body(cond[1])
+        end = self._end(pos)
+        if end is None:
+            return None
+        return While(cond=cond[0], body=body), end
+
+
+    def _if_stmt(self, pos):
+        cond = self._expr(pos)
+        if cond is None:
+            return None
+        body, pos = self._body(cond[1])
+        elseifs = []
+        while True:
+            q = self._keyword(self._skip(pos, _A), 'elseif')
+            clause_cond = self._expr(q) if q is not None else None
+            if clause_cond is None:
+                break
+            clause_body, pos = self._body(clause_cond[1])
+            elseifs.append((clause_cond[0], clause_body))
+        else_body = None
+        q = self._keyword(self._skip(pos, _A), 'else')
+        if q is not None:
+            else_body, pos = self._body(q)
+        end = self._end(pos)
+        if end is None:
+            return None
+        return If(cond=cond[0], body=body, elseif_tuples=elseifs,
+                  else_body=else_body), end
+
+
+    def _switch_stmt(self, pos):
+        cond = self._expr(pos)
+        if cond is None:
+            return None
+        pos = cond[1]
+        cases = []
+        while True:
+            q = self._keyword(self._skip(pos, _A), 'case')
+            case_cond = self._expr(q) if q is not None else None
+            if case_cond is None:
+                break
+            case_body, pos = self._body(case_cond[1])
+            cases.append((case_cond[0], case_body))
+        otherwise = None
+        q = self._keyword(self._skip(pos, _A), 'otherwise')
+        if q is not None:
+            otherwise, pos = self._body(q)
+        end = self._end(pos)
+        if end is None:
+            return None
+        return Switch(cond=cond[0], case_tuples=cases, otherwise=otherwise), end
+
+
+    def _for_stmt(self, pos):
+        # _for_version2 | _for_version1
+        q = self._skip(pos, _S)
+        result = None
+        if self._char(q) == '(':
+            result = self._for_rest(q + 1, True)
+        if result is None:
+            result = self._for_rest(pos, False)
+        return result
+
+
+    def _for_rest(self, pos, parens):
+        var = self._identifier(self._skip(pos, _A))
+        if var is None:
+            return None
+        q = self._skip(var[1], _S)
+        if self._char(q) != '=':
+            return None
+        expr = self._expr(q + 1)
+        if expr is None:
+            return None
+        pos = expr[1]
+        if parens:
+            q = self._skip(pos, _S)
+            if self._char(q) != ')':
+                return None
+            pos = q + 1
+        body, pos = self._body(pos)
+        end = self._end(pos)
+        if end is None:
+            return None
+        body = self._disambiguator(self, vars=[var[0]]).visit(body)
+        return For(var=var[0], expr=expr[0], body=body), end
+
+
+    def _try_stmt(self, pos):
+        body, pos = self._body(pos)
+        catch_var = None
+        catch = self._catch_term(pos)
+        if catch is not None:
+            catch_var, pos = catch
+        catch_body, pos = self._body(pos)
+        if catch_var:
+            catch_body = self._disambiguator(self, vars=[catch_var]).visit(catch_body)
+        end = self._end(pos)
+        if end is None:
+            return None
+        return Try(body=body, catch_var=catch_var, catch_body=catch_body), end
+
+
+    def _catch_term(self, pos):
+        # _catch_term.  Returns (catch variable or None, end).
+        end = self._keyword(self._skip(pos, _A), 'catch')
+        if end is None:
+            return None
+        var = None
+        if self._noncontent(end) is None:
+            ident = self._identifier(self._skip(end, _A))
+            if ident is not None:
+                var, end = ident
+        delimiter = self._noncontent(end)
+        if delimiter is None:
+            return None
+        return var, delimiter[1]
+
+
+    # Function definitions.
+    # .........................................................................
+
+    def _fun_def(self, pos, deep):
+        # _fun_def_shallow or _fun_def_deep.
+        pos = self._skip(pos, _A)
+        q = self._keyword(pos, 'function')
+        if q is None:
+            return None
+        output = None
+        q = self._skip(q, _A)
+        outputs = self._fun_outputs(q)
+        if outputs is not None:
+            r = self._skip(outputs[1], _S)
+            if self._char(r) == '=':
+                output = outputs[0]
+                q = r + 1
+        q = self._opt_white(q, False)
+        name = self._identifier(self._skip(q, _A))
+        if name is None:
+            return None
+        params = None
+        q = self._skip(name[1], _S)
+        if self._char(q) == '(':
+            r = self._skip(q + 1, _S)
+            paramlist = self._paramlist(r, False)
+            if paramlist is not None:
+                r = paramlist[1]
+            r = self._skip(r, _S)
+            if self._char(r) == ')':
+                q = r + 1
+                if paramlist is not None:
+                    params = paramlist[0]
+        body, q = self._stmt_list(self._skip(q, _A), deep, fun_defs=deep)
+        if deep:
+            q = self._end(q)
+            if q is None:
+                return None
+        return FunDef(name=name[0], parameters=params, output=output,
+                      body=body, context=None), q
+
+
+    def _fun_outputs(self, pos):
+        # _fun_outputs.  Returns (list of values, end).
+        q = self._skip(pos, _S)
+        if self._char(q) == '[':
+            q += 1
+            values = self._longest([self._comma_values(q),
+                                    self._space_values(q)])
+            if values is not None:
+                q = values[1]
+            q = self._skip(q, _S)
+            if self._char(q) == ']':
+                return (values[0] if values else []), q + 1
+            return None
+        value = self._single_value(pos)
+        if value is None:
+            return None
+        return [value[0]], value[1]
+
+
+    def _single_value(self, pos):
+        # _single_value
+        pos = self._skip(pos, _A)
+        if self._char(pos) == '~':
+            return Special(value='~'), pos + 1
+        return self._identifier(pos)
+
+
+    def _comma_values(self, pos):
+        value = self._single_value(pos)
+        if value is None:
+            return None
+        values = [value[0]]
+        end = value[1]
+        while True:
+            q = self._skip(end, _A)
+            if self._char(q) != ',':
+                break
+            value = self._single_value(q + 1)
+            if value is None:
+                break
+            values.append(value[0])
+            end = value[1]
+        return values, end
+
+
+    def _space_values(self, pos):
+        values = []
+        while True:
+            value = self._single_value(pos)
+            if value is None:
+                break
+            values.append(value[0])
+            pos = value[1]
+        return (values, pos) if values else None
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+#
+# @file    expression.py
+# @brief   Operator-precedence parser for MATLAB expressions
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of the expression parser
+# -----------------------------------------
+#
+# MATLAB expressions used to be parsed using PyParsing's infixNotation(),
+# once for ordinary expressions (_expr) and once for expressions inside
+# square brackets and braces (_expr_in_array).  infixNotation() creates one
+# grammar level per operator precedence level, so that every operand was
+# tried against a dozen nested levels before anything could be decided, and
+# the results had to be re-nested afterwards with a parse action.  On long
+# expressions (e.g., the right-hand sides of ODE models with hundreds of
+# terms), this was where most of the parse time went.
+#
+# ExpressionParser replaces both with a single operator-precedence
+# ("precedence climbing") parser.  An expression is parsed by reading a
+# term and then looping over the binary operators that follow it, recursing
+# only when an operator of higher precedence shows up.  The result is built
+# directly out of BinaryOp, UnaryOp, ColonOp and Transpose objects.
+#
+# ExpressionParser only deals with operators.  The operands (identifiers,
+# numbers, function calls, arrays, etc.) are parsed by the class that
+# inherits from it, which must provide the following:
+#
+#   self._text                   the text being parsed
+#   self._len                    its length
+#   self._operand(pos, array)    parses an operand at `pos`
+#   self._expr(pos, array)       parses a parenthesized subexpression; this
+#                                may simply call self._expression()
+#   self._transpose(pos)         returns (operator, end) if a transpose
+#                                operator starts at `pos`, None otherwise
+#
+# The latter three return either None or a tuple of the result and the
+# position just past it.  `array` is True for expressions inside brackets,
+# where the operands don't skip whitespace in front of themselves.
+#
+# The parser must produce exactly the same results as the old grammar did,
+# including its treatment of whitespace, which MATLAB doesn't document and
+# which matters inside brackets:
+#
+# * A line break may come before a binary operator only if the operator
+#   continues a chain of operators of the same precedence level, and only
+#   for the relational, additive, multiplicative and power operators.  The
+#   colon operator may always come after a line break; the logical
+#   operators never can.
+#
+# * Inside brackets, the first '+' or '-' of a chain must either have
+#   whitespace on both sides or no whitespace in front of it.  Otherwise,
+#   it's taken to be a unary operator in front of the next array element,
+#   as in "[1 -2]".
+#
+# * The second operand of a power operator can have unary plus or minus in
+#   front of it, but not unary negation, and it doesn't include any further
+#   binary operators ("2^-3^2" is "(2^-3)^2").
+#
+# * The colon operator has two forms.  "a:b:c" is matched at most once, and
+#   longer sequences of colons nest the ternary form inside the binary form
+#   from the left ("a:b:c:d" is "(a:b:c):d").
+#
+# * Transpose operators must follow their operand immediately.
+
+try:
+    from matlab import *
+except:
+    from .matlab import *
+
+
+# Constants.
+# .............................................................................
+
+# Whitespace definitions.
+
+_S = ' \t'                              # Whitespace within a line.
+_A = ' \t\n\r'                          # Any whitespace.
+_N = '\n\r'                             # Line breaks only.
+
+# Precedence levels of binary operators, from lowest to highest.  Unary
+# plus, minus and negation sit between _TIMESDIV and _POWER.
+
+_SHORT_OR  = 1
+_SHORT_AND = 2
+_OR        = 3
+_AND       = 4
+_LOGICAL   = 5
+_COLON     = 6
+_PLUSMINUS = 7
+_TIMESDIV  = 8
+_UNARY     = 9
+_POWER     = 10
+
+_LEVELS = {'||': _SHORT_OR,
+           '&&': _SHORT_AND,
+           '|' : _OR,
+           '&' : _AND,
+           '<=': _LOGICAL, '>=': _LOGICAL, '~=': _LOGICAL, '==': _LOGICAL,
+           '<' : _LOGICAL, '>' : _LOGICAL,
+           ':' : _COLON,
+           '+' : _PLUSMINUS, '-': _PLUSMINUS,
+           '.*': _TIMESDIV, './': _TIMESDIV, '.\\': _TIMESDIV,
+           '*' : _TIMESDIV, '/' : _TIMESDIV, '\\' : _TIMESDIV,
+           '.^': _POWER, '^': _POWER}
+
+# Binary operators indexed by their first character, longest first, so that
+# the first match is also the longest match.
+
+_OPS_BY_CHAR = {}
+for _op in sorted(_LEVELS, key=len, reverse=True):
+    _OPS_BY_CHAR.setdefault(_op[0], []).append(_op)
+
+# Levels at which an operator other than the first one of a chain may come
+# after a line break.
+
+_CONTINUING_LEVELS = frozenset([_LOGICAL, _PLUSMINUS, _TIMESDIV, _POWER])
+
+
+# ExpressionParser
+# .............................................................................
+
+class ExpressionParser(object):
+    """Mixin class implementing operator-precedence parsing of MATLAB
+    expressions.  See the comments at the top of this file for what the
+    class using it must provide."""
+
+    def _expression(self, pos, array=False):
+        """Parses an expression starting at `pos`, after skipping any
+        whitespace there.  Returns None or a tuple (node, end)."""
+        return self._climb(self._skip(pos, _A), array, _SHORT_OR)
+
+
+    def _skip(self, pos, chars):
+        text = self._text
+        length = self._len
+        while pos < length and text[pos] in chars:
+            pos += 1
+        return pos
+
+
+    def _char(self, pos):
+        return self._text[pos] if pos < self._len else ''
+
+
+    def _white(self, pos):
+        # Spaces and tabs, at least one.
+        end = self._skip(pos, _S)
+        return end if end > pos else None
+
+
+    def _climb(self, pos, array, min_level):
+        # Parses a term, then as many binary operators (and their right
+        # operands) as have a precedence level of at least `min_level`.
+        left = None
+        c = self._char(pos)
+        if c in ('+', '-', '~'):
+            operand = self._climb(self._skip(pos + 1, _A), array, _UNARY)
+            if operand is not None:
+                left = (self._unary_node(c, operand[0]), operand[1])
+        if left is None:
+            left = self._unary_after(pos, array)
+            if left is None:
+                return None
+        node, end = left
+        last = None
+        while True:
+            found = self._binary_op(end, array, last)
+            if found is None:
+                break
+            op, level, q = found
+            if level < min_level:
+                break
+            q = self._skip(q, _A)
+            if level == _COLON:
+                if last != _COLON:
+                    # Start of a colon chain: "a:b:c" or "a:b".
+                    middle = self._climb(q, array, _PLUSMINUS)
+                    if middle is None:
+                        break
+                    right = self._colon_rest(middle[1], array)
+                    if right is None:
+                        node = ColonOp(left=node, middle=None, right=middle[0])
+                        end = middle[1]
+                    else:
+                        node = ColonOp(left=node, middle=middle[0],
+                                       right=right[0])
+                        end = right[1]
+                else:
+                    right = self._colon_term(q, array)
+                    if right is None:
+                        break
+                    node = ColonOp(left=node, middle=None, right=right[0])
+                    end = right[1]
+            else:
+                if level == _POWER:
+                    right = self._unary_after(q, array)
+                else:
+                    right = self._climb(q, array, level + 1)
+                if right is None:
+                    break
+                node = BinaryOp(op=op, left=node, right=right[0])
+                end = right[1]
+            last = level
+        return node, end
+
+
+    def _binary_op(self, pos, array, last):
+        # Returns (operator, level, position after it) for the binary
+        # operator following the operand that ends at `pos`, or None.
+        # `last` is the level of the previous operator in the chain.
+        if array and last != _PLUSMINUS:
+            found = self._plusminus_array_op(pos)
+            if found is not None:
+                return found[0], _PLUSMINUS, found[1]
+        q = self._skip(pos, _S)
+        op = self._match_binary(q)
+        if op is None:
+            after_break = self._skip(q, _A)
+            if after_break == q:
+                return None
+            op = self._match_binary(after_break)
+            if op is None:
+                return None
+            level = _LEVELS[op]
+            if level != _COLON and (level != last
+                                    or level not in _CONTINUING_LEVELS):
+                return None
+            q = after_break
+        level = _LEVELS[op]
+        if array and level == _PLUSMINUS and last != _PLUSMINUS:
+            return None
+        return op, level, q + len(op)
+
+
+    def _match_binary(self, pos):
+        text = self._text
+        for op in _OPS_BY_CHAR.get(self._char(pos), ()):
+            if text.startswith(op, pos):
+                return op
+        return None
+
+
+    def _plusminus_array_op(self, pos):
+        # The first '+' or '-' of a chain inside brackets.  Returns
+        # (operator, position after it) or None.
+        q = self._white_run(pos)
+        if q is not None and self._char(q) in ('+', '-'):
+            if self._white_run(q + 1) is not None:
+                return self._text[q], q + 1
+        if self._white(self._skip(pos, _N)) is None:
+            c = self._char(pos)
+            if c in ('+', '-'):
+                return c, pos + 1
+        return None
+
+
+    def _white_run(self, pos):
+        # Spaces, possibly interrupted by line breaks.
+        end = self._white(self._skip(pos, _N))
+        if end is None:
+            return None
+        while True:
+            more = self._white(self._skip(end, _N))
+            if more is None:
+                return end
+            end = more
+
+
+    def _colon_rest(self, pos, array):
+        # The third part of a ternary colon expression, given the end of
+        # the second part.
+        q = self._skip(pos, _A)
+        if self._char(q) != ':':
+            return None
+        return self._climb(self._skip(q + 1, _A), array, _PLUSMINUS)
+
+
+    def _colon_term(self, pos, array):
+        # An operand of the binary colon operator, which may itself be a
+        # ternary colon expression.
+        left = self._climb(pos, array, _PLUSMINUS)
+        if left is None:
+            return None
+        middle = self._skip(left[1], _A)
+        if self._char(middle) == ':':
+            middle = self._climb(self._skip(middle + 1, _A), array, _PLUSMINUS)
+            if middle is not None:
+                right = self._colon_rest(middle[1], array)
+                if right is not None:
+                    node = ColonOp(left=left[0], middle=middle[0],
+                                   right=right[0])
+                    return node, right[1]
+        return left
+
+
+    def _unary_after(self, pos, array):
+        # A term without unary negation in front of it, as in the second
+        # operand of a power operator.
+        c = self._char(pos)
+        if c in ('+', '-'):
+            operand = self._unary_after(self._skip(pos + 1, _A), array)
+            if operand is not None:
+                return self._unary_node(c, operand[0]), operand[1]
+        return self._postfix(pos, array)
+
+
+    def _unary_node(self, op, operand):
+        if op == '-' and isinstance(operand, Number):
+            # Replace UnaryOp(op='-', Number(value='x')) with
+            # Number(value='-x'), watching out for negative numbers.
+            if operand.value.startswith('-'):
+                return Number(value=operand.value[1:])
+            else:
+                return Number(value=op + operand.value)
+        elif op == '+' and isinstance(operand, Number):
+            # Doesn't seem worth preserving the '+'.
+            return Number(operand.value)
+        else:
+            return UnaryOp(op=op, operand=operand)
+
+
+    def _postfix(self, pos, array):
+        primary = self._primary(pos, array)
+        if primary is None:
+            return None
+        node, end = primary
+        while True:
+            transpose = self._transpose(end)
+            if transpose is None:
+                return node, end
+            node = Transpose(op=transpose[0], operand=node)
+            end = transpose[1]
+
+
+    def _primary(self, pos, array):
+        result = self._operand(pos, array)
+        if result is None and self._char(pos) == '(':
+            inner = self._expr(pos + 1, array)
+            if inner is not None:
+                q = self._skip(inner[1], _A)
+                if self._char(q) == ')':
+                    return inner[0], q + 1
+        return result
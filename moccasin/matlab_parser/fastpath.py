@@ -0,0 +1,331 @@
+#!/usr/bin/env python
+#
+# @file    fastpath.py
+# @brief   Parsing simple statements without going through the grammar
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of the fast path
+# ---------------------------------
+#
+# Most statements in the ODE models we convert are simple assignments
+# ending in a semicolon, such as
+#
+#    k1 = 0.5;
+#    x0 = [1 2 3];
+#    y(3) = a*x(1) - b*x(2);
+#
+# The PyParsing grammar gets these right, but only after trying every kind
+# of statement that comes before assignments in _stmt, and every kind of
+# left-hand side and operand that comes before the right one.  A
+# StatementFastPath sits in front of _stmt (like the StatementRecorder in
+# incremental.py) and recognizes such statements itself:
+#
+# * The left-hand side is matched with a regular expression: a name,
+#   optionally followed by subscripts in parentheses that are numbers or
+#   names.
+#
+# * The right-hand side is either an array of numbers, matched with a
+#   regular expression, or an expression whose operands are numbers, names
+#   and function calls or array references with parenthesized arguments.
+#   The latter is parsed by _FastExpressionParser, which uses the same
+#   ExpressionParser (see expression.py) as the grammar does, so that the
+#   operators come out the same.
+#
+# * The statement must be followed by a semicolon or a comma on the same
+#   line.  A statement that ends at the end of its line could continue with
+#   an operator on the next one, which is left to the grammar to decide.
+#
+# The result is the same MatlabNode object that the grammar would produce.
+# Whenever anything doesn't fit (a string, a struct field, a keyword, a
+# continuation line, etc.), the statement is handed over to the grammar
+# as usual, so the fast path never changes what the parser accepts.  A
+# position where the text starts with a comment can't be the start of any
+# statement, so there _stmt fails right away.  (Comments themselves are
+# already cheap: the grammar takes them straight from the lexer's tokens.)
+#
+# The fast path counts the statements it handled and the ones it handed
+# over, by position, so that parse_chunks() in grammar_rules.py can report
+# in its statistics what fraction of the statements took the fast path.
+
+import re
+import threading
+from pyparsing import ParseException, ParseResults
+try:
+    from expression import ExpressionParser
+    from grammar_utils import parse_options
+    from lexer import number_pattern, identifier_pattern, reserved_words
+    from matlab import *
+except:
+    from .expression import ExpressionParser
+    from .grammar_utils import parse_options
+    from .lexer import number_pattern, identifier_pattern, reserved_words
+    from .matlab import *
+
+
+# Regular expressions for the parts of simple statements.
+# .............................................................................
+
+_name_re   = re.compile(identifier_pattern)
+_number_re = re.compile(number_pattern)
+
+# A left-hand side, up to and including the '='.  The subscripts are kept
+# to a form whose whitespace the grammar treats the same inside and outside
+# of arrays (the subscripts of an assignment's left-hand side are parsed
+# like array contents).
+
+_item      = '(?:' + number_pattern + '|' + identifier_pattern + ')'
+_lhs_re    = re.compile(r'(?P<name>' + identifier_pattern + r')'
+                        r'(?:\((?P<args>' + _item + r'(?:[ \t]*,[ \t]*' + _item
+                        + r')*)\))?[ \t]*=(?!=)')
+_arg_re    = re.compile(_item)
+
+# An array of numbers, in rows separated by semicolons, with the elements of
+# a row separated either by commas or by whitespace.  A sign must be stuck
+# to its number, so that "[1 -2]" has two elements; "[1 - 2]" is left to the
+# grammar.
+
+_element   = r'[+-]?' + number_pattern
+_row       = (r'(?:' + _element + r'(?:[ \t]*,[ \t]*' + _element + r')*'
+              + r'|' + _element + r'(?:[ \t]+' + _element + r')*)')
+_array_re  = re.compile(r'\[[ \t]*(?P<rows>(?:' + _row + r')?'
+                        r'(?:[ \t]*;[ \t]*(?:' + _row + r')?)*)[ \t]*\]')
+_split_re  = re.compile(r'[ \t]*,[ \t]*|[ \t]+')
+
+# What must follow a statement for the fast path to take it.
+
+_end_re    = re.compile(r'[ \t]*[;,]')
+
+_whitespace = ' \t\n\r'
+
+
+class StatementFastPath(threading.local):
+    """Parses simple statements for the grammar element it is installed on,
+    when the text being parsed is `text`.  Setting `enabled` to False sends
+    every statement to the grammar, but they're still counted.  Each thread
+    has its own text, counts and setting of `enabled`."""
+
+    def __init__(self):
+        self.text = None
+        self.enabled = True
+        self._fast = set()
+        self._slow = set()
+        self._last = None
+
+
+    def start(self, text):
+        """Starts a new parse of `text`, and resets the counts."""
+        self.text = text
+        self._fast = set()
+        self._slow = set()
+        self._last = None
+
+
+    def stop(self):
+        """Ends the current parse.  The counts remain available."""
+        self.text = None
+        self._last = None
+
+
+    def counts(self):
+        """Returns a tuple (statements, fast): the number of statements
+        matched in the last parse, and how many of them took the fast path."""
+        return len(self._fast) + len(self._slow), len(self._fast)
+
+
+    def install(self, element):
+        parse = element._parse
+        def _parse(instring, loc, *args, **kwargs):
+            if instring is not self.text:
+                return parse(instring, loc, *args, **kwargs)
+            options = parse_options(args, kwargs)
+            start = _skip(instring, loc) if options[1] else loc
+            if self.enabled:
+                last = self._last
+                if last is not None and last[0] == start:
+                    # PyParsing's "^" tries an alternative before using it.
+                    return last[1], ParseResults([last[2]])
+                if instring.startswith('%', start):
+                    raise ParseException(instring, start, element.errmsg,
+                                         element)
+                found = _statement(instring, start)
+                if found is not None:
+                    node, end = found
+                    self._fast.add(start)
+                    self._last = (start, end, node)
+                    return end, ParseResults([node])
+            end, tokens = parse(instring, loc, *options)
+            self._slow.add(start)
+            return end, tokens
+        element._parse = _parse
+
+
+# Helper functions.
+# .............................................................................
+
+def _skip(text, pos):
+    length = len(text)
+    while pos < length and text[pos] in _whitespace:
+        pos += 1
+    return pos
+
+
+def _statement(text, pos):
+    # Returns (Assignment, end) for a simple assignment at `pos`, or None.
+    try:
+        return _assignment(text, pos)
+    except _GiveUp:
+        return None
+
+
+def _assignment(text, pos):
+    m = _lhs_re.match(text, pos)
+    if m is None or m.group('name') in reserved_words:
+        return None
+    name = Identifier(name=m.group('name'))
+    args = m.group('args')
+    if args is None:
+        lhs = name
+    else:
+        lhs = ArrayRef(name=name, args=[_item_node(arg) for arg in
+                                        _arg_re.findall(args)], is_cell=False)
+    rhs_start = _skip(text, m.end())
+    if text.startswith('[', rhs_start):
+        found = _number_array(text, rhs_start)
+    else:
+        found = _FastExpressionParser(text)._expression(rhs_start)
+    if found is None:
+        return None
+    rhs, end = found
+    if not _end_re.match(text, end):
+        return None
+    return Assignment(lhs=lhs, rhs=rhs), end
+
+
+def _item_node(item):
+    if _name_re.match(item):
+        if item in reserved_words:
+            # Subscripts such as 'end' are left to the grammar.
+            raise _GiveUp()
+        return Ambiguous(name=Identifier(name=item), args=None)
+    return Number(value=item)
+
+
+def _number_array(text, pos):
+    m = _array_re.match(text, pos)
+    if m is None:
+        return None
+    rows = []
+    for row in m.group('rows').split(';'):
+        row = row.strip(' \t')
+        if row:
+            rows.append([_number(element) for element in _split_re.split(row)])
+    return Array(rows=rows, is_cell=False), m.end()
+
+
+def _number(element):
+    # Signs are folded into the number, as ExpressionParser._unary_node()
+    # does it.
+    if element.startswith('+'):
+        return Number(value=element[1:])
+    return Number(value=element)
+
+
+class _GiveUp(Exception):
+    # Raised when the fast path finds something it leaves to the grammar.
+    pass
+
+
+# _FastExpressionParser
+# .............................................................................
+
+class _FastExpressionParser(ExpressionParser):
+    # ExpressionParser for right-hand sides whose operands are numbers,
+    # names, and names followed by parenthesized arguments, which are the
+    # only operands that the grammar produces Number and Ambiguous objects
+    # for without further ado.
+
+    def __init__(self, text):
+        self._text = text
+        self._len = len(text)
+
+
+    def _operand(self, pos, array):
+        pos = self._skip(pos, _whitespace)
+        m = _number_re.match(self._text, pos)
+        if m is not None:
+            return Number(value=m.group()), m.end()
+        m = _name_re.match(self._text, pos)
+        if m is None:
+            c = self._char(pos)
+            if c and c not in '+-~(':
+                # Strings, arrays, cell arrays, function handles, 'end' ...
+                raise _GiveUp()
+            return None
+        name = m.group()
+        if name in reserved_words:
+            raise _GiveUp()
+        end = m.end()
+        q = self._skip(end, ' \t')
+        if self._char(q) != '(':
+            self._check_followers(end)
+            return Ambiguous(name=Identifier(name=name), args=None), end
+        args, end = self._arguments(q + 1)
+        self._check_followers(end)
+        return Ambiguous(name=Identifier(name=name), args=args), end
+
+
+    def _arguments(self, pos):
+        # The arguments of a function call, after the '('.  Returns the list
+        # of argument nodes and the position after the ')'.
+        q = self._skip(pos, ' \t')
+        if self._char(q) == ')':
+            return [], q + 1
+        args = []
+        while True:
+            arg = self._expression(q)
+            if arg is None:
+                raise _GiveUp()
+            args.append(arg[0])
+            q = self._skip(arg[1], ' \t')
+            c = self._char(q)
+            if c == ')':
+                return args, q + 1
+            if c != ',':
+                raise _GiveUp()
+            q += 1
+
+
+    def _check_followers(self, end):
+        # Struct fields, cell array references and the like, which can
+        # follow the kinds of operands we handle, are left to the grammar.
+        q = self._skip(end, ' \t')
+        c = self._char(q)
+        if c == '{' or (c == '.' and self._char(q + 1) not in ('*', '/', '\\', '^')):
+            raise _GiveUp()
+
+
+    def _expr(self, pos, array):
+        return self._expression(pos, array)
+
+
+    def _transpose(self, pos):
+        # The grammar decides between transposes and strings.
+        if self._char(pos) == "'" or self._text.startswith(".'", pos):
+            raise _GiveUp()
+        return None
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 #
 # @file    grammar.py
-# @brief   Core of the MATLAB grammar definition in PyParsing
+# @brief   The MATLAB parser: MatlabGrammar and its output
 # @author  Michael Hucka
 #
 # <!---------------------------------------------------------------------------
@@ -358,42 +358,66 @@
 from __future__ import print_function
 import codecs
 import copy
-import pdb
+import locale
+import mmap
+import multiprocessing
+import os
+import pickle
 import six
-import sys
+import threading
+import time
 import traceback
-import pyparsing                        # Need this for version check, so ...
-from pyparsing import *                 # ... DON'T merge this & previous stmt!
-from distutils.version import LooseVersion
-from collections import defaultdict
 try:
-    from grammar_utils import *
     from context import *
     from matlab import *
     from functions import *
+    from descent import *
+    from cache import ParseCache
+    from callgraph import call_graph
+    from inference import TypeInference
+    from preprocessor import preprocess, unexpand_offset
+    from prescan import last_cut
+    from recovery import recover
 except:
-    from .grammar_utils import *
     from .context import *
     from .matlab import *
     from .functions import *
+    from .descent import *
+    from .cache import ParseCache
+    from .callgraph import call_graph
+    from .inference import TypeInference
+    from .preprocessor import preprocess, unexpand_offset
+    from .prescan import last_cut
+    from .recovery import recover
+
+# The PyParsing grammar is in grammar_rules.py, which is only imported when
+# the grammar is first needed; see the notes at the top of that file.  The
+# module is kept here once it has been imported.
+
+_rules = []
+_rules_lock = threading.Lock()
+
+def _grammar_rules():
+    if not _rules:
+        with _rules_lock:
+            if not _rules:
+                try:
+                    import grammar_rules
+                except:
+                    from . import grammar_rules
+                _rules.append(grammar_rules)
+    return _rules[0]
+
+
+def _parse_errors():
+    # The exceptions raised for input that can't be parsed.  PyParsing's
+    # ParseException can only have been raised if the grammar was loaded.
+    if _rules:
+        return (_rules[0].ParseException, MatlabDescentException)
+    return (MatlabDescentException,)
 
-# Check minimum version of PyParsing.
 
-if LooseVersion(pyparsing.__version__) < LooseVersion('2.0.3'):
-    raise Exception('MatlabGrammar requires PyParsing version 2.0.3 or higher')
 
-# Necessary optimization.  Without this, the PyParsing grammar defined below
-# never finishes parsing anything.
-
-ParserElement.enablePackrat()
-
-# The inefficient nature of this parser leads to easily exceeding the default
-# recursion stack limit.  Let's increase it:
-
-sys.setrecursionlimit(5000)
-
-
-
 # Exception classes
 # .............................................................................
 
@@ -405,421 +429,6 @@ class MatlabInternalException(Exception):
     pass
 
 
-
-# Helper classes
-# .............................................................................
-
-# ParseResultsTransformer
-#
-# Helper class to transform ParseResults to MatlabNode-based output format.
-#
-# This takes our heavily-annotated output from PyParsing and converts it
-# to a tree-based representation consisting of lists of MatlabNode objects.
-#
-# In what follows, the visit_* functions are visitors named after the names
-# of our grammar objects (in the PyParsing grammar definition later below).
-# They are named such that the visit() function can dispatch on the name we
-# assign to PyParsing objects.  For instance, to format what we label an
-# "assignment" in the PyParsing grammar above, there's a function called
-# visit_assignment() below.
-#
-# I would implement this using an annotation-based approach like the
-# @dispatch.on and @visit.when annotations that are floating around on the
-# net, but can't: the objects we're processing are always ParseResults (a
-# single class), so the class-based @visit.when dispatching won't work here.
-
-class ParseResultsTransformer:
-    def __init__(self, parser):
-        self._parser = parser
-
-
-    def visit(self, pr):
-        if not isinstance(pr, ParseResults):
-            # It's a terminal element, so we don't do anything more.
-            return pr
-
-        length = len(pr)
-        if length > 1 and empty_dict(pr):
-            # It's an expression.  We deconstruct the infix notation.
-            if pr[1].get('transpose'):
-                # Process the first part and revisit the rest, in case we
-                # have more than one operator applied to the lead item.
-                return self.visit_transpose(pr)
-            elif len(pr) == 2 and 'unary operator' in pr[0].keys():
-                return self.visit_unary_operator(pr)
-            elif len(pr) == 3:
-                if 'binary operator' in pr[1].keys():
-                    return self.visit_binary_operator(pr)
-                elif 'colon operator' in pr[1].keys():
-                    return self.visit_colon_operator(pr)
-            elif len(pr) == 5 and 'colon operator' in pr[1].keys():
-                return self.visit_colon_operator(pr)
-            else:
-                # This should not happen, but maybe someday it will.
-                msg = 'Unexpected expression form encountered in ParseResults.'
-                raise MatlabInternalException(msg)
-
-        elif length == 1 and pr[0] == '':
-            # An empty string.  This special case handling shoudn't be
-            # needed, but for some reason, empty strings don't get tagged
-            # with the 'string' key like non-empty strings do.
-            return String(value='')
-
-        # Not an expression, but an individual, single parse result.
-        # We dispatch to the appropriate transformer by building the name.
-        if num_keys(pr) > 1:
-            # Sanity check.  This should not happen, but maybe someday it will.
-            msg = 'Internal grammar inconsistency: multiple tags for same construct.'
-            raise MatlabInternalException(msg)
-        key = first_key(pr)
-        methname = 'visit_' + '_'.join(key.split())
-        meth = getattr(self, methname, None)
-        if meth is None:
-            return pr
-        else:
-            return meth(pr)
-
-
-    def visit_identifier(self, pr):
-        return Identifier(name=pr['identifier'])
-
-
-    def visit_number(self, pr):
-        return Number(value=pr['number'])
-
-
-    def visit_string(self, pr):
-        return String(value=pr['string'])
-
-
-    def visit_tilde(self, pr):
-        return Special(value='~')
-
-
-    def visit_colon(self, pr):
-        return Special(value=':')
-
-
-    def visit_end_operator(self, pr):
-        return Special(value='end')
-
-
-    def visit_unary_operator(self, pr):
-        op_key = first_key(pr[0])
-        op = pr[0][op_key]
-        operand = self.visit(pr[1])
-        if op == '-' and isinstance(operand, Number):
-            # Replace [UnaryOp(op='-'), Number(value='x')] with Number(value='-x')
-            # But watch out if it's already a negative number.
-            if operand.value.startswith('-'):
-                return Number(value=operand.value[1:])
-            else:
-                return Number(value=op + operand.value)
-        elif op == '+' and isinstance(operand, Number):
-            # Doesn't seem worth preserving the '+'.
-            # Replace [UnaryOp(op='+'), Number(value='x')] with Number(value='x')
-            return Number(operand.value)
-        else:
-            # This is probably negation, "~".
-            return UnaryOp(op=op, operand=operand)
-
-
-    def visit_binary_operator(self, pr):
-        op_key = first_key(pr[1])
-        op = pr[1][op_key]
-        left = self.visit(pr[0])
-        right = self.visit(pr[2])
-        return BinaryOp(op=op, left=left, right=right)
-
-
-    def visit_colon_operator(self, pr):
-        if len(pr) == 3:
-            left=self.visit(pr[0])
-            middle=None
-            right=self.visit(pr[2])
-        elif len(pr) == 5:
-            left=self.visit(pr[0])
-            middle=self.visit(pr[2])
-            right=self.visit(pr[4])
-        return ColonOp(left=left, middle=middle, right=right)
-
-
-    def visit_transpose(self, pr):
-        operand=self.visit(pr[0])
-        op = pr[1]['transpose']
-        return Transpose(op=op, operand=operand)
-
-
-    def visit_standalone_expression(self, pr):
-        content = pr['standalone expression']
-        return self.visit(content)
-
-
-    def visit_assignment(self, pr):
-        content = pr['assignment']
-        lvalue = self.visit(content['lhs'])
-        rvalue = self.visit(content['rhs'])
-        node = Assignment(lhs=lvalue, rhs=rvalue)
-        return node
-
-
-    def visit_array(self, pr):
-        content = pr['array']
-        # Two kinds of array situations: a bare array, and one where we
-        # managed to determine it's an array access (and not the more
-        # ambiguous function call or array access).  If we have an 'array
-        # base' part, it's the latter; if we have a row list, it's the former.
-        if 'array base' in content:
-            base = content['array base']
-            if 'name' in base:
-                name = self.visit(base['name'])
-            else:
-                name = self.visit(base)
-            subscripts = self._convert_list(content['subscript list'])
-            return ArrayRef(name=name, args=subscripts, is_cell=False)
-        elif 'row list' in content:
-            # Bare array.
-            return Array(rows=self._convert_rows(content['row list']), is_cell=False)
-        else:
-            # No row list or subscript list => empty array.
-            return Array(rows=[], is_cell=False)
-
-
-    def visit_cell_array(self, pr):
-        content = pr['cell array']
-        # Two kinds of situations: a bare cell array, and one where we
-        # managed to determine it's an array access.  If we have 'row list'
-        # in the keys, it's the former.
-        if 'row list' in content:
-            # Bare array.
-            return Array(rows=self._convert_rows(content['row list']), is_cell=True)
-        elif 'cell array' in content:
-            # Nested reference.
-            base = self.visit(content['cell array'])
-            subscripts = self._convert_list(content['subscript list'])
-            return ArrayRef(name=base, args=subscripts, is_cell=True)
-        elif 'name' in content:
-            # Basic array reference.
-            name = self.visit(content['name'])
-            subscripts = self._convert_list(content['subscript list'])
-            return ArrayRef(name=name, args=subscripts, is_cell=True)
-        else:
-            # No row list or subscript list => empty array.
-            return Array(rows=[], is_cell=True)
-
-
-    def visit_array_or_function(self, pr):
-        content = pr['array or function']
-        the_name = self.visit(content['name'])
-        if 'argument list' in content.keys():
-            the_args = self._convert_list(content['argument list'])
-        else:
-            the_args = []
-        return Ambiguous(name=the_name, args=the_args)
-
-
-    def visit_function_handle(self, pr):
-        content = pr['function handle']
-        if 'name' in content:
-            return FuncHandle(name=self.visit(content['name']))
-        else:
-            if 'parameter list' in content.keys():
-                the_args = self._convert_list(content['parameter list'])
-            else:
-                the_args = []
-            the_body = self.visit(content['function definition'])
-            return AnonFun(args=the_args, body=the_body)
-
-
-    def visit_function_definition(self, pr):
-        # Processing function definitions requires extra work.  MATLAB
-        # functions establish contexts for other constructs and we need to
-        # build a dynamic stack to track those contexts.  This is done here
-        # by pushing a context object before we process the function
-        # definition body, so that the constructs in the body are processed
-        # in the appropriate context.
-
-        content = pr['function definition']
-        name = self.visit(content['name'])
-
-        params = None
-        output = None
-        if 'parameter list' in content:
-            params = self._convert_list(content['parameter list'])
-        if 'output list' in content:
-            output = self._convert_list(content['output list'])
-
-        # Chicken, meet egg.  So: create an incomplete FunDef, use it to
-        # create a context object, and then set the FunDef's context field.
-        fundef = FunDef(name=name, parameters=params, output=output,
-                        body=None, context=None)
-        fundef.context = self._parser._save_function_definition(fundef)
-        self._parser._push_context(fundef.context)
-
-        # Now process the body, having set the context.
-        body = None
-        if 'body' in content:
-            body = self._convert_list(content['body'])
-
-        # Go back and complete the function definition object.
-        fundef.body = body
-
-        # And finally, pop the context before returning.
-        self._parser._pop_context()
-
-        return fundef
-
-
-    def visit_ambiguous_id(self, pr):
-        content = pr['ambiguous id']
-        name = content[0]
-        return Ambiguous(name=Identifier(name=name), args=None)
-
-
-    def visit_struct(self, pr):
-        content = pr['struct']
-        the_base = self.visit(content['struct base'])
-        dynamic = 'dynamic field' in content
-        if dynamic:
-            the_field = self.visit(content['dynamic field'])
-        else:
-            the_field = self.visit(content['static field'])
-        return StructRef(name=the_base, field=the_field, dynamic=dynamic)
-
-
-    def visit_shell_command(self, pr):
-        content = pr['shell command']
-        cmd = content[1][0]
-        backgrounded = cmd.strip().endswith('&')
-        if backgrounded:
-            cmd = cmd[:cmd.rfind('&') - 1]
-        return ShellCommand(command=cmd, background=backgrounded)
-
-
-    def visit_command_statement(self, pr):
-        content = pr['command statement']
-        the_name = self.visit(content['name'])
-        the_args = [String(value=x) for x in content['arguments'].asList()]
-        return FunCall(name=the_name, args=the_args)
-
-
-    def visit_comment(self, pr):
-        return Comment(content=pr['comment'][0])
-
-
-    def visit_control_statement(self, pr):
-        content = pr['control statement']
-        return self.visit(content)
-
-
-    def visit_while_statement(self, pr):
-        content = pr['while statement']
-        the_cond = self.visit(content['expression'])
-        the_body = None
-        if 'body' in content:
-            the_body = self._convert_list(content['body'])
-        return While(cond=the_cond, body=the_body)
-
-
-    def visit_if_statement(self, pr):
-        content = pr['if statement']
-        the_cond = self.visit(content['expression'])
-        the_body = None
-        the_else_body = None
-        elseifs = []
-        if 'body' in content:
-            the_body = self._convert_list(content['body'])
-        if 'else statement' in content and 'body' in content['else statement']:
-            the_else_body = self._convert_list(content['else statement']['body'])
-        if 'elseif statements' in content:
-            # We create tuples of (condition, body) for each elseif clause.
-            for clause in content['elseif statements']:
-                cond = self.visit(clause['expression'])
-                body = None
-                if 'body' in clause:
-                    body = self._convert_list(clause['body'])
-                elseifs.append((cond, body))
-        return If(cond=the_cond, body=the_body, elseif_tuples=elseifs,
-                  else_body=the_else_body)
-
-
-    def visit_switch_statement(self, pr):
-        content = pr['switch statement']
-        the_cond = self.visit(content['expression'])
-        the_other = None
-        the_cases = []
-        if 'case statements' in content:
-            # We create tuples of (condition, body) for each elseif clause.
-            for clause in content['case statements']:
-                cond = self.visit(clause['expression'])
-                body = None
-                if 'body' in clause:
-                    body = self._convert_list(clause['body'])
-                the_cases.append((cond, body))
-        if 'otherwise statement' in content and 'body' in content['otherwise statement']:
-            the_other = self._convert_list(content['otherwise statement']['body'])
-        return Switch(cond=the_cond, case_tuples=the_cases, otherwise=the_other)
-
-
-    def visit_for_statement(self, pr):
-        content = pr['for statement']
-        the_var = self.visit(content['loop variable'])
-        the_expr = self.visit(content['expression'])
-        the_body = None
-        if 'body' in content:
-            the_body = self._convert_list(content['body'])
-        # We can convert references to the loop variable.
-        the_body = Disambiguator(self, vars=[the_var]).visit(the_body)
-        return For(var=the_var, expr=the_expr, body=the_body)
-
-
-    def visit_try_statement(self, pr):
-        content = pr['try statement']
-        the_body = None
-        the_var = None
-        the_catch_body = None
-        if 'body' in content:
-            the_body = self._convert_list(content['body'])
-        if 'catch variable' in content:
-            the_var = self.visit(content['catch variable'])
-        if 'catch body' in content:
-            the_catch_body = self._convert_list(content['catch body'])
-            if the_var:
-                # We can convert references to the loop variable.
-                the_catch_body = Disambiguator(self, vars=[the_var]).visit(the_catch_body)
-        return Try(body=the_body, catch_var=the_var, catch_body=the_catch_body)
-
-
-    def visit_scope_declaration(self, pr):
-        content = pr['scope declaration']
-        the_type = content['type'][0]
-        the_vars = self._convert_list(content['variables list'])
-        return ScopeDecl(type=the_type, variables=the_vars)
-
-
-    def visit_break_statement(self, pr):
-        return Branch(kind='break')
-
-
-    def visit_return_statement(self, pr):
-        return Branch(kind='return')
-
-
-    def visit_continue_statement(self, pr):
-        return Branch(kind='continue')
-
-
-    def _convert_list(self, list):
-        return [self.visit(thing) for thing in list]
-
-
-    def _convert_rows(self, rowlist):
-        # MATLAB doesn't keep blank rows.
-        nodelist = [self._convert_list(row['subscript list']) for row in rowlist
-                    if 'subscript list' in row]
-        return [node for node in nodelist if node]
-
-
 
 # NodeTransformer
 #
@@ -835,6 +444,11 @@ class ParseResultsTransformer:
 #     things like convert ambiguous cases, like something that could be
 #     either a function call or an array reference, to more specific classes
 #     of objects if we have figured out what those objects should be.
+#
+# TypeInference (in inference.py) uses it to visit the statements of the
+# input as many times as it takes for the inferences to settle.  For that,
+# the looking up and recording of facts about objects must go through the
+# methods of the parser object, which TypeInference stands in for.
 
 class NodeTransformer(MatlabNodeVisitor):
     def __init__(self, parser):
@@ -852,6 +466,18 @@ class NodeTransformer(MatlabNodeVisitor):
 
 
     def visit_FunDef(self, node):
+        parser = self._parser
+        self.infer_signature(node)
+        # Make sure to process the body of this function.
+        if node.body:
+            parser._push_context(node.context)
+            node.body = self.visit(node.body)
+            parser._context.nodes = node.body
+            parser._pop_context()
+        return node
+
+
+    def infer_signature(self, node):
         parser = self._parser
         # Since we know this to be a function, we record its type as such.
         # Make sure to record it in the parent's context -- that's why this
@@ -912,12 +538,7 @@ class NodeTransformer(MatlabNodeVisitor):
                 for param in node.parameters:
                     if isinstance(param, Identifier):
                         parser._save_type(param, 'variable')
-        # Make sure to process the body of this function.
-        if node.body:
-            node.body = self.visit(node.body)
-            parser._context.nodes = node.body
         parser._pop_context()
-        return node
 
 
     def visit_Assignment(self, node):
@@ -1025,8 +646,7 @@ class NodeTransformer(MatlabNodeVisitor):
                     # args/subscripts.  Also, if it was previously unknown
                     # whether this name is a function or array, it might have
                     # been put in the list of function calls.  Remove it.
-                    if thing in context.calls:
-                        context.calls.pop(thing)
+                    parser._drop_function_calls(thing)
                     the_args = self.visit(node.args)
                     node = ArrayRef(name=node.name, args=the_args, is_cell=False)
         elif parser._get_type(thing, context) == 'function':
@@ -1113,764 +733,28 @@ class Disambiguator(MatlabNodeVisitor):
 
 
 
-# MatlabGrammar.
-# .............................................................................
-# The definition of our MATLAB grammar, in PyParsing.
+# MarkerReplacer
 #
-# Note: the grammar is written in reverse order, from smallest elements to
-# the highest level parsing object, simply because Python interprets the file
-# in this order and needs each item defined before it encounters it later.
-# However, for readabily, it's probably easiest to start at the last
-# definition (which is _matlab_syntax) and read up.
-
-class MatlabGrammar:
-
-    # First, the lowest-level terminal tokens.
-    # .........................................................................
-
-    _EOL        = LineEnd().suppress()
-    _SOL        = LineStart().suppress()
-    _WHITE      = White(ws=' \t').suppress()
-
-    # Note: For MATLAB, we often need to control where line breaks are
-    # allowed.  In PyParsing, the whitespace property is attached to term
-    # definitions and not to definitions that only combine the terms; i.e.,
-    # when using the "^" or "|" operators to combine terms, it doesn't matter
-    # if you precede that with setDefaultWhitespaceChars settings.  You have
-    # to set the value for the individual term expressions.  That's why some
-    # of the following primitives are wrapped with setDefaultWhitespaceChars.
-
-    ParserElement.setDefaultWhitespaceChars(' \t')
-
-    _SEMI       = Literal(';').suppress()
-    _COMMA      = Literal(',').suppress()
-    _LPAR       = Literal("(").suppress()
-    _RPAR       = Literal(")").suppress()
-    _LBRACKET   = Literal('[').suppress()
-    _RBRACKET   = Literal(']').suppress()
-    _LBRACE     = Literal('{').suppress()
-    _RBRACE     = Literal('}').suppress()
-    _EQUALS     = Literal('=').suppress()
-    _DOT        = Literal('.').suppress()
-    _ELLIPSIS   = Literal('...')
-
-    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
-
-    # This definition of numbers knowingly ignores imaginary numbers because
-    # they're not used in our domain.
-
-    _INTEGER    = Word(nums)
-    _EXPONENT   = Combine(oneOf('E e D d') + Optional(oneOf('+ -')) + Word(nums))
-    _FLOAT      = (Combine(Word(nums) + Optional('.' + Word(nums)) + _EXPONENT)
-                   | Combine(Word(nums) + '.' + _EXPONENT)
-                   | Combine(Word(nums) + '.' + Word(nums))
-                   | Combine('.' + Word(nums) + _EXPONENT)
-                   | Combine('.' + Word(nums))
-                   | Combine(Word(nums) + '.'))
-
-    # Next come definitions of terminal elements.  The funky syntax with the
-    # second parenthesized argument on each line is something PyParsing allows;
-    # it's a short form, equivalent to calling .setResultsName(...).
-
-    _NUMBER     = (_FLOAT | _INTEGER)                 ('number')
-    _STRING     = QuotedString("'", escQuote="''")    ('string')
-
-    _TILDE      = Literal('~')                        ('tilde')
-
-    ParserElement.setDefaultWhitespaceChars(' \t')
-
-    _UMINUS     = Literal('-')                        ('unary operator')
-    _UPLUS      = Literal('+')                        ('unary operator')
-    _UNOT       = Literal('~')                        ('unary operator')
-    _TIMES      = Literal('*')                        ('binary operator')
-    _ELTIMES    = Literal('.*')                       ('binary operator')
-    _MRDIVIDE   = Literal('/')                        ('binary operator')
-    _MLDIVIDE   = Literal('\\')                       ('binary operator')
-    _RDIVIDE    = Literal('./')                       ('binary operator')
-    _LDIVIDE    = Literal('.\\')                      ('binary operator')
-    _MPOWER     = Literal('^')                        ('binary operator')
-    _ELPOWER    = Literal('.^')                       ('binary operator')
-    _PLUS       = Literal('+')                        ('binary operator')
-    _MINUS      = Literal('-')                        ('binary operator')
-    _LT         = Literal('<')                        ('binary operator')
-    _LE         = Literal('<=')                       ('binary operator')
-    _GT         = Literal('>')                        ('binary operator')
-    _GE         = Literal('>=')                       ('binary operator')
-    _EQ         = Literal('==')                       ('binary operator')
-    _NE         = Literal('~=')                       ('binary operator')
-    _AND        = Literal('&')                        ('binary operator')
-    _OR         = Literal('|')                        ('binary operator')
-    _SHORT_AND  = Literal('&&')                       ('binary operator')
-    _SHORT_OR   = Literal('||')                       ('binary operator')
-
-    # Operators that have special-case handling.
-
-    _COLON      = Literal(':')
-    _NC_TRANSP  = Literal(".'")                       ('transpose')
-    _CC_TRANSP  = Literal("'")                        ('transpose')
-
-    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
-
-    # Keywords.  This list is based on what the command 'iskeyword' returns
-    # in MATLAB 2014b.  Note that 'end' as an operator is defined again below.
-
-    _BREAK      = Keyword('break')
-    _CASE       = Keyword('case')
-    _CATCH      = Keyword('catch')
-    _CLASSDEF   = Keyword('classdef')
-    _CONTINUE   = Keyword('continue')
-    _ELSE       = Keyword('else')
-    _ELSEIF     = Keyword('elseif')
-    _END        = Keyword('end')
-    _FOR        = Keyword('for')
-    _FUNCTION   = Keyword('function')
-    _GLOBAL     = Keyword('global')
-    _IF         = Keyword('if')
-    _OTHERWISE  = Keyword('otherwise')
-    _PARFOR     = Keyword('parfor')
-    _PERSISTENT = Keyword('persistent')
-    _RETURN     = Keyword('return')
-    _SPMD       = Keyword('spmd')
-    _SWITCH     = Keyword('switch')
-    _TRY        = Keyword('try')
-    _WHILE      = Keyword('while')
-
-    # Identifiers.
-    #
-    # _id defines identifiers that can be used in user programs.  They can't
-    # be the same as known MATLAB language keywords.  _name defines a labeled
-    # version of _id that we use in most grammar expressions below to avoid
-    # writing "Group(_id)('name')".
-
-    _reserved   = _BREAK | _CASE | _CATCH | _CLASSDEF | _CONTINUE \
-                  | _ELSE | _ELSEIF | _END | _FOR | _FUNCTION \
-                  | _GLOBAL | _IF | _OTHERWISE | _PARFOR | _PERSISTENT \
-                  | _RETURN | _SPMD | _SWITCH | _TRY | _WHILE
-
-    _identifier = Word(alphas, alphanums + '_')
-    _id         = NotAny(_reserved) + _identifier('identifier')
-    _name       = Group(_id)('name')
-
-    # Grammar for expressions.
-    #
-    # Some up-front notes:
-    #
-    # 1) Calling PyParsing's setResultsName() function or its equivalent
-    # yields A COPY of the thing affected -- it does not return the original
-    # thing.  This means that if you have a grammar element of the form
-    #             _foo = Group(_bar('bar') | _biff('biff'))
-    # then _bar and _biff never actually get invoked when _foo is invoked;
-    # what get invoked are copies of _bar and _biff, because that's what gets
-    # stored in _foo.  This has implications for using parse actions and also
-    # debug tracing.  Right now, we no longer use parse actions, but beware
-    # that if parse actions are ever attached to _bar & _biff, they are not
-    # actually called when _foo is invoked because _foo uses copies of _bar
-    # and _biff.  This leads to subtle and frustrating rounds of bug-chasing.
-    #
-    # 2) The grammar below is sometimes designed with the assumption that the
-    # input is valid Matlab.  This fits our purpose, which is to parse valid
-    # Matlab, so we can afford to produce something simpler here and assume
-    # that the input won't do some things that the Matlab parser would
-    # reject.  The basic rule is: accept everything that's valid Matlab, but
-    # don't worry about deliberately excluding what isn't valid Matlab.
-    # .........................................................................
-
-    _expr          = Forward()
-    _expr_in_array = Forward()
-
-    # The possible statement separators/delimiters in Matlab are:
-    #   - EOL
-    #   - line comment (because they eat the EOL at the end)
-    #   - block comments
-    #   - semicolon
-    #   - comma
-    # We handle EOL implicitly in most cases by leaving PyParsing's default
-    # whitespace definition as-is, which marks EOL as an ignored whitespace
-    # character. However, sometimes Matlab syntax requires special care with
-    # EOL, so in those cases, EOL is handled explicitly.
-
-    _line_c_start  = Literal('%').suppress()
-    _block_c_start = Literal('%{').suppress()
-    _block_c_end   = Literal('%}').suppress()
-    _line_comment  = Group(_line_c_start + restOfLine + _EOL)
-    _block_comment = Group(_block_c_start + SkipTo(_block_c_end, include=True))
-    _comment       = Group(_block_comment('comment') | _line_comment('comment'))
-
-    _delimiter     = _COMMA | _SEMI
-    _noncontent    = _delimiter | _comment | _EOL
-
-    # Comma-separated arguments to matrix/array/cell arrays can have ':'
-    # in arguments, but arguments to function calls can't.  Parameter lists in
-    # some other situations (like function return values) can have '~', but
-    # the other elements can only be identifiers, not expressions.  The
-    # following are the different versions used in different places later on.
-    #
-    # For array parsing to work, the next bunch of grammar objects have to be
-    # constructed with different whitespace-handling rules: they must not eat
-    # line breaks, because we need to match EOL explicitly, or else we can't
-    # properly parse a matrix like the following as consisting of 2 rows:
-    #    a = [1 2
-    #         3 4]
-    # That's the reason for the next call to setDefaultWhitespaceChars().
-    # This is turned off again further below.
-    #
-    # Also, the definitions of the array contents grammars below explicitly
-    # include references to _WHITE, which normally would not be necessary and
-    # considered redundant, *except* that in order to deal with some other
-    # problems with array parsing, the definition of expressions used as
-    # array contents explicitly turn off the regular whitespace rules.  This
-    # is why whitespace appears in the next several terms.  So, if you find
-    # yourself looking at these and thinking that the business involving
-    # Optional(_WHITE) is useless and can be removed: no, they have to stay
-    # in order to work properly inside other definitions later.
-    #
-    # Important note about _one_sub: handling MATLAB whitespace behavior
-    # inside and outside of arrays is extremely challenging in this parsing
-    # framework.  Here are examples of cases to be dealt with.  Suppose that
-    # "a" is an array of one item:
-    #
-    #    a(1)        => one item, the value inside the array "a" at location 1
-    #    a (1)       => one item, the value inside the array "a" at location 1
-    #    [a (1)]     => an array of TWO items, the value of a and 1
-    #    [(a (1))]   => an array of ONE item, a(1)
-    #
-    # Notice how in the 3rd example, the handling of whitespace changes inside
-    # the array context, yet wrapping the same expression in parentheses once
-    # again reverts the behavior of whitespace handling to how it is outside
-    # the array context.  (Aside: WTF, MATLAB!?)  The solution implemented here
-    # is rooted in the definition of _one_sub below, which references two
-    # different expression grammar terms.  The first one, _expr_in_array,
-    # handles the third example above.  The definition of _expr_in_array is a
-    # variant of _expr that changes whitespace behavior such that whitespace
-    # is not ignored.  This lets us handle the case where "a (1)" is
-    # interpreted as two subscript items in the array context.  But, this
-    # then screws up interpretation of the fourth example above, in which we
-    # now want to revert handling of whitespace to what it is outside of an
-    # array context.  That's the reason for the introduction of the separate
-    # reference to _LPAR + _expr + _RPAR in the definition of _one_sub: it
-    # lets us use the normal _expr to handle whitespace inside parenthesized
-    # expressions as if they were outside the array context.
-
-    ParserElement.setDefaultWhitespaceChars(' \t')
-
-    _one_sub       = Group(_COLON('colon')) | _expr_in_array | _LPAR + _expr + _RPAR
-    _comma_subs    = Optional(_one_sub) \
-                     + ZeroOrMore(Optional(_WHITE) + _COMMA + Optional(_WHITE) + Optional(_one_sub))
-    _space_subs    = _one_sub + ZeroOrMore(OneOrMore(_WHITE) + _one_sub)
-
-    _call_args     = delimitedList(_expr)
-
-    _opt_arglist   = Optional(_call_args('argument list'))
-
-    _one_param     = Group(_TILDE) | Group(_id)
-    _paramlist     = delimitedList(_one_param)
-    _opt_paramlist = Optional(_paramlist('parameter list'))
-
-    # Bare matrices.  This is a cheat because it doesn't check that all the
-    # element contents have the same data type.  But again, since we expect our
-    # input to be valid Matlab, we don't expect to have to verify that property.
-
-    _row_sep       = Optional(_WHITE) + _SEMI + Optional(_WHITE) + Optional(_comment) \
-                     | Optional(_WHITE) + _comment | _EOL
-    _one_row       = _comma_subs('subscript list') ^ _space_subs('subscript list')
-    _rows          = Optional(_WHITE) + Optional(Group(_one_row.leaveWhitespace())) \
-                     + ZeroOrMore(_row_sep + Optional(Group(_one_row))) + Optional(_WHITE)
-    _bare_array    = Group(_LBRACKET + _rows('row list') + _RBRACKET)('array')
-
-    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
-
-    # Cell arrays.  You can write {} by itself, but a reference has to have at
-    # least one subscript: "somearray{}" is not valid.  Newlines don't
-    # seem to be allowed in args to references, but a bare ':' is allowed.
-    # Some tricky parts:
-    # - The following parses as a cell reference:        a{1}
-    # - The following parses as a function call:         a {1}
-    # - The following parses as an array of 3 elements:  [a {1} a]
-    # - Cell array references can be nested: a{2}{3}
-
-    _bare_cell     = Group(_LBRACE + Optional(_WHITE) + _rows('row list')
-                           + Optional(_WHITE) + _RBRACE)('cell array')
-    _cell_args     = Optional(_WHITE) + Group(_comma_subs)('subscript list') + Optional(_WHITE)
-    _cell_base     = Group(_name + _LBRACE + _cell_args + _RBRACE)('cell array')
-    _cell_nested   = Group(Group(_cell_base)('cell array')
-                           + _LBRACE + _cell_args + _RBRACE)('cell array')
-    _cell_access   = _cell_nested | _cell_base
-    _cell_array    = _cell_access | _bare_cell
-
-    # Named array references.  Note: this interacts with the definition of
-    # function calls later below.  (See _funcall_or_array.)
-
-    _array_args    = Group(_comma_subs)
-    _array_base    = Group(_cell_access | _name)('array base')
-    _array_access  = Group(_array_base
-                           + _LPAR + _array_args('subscript list') + _RPAR
-                          ).setResultsName('array')  # noqa
-
-    # Function handles.
-    #
-    # See http://mathworks.com/help/matlab/ref/function_handle.html
-    # In all function arguments, you can use a bare tilde to indicate a value
-    # that can be ignored.  This is not obvious from the functional
-    # documentation, but it seems to be the case when I try it.  (It's the
-    # case for function defs and function return values too.)
-
-    _named_handle  = Group('@' + _name)
-    _anon_handle   = Group('@' + _LPAR + _opt_paramlist + _RPAR
-                           + _expr('function definition'))  # noqa
-    _fun_handle    = (_named_handle | _anon_handle).setResultsName('function handle')
-
-    # Struct array references.  This is incomplete: in Matlab, the LHS can
-    # actually be a full expression that yields a struct.  Here, to avoid an
-    # infinitely recursive grammar, we only allow a specific set of objects
-    # and exclude a full expr.  (Doing the obvious thing, expr + "." + _id,
-    # results in an infinitely-recursive grammar.)  Also note _bare_array is
-    # deliberately not part of the following because [1].foo is not legal.
-    #
-    # Dynamic field access means that 'str' in
-    #    a.(str)
-    # needs to be interpreted as something to be evaluated, not a static
-    # identifier.  Thus, we can't return Identifier(name='str') alone, or
-    # the caller will not be able to distinguish that from a static access,
-    #    a.str
-    # The solution here is to detect the use of ".()" and explicitly label
-    # the type of field found (as either 'static field' or 'dynamic field').
-    #
-    # Note: BE VERY CAREFUL about the ordering of the terms in _struct_base.
-    # A change to the order can lead to infinite recursion on some inputs.
-    # The current order was determined by trial and error to work on our
-    # various test cases.  (And no, I'm not proud of the hackiness.)
-
-    _funcall_or_array   = Forward()
-    _struct_field       = _id('static field') | _LPAR + _expr('dynamic field') + _RPAR
-    _simple_struct_base = Group(_array_access | _id)
-    _simple_struct      = Group(_simple_struct_base('struct base')
-                                + Optional(_WHITE) + _DOT + Optional(_WHITE) 
-                                + _struct_field)('struct')
-    _struct_base        = Group(_simple_struct + Optional(_WHITE) + FollowedBy(_DOT)
-                                ^ _fun_handle
-                                ^ _funcall_or_array
-                                ^ _cell_access
-                                ^ _array_access
-                                ^ _id)
-    _struct_access      = Group(_struct_base('struct base')
-                                + Optional(_WHITE) + _DOT + Optional(_WHITE)
-                                + _struct_field)('struct')
-
-    # "Function syntax" function calls.
-    #
-    # Unfortunately, the function call forms using parentheses look identical
-    # to matrix/array accesses, and in fact in MATLAB there's no way to tell
-    # them apart except by determining whether the first name is a function
-    # or command.  This means it's ultimately run-time dependent, and depends
-    # on the functions and scripts that the user has defined.
-    #
-    # We don't have access to the user's MATLAB environment, so we are left
-    # to resort to various heuristics to try to guess what we have.  For
-    # instance, if something comes through in "command syntax", we can assume
-    # it's a function call.  (Handled by _funcall_cmd_style below.)  Another
-    # one is that in arrays, you can use bare ':' in the argument list.  This
-    # means that if a ':' is found, it's an array reference for sure.  (This
-    # case is handled in the definition of _opt_arglist) Beyond that, we call
-    # all cases we can't resolve syntactically as "array or function", and
-    # then in post-processing, attempt to apply other heuristics to figure
-    # out which ones are in fact functions.
-    #
-    # There are complications.  You can put function names or arrays inside a
-    # cell array or struct, reference into that to get the function, and hand
-    # it arguments.  E.g.:
-    #    x = somearray{1}(x, 3)
-    # or even
-    #    somestruct(2).somefieldname = str2func('functionname')
-    #    somestruct(2).somefieldname(42)
-    #
-    # The following definition is incomplete w.r.t. what MATLAB allows, since
-    # MATLAB would probably let you use the full range of expressions as the
-    # base for the function.
-
-    _fun_access         = Group(_cell_access('cell array')) \
-                          ^ Group(_simple_struct) \
-                          ^ Group(_id)
-    _funcall_or_array <<= Group(_fun_access('name')
-                                + _LPAR + _opt_arglist + _RPAR
-                               ).setResultsName('array or function')  # noqa
-
-    # "Command syntax" function calls and array references.
-    #
-    # Matlab functions can be called with arguments either surrounded with
-    # parentheses or not.  This is called "command vs. function syntax".
-    # Here are examples of command syntax:
-    #    clear x y z
-    #    format long
-    #    print -dpng magicsquare.png
-    #    save /tmp/foo
-    #    save relative/path.m
-    # etc.  As the MATLAB docs say, the following are equivalent:
-    #    load durer.mat        % Command syntax
-    #    load('durer.mat')     % Function syntax
-    # Note the way that the first form treats the arguments as (unquoted)
-    # strings.  Also note that spaces are allowed in the second form but
-    # do not turn the result into command-style syntax.  I.e.,
-    #    load ('durer.mat')
-    # is not the same as
-    #    load '(\'durer.mat\')'
-    #
-    # The syntactic rules are explained in the following MATLAB document:
-    # http://mathworks.com/help/matlab/matlab_prog/command-vs-function-syntax.html
-    # The grammar below for command-style syntax is not fully compliant.  One
-    # known failure: it requires an argument.  We deal with command-syntax
-    # function calls *without* arguments separately in post-processing.
-
-    ParserElement.setDefaultWhitespaceChars(' \t')
-
-    _most_ops          = Group(_PLUS ^ _MINUS ^ _TIMES ^ _ELTIMES ^ _MRDIVIDE
-                               ^ _MLDIVIDE ^ _RDIVIDE ^ _LDIVIDE ^ _MPOWER
-                               ^ _ELPOWER ^ _LT ^ _LE ^ _GT ^ _GE ^ _EQ ^ _NE
-                               ^ _AND ^ _OR ^ _SHORT_AND ^ _SHORT_OR ^ _COLON
-                               ^ _NC_TRANSP)
-    _noncmd_arg_start  = _EQUALS | _LPAR | _most_ops + _WHITE | _delimiter | _comment
-    _dash_term         = Combine(Literal('-') + Word(alphas, alphanums + '_'))
-    _fun_cmd_arg       = _STRING | _dash_term | CharsNotIn(" ,;\t\n\r")
-    _fun_cmd_arglist   = _fun_cmd_arg + ZeroOrMore(NotAny(_noncontent)
-                                                   + Optional(_WHITE)
-                                                   + _fun_cmd_arg)
-    _funcall_cmd_style = Group(_name + NotAny(_EOL)
-                               + _WHITE + NotAny(_noncmd_arg_start)
-                               + _fun_cmd_arglist('arguments')
-                              )('command statement')
-
-    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
-
-    # Function calls without parentheses.
-    #
-    # A final bit of nastiness in MATLAB is the ability to invoke a function
-    # without using parenthese, such as this example:
-    #
-    #   if (rand > 0.50)
-    #       A=1;
-    #   end;
-    #
-    # Currently, we only recognize this case if the function involved is a
-    # known MATLAB function or a function defined somewhere in the file.
-    # This is done in post processing, but we tag the possible cases during
-    # the initial parse by looking for _ambiguous_id instead of a plain _id.
-    # This is why the following seemingly-pointless definition exists, and is
-    # used instead of using _id directly in _operand and other similar places
-    # later.
-
-    _ambiguous_id = Group(NotAny(_reserved) + _identifier)('ambiguous id')
-
-    # And now, general expressions and operators outside of arrays.
-
-    _operand = Group(_funcall_or_array \
-                     | _struct_access  \
-                     | _array_access   \
-                     | _cell_array     \
-                     | _bare_array     \
-                     | _fun_handle     \
-                     | _ambiguous_id   \
-                     | _NUMBER         \
-                     | _STRING)
-
-    _transp_op     = NotAny(_WHITE) + _NC_TRANSP ^ NotAny(_WHITE) + _CC_TRANSP
-    _uplusminusneg = _UPLUS ^ _UMINUS ^ _UNOT
-    _plusminus     = _PLUS ^ _MINUS
-    _timesdiv      = _TIMES ^ _ELTIMES ^ _MRDIVIDE ^ _MLDIVIDE ^ _RDIVIDE ^ _LDIVIDE
-    _power         = _MPOWER ^ _ELPOWER
-    _logical_op    = _LE ^ _GE ^ _NE ^ _LT ^ _GT ^ _EQ
-    _colon_op      = _COLON('colon operator')
-
-    # In MATLAB, power and transpose have higher precedence than the unary
-    # operators.  The next hack solves a problem in correctly matching
-    # expressions in which a unary operator comes immediately after another
-    # operator, particularly the _power operators.  The problem occurs
-    # because of how infixNotation() constructs the matching expression
-    # left-to-right as it goes down the list of arguments in the order given.
-    # To get the right behavior, we have to set up _power to have higher
-    # precendence than unary operators, which seems easy at first but it
-    # turns out it interacts with the right-associative nature of unary
-    # operators (_uplusminusneg).  For reasons that are not 100% clear, if
-    # the first few terms are in the following (more intuitive, natural) order,
-    #
-    #   _expr <<= infixNotation(_operand, [
-    #        (Group(_transp_op),     1, opAssoc.LEFT, makeLRlike(1)),
-    #        (Group(_power),         2, opAssoc.LEFT, makeLRlike(2)),
-    #        (Group(_uplusminusneg), 1, opAssoc.RIGHT),
-    #       ...
-    #
-    # then an expression such as 2^-3 does not match.  The following hack
-    # provides a second expression (_uplusminusneg_after) for matching the
-    # unary operators if and only if they appear in the second operand of a
-    # binary operator.
-    #
-    # The operator precedence rules in MATLAB are listed here:
-    # http://www.mathworks.com/help/matlab/matlab_prog/operator-precedence.html
-
-    _not_unary = _transp_op ^ _plusminus ^ _timesdiv ^ _power ^ _logical_op ^ _COLON
-    _uplusminusneg_after = FollowedBy(_not_unary) + _UPLUS \
-                           ^ FollowedBy(_not_unary) + _UMINUS \
-                           ^ FollowedBy(_not_unary) + _UNOT
-
-    _expr        <<= infixNotation(_operand, [
-        (Group(_transp_op),                    1, opAssoc.LEFT, makeLRlike(1)),
-        (Group(_uplusminusneg_after),          1, opAssoc.RIGHT),
-        (Group(_power),                        2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_uplusminusneg),                1, opAssoc.RIGHT),
-        (Group(_timesdiv),                     2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_plusminus),                    2, opAssoc.LEFT, makeLRlike(2)),
-        ((Group(_colon_op), Group(_colon_op)), 3, opAssoc.LEFT, makeLRlike(3)),
-        (Group(_colon_op),                     2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_logical_op),                   2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_AND),                          2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_OR),                           2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_SHORT_AND),                    2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_SHORT_OR),                     2, opAssoc.LEFT, makeLRlike(2)),
-    ])
-
-    # The 'end' keyword is special because of its many meanings.  One applies
-    # when indexing arrays.  This next definition is so we can detect that.
-
-    _end_op        = Keyword('end')('end operator')
-
-    # MATLAB does something evil: the parsing behavior changes inside array
-    # expressions.  This can be seen by typing the following expressions into
-    # the MATLAB interpreter:
-    #
-    # 1 -1          result: 0
-    # [1 -1]        result: array of 2 elements, [1, -1]
-    # [1 - 1]       result: array of 1 element, [0]
-    # [1 -1 - 1]    result: array of 2 elements, [1, -2]
-    # 1 - 1         result: 0
-    # 1-1           result: 0
-    # [1- 1]        result: array of 1 element, [0]
-    # [1 2 -3 + 4]  result: array of 3 elements, [1, 2, 1]
-    # [1 2 -3 +4]   result: array of 4 elements, [1, 2, -3, 4]
-    #
-    # Another example was mentioned earlier in this file, involving the
-    # definition of _one_sub.  Suppose that "a" is an array of one item:
-    #
-    #    a(1)        => one item, the value inside the array "a" at location 1
-    #    a (1)       => one item, the value inside the array "a" at location 1
-    #    [a (1)]     => an array of TWO items, the value of a and 1
-    #    [(a (1))]   => an array of ONE item, a(1)
-    #
-    # The only solution I have found is to define the expression grammar
-    # differently for the case of array contents.  This is the reason for
-    # _expr_in_array, _funcall_or_array_in_array, and _operand_in_array
-    # below; these versions change the interpretation of whitespace to make
-    # it significant, to cause matching to prefer different interpretations
-    # when used inside arrays.  Along with this, the definitions of arrays
-    # and their subscripts earlier in this file also have explicit uses of
-    # _WHITE in them, which wouldn't be necessary except for the fact that
-    # _operand_in_array below uses leaveWhitespace() to cause whitespace to
-    # be significant.
-    #
-    # Look, I know it's ugly.
-
-    _plusminus_array = (OneOrMore(_WHITE) + (_PLUS ^ _MINUS).leaveWhitespace() + OneOrMore(_WHITE)) \
-                       | (NotAny(_WHITE) + (_PLUS ^ _MINUS).leaveWhitespace())
-
-    _funcall_or_array_in_array = Group(_fun_access('name')
-                                       + _LPAR.copy().leaveWhitespace() + _opt_arglist + _RPAR
-                                      ).setResultsName('array or function')  # noqa
-
-    _operand_in_array = Group(_end_op
-                              | _TILDE
-                              | _funcall_or_array_in_array
-                              | _struct_access
-                              | _array_access
-                              | _cell_array
-                              | _bare_array
-                              | _fun_handle
-                              | _ambiguous_id
-                              | _NUMBER
-                              | _STRING
-                             ).leaveWhitespace()
-
-    _expr_in_array <<= infixNotation(_operand_in_array, [
-        (Group(_transp_op),                    1, opAssoc.LEFT, makeLRlike(1)),
-        (Group(_uplusminusneg_after),          1, opAssoc.RIGHT),
-        (Group(_power),                        2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_uplusminusneg),                1, opAssoc.RIGHT),
-        (Group(_timesdiv),                     2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_plusminus_array),              2, opAssoc.LEFT, makeLRlike(2)),
-        ((Group(_colon_op), Group(_colon_op)), 3, opAssoc.LEFT, makeLRlike(3)),
-        (Group(_colon_op),                     2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_logical_op),                   2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_AND),                          2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_OR),                           2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_SHORT_AND),                    2, opAssoc.LEFT, makeLRlike(2)),
-        (Group(_SHORT_OR),                     2, opAssoc.LEFT, makeLRlike(2)),
-    ])
-
-    # Assignments.
-    #
-    # We tag the LHS with 'lhs' whether it's a single variable or an array,
-    # because we can distinguish the cases by examining the parsed object.
+# Replaces the markers that recover() (in recovery.py) puts in the place of
+# statements that can't be parsed, which come out of the parse as String
+# objects, with the ParseError objects for those statements.
 
-    _lhs_var        = Group(_id)
-    _simple_assign  = Group(_lhs_var('lhs') + _EQUALS + _expr('rhs'))
-    _lhs_array      = Group(_struct_access | _array_access | _cell_access | _bare_array)
-    _other_assign   = Group(_lhs_array('lhs') + _EQUALS + _expr('rhs'))
-    _assignment     = (_other_assign | _simple_assign).setResultsName('assignment')
+class MarkerReplacer(MatlabNodeVisitor):
+    def __init__(self, errors):
+        super(MarkerReplacer, self).__init__()
+        self._errors = errors
 
-    # Commands.
-    #
-    # Shell commands don't respect ellipses or delimiters, so we use EOL
-    # explicitly here and match _shell_cmd at the _matlab_syntax level.
-
-    _shell_cmd_cmd  = Group(restOfLine)('command')
-    _shell_cmd      = Group(Group('!' + _shell_cmd_cmd + _EOL)('shell command'))
-
-    # Control-flow statements.
-
-    _control_stmt   = Forward()
-    _stmt_list      = Forward()
-
-    _single_expr    = _expr('expression') + Optional(FollowedBy(_noncontent))
-    _test_expr      = _single_expr
-    _body           = Group(_stmt_list)                    ('body')
-    _break_stmt     = _BREAK                               ('break statement')
-    _return_stmt    = _RETURN                              ('return statement')
-    _continue_stmt  = _CONTINUE                            ('continue statement')
-
-    _while_stmt     = Group(_WHILE + _test_expr
-                            + _body
-                            + _END)                        ('while statement')
-
-    _loop_var       = Group(_id)                           ('loop variable')
-    _for_version1   = _FOR + _loop_var + _EQUALS + _test_expr \
-                      + _body \
-                      + _END
-    _for_version2   = _FOR + _LPAR + _loop_var + _EQUALS + _expr('expression') + _RPAR \
-                      + _body \
-                      + _END
-    _for_stmt       = Group(_for_version2 | _for_version1) ('for statement')
-
-    _catch_var      = Group(_id)                           ('catch variable')
-    ParserElement.setDefaultWhitespaceChars(' \t')
-    _catch_term     = _CATCH + Optional(NotAny(_noncontent) + _catch_var) + _noncontent
-    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
-    _catch_body     = Group(_stmt_list)                    ('catch body')
-    _try_stmt       = Group(_TRY
-                            + _body
-                            + Optional(_catch_term)
-                            + _catch_body
-                            + _END)                        ('try statement')
-
-    _else_stmt      = Group(_ELSE + _body)                 ('else statement')
-    _elseif_stmt    = Group(_ELSEIF + _test_expr + _body)
-    _if_stmt        = Group(_IF + _test_expr
-                            + _body
-                            + ZeroOrMore(_elseif_stmt)     ('elseif statements')
-                            + Optional(_else_stmt)
-                            + _END).setResultsName         ('if statement')
-
-    _case_stmt      = Group(_CASE + _test_expr + _body)
-    _switch_other   = Group(_OTHERWISE + _body)            ('otherwise statement')
-    _switch_stmt    = Group(_SWITCH + _test_expr
-                            + ZeroOrMore(_case_stmt)       ('case statements')
-                            + Optional(_switch_other)
-                            + _END)                        ('switch statement')
-
-    _control_stmt  <<= Group(_while_stmt
-                             | _if_stmt
-                             | _switch_stmt
-                             | _for_stmt
-                             | _try_stmt
-                             | _continue_stmt
-                             | _break_stmt
-                             | _return_stmt
-                            ).setResultsName('control statement')  # noqa
-
-    # Global and persistent declarations.
-
-    _scope_type     = Group(_PERSISTENT | _GLOBAL)         ('type')
-    ParserElement.setDefaultWhitespaceChars(' \t')
-    _scope_var_list = Group(_id) + ZeroOrMore(_WHITE + Group(_id)).leaveWhitespace()
-    _scope_args     = _scope_var_list                      ('variables list')
-    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
-    _scope_stmt     = Group(_scope_type + _scope_args)     ('scope declaration')
-
-    # Standalone expressions.
-    #
-    # If an expression is written on a line outside of another construct,
-    # it needs to be separated from other expressions by commas or newlines.
 
-    ParserElement.setDefaultWhitespaceChars(' \t')
-    _standalone_expr = _expr('standalone expression') + FollowedBy(_noncontent)
-    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
+    def visit_String(self, node):
+        return self._errors.get(node.value, node)
 
-    # Statements and statement lists.
-    #
-    # Statement lists are almost the full _matlab_syntax, except that
-    # they don't include function definitions.
 
-    _stmt           = Group(_control_stmt
-                            | _scope_stmt
-                            | _assignment
-                            | _funcall_cmd_style
-                            | _standalone_expr)
-    _stmt_list    <<= ZeroOrMore(_stmt ^ _shell_cmd ^ _noncontent)
-
-    # Function definitions.
-    #
-    # When a function returns multiple values and the LHS is an array
-    # expression in square brackets, a bare tilde can be put in place of an
-    # argument value to indicate that the value is to be ignored.
-
-    _fun_body       = Forward()
-
-    _single_value   = Group(_id) | Group(_TILDE)
-    _comma_values   = delimitedList(_single_value)
-    _space_values   = OneOrMore(_single_value)
-    _multi_values   = _LBRACKET + Optional(_comma_values ^ _space_values) + _RBRACKET
-    _fun_outputs    = Group(_multi_values) | Group(_single_value)
-    _fun_paramslist = _LPAR + _opt_paramlist + _RPAR
-
-    # The 'end' in a function definition is optional in some cases and not in
-    # others.  The use of 'end' is required for nested function definitions,
-    # which means that we need two variants of function bodies too.  This
-    # leads to our final grammatical indiginity: two expressions for function
-    # definitions, which are used in the overall definition of _matlab_file
-    # such that _matlab_file tries first one variant and then the other.
-    # In the following two definitions, note that both the use of 'end' and
-    # the definition of the body are different.
-
-    _fun_without_end = Group(_FUNCTION
-                             + Optional(_fun_outputs('output list') + _EQUALS())
-                             + Optional(_WHITE) + _name
-                             + Optional(_fun_paramslist)
-                             + Group(_stmt_list)('body')
-                            ).setResultsName('function definition')
-
-    _fun_with_end   = Group(_FUNCTION
-                            + Optional(_fun_outputs('output list') + _EQUALS())
-                            + Optional(_WHITE) + _name
-                            + Optional(_fun_paramslist)
-                            + Group(_fun_body)('body')
-                            + _END
-                           ).setResultsName('function definition')
-
-    # The next two definitions are only used to make the grouping level the
-    # same as other statements in the overall grammar.
-
-    _fun_def_shallow = Group(_fun_without_end)
-    _fun_def_deep    = Group(_fun_with_end)
-
-    # And now, the function body for function definitions that permit nesting.
-    # (Bodies that don't allow function nesting simply use _stmt_list.)
-
-    _fun_body <<= ZeroOrMore(_fun_def_deep ^ _stmt ^ _shell_cmd ^ _noncontent)
-
-    # The complete MATLAB file syntax.
-    #
-    # Since a file cannot mix the style of function definitions that use ends
-    # (either they all have to have 'end', or none do), we have two forms of
-    # MATLAB files.
-
-    _matlab_file = (ZeroOrMore(_fun_def_shallow ^ _stmt ^ _shell_cmd ^ _noncontent)
-                    ^ ZeroOrMore(_fun_def_deep ^ _stmt ^ _shell_cmd ^ _noncontent))
+
+# MatlabGrammar.
+# .............................................................................
+# The parser.  The grammar itself is defined in grammar_rules.py.
 
+class MatlabGrammar:
 
     # Preprocessor.
     # .........................................................................
@@ -1901,49 +785,105 @@ class MatlabGrammar:
     # MATLAB does this because the ellipsis sequence is turned into a space;
     # which is not the same as ignoring it completely.
     #
-    # Currently, MOCCASIN does not handle continuations well: it always
-    # replaces them, even inside strings and shell commands, because in our
-    # application we don't do anything with strings and shell commands
-    # anyway.  We can afford to munge them.  We use this cheap approach
-    # because it's difficult to avoid matching inside strings and shell
-    # commands.  A better approach would be something like the following: (1)
-    # preprocess the input to store all strings and shell commands and
-    # replace them in the input with temporary markers, (2) do the
-    # continuation replacements, (3) go back and replace the markers with the
-    # stored strings and shell commands.
-
-    _continuation  = Combine(_ELLIPSIS.leaveWhitespace()
-                             + Optional(CharsNotIn('\n\r\f')('comment'))
-                             + _EOL + _SOL)
-
-    _continuation.setParseAction(lambda t: ' ')
+    # The replacement is done by preprocess() in preprocessor.py, in a single
+    # pass over the input that skips strings, comments, block comments and
+    # shell command lines.  It also returns a map from offsets in its output
+    # to offsets in the original input, which we keep in self._offsets for
+    # reporting the locations of parse errors.  When iter_parse() parses
+    # the input in parts, self._part_start holds the offset and the number
+    # of lines of the input in front of the current part.
 
     def _preprocess(self, input):
-        # Remove DOS-style carriage returns from the input.
-        input = input.replace('\r\n', '\n')
-        # Remove continuations.
-        return self._continuation.transformString(input)
+        preprocessed, self._offsets = preprocess(input)
+        return preprocessed
+
+
+    def _error_message(self, err):
+        loc = getattr(err, 'loc', None)
+        if self._offsets is None or loc is None:
+            return "Error: {0}".format(err)
+        offset, line, column = self._location(loc)
+        return "Error: {0} (at char {1}), (line:{2}, col:{3})".format(
+            err.msg, offset, line, column)
+
+
+    def _location(self, loc):
+        # PyParsing and the descent parser report the location of an error
+        # as an offset in the preprocessed input with its tabs expanded.
+        # This turns it into a tuple (offset, line, column) in the original
+        # input.
+        offset = self._original_offset(loc)
+        line, column = self._offsets.location_of(offset)
+        return (offset + self._part_start[0], line + self._part_start[1],
+                column)
+
+
+    def _original_offset(self, loc):
+        return self._offsets.original_offset(
+            unexpand_offset(self._offsets.text, loc))
 
 
     # Generator for final MatlabNode-based output representation.
     #
-    # The following post-processes the ParseResults-based output from PyParsing
+    # The following post-processes the MatlabNode-based output from PyParsing
     # and creates our format consisting of MatlabContext and MatlabNode.
     # .........................................................................
 
-    def _generate_nodes_and_contexts(self, pr):
-        # Start by creating a context for the overall input.
-        self._push_context(MatlabContext(topmost=True))
+    def _generate_nodes_and_contexts(self, nodes):
+        # The context for the overall input is the one that _reset() put
+        # in place, as for iter_parse().
+
+        # 1st pass: the parse actions have translated everything into
+        # MatlabNodes; create contexts for function definitions encountered.
+        self._finish_statements(nodes)
+        return self._complete_nodes_and_contexts(nodes)
+
 
-        # 1st pass: visit ParseResults items, translate them to MatlabNodes,
-        # and create contexts for function definitions encountered.
-        nodes = [ParseResultsTransformer(self).visit(item) for item in pr]
+    def _generate_nodes_with_descent(self, input):
+        # Same as _generate_nodes_and_contexts, but the 1st pass is done by
+        # the recursive-descent engine, which produces MatlabNodes directly.
+        nodes = MatlabDescentParser(self, Disambiguator).parse(input)
+        return self._complete_nodes_and_contexts(nodes)
 
-        # 2nd & 3rd passes: infer the types of objects where possible, and
-        # transform some classes into others to overcome limitations in our
-        # initial parse.  Must be done twice to propagate inferences.
-        nodes = NodeTransformer(self).visit(nodes)
-        nodes = NodeTransformer(self).visit(nodes)
+
+    def _finish_statements(self, nodes):
+        # Does the parts of converting statements that modify nodes, which
+        # the parse actions must not do (see ParseResultsTransformer).  This
+        # only needs to look at statements, not inside expressions.
+        for node in nodes or []:
+            if isinstance(node, FunDef):
+                node.context = self._save_function_definition(node)
+                self._push_context(node.context)
+                self._finish_statements(node.body)
+                self._pop_context()
+            elif isinstance(node, (While, For)):
+                self._finish_statements(node.body)
+                if isinstance(node, For):
+                    # We can convert references to the loop variable.
+                    node.body = Disambiguator(self, vars=[node.var]).visit(node.body)
+            elif isinstance(node, If):
+                self._finish_statements(node.body)
+                for cond, body in node.elseif_tuples:
+                    self._finish_statements(body)
+                self._finish_statements(node.else_body)
+            elif isinstance(node, Switch):
+                for cond, body in node.case_tuples:
+                    self._finish_statements(body)
+                self._finish_statements(node.otherwise)
+            elif isinstance(node, Try):
+                self._finish_statements(node.body)
+                self._finish_statements(node.catch_body)
+                if node.catch_var:
+                    # Same for the catch variable.
+                    node.catch_body = Disambiguator(self, vars=[node.catch_var]).visit(node.catch_body)
+
+
+    def _complete_nodes_and_contexts(self, nodes):
+        # 2nd pass: infer the types of objects where possible, and transform
+        # some classes into others to overcome limitations in our initial
+        # parse.  This takes as many walks over the nodes as it needs to
+        # propagate the inferences (see inference.py).
+        nodes = self._infer_types(nodes)
 
         # Final step: if the first construct in this file (after possible
         # comments) is a function definition, this whole file is a function.
@@ -1956,6 +896,17 @@ class MatlabGrammar:
         return self._context
 
 
+    def _infer_types(self, nodes):
+        # The call graph is made here so that the top context has one even
+        # if no calls are recorded.
+        top = self._context
+        call_graph(top)
+        inference = TypeInference(self, NodeTransformer)
+        nodes = inference.infer(nodes)
+        top.inference_passes = max(top.inference_passes or 0, inference.passes)
+        return nodes
+
+
     # Context and scope management.
     #
     # This block is used by the code that converts the PyParsing output to
@@ -2005,11 +956,23 @@ class MatlabGrammar:
 
     def _save_function_call(self, node):
         # Save each call as a list of the arguments to the call.
-        # This will thus be a list of lists.
-        if node.name not in self._context.calls:
-            self._context.calls[node.name] = [node.args]
-        else:
-            self._context.calls[node.name].append(node.args)
+        # This will thus be a list of lists.  The call graph (see
+        # callgraph.py) stores it in the context and indexes it.
+        call_graph(self._context).add(self._context, node.name, node.args)
+
+
+    def _drop_function_calls(self, name):
+        call_graph(self._context).drop(self._context, name)
+
+
+    def _forget_function_call(self, context, name, args):
+        # Removes one call recorded by _save_function_call(), leaving the
+        # entry for `name` in context.calls even if it becomes empty.
+        return call_graph(context).remove(context, name, args)
+
+
+    def _prune_function_calls(self, context, name):
+        call_graph(context).prune(context, name)
 
 
     def _save_assignment(self, node):
@@ -2017,17 +980,18 @@ class MatlabGrammar:
 
 
     def _get_assignment(self, node, context, recursive=False):
-        if node in self._context.assignments:
-            value = self._context.assignments[node]
-            if isinstance(value, Identifier) and recursive:
-                ultimate_value = self._get_assignment(value, context, True)
-                return ultimate_value or value
-            else:
-                return value
-        elif hasattr(context, 'parent') and context.parent:
-            return self._get_assignment(self, node, context.parent)
-        else:
-            return None
+        # Looks in `context` and the contexts around it (see "Scoped lookups"
+        # in context.py).  If the value is an Identifier and `recursive` is
+        # True, follows the assignments to the last name assigned one.
+        value = context.lookup('assignments', node)
+        names = [node]
+        while recursive and isinstance(value, Identifier) and value not in names:
+            names.append(value)
+            next_value = context.lookup('assignments', value)
+            if not next_value:
+                break
+            value = next_value
+        return value
 
 
     def _save_type(self, thing, type):
@@ -2035,10 +999,9 @@ class MatlabGrammar:
 
 
     def _get_type(self, thing, context):
-        if thing in context.types:
-            return context.types[thing]
-        elif hasattr(context, 'parent') and context.parent:
-            return self._get_type(thing, context.parent)
+        type = context.lookup('types', thing)
+        if type is not None:
+            return type
         elif isinstance(thing, Ambiguous) or isinstance(thing, FunCall):
             if isinstance(thing.name, Identifier):
                 name = thing.name.name
@@ -2051,31 +1014,16 @@ class MatlabGrammar:
 
 
     def _get_direct_calls(self, name, context, anywhere=False, recursive=False):
-        calls = []
-        if context.calls and name in context.calls:
-            calls += context.calls[name]
-        if anywhere and context.functions:
-            for fun_name, fun_context in context.functions.items():
-                if name == fun_name:
-                    continue
-                calls += self._get_direct_calls(name, fun_context, False, False)
+        calls = call_graph(context).direct_calls(name, context, anywhere)
         if recursive and hasattr(context, 'parent') and context.parent:
             calls += self._get_direct_calls(name, context.parent, anywhere, True)
-        return [x for x in calls if x]
+        return calls
 
 
     def _get_indirect_calls(self, name, context, anywhere=False, recursive=False):
-        # Search function calls, looking for cases where the named function is
-        # passed in as a function handle.
-        calls = defaultdict(list)
-        for fun_name in (context.calls or []):
-            for arglist in context.calls[fun_name]:
-                for arg in (arglist or []):
-                    if isinstance(arg, FuncHandle) and name == arg.name:
-                        calls[fun_name].append(arglist)
-        if anywhere and context.functions:
-            for fun_name, fun_context in context.functions.items():
-                calls.update(self._get_indirect_calls(name, fun_context, False, False))
+        # Find function calls where the named function is passed in as a
+        # function handle.
+        calls = call_graph(context).indirect_calls(name, context, anywhere)
         if recursive and hasattr(context, 'parent') and context.parent:
             calls.update(self._get_indirect_calls(name, context.parent, anywhere, True))
         return calls
@@ -2095,95 +1043,172 @@ class MatlabGrammar:
     # The core parser invocation.
     # .........................................................................
 
-    def _do_parse(self, input):
-        preprocessed = self._preprocess(input)
-        pr = self._matlab_file.parseString(preprocessed, parseAll=True)
-        return self._generate_nodes_and_contexts(pr)
-
-
-    # Debugging.
-    # .........................................................................
-
-    # Name each grammar object after itself, so that when PyParsing prints
-    # debugging output, it uses the name rather than a generic regexp term.
-
-    _to_name = [ _AND, _CC_TRANSP, _COLON, _COMMA, _DOT, _ELLIPSIS, _ELPOWER,
-                 _ELTIMES, _END, _EOL, _EQ, _EQUALS, _EXPONENT, _FLOAT,
-                 _FUNCTION, _GE, _GT, _INTEGER, _LBRACE, _LBRACKET, _LDIVIDE,
-                 _LE, _LPAR, _LT, _MINUS, _MLDIVIDE, _MPOWER, _MRDIVIDE,
-                 _NC_TRANSP, _NE, _NUMBER, _OR, _PLUS, _RBRACE, _RBRACKET,
-                 _RDIVIDE, _RPAR, _SEMI, _SHORT_AND, _SHORT_OR, _SOL,
-                 _STRING, _TILDE, _TIMES, _UMINUS, _UNOT, _UPLUS, _WHITE,
-                 _ambiguous_id, _anon_handle, _array_access, _array_args,
-                 _array_base, _assignment, _bare_array, _bare_cell,
-                 _block_c_end, _block_c_start, _block_comment, _body,
-                 _break_stmt, _call_args, _case_stmt, _catch_body,
-                 _catch_term, _catch_var, _cell_access, _cell_args,
-                 _cell_array, _cell_base, _cell_nested, _colon_op,
-                 _comma_subs, _comma_values, _comment, _continue_stmt,
-                 _control_stmt, _control_stmt, _dash_term, _delimiter,
-                 _else_stmt, _elseif_stmt, _end_op, _expr, _expr_in_array,
-                 _expr_in_array, _for_stmt, _for_version1, _for_version2,
-                 _fun_access, _fun_body, _fun_cmd_arg, _fun_cmd_arglist,
-                 _fun_def_deep, _fun_def_shallow, _fun_handle, _fun_outputs,
-                 _fun_paramslist, _fun_with_end, _fun_without_end,
-                 _funcall_cmd_style, _funcall_or_array, _id , _identifier,
-                 _if_stmt, _lhs_array, _lhs_var, _line_c_start,
-                 _line_comment, _logical_op, _loop_var, _matlab_file,
-                 _most_ops, _multi_values, _name, _named_handle,
-                 _noncmd_arg_start, _noncontent, _not_unary, _one_param,
-                 _one_row, _one_sub, _operand, _operand_in_array,
-                 _opt_arglist, _opt_paramlist, _other_assign, _paramlist,
-                 _plusminus, _plusminus_array, _power, _reserved,
-                 _return_stmt, _row_sep, _rows, _scope_args, _scope_stmt,
-                 _scope_type, _scope_var_list, _shell_cmd, _shell_cmd_cmd,
-                 _simple_assign, _simple_struct, _simple_struct_base,
-                 _single_expr, _single_value, _space_subs, _space_values,
-                 _standalone_expr, _stmt, _stmt_list, _stmt_list,
-                 _struct_access, _struct_base, _struct_field, _switch_other,
-                 _switch_stmt, _test_expr, _timesdiv, _transp_op, _try_stmt,
-                 _uplusminusneg, _uplusminusneg_after, _while_stmt]
-
-    def _object_name(self, obj):
-        """Returns the name of a given object."""
+    # The parsing engines accepted by parse_string() and parse_file().  The
+    # 'descent' engine is implemented in descent.py; it produces the same
+    # results as the PyParsing grammar, in time linear in the input size.
+
+    _engines = ['pyparsing', 'descent']
+
+    # If there is a parse cache (see cache.py), _do_parse() returns the
+    # results stored there when it can, and stores the results otherwise.
+    # If `recover` is True and the input can't be parsed, it is parsed again
+    # with error recovery (see recovery.py); those results aren't cached.
+    # Nor is the cache used while profiling, since nothing would be parsed.
+
+    def _do_parse(self, input, engine='pyparsing', recover=False):
+        if recover:
+            try:
+                return self._do_parse(input, engine)
+            except _parse_errors():
+                self._reset()
+                return self._recover(input, engine)
+        if self._parse_cache is not None and self._profile is None:
+            key = self._parse_cache.key(input, engine)
+            context = self._parse_cache.get(key)
+            if context is not None:
+                context.parse_stats = None
+                self._context = context
+                return context
+            context = self._parse_input(input, engine)
+            self._parse_cache.put(key, context)
+            return context
+        return self._parse_input(input, engine)
+
+
+    def _parse_input(self, input, engine):
+        return self._parse_preprocessed(self._preprocess(input), engine)
+
+
+    def _parse_preprocessed(self, preprocessed, engine):
+        if engine == 'descent':
+            return self._generate_nodes_with_descent(preprocessed)
+        pr = self._parse_chunks(preprocessed)
+        context = self._generate_nodes_and_contexts(pr)
+        context.parse_stats = self._parse_stats
+        context._statements = self._statements
+        return context
+
+
+    def _recover(self, input, engine):
+        # Parses the input with error recovery.  recover() works on the
+        # preprocessed input with its tabs expanded, as the parsers do, so
+        # the locations it reports are turned into locations in the input
+        # as for error messages.
+        preprocessed = self._preprocess(input).expandtabs()
+        offsets = self._offsets
+        def parse(text):
+            self._reset()
+            self._offsets = offsets
+            return self._parse_preprocessed(text, engine)
+        context, failures = recover(preprocessed, parse, _parse_errors())
+        errors = {}
+        for failure in failures:
+            _, line, column = self._location(failure.start)
+            text = input[self._original_offset(failure.start):
+                         self._original_offset(failure.end)]
+            errors[failure.marker] = ParseError(text=text, rule=failure.rule,
+                                                message=failure.message,
+                                                line=line, column=column)
+        context.nodes = MarkerReplacer(errors).visit(context.nodes)
+        context.diagnostics = [errors[failure.marker] for failure in failures]
+        return context
+
+
+    def _parse_chunks(self, input):
+        # The 'pyparsing' engine.  See parse_chunks() in grammar_rules.py.
+        # A profile that records positions gets them as lines and columns
+        # of the original input, even if the parse fails.
         try:
-            values = MatlabGrammar.__dict__.iteritems()  # Python 2
-        except:
-            values = MatlabGrammar.__dict__.items()      # Python 3
-        for name, thing in values:
-            if thing is obj:
-                return name
-
-
-    _init_grammar_names_done = []
+            nodes, self._parse_stats, self._statements = \
+                _grammar_rules().parse_chunks(input, self._cache_size,
+                                              self._previous_statements,
+                                              self._profile,
+                                              self._incremental)
+        finally:
+            profile = self._profile
+            if profile is not None and profile.positions is not None:
+                profile._locate(self._location, input.expandtabs())
+        return nodes
 
-    def _init_grammar_names(self):
-        if 'done' not in self._init_grammar_names_done:
-            for obj in self._to_name:
-                obj.setName(self._object_name(obj))
-            self._init_grammar_names_done.append('done')
 
+    def _check_engine(self, engine):
+        if engine not in self._engines:
+            raise ValueError('Unknown parsing engine "{}"; expected one of {}'
+                             .format(engine, ', '.join(self._engines)))
 
-    # The next variable and function are for printing low-level PyParsing
-    # matches.  You can reduce the amount of output by changing the value
-    # (which is _to_name by default) to a list of specific objects.  E.g.:
-    #    _to_print_debug = [_cell_access, _cell_array, _bare_cell, _expr]
 
-    _to_print_debug = _to_name # [_fun_body, _fun_def_deep, _fun_def_shallow, _stmt, _matlab_file]
+    # Debugging.
+    # .........................................................................
 
     def _print_debug(self, print_debug=False):
+        # Turns on PyParsing's printing of the matches of the grammar objects
+        # listed in _to_print_debug in grammar_rules.py.
         if print_debug:
-            for obj in self._to_print_debug:
+            for obj in _grammar_rules().GrammarRules._to_print_debug:
                 obj.setDebug(True)
 
 
     # Instance initialization.
     # .........................................................................
 
-    def __init__(self):
-        self._init_grammar_names()
-        # self._init_parse_actions()
-        self._print_debug(False)
+    # Thread safety.  A MatlabGrammar object can be used by any number of
+    # threads at the same time.  The state of a parse (the current context,
+    # the offsets of the preprocessed input, the statistics, etc.) is kept
+    # in attributes of the object, but each call of parse_string(),
+    # reparse(), parse_file() and iter_parse() works on a copy of the object
+    # made by _for_call(), so every call has its own.  The grammar itself is
+    # shared by all threads, and its packrat cache and other helpers keep
+    # their state per thread (see grammar_rules.py).  Two things are not
+    # made for concurrency: print_debug, which turns on PyParsing's debug
+    # output for everyone, and profiling (see profiler.py), which is
+    # limited to one parse at a time.
+
+    # The grammar objects are shared by all MatlabGrammar objects, and so is
+    # their packrat cache (see grammar_rules.py).  Each parse sets the cache
+    # size to that of the MatlabGrammar object doing the parsing.  The size
+    # can be given to the constructor or in the environment variable named
+    # by _cache_size_variable; if neither is given, the cache has no size
+    # limit.
+
+    _cache_size_variable = 'MOCCASIN_PACKRAT_CACHE_SIZE'
+
+    def _packrat_cache_size(self, cache_size):
+        if cache_size is None:
+            cache_size = os.environ.get(self._cache_size_variable) or None
+        if cache_size is None:
+            return None
+        try:
+            size = int(cache_size)
+        except ValueError:
+            size = -1
+        if size < 0:
+            raise ValueError('Packrat cache size must be a non-negative '
+                             'integer; got "{}"'.format(cache_size))
+        return size
+
+
+    def __init__(self, cache_size=None, parse_cache=None):
+        """Creates a parser.
+
+        :param cache_size: the maximum number of entries in the packrat
+        cache used by the 'pyparsing' engine, or 0 to disable the cache.
+        The default is the value of the environment variable
+        MOCCASIN_PACKRAT_CACHE_SIZE, or no limit if that is not set.
+        :param parse_cache: a ParseCache object in which to look up and
+        store the results of parsing.  The default is a ParseCache in the
+        directory named by the environment variable MOCCASIN_PARSE_CACHE_DIR
+        if that is set, and no caching otherwise.
+        """
+        self._cache_size = self._packrat_cache_size(cache_size)
+        if parse_cache is None and os.environ.get('MOCCASIN_PARSE_CACHE_DIR'):
+            parse_cache = ParseCache()
+        self._parse_cache = parse_cache
+        self._parse_stats = None
+        self._statements = None
+        self._previous_statements = None
+        self._incremental = False
+        self._profile = None
+        self._iteration = threading.local()
         self._reset()
 
 
@@ -2201,32 +1226,71 @@ class MatlabGrammar:
 
     def _reset(self):
         self._context = None
+        self._offsets = None
+        self._part_start = (0, 0)
         self._push_context(MatlabContext(topmost=True))
 
 
+    def _for_call(self):
+        # Returns the copy of this object that a call of the external
+        # interfaces works on (see the notes on thread safety above).
+        parser = copy.copy(self)
+        parser._parse_stats = None
+        parser._statements = None
+        parser._previous_statements = None
+        parser._incremental = False
+        parser._profile = None
+        parser._reset()
+        return parser
+
+
     # External interfaces.
     # .........................................................................
 
     def parse_string(self, input, print_results=False, print_debug=False,
-                     fail_soft=False):
+                     fail_soft=False, engine='pyparsing', recover=False,
+                     profile=None, incremental=False):
         """Parses MATLAB input and returns an a MatlabContext object.
 
         :param print_debug: print complete parsing debug output.
         :param print_results: print the internal presentation of the results.
         :param fail_soft: don't raise an exception if parsing fails.
+        :param engine: the parsing engine to use, either 'pyparsing' (the
+        default) or 'descent'.  Both produce the same results.
+        :param recover: if some statements can't be parsed, put ParseError
+        objects in their place and carry on (see recovery.py), instead of
+        failing.  The ParseError objects are also listed in the context's
+        `diagnostics`.
+        :param profile: a RuleProfile object in which to count and time the
+        matches of the grammar's rules (see profiler.py).  This makes the
+        parse several times slower, and has no effect on the 'descent'
+        engine.
+        :param incremental: keep the results of the statements in the
+        returned context, so that reparse() can use them for an edited
+        version of the input.  This has no effect on the 'descent' engine.
 
         Warning: print_debug produces *a lot* of output.  Don't use it on
-        anything more than a few lines of input.
+        anything more than a few lines of input.  It has no effect on the
+        'descent' engine.
         """
-        self._reset()
+        self._check_engine(engine)
+        parser = self._for_call()
+        parser._profile = profile
+        parser._incremental = incremental
+        return parser._parse_string(input, print_results, print_debug,
+                                    fail_soft, engine, recover)
+
+
+    def _parse_string(self, input, print_results, print_debug, fail_soft,
+                      engine='pyparsing', recover=False):
         try:
             self._print_debug(print_debug)
-            top_context = self._do_parse(input)
+            top_context = self._do_parse(input, engine, recover)
             if print_results:
                 self.print_parse_results(top_context)
             return top_context
-        except ParseException as err:
-            msg = "Error: {0}".format(err)
+        except _parse_errors() as err:
+            msg = self._error_message(err)
             if fail_soft:
                 print(msg)
                 return None
@@ -2235,8 +1299,29 @@ class MatlabGrammar:
                 raise MatlabParsingException(msg)
 
 
+    def reparse(self, context, input, print_results=False, print_debug=False,
+                fail_soft=False):
+        """Parses MATLAB input that is an edited version of the input for
+        which `context` was returned, and returns a new MatlabContext object.
+        The result is the same as that of parse_string(input), but the
+        statements that the edits did not affect are not parsed again.
+        `context` must have come from parse_string() or parse_file() with
+        incremental=True, or from reparse(); otherwise (e.g., if it came
+        from the 'descent' engine or a ParseCache), this does the same as
+        parse_string().  The result can be given to reparse() in turn.
+
+        The parameters are the same as for parse_string().
+        """
+        parser = self._for_call()
+        parser._previous_statements = getattr(context, '_statements', None)
+        parser._incremental = True
+        return parser._parse_string(input, print_results, print_debug,
+                                    fail_soft)
+
+
     def parse_file(self, path, print_results=False, print_debug=False,
-                   fail_soft=False):
+                   fail_soft=False, engine='pyparsing', recover=False,
+                   profile=None, incremental=False):
         """Parses the MATLAB contained in `file` and returns a MatlabContext.
         object This is essentially identical to MatlabGrammar.parse_string()
         but does the work of opening and closing the `file`.
@@ -2244,23 +1329,39 @@ class MatlabGrammar:
         :param print_debug: print complete parsing debug output.
         :param print_results: print the internal presentation of the results.
         :param fail_soft: don't raise an exception if parsing fails.
+        :param engine: the parsing engine to use, either 'pyparsing' (the
+        default) or 'descent'.  Both produce the same results.
+        :param recover: carry on past statements that can't be parsed, as
+        for parse_string().
+        :param profile: a RuleProfile to count the matches of the grammar's
+        rules in, as for parse_string().
+        :param incremental: keep what reparse() needs, as for parse_string().
 
         Warning: print_debug produces *a lot* of output.  Don't use it on
         anything more than a few lines of input.
         """
-        self._reset()
+        self._check_engine(engine)
+        parser = self._for_call()
+        parser._profile = profile
+        parser._incremental = incremental
+        return parser._parse_file(path, print_results, print_debug,
+                                  fail_soft, engine, recover)
+
+
+    def _parse_file(self, path, print_results, print_debug, fail_soft,
+                    engine, recover):
         try:
             file = codecs.open(path)
             contents = file.read()
             self._print_debug(print_debug)
-            top_context = self._do_parse(contents)
+            top_context = self._do_parse(contents, engine, recover)
             top_context.file = path
             file.close()
             if print_results:
                 self.print_parse_results(top_context)
             return top_context
         except Exception as err:
-            msg = "Error: {0}".format(err)
+            msg = self._error_message(err)
             if fail_soft:
                 print(msg)
                 return None
@@ -2269,6 +1370,153 @@ class MatlabGrammar:
                 raise MatlabParsingException(msg)
 
 
+    def parse_files(self, paths, workers=None, fail_soft=False,
+                    engine='pyparsing', recover=False):
+        """Parses the MATLAB files in `paths` using a pool of `workers`
+        processes, and returns an iterator over tuples (path, result,
+        timings), one per file, in the order in which the files are
+        finished.  `result` is the MatlabContext for the file.  `timings` is
+        a dictionary: its value for 'parse' is the time in seconds taken to
+        parse the file, and its value for 'elapsed' is the time since the
+        call to parse_files().
+
+        :param workers: the number of processes to use.  The default is the
+        number of CPUs.  If it's 1, the files are parsed in this process.
+        :param fail_soft: if a file can't be parsed, make `result` the
+        MatlabParsingException object instead of raising it.
+        :param engine: the parsing engine to use, either 'pyparsing' (the
+        default) or 'descent'.  Both produce the same results.
+        :param recover: carry on past statements that can't be parsed, as
+        for parse_string().  The contexts' `diagnostics` then list them.
+
+        Each worker process parses all of its files with the same
+        MatlabGrammar object, created with the same packrat cache size and
+        parse cache as this one.
+        """
+        self._check_engine(engine)
+        if workers is None:
+            workers = multiprocessing.cpu_count()
+        if workers < 1:
+            raise ValueError('Number of workers must be at least 1')
+        return self._parse_files(list(paths), workers, fail_soft, engine,
+                                 recover)
+
+
+    def _parse_files(self, paths, workers, fail_soft, engine, recover):
+        start = time.time()
+        if workers == 1:
+            results = (_parse_one(self, path, engine, recover) for path in paths)
+            pool = None
+        else:
+            pool = multiprocessing.Pool(workers, _init_worker,
+                                        (self._cache_size, self._parse_cache,
+                                         engine, recover))
+            results = ((path, pickle.loads(pickled), parse_time)
+                       for path, pickled, parse_time
+                       in pool.imap_unordered(_parse_in_worker, paths))
+        finished = False
+        try:
+            for path, result, parse_time in results:
+                if isinstance(result, MatlabParsingException) and not fail_soft:
+                    raise result
+                timings = {'parse': parse_time, 'elapsed': time.time() - start}
+                yield path, result, timings
+            finished = True
+        finally:
+            if pool is not None:
+                if finished:
+                    pool.close()
+                else:
+                    pool.terminate()
+                pool.join()
+
+
+    def iter_parse(self, source, fail_soft=False, engine='pyparsing',
+                   block_size=65536):
+        """Parses the MATLAB in `source`, which is either the path to a file
+        or a file object, and yields the MatlabNode objects for the
+        top-level statements and function definitions in it as soon as each
+        one is complete.  The input is read `block_size` characters at a
+        time (through a memory map, if `source` is a path), and only the
+        part of it that hasn't been parsed yet is kept in memory.
+
+        The MatlabContext for the input is the value of the `context`
+        property from the start, and it is updated as the nodes are
+        yielded, so its nodes, functions, assignments, etc., cover the
+        input up to the last node yielded.
+
+        The results are the same as those of parse_file(), except that the
+        types of things are only inferred from what comes before them in
+        the input; e.g., a call to a function that is defined further down
+        stays Ambiguous.  Functions are yielded at their 'end', or at the
+        end of the input in files whose functions don't end with 'end'.
+
+        :param fail_soft: if the input can't be parsed, print the error and
+        stop instead of raising MatlabParsingException.
+        :param engine: the parsing engine to use, either 'pyparsing' (the
+        default) or 'descent'.
+        :param block_size: the number of characters to read at a time.
+        """
+        self._check_engine(engine)
+        parser = self._for_call()
+        self._iteration.context = parser._context
+        return parser._iter_parse(source, fail_soft, engine, block_size)
+
+
+    def _iter_parse(self, source, fail_soft, engine, block_size):
+        context = self._context
+        context.nodes = []
+        if not hasattr(source, 'read'):
+            context.file = source
+        decided = False
+        parts = _InputParts(source, block_size)
+        for text, offset, lines in parts:
+            self._part_start = (offset, lines)
+            try:
+                nodes = self._parse_part(text, engine)
+            except _parse_errors() as err:
+                if parts.cutting and not parts.at_end:
+                    # The input may have been cut in the wrong place.  Parse
+                    # this part again together with the rest of the input.
+                    parts.cutting = False
+                    continue
+                msg = self._error_message(err)
+                if fail_soft:
+                    print(msg)
+                    return
+                raise MatlabParsingException('Failed to parse MATLAB input')
+            context.nodes.extend(nodes)
+            if not decided and not all(isinstance(n, Comment) for n in nodes):
+                # Whether this is a function file (see
+                # _complete_nodes_and_contexts()) is now known.
+                decided = True
+                is_function_file, name = self._find_first_function(context.nodes)
+                if is_function_file:
+                    context.name = name
+            for node in nodes:
+                yield node
+
+
+    @property
+    def context(self):
+        """The MatlabContext of the input being parsed by the last call of
+        iter_parse() in the current thread."""
+        return getattr(self._iteration, 'context', None)
+
+
+    def _parse_part(self, text, engine):
+        # Parses one of the parts of the input that iter_parse() cuts it
+        # into, and finishes the nodes as _generate_nodes_and_contexts()
+        # does, in the current context.
+        preprocessed = self._preprocess(text)
+        if engine == 'descent':
+            nodes = MatlabDescentParser(self, Disambiguator).parse(preprocessed)
+        else:
+            nodes = self._parse_chunks(preprocessed)
+            self._finish_statements(nodes)
+        return self._infer_types(nodes)
+
+
     def print_parse_results(self, results, print_raw=False):
         """Prints a representation of the parsed output given in `results`.
         This is intended for debugging purposes.  If `print_raw` is True,
@@ -2306,275 +1554,215 @@ class MatlabGrammar:
         If no 'atrans' is given, the default behavior is to render arrays
         as they would appear in Matlab text: e.g., "foo(2,3)".
         """
-        def compose(name, args, delimiters=None):
-            list = [MatlabGrammar.make_formula(arg, spaces, parens, atrans)
-                    for arg in (args or [])]
-            sep = ' ' if spaces else ''
+        # The formula is built with fold_tree() (see matlab.py) rather than
+        # by recursion, because expressions can be thousands of operators
+        # long.  formula_parts() returns the parts of the formula for one
+        # item in the form fold_tree() wants.
+        sep = ' ' if spaces else ''
+
+        def compose(name, delimiters):
             front = name if name else ''
-            left = delimiters[0] if delimiters else ''
-            right = delimiters[1] if delimiters else ''
-            return front + left + sep.join(list) + right
-
-        recurse = MatlabGrammar.make_formula
-        if isinstance(thing, str):
-            return thing
-        elif isinstance(thing, Primitive):
-            return MatlabNode.as_string(thing.value)
-        elif isinstance(thing, Identifier):
-            return MatlabNode.as_string(thing.name)
-        elif isinstance(thing, ArrayRef) or isinstance(thing, Ambiguous):
-            if atrans:
-                return atrans(thing)
-            if isinstance(thing.name, Identifier):
-                aname = thing.name.name
-            else:
-                aname = recurse(thing.name, spaces, parens, atrans)
-            return compose(aname, thing.args, '()')
-        elif isinstance(thing, FunCall):
-            return compose(thing.name.name, thing.args, '()')
-        elif (isinstance(thing, StructRef) or isinstance(thing, FuncHandle)
-              or isinstance(thing, AnonFun)):
-            # FIXME: we don't have a sensible equivalent in SBML.
-            return MatlabNode.as_string(thing)
-        elif isinstance(thing, Operator):
-            if isinstance(thing, UnaryOp):
-                operand = recurse(thing.operand, spaces, parens, atrans)
-                return compose(None, [thing.op, operand], '()')
-            elif isinstance(thing, BinaryOp):
-                left = recurse(thing.left, spaces, parens, atrans)
-                right = recurse(thing.right, spaces, parens, atrans)
-                return compose(None, [left, thing.op, right], '()')
-            elif isinstance(thing, ColonOp):
+            return lambda strings: (front + delimiters[0] + sep.join(strings)
+                                    + delimiters[1])
+
+        def formula_parts(thing):
+            if isinstance(thing, str):
+                return thing, None
+            elif isinstance(thing, Primitive):
+                return MatlabNode.as_string(thing.value), None
+            elif isinstance(thing, Identifier):
+                return MatlabNode.as_string(thing.name), None
+            elif isinstance(thing, ArrayRef) or isinstance(thing, Ambiguous):
+                if atrans:
+                    return atrans(thing), None
+                args = thing.args or []
+                if isinstance(thing.name, Identifier):
+                    return args, compose(thing.name.name, '()')
+                # The name is a formula too.
+                return ([thing.name] + args,
+                        lambda s: compose(s[0], '()')(s[1:]))
+            elif isinstance(thing, FunCall):
+                return thing.args or [], compose(thing.name.name, '()')
+            elif (isinstance(thing, StructRef) or isinstance(thing, FuncHandle)
+                  or isinstance(thing, AnonFun)):
                 # FIXME: we don't have a sensible equivalent in SBML.
-                left = recurse(thing.left, spaces, parens, atrans)
-                right = recurse(thing.right, spaces, parens, atrans)
-                if thing.middle:
-                    middle = recurse(thing.middle, spaces, parens, atrans)
-                    return left + ':' + middle + ':' + right
-                else:
-                    return left + ':' + right
-            elif isinstance(thing, Transpose):
-                # FIXME: we don't have a sensible equivalent in SBML.
-                return recurse(thing.operand, spaces, parens, atrans) + thing.op
+                return MatlabNode.as_string(thing), None
+            elif isinstance(thing, Operator):
+                if isinstance(thing, UnaryOp):
+                    return [thing.op, thing.operand], compose(None, '()')
+                elif isinstance(thing, BinaryOp):
+                    return ([thing.left, thing.op, thing.right],
+                            compose(None, '()'))
+                elif isinstance(thing, ColonOp):
+                    # FIXME: we don't have a sensible equivalent in SBML.
+                    if thing.middle:
+                        return ([thing.left, thing.middle, thing.right],
+                                ':'.join)
+                    else:
+                        return [thing.left, thing.right], ':'.join
+                elif isinstance(thing, Transpose):
+                    # FIXME: we don't have a sensible equivalent in SBML.
+                    return [thing.operand], lambda s: s[0] + thing.op
+                return None, None
+            elif isinstance(thing, Array):
+                # FIXME: we don't have arrays in core SBML.
+                return thing.rows, compose(None, '[]')
+            elif isinstance(thing, list):
+                return thing, compose(None, '()')
+            elif 'comment' in thing:
+                return '', None
+            else:
+                # The remaining cases are things like command statements.
+                # Those shouldn't end up being called for make_formula.
+                # Rather than raise an error, though, this just returns None
+                # and lets the caller deal with the problem.
+                return None, None
 
-        elif isinstance(thing, Array):
-            # FIXME: we don't have arrays in core SBML.
-            return compose(None, thing.rows, '[]')
+        return fold_tree(thing, formula_parts)
 
-        elif isinstance(thing, list):
-            return compose(None, thing, '()')
-        elif 'comment' in thing:
-            return ''
-        else:
-            # The remaining cases are things like command statements.  Those
-            # shouldn't end up being called for make_formula.  Rather than
-            # raise an error, though, this just returns None and lets the
-            # caller deal with the problem.
-            return None
+
+# Reading the input of MatlabGrammar.iter_parse().
+# .............................................................................
+
+class _InputParts(object):
+    # Reads the input for iter_parse() and iterates over it in parts that
+    # can be parsed on their own (see last_cut() in prescan.py), as tuples
+    # (text, offset, lines): the text of the part, and the offset and the
+    # number of lines of the input in front of it.  Setting `cutting` to
+    # False right after a part has been returned puts that part back, and
+    # the rest of the input comes in one piece with it.  `at_end` is True
+    # once the last part has been returned.
+
+    def __init__(self, source, block_size):
+        self.cutting = True
+        self.at_end = False
+        self._blocks = _input_blocks(source, block_size)
+
+
+    def __iter__(self):
+        pending = ''
+        offset = lines = 0
+        scanned = 0
+        for block in self._blocks:
+            pending += block
+            # Looking for the place to cut means lexing all of the pending
+            # text, so that is only done again once it has doubled in size.
+            if not self.cutting or len(pending) < 2 * scanned:
+                continue
+            scanned = len(pending)
+            cut = last_cut(pending)
+            if cut:
+                text = pending[:cut]
+                yield text, offset, lines
+                if self.cutting:
+                    offset += cut
+                    lines += (text.count('\n') + text.count('\r')
+                              - text.count('\r\n'))
+                    pending = pending[cut:]
+                    scanned = len(pending)
+        self.at_end = True
+        if pending.strip():
+            yield pending, offset, lines
+
+
+def _input_blocks(source, block_size):
+    # Yields the contents of `source` (a path or a file object) in blocks
+    # of text.  Bytes are decoded the same way parse_file() decodes them.
+    decoder = None
+    for block in _raw_blocks(source, block_size):
+        if not isinstance(block, str):
+            if decoder is None:
+                encoding = locale.getpreferredencoding(False)
+                decoder = codecs.getincrementaldecoder(encoding)()
+            block = decoder.decode(block)
+        yield block
+
+
+def _raw_blocks(source, block_size):
+    if hasattr(source, 'read'):
+        while True:
+            block = source.read(block_size)
+            if not block:
+                return
+            yield block
+    with open(source, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            # An empty file can't be memory-mapped.
+            return
+        data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            for start in range(0, size, block_size):
+                yield data[start:start + block_size]
+        finally:
+            data.close()
+
+
+# Worker processes for MatlabGrammar.parse_files().
+# .............................................................................
+# These have to be module-level functions so that multiprocessing can pass
+# them to the worker processes.  Each process keeps its own MatlabGrammar
+# object.  The results are pickled in the worker rather than by
+# multiprocessing, so that a result that can't be pickled becomes an error
+# for that file alone instead of breaking the whole pool.  With one worker,
+# parse_files() calls _parse_one() itself, and nothing is pickled.
+
+_worker_parser = None
+_worker_engine = None
+_worker_recover = None
+
+
+def _init_worker(cache_size, parse_cache, engine, recover):
+    global _worker_parser, _worker_engine, _worker_recover
+    _worker_parser = MatlabGrammar(cache_size=cache_size,
+                                   parse_cache=parse_cache)
+    _worker_engine = engine
+    _worker_recover = recover
+
+
+def _parse_in_worker(path):
+    path, result, elapsed = _parse_one(_worker_parser, path, _worker_engine,
+                                       _worker_recover)
+    try:
+        pickled = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception as err:
+        pickled = pickle.dumps(_parse_failure(path, err))
+    return path, pickled, elapsed
+
+
+def _parse_one(parser, path, engine, recover):
+    start = time.time()
+    try:
+        result = parser.parse_file(path, engine=engine, recover=recover)
+    except Exception as err:
+        result = _parse_failure(path, err)
+    return path, result, time.time() - start
+
+
+def _parse_failure(path, err):
+    msg = 'Failed to parse MATLAB input in {}: {}'.format(path, err)
+    return MatlabParsingException(msg)
 
 
-# Notes about dealing with the intermediate PyParsing-based representation.
+# Notes about how the nodes are built.
 # .............................................................................
 #
-# First thing to know: the ParseResults objects generated by this
-# PyParsing-based parser are heavily nested and annotated.  This is annoying
-# to traverse by hand, and even more annoying to print (you will a *lot* of
-# output for even simple things).  More on that below.
-#
-# The second thing to note is that the grammar is designed to attach
-# PyParsing "result names" to matched components.  What this means is that
-# most ParseResults objects have a Python dictionary associated with them.
-# You can use Python's keys() operator to inspect the dictionary keys on most
-# objects.  The basic approach to using the parsing results thus becomes a
-# matter of using keys() to find out the entry or entries on an object,
-# accessing the dictionary entries using the keys, calling keys() on the
-# result of *that*, and so on, recursively.
-#
-# Here's an example using a simple assignment.  Suppose a file contains this:
-#
-#     a = 1
-#
-# This will return one ParseResults object at the top level, but this object
-# will in reality be a recursively-structured list of annotated ParseResults
-# objects.  (This will hopefully become more clear as this example
-# progresses.)  At the top level, there will be one object per line in the
-# file.  To find out how many there are, you can look at the length of what
-# was returned by pyparsing's parseString(...):
-#
-#     (Pdb) type(results)
-#     <class 'pyparsing.ParseResults'>
-#     (Pdb) len(results)
-#     1
-#
-# In this example, there's only one line in the file, so the length of the
-# ParseResults object is one.  Let's get the ParseResults object for that
-# first line:
-#
-#     (Pdb) content = results[0]
-#     (Pdb) content.keys()
-#     ['assignment']
-#
-# This first line of the file was labeled as an 'assignment', which is
-# MatlabGrammar's way of identifying (you guessed it) an assignment
-# statement.  Now let's look inside of it:
-#
-#     (Pdb) content['assignment'].keys()
-#     ['rhs', 'lhs']
-#
-# The object stored under the dictionary key 'assignment' has its own
-# dictionary, and that dictionary has two entries: one under the key 'lhs'
-# (for the left-hand side of the assignment) and another under the key 'rhs'
-# (for the right-hand side).  You can access each of these individually:
-#
-#     (Pdb) content['assignment']['lhs'].keys()
-#     ['identifier']
-#
-# This now says that the object keyed by 'lhs' in the content['assignment']
-# ParseResults object has another dictionary, with a single item stored under
-# the key 'identifier'.  'identifier' is one of the terminal entities in
-# MatlabGrammar.  When you access its value, you will find it's not a
-# ParseResults object, but a string:
-#
-#     (Pdb) content['assignment']['lhs']['identifier']
-#     'a'
-#
-# And there it is: the name of the variable on the left-hand side of the
-# assignment in the file.  If we repeat the process for the right-hand side
-# of the assignment, we find the following:
-#
-#     (Pdb) content['assignment']['rhs'].keys()
-#     ['number']
-#     (Pdb) content['assignment']['rhs']['number']
-#     '1'
-#
-# The key 'number' corresponds to another terminal entity in MatlabGrammar.
-# Its value is (you guessed it again) a number.  Note that the values
-# returned by MatlabGrammar are always strings, so even though it could in
-# principle be returned in the form of a numerical data type, MatlabGrammar
-# does not do that, because doing so might require data type conversions and
-# such conversions might require decisions that are best left to the
-# applications calling MatlabGrammar.  So instead, it always returns
-# everything in finds in a MATLAB file as a text string.
-#
-# Now, let's examine what happens if we have something slightly more
-# complicated in the file, such as the following:
-#
-#     a = [1 2; 3 4]
-#
-# This is an assignment to an array that has two rows, each of which have two
-# items.  Applying the parser to this input will once again yield a
-# ParseResults object that itself contains a list of ParseResults objects,
-# where the list will only have length one.  If we access the object,
-#
-#     (Pdb) content = results[0]
-#     (Pdb) content.keys()
-#     ['assignment']
-#
-# we once again have an assignment, as expected.  Let's take a look at the
-# right-hand side of this one:
-#
-#     (Pdb) content['assignment']['rhs'].keys()
-#     ['array']
-#
-# This time, MatlabGrammar has helpfully identified the object on the
-# right-hand side as an array.  In the MATLAB world, a "matrix" is a
-# two-dimensional array, but the MatlabGrammar grammar is not able to
-# determine the number of dimensions of an array object; consequently, all of
-# the homogeneous array objects (vectors, matrices, and arrays) are labeled
-# as simply 'array'.  (MATLAB cell arrays are labeled 'cell array'.)  Now
-# let's traverse the structure it produced:
-#
-#     (Pdb) array = content['assignment']['rhs']['array']
-#     (Pdb) array.keys()
-#     ['row list']
-#     (Pdb) array['row list'].keys()
-#     []
-#
-# This time, the object has no keys.  The reason for this is the following:
-# some objects stored under the dictionary keys are actually lists.  The name
-# 'row list' is meant to suggest this possibility.  When a value created by
-# MatlabGrammar is a list, the first thing to do is to find out its length:
-#
-#     (Pdb) len(array['row list'])
-#     2
-#
-# What this means is that the array has two row entries stored in a list
-# keyed by 'row list'.  Accessing them is simple:
-#
-#     (Pdb) row1 = array['row list'][0]
-#     (Pdb) row2 = array['row list'][1]
-#     (Pdb) row1.keys()
-#     ['subscript list']
-#     (Pdb) row2.keys()
-#     ['subscript list']
-#
-# Both of them have lists of their own.  These work in the same way as the
-# row lists: you first find out their length, and then index into them to get
-# the values.
-#
-#     (Pdb) len(row1)
-#     2
-#     (Pdb) row1[0].keys()
-#     ['number']
-#     (Pdb) row1[0]['number']
-#     '1'
-#
-# As expected, we are down to the terminal parts of the expression, and here
-# we have indexed into the first element of the first row of the array.  All
-# of the rest of the entries in the array are accessed in the same way.  For
-# example,
-#
-#     (Pdb) row2[1].keys()
-#     ['number']
-#     (Pdb) row2[1]['number']
-#     '4'
-#
-# As a final example, let's take a look at a mathematical expression.
-# Suppose our file contains the following:
-#
-#     a = 1 + 2
-#
-# As usual, applying the parser to this input will once again yield a
-# ParseResults object that itself contains a list of ParseResults objects,
-# and once again the list will only have length 1 because there is only one
-# line in the file.  If we access the first object,
-#
-#     (Pdb) content = results[0]
-#     (Pdb) content.keys()
-#     ['assignment']
-#
-# we once again have an assignment, as expected.  Let's take a look at the
-# right-hand side of this one:
-#
-#     (Pdb) content['assignment']['rhs'].keys()
-#     []
-#
-# This time, the right-hand side does not have a key.  This is the tip-off
-# that the right-hand side is an expression: in MatlabGrammar, if there is no
-# key on an object, it means that the object is an expression or a list.
-# Expressions are lists: when you encounter them, it means the next step is
-# to iterate over the elements.
-#
-#     (Pdb) len(content['assignment']['rhs'])
-#     3
-#     (Pdb) content['assignment']['rhs'][0].keys()
-#     ['number']
-#     (Pdb) content['assignment']['rhs'][1].keys()
-#     ['binary operator']
-#     (Pdb) content['assignment']['rhs'][2].keys()
-#     ['number']
-#
-# In this simple expression, the elements inside the expression list are
-# terminal objects, but in general, they could be anything, including more
-# expressions.  The rule for traversing expressions is the same: inspect the
-# keys of each object, do whatever is appropriate for kind of object it is,
-# and if there are no keys, it's another expression, so traverse it
-# recursively.
-#
-# And that summarizes the basic process for working with MatlabGrammar parse
-# results.  The parser(...) returns a list of objects results for the lines
-# in the file; each has a dictionary, which you inspect to figure out what
-# kind of objects were extracted, and then you dig into the object's
-# dictionaries recursively until you reach terminal entities.  Sometimes the
-# values for dictionaries are lists, in which case you iterate over the
-# values, applying the same principle.
+# There is no intermediate representation to deal with.  With the
+# 'pyparsing' engine, the parse actions set up at the end of GrammarRules
+# (grammar_rules.py) call ParseResultsTransformer as each statement is
+# matched, so what PyParsing returns is already a list of MatlabNode
+# objects; the Group around each statement is removed by the same actions.
+# With the 'descent' engine, MatlabDescentParser (descent.py) produces the
+# same MatlabNode objects directly.
+#
+# Either way, the list of nodes then goes through the passes in
+# MatlabGrammar._generate_nodes_and_contexts() and
+# _complete_nodes_and_contexts(): the first creates a MatlabContext for each
+# function definition; the second walks the nodes with NodeTransformer,
+# recording assignments, calls and the types of things in the contexts and
+# turning Ambiguous nodes into FunCall or ArrayRef nodes where it can, as
+# many times as the inferences need (see inference.py).  The result is the
+# MatlabContext for the whole input, whose `nodes` are the top-level nodes.
+#
+# Node trees can be thousands of levels deep, so code that walks them should
+# use fold_tree() or MatlabNodeVisitor (matlab.py) rather than recursion.
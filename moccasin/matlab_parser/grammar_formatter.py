@@ -22,6 +22,7 @@
 
 from pyparsing import ParseResults
 from grammar import *
+from grammar_utils import *
 
 
 # MatlabGrammarFormatter
@@ -45,6 +46,9 @@ class MatlabGrammarFormatter(MatlabGrammar):
         return '\n'.join([self._format_pr(pr) for pr in thing])
 
 
+    # The formatter functions, by key of the ParseResults they format.
+    _formatters = {}
+
     def _format_pr(self, pr):
         if isinstance(pr, str):
             return pr
@@ -52,12 +56,16 @@ class MatlabGrammarFormatter(MatlabGrammar):
             # It's an expression.
             return self._format_expression(pr)
         key = first_key(pr)
-        # Construct the function name dynamically.
-        func_name = '_format_' + '_'.join(key.split())
-        if func_name in MatlabGrammarFormatter.__dict__:
-            return MatlabGrammarFormatter.__dict__[func_name](self, pr)
-        else:
-            self._warn('Internal error: no formatter for ' + str(key))
+        func = self._formatters.get(key)
+        if func is None:
+            # Construct the function name dynamically.
+            func_name = '_format_' + '_'.join(key.split())
+            func = MatlabGrammarFormatter.__dict__.get(func_name)
+            if func is None:
+                self._warn('Internal error: no formatter for ' + str(key))
+                return
+            self._formatters[key] = func
+        return func(self, pr)
 
 
     def _format_identifier(self, pr):
@@ -0,0 +1,1405 @@
+#!/usr/bin/env python
+#
+# @file    grammar_rules.py
+# @brief   The MATLAB grammar in PyParsing, and the engine that runs it
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# This module holds the PyParsing grammar used by the 'pyparsing' engine of
+# MatlabGrammar (see grammar.py for how the parser works as a whole).  The
+# grammar objects are built when this module is imported, which takes
+# longer than importing everything else in the package together, and many
+# users of the package never parse anything (they only need the MatlabNode
+# classes, the visitors, or the table of MATLAB functions).  So grammar.py
+# doesn't import this module until the first time it parses something with
+# the 'pyparsing' engine; after that, the grammar stays in memory and is
+# shared by all MatlabGrammar objects in the process.  Nothing else in the
+# package imports PyParsing when it is imported.
+
+from __future__ import print_function
+import sys
+import threading
+import pyparsing                        # Need this for version check, so ...
+from pyparsing import *                 # ... DON'T merge this & previous stmt!
+from distutils.version import LooseVersion
+try:
+    from grammar_utils import *
+    from lexer import TokenTable, NUMBER, IDENTIFIER
+    from matlab import *
+    from prescan import chunk_starts, function_style, has_functions
+    from incremental import StatementRecorder, StatementTable
+    from fastpath import StatementFastPath
+    from profiler import RuleProfiler
+except:
+    from .grammar_utils import *
+    from .lexer import TokenTable, NUMBER, IDENTIFIER
+    from .matlab import *
+    from .prescan import chunk_starts, function_style, has_functions
+    from .incremental import StatementRecorder, StatementTable
+    from .fastpath import StatementFastPath
+    from .profiler import RuleProfiler
+
+# Check minimum version of PyParsing.
+
+if LooseVersion(pyparsing.__version__) < LooseVersion('2.0.3'):
+    raise Exception('MatlabGrammar requires PyParsing version 2.0.3 or higher')
+
+# The inefficient nature of this parser leads to easily exceeding the default
+# recursion stack limit.  Let's increase it.  (Only the parser needs this;
+# the code that walks the resulting node trees doesn't recurse per level.)
+
+if sys.getrecursionlimit() < 5000:
+    sys.setrecursionlimit(5000)
+
+
+
+# Helper classes
+# .............................................................................
+
+# ParseResultsTransformer
+#
+# Helper class to transform ParseResults to MatlabNode-based output format.
+#
+# This takes our heavily-annotated output from PyParsing and converts it
+# to a tree-based representation consisting of lists of MatlabNode objects.
+#
+# In what follows, the visit_* functions are visitors named after the names
+# of our grammar objects (in the PyParsing grammar definition later below).
+# They are named such that the visit() function can dispatch on the name we
+# assign to PyParsing objects.  For instance, to format what we label an
+# "assignment" in the PyParsing grammar above, there's a function called
+# visit_assignment() below.
+#
+# I would implement this using an annotation-based approach like the
+# @dispatch.on and @visit.when annotations that are floating around on the
+# net, but can't: the objects we're processing are always ParseResults (a
+# single class), so the class-based @visit.when dispatching won't work here.
+#
+# The conversion does not happen after parsing.  The visitors for
+# statements, function definitions, shell commands and comments are the
+# parse actions of the corresponding grammar objects (see _node_action()),
+# and expressions convert their operands as they go (see MatlabExpression in
+# grammar_utils.py).  So by the time a statement is converted, everything
+# in it that is a statement or an expression is a MatlabNode already, and
+# visit() passes those through; only the small pieces in between (names,
+# the left-hand sides of assignments, etc.) are still ParseResults.
+#
+# PyParsing's packrat cache can hand out the result of a parse action more
+# than once, so the visitors must never modify the nodes they are given;
+# they only create new ones.  That is why function definitions are created
+# without contexts, and why references to loop variables are not
+# disambiguated here: both are done afterwards by
+# MatlabGrammar._finish_statements(), on the final statements only.
+
+class ParseResultsTransformer:
+    _tables = {}                        # Class -> table of visitors.
+
+    def __init__(self):
+        # Map the names we give to grammar objects to the visitors for them,
+        # as functions.  The table is made once for each class.
+        cls = self.__class__
+        if cls not in self._tables:
+            self._tables[cls] = dict((name[len('visit_'):].replace('_', ' '),
+                                      getattr(getattr(cls, name), '__func__',
+                                              getattr(cls, name)))
+                                     for name in dir(cls) if name.startswith('visit_'))
+        self._visitors = self._tables[cls]
+
+
+    def visit(self, pr):
+        if not isinstance(pr, ParseResults):
+            # It's a terminal element or an expression, which the grammar
+            # produces as a MatlabNode already, so we don't do anything more.
+            return pr
+
+        if len(pr) == 1 and pr[0] == '':
+            # An empty string.  This special case handling shoudn't be
+            # needed, but for some reason, empty strings don't get tagged
+            # with the 'string' key like non-empty strings do.
+            return String(value='')
+
+        # An individual, single parse result.  We dispatch to the
+        # appropriate transformer using the name.
+        keys = list(pr.keys())
+        if len(keys) > 1:
+            # Sanity check.  This should not happen, but maybe someday it will.
+            msg = 'Internal grammar inconsistency: multiple tags for same construct.'
+            raise MatlabInternalException(msg)
+        meth = self._visitors.get(keys[0])
+        if meth is None:
+            return pr
+        else:
+            return meth(self, pr)
+
+
+    def visit_identifier(self, pr):
+        return Identifier(name=pr['identifier'])
+
+
+    def visit_number(self, pr):
+        return Number(value=pr['number'])
+
+
+    def visit_string(self, pr):
+        return String(value=pr['string'])
+
+
+    def visit_tilde(self, pr):
+        return Special(value='~')
+
+
+    def visit_colon(self, pr):
+        return Special(value=':')
+
+
+    def visit_end_operator(self, pr):
+        return Special(value='end')
+
+
+    def visit_standalone_expression(self, pr):
+        content = pr['standalone expression']
+        return self.visit(content)
+
+
+    def visit_assignment(self, pr):
+        content = pr['assignment']
+        lvalue = self.visit(content['lhs'])
+        rvalue = self.visit(content['rhs'])
+        node = Assignment(lhs=lvalue, rhs=rvalue)
+        return node
+
+
+    def visit_array(self, pr):
+        content = pr['array']
+        # Two kinds of array situations: a bare array, and one where we
+        # managed to determine it's an array access (and not the more
+        # ambiguous function call or array access).  If we have an 'array
+        # base' part, it's the latter; if we have a row list, it's the former.
+        if 'array base' in content:
+            base = content['array base']
+            if 'name' in base:
+                name = self.visit(base['name'])
+            else:
+                name = self.visit(base)
+            subscripts = self._convert_list(content['subscript list'])
+            return ArrayRef(name=name, args=subscripts, is_cell=False)
+        elif 'row list' in content:
+            # Bare array.
+            return Array(rows=self._convert_rows(content['row list']), is_cell=False)
+        else:
+            # No row list or subscript list => empty array.
+            return Array(rows=[], is_cell=False)
+
+
+    def visit_cell_array(self, pr):
+        content = pr['cell array']
+        # Two kinds of situations: a bare cell array, and one where we
+        # managed to determine it's an array access.  If we have 'row list'
+        # in the keys, it's the former.
+        if 'row list' in content:
+            # Bare array.
+            return Array(rows=self._convert_rows(content['row list']), is_cell=True)
+        elif 'cell array' in content:
+            # Nested reference.
+            base = self.visit(content['cell array'])
+            subscripts = self._convert_list(content['subscript list'])
+            return ArrayRef(name=base, args=subscripts, is_cell=True)
+        elif 'name' in content:
+            # Basic array reference.
+            name = self.visit(content['name'])
+            subscripts = self._convert_list(content['subscript list'])
+            return ArrayRef(name=name, args=subscripts, is_cell=True)
+        else:
+            # No row list or subscript list => empty array.
+            return Array(rows=[], is_cell=True)
+
+
+    def visit_array_or_function(self, pr):
+        content = pr['array or function']
+        the_name = self.visit(content['name'])
+        if 'argument list' in content.keys():
+            the_args = self._convert_list(content['argument list'])
+        else:
+            the_args = []
+        return Ambiguous(name=the_name, args=the_args)
+
+
+    def visit_function_handle(self, pr):
+        content = pr['function handle']
+        if 'name' in content:
+            return FuncHandle(name=self.visit(content['name']))
+        else:
+            if 'parameter list' in content.keys():
+                the_args = self._convert_list(content['parameter list'])
+            else:
+                the_args = []
+            the_body = self.visit(content['function definition'])
+            return AnonFun(args=the_args, body=the_body)
+
+
+    def visit_function_definition(self, pr):
+        # MATLAB functions establish contexts for other constructs.  The
+        # context is created later, by MatlabGrammar._finish_statements().
+        content = pr['function definition']
+        name = self.visit(content['name'])
+
+        params = None
+        output = None
+        body = None
+        if 'parameter list' in content:
+            params = self._convert_list(content['parameter list'])
+        if 'output list' in content:
+            output = self._convert_list(content['output list'])
+        if 'body' in content:
+            body = self._convert_list(content['body'])
+        return FunDef(name=name, parameters=params, output=output,
+                      body=body, context=None)
+
+
+    def visit_ambiguous_id(self, pr):
+        content = pr['ambiguous id']
+        name = content[0]
+        return Ambiguous(name=Identifier(name=name), args=None)
+
+
+    def visit_struct(self, pr):
+        content = pr['struct']
+        the_base = self.visit(content['struct base'])
+        dynamic = 'dynamic field' in content
+        if dynamic:
+            the_field = self.visit(content['dynamic field'])
+        else:
+            the_field = self.visit(content['static field'])
+        return StructRef(name=the_base, field=the_field, dynamic=dynamic)
+
+
+    def visit_shell_command(self, pr):
+        content = pr['shell command']
+        cmd = content[1][0]
+        backgrounded = cmd.strip().endswith('&')
+        if backgrounded:
+            cmd = cmd[:cmd.rfind('&') - 1]
+        return ShellCommand(command=cmd, background=backgrounded)
+
+
+    def visit_command_statement(self, pr):
+        content = pr['command statement']
+        the_name = self.visit(content['name'])
+        the_args = [String(value=x) for x in content['arguments'].asList()]
+        return FunCall(name=the_name, args=the_args)
+
+
+    def visit_comment(self, pr):
+        return Comment(content=pr['comment'][0])
+
+
+    def visit_control_statement(self, pr):
+        # The statement inside has been converted by its own parse action.
+        return pr['control statement'][0]
+
+
+    def visit_while_statement(self, pr):
+        content = pr['while statement']
+        the_cond = self.visit(content['expression'])
+        the_body = None
+        if 'body' in content:
+            the_body = self._convert_list(content['body'])
+        return While(cond=the_cond, body=the_body)
+
+
+    def visit_if_statement(self, pr):
+        content = pr['if statement']
+        the_cond = self.visit(content['expression'])
+        the_body = None
+        the_else_body = None
+        elseifs = []
+        if 'body' in content:
+            the_body = self._convert_list(content['body'])
+        if 'else statement' in content and 'body' in content['else statement']:
+            the_else_body = self._convert_list(content['else statement']['body'])
+        if 'elseif statements' in content:
+            # We create tuples of (condition, body) for each elseif clause.
+            for clause in content['elseif statements']:
+                cond = self.visit(clause['expression'])
+                body = None
+                if 'body' in clause:
+                    body = self._convert_list(clause['body'])
+                elseifs.append((cond, body))
+        return If(cond=the_cond, body=the_body, elseif_tuples=elseifs,
+                  else_body=the_else_body)
+
+
+    def visit_switch_statement(self, pr):
+        content = pr['switch statement']
+        the_cond = self.visit(content['expression'])
+        the_other = None
+        the_cases = []
+        if 'case statements' in content:
+            # We create tuples of (condition, body) for each elseif clause.
+            for clause in content['case statements']:
+                cond = self.visit(clause['expression'])
+                body = None
+                if 'body' in clause:
+                    body = self._convert_list(clause['body'])
+                the_cases.append((cond, body))
+        if 'otherwise statement' in content and 'body' in content['otherwise statement']:
+            the_other = self._convert_list(content['otherwise statement']['body'])
+        return Switch(cond=the_cond, case_tuples=the_cases, otherwise=the_other)
+
+
+    def visit_for_statement(self, pr):
+        content = pr['for statement']
+        the_var = self.visit(content['loop variable'])
+        the_expr = self.visit(content['expression'])
+        the_body = None
+        if 'body' in content:
+            the_body = self._convert_list(content['body'])
+        return For(var=the_var, expr=the_expr, body=the_body)
+
+
+    def visit_try_statement(self, pr):
+        content = pr['try statement']
+        the_body = None
+        the_var = None
+        the_catch_body = None
+        if 'body' in content:
+            the_body = self._convert_list(content['body'])
+        if 'catch variable' in content:
+            the_var = self.visit(content['catch variable'])
+        if 'catch body' in content:
+            the_catch_body = self._convert_list(content['catch body'])
+        return Try(body=the_body, catch_var=the_var, catch_body=the_catch_body)
+
+
+    def visit_scope_declaration(self, pr):
+        content = pr['scope declaration']
+        the_type = content['type'][0]
+        the_vars = self._convert_list(content['variables list'])
+        return ScopeDecl(type=the_type, variables=the_vars)
+
+
+    def visit_break_statement(self, pr):
+        return Branch(kind='break')
+
+
+    def visit_return_statement(self, pr):
+        return Branch(kind='return')
+
+
+    def visit_continue_statement(self, pr):
+        return Branch(kind='continue')
+
+
+    def _convert_list(self, list):
+        return [self.visit(thing) for thing in list]
+
+
+    def _convert_rows(self, rowlist):
+        # MATLAB doesn't keep blank rows.  The rows are separated by the
+        # delimiters and comments in rowlist, which we skip.
+        nodelist = [self._convert_list(row['subscript list']) for row in rowlist
+                    if isinstance(row, ParseResults) and 'subscript list' in row]
+        return [node for node in nodelist if node]
+
+
+def _node_action(visitor):
+    # Returns a parse action that converts what a grammar object matched
+    # into a MatlabNode, by calling one of ParseResultsTransformer's visitors.
+    def action(instring, loc, tokens):
+        return [visitor(tokens)]
+    return action
+
+
+def _ungroup_action(instring, loc, tokens):
+    # Parse action for a Group around a single MatlabNode.
+    return [tokens[0][0]]
+
+
+
+# GrammarRules.
+# .............................................................................
+# The definition of our MATLAB grammar, in PyParsing.
+#
+# Note: the grammar is written in reverse order, from smallest elements to
+# the highest level parsing object, simply because Python interprets the file
+# in this order and needs each item defined before it encounters it later.
+# However, for readabily, it's probably easiest to start at the last
+# definition (which is _matlab_syntax) and read up.
+
+
+class GrammarRules:
+
+    # First, the lowest-level terminal tokens.
+    # .........................................................................
+
+    # Numbers, strings, identifiers, keywords, comments and transpose
+    # operators are not matched character by character: the input is run
+    # through MatlabLexer once and the terminals below that are MatlabToken
+    # objects look up the lexer's tokens in _tokens.  (See grammar_utils.py.)
+
+    _tokens     = TokenTable()
+
+    # Most of what the grammar matches is converted to MatlabNode objects as
+    # soon as it is matched, by _to_node.  (See ParseResultsTransformer and
+    # the parse actions set at the end of the grammar.)
+
+    _to_node    = ParseResultsTransformer()
+
+    _EOL        = LineEnd().suppress()
+    _SOL        = LineStart().suppress()
+    _WHITE      = White(ws=' \t').suppress()
+
+    # Note: For MATLAB, we often need to control where line breaks are
+    # allowed.  In PyParsing, the whitespace property is attached to term
+    # definitions and not to definitions that only combine the terms; i.e.,
+    # when using the "^" or "|" operators to combine terms, it doesn't matter
+    # if you precede that with setDefaultWhitespaceChars settings.  You have
+    # to set the value for the individual term expressions.  That's why some
+    # of the following primitives are wrapped with setDefaultWhitespaceChars.
+
+    ParserElement.setDefaultWhitespaceChars(' \t')
+
+    _SEMI       = Literal(';').suppress()
+    _COMMA      = Literal(',').suppress()
+    _LPAR       = Literal("(").suppress()
+    _RPAR       = Literal(")").suppress()
+    _LBRACKET   = Literal('[').suppress()
+    _RBRACKET   = Literal(']').suppress()
+    _LBRACE     = Literal('{').suppress()
+    _RBRACE     = Literal('}').suppress()
+    _EQUALS     = Literal('=').suppress()
+    _DOT        = Literal('.').suppress()
+    _ELLIPSIS   = Literal('...')
+
+    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
+
+    # Next come definitions of terminal elements.  The funky syntax with the
+    # second parenthesized argument on each line is something PyParsing allows;
+    # it's a short form, equivalent to calling .setResultsName(...).  The
+    # definition of numbers (in lexer.py) knowingly ignores imaginary numbers
+    # because they're not used in our domain.
+
+    _NUMBER     = MatlabToken(_tokens, NUMBER)        ('number')
+    _STRING     = MatlabToken(_tokens, STRING)        ('string')
+
+    _TILDE      = Literal('~')                        ('tilde')
+
+    ParserElement.setDefaultWhitespaceChars(' \t')
+
+    _TIMES      = Literal('*')                        ('binary operator')
+    _ELTIMES    = Literal('.*')                       ('binary operator')
+    _MRDIVIDE   = Literal('/')                        ('binary operator')
+    _MLDIVIDE   = Literal('\\')                       ('binary operator')
+    _RDIVIDE    = Literal('./')                       ('binary operator')
+    _LDIVIDE    = Literal('.\\')                      ('binary operator')
+    _MPOWER     = Literal('^')                        ('binary operator')
+    _ELPOWER    = Literal('.^')                       ('binary operator')
+    _PLUS       = Literal('+')                        ('binary operator')
+    _MINUS      = Literal('-')                        ('binary operator')
+    _LT         = Literal('<')                        ('binary operator')
+    _LE         = Literal('<=')                       ('binary operator')
+    _GT         = Literal('>')                        ('binary operator')
+    _GE         = Literal('>=')                       ('binary operator')
+    _EQ         = Literal('==')                       ('binary operator')
+    _NE         = Literal('~=')                       ('binary operator')
+    _AND        = Literal('&')                        ('binary operator')
+    _OR         = Literal('|')                        ('binary operator')
+    _SHORT_AND  = Literal('&&')                       ('binary operator')
+    _SHORT_OR   = Literal('||')                       ('binary operator')
+
+    # Operators that have special-case handling.
+
+    _COLON      = Literal(':')
+    _NC_TRANSP  = Literal(".'")                       ('transpose')
+
+    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
+
+    # Keywords.  This list is based on what the command 'iskeyword' returns
+    # in MATLAB 2014b.  Note that 'end' as an operator is defined again below.
+
+    _BREAK      = MatlabToken(_tokens, KEYWORD, ['break'])
+    _CASE       = MatlabToken(_tokens, KEYWORD, ['case'])
+    _CATCH      = MatlabToken(_tokens, KEYWORD, ['catch'])
+    _CLASSDEF   = MatlabToken(_tokens, KEYWORD, ['classdef'])
+    _CONTINUE   = MatlabToken(_tokens, KEYWORD, ['continue'])
+    _ELSE       = MatlabToken(_tokens, KEYWORD, ['else'])
+    _ELSEIF     = MatlabToken(_tokens, KEYWORD, ['elseif'])
+    _END        = MatlabToken(_tokens, KEYWORD, ['end'])
+    _FOR        = MatlabToken(_tokens, KEYWORD, ['for'])
+    _FUNCTION   = MatlabToken(_tokens, KEYWORD, ['function'])
+    _GLOBAL     = MatlabToken(_tokens, KEYWORD, ['global'])
+    _IF         = MatlabToken(_tokens, KEYWORD, ['if'])
+    _OTHERWISE  = MatlabToken(_tokens, KEYWORD, ['otherwise'])
+    _PARFOR     = MatlabToken(_tokens, KEYWORD, ['parfor'])
+    _PERSISTENT = MatlabToken(_tokens, KEYWORD, ['persistent'])
+    _RETURN     = MatlabToken(_tokens, KEYWORD, ['return'])
+    _SPMD       = MatlabToken(_tokens, KEYWORD, ['spmd'])
+    _SWITCH     = MatlabToken(_tokens, KEYWORD, ['switch'])
+    _TRY        = MatlabToken(_tokens, KEYWORD, ['try'])
+    _WHILE      = MatlabToken(_tokens, KEYWORD, ['while'])
+
+    # Identifiers.
+    #
+    # _id defines identifiers that can be used in user programs.  They can't
+    # be the same as known MATLAB language keywords, but there is no need to
+    # test for that here: the lexer produces keyword tokens for those.  _id
+    # is wrapped in And() so that it keeps its 'identifier' label when other
+    # grammar expressions give it a different name.  _name defines a labeled
+    # version of _id that we use in most grammar expressions below to avoid
+    # writing "Group(_id)('name')".
+
+    _identifier = MatlabToken(_tokens, IDENTIFIER)
+    _id         = And([_identifier('identifier')])
+    _name       = Group(_id)('name')
+
+    # Grammar for expressions.
+    #
+    # Some up-front notes:
+    #
+    # 1) Calling PyParsing's setResultsName() function or its equivalent
+    # yields A COPY of the thing affected -- it does not return the original
+    # thing.  This means that if you have a grammar element of the form
+    #             _foo = Group(_bar('bar') | _biff('biff'))
+    # then _bar and _biff never actually get invoked when _foo is invoked;
+    # what get invoked are copies of _bar and _biff, because that's what gets
+    # stored in _foo.  This has implications for using parse actions and also
+    # debug tracing.  Parse actions are attached to statement-level objects at
+    # the end of the grammar, but beware that if parse actions are ever
+    # attached to _bar & _biff, they are not actually called when _foo is
+    # invoked because _foo uses copies of _bar and _biff.  This leads to
+    # subtle and frustrating rounds of bug-chasing.
+    #
+    # 2) The grammar below is sometimes designed with the assumption that the
+    # input is valid Matlab.  This fits our purpose, which is to parse valid
+    # Matlab, so we can afford to produce something simpler here and assume
+    # that the input won't do some things that the Matlab parser would
+    # reject.  The basic rule is: accept everything that's valid Matlab, but
+    # don't worry about deliberately excluding what isn't valid Matlab.
+    # .........................................................................
+
+    _expr          = Forward()
+    _expr_in_array = Forward()
+
+    # The possible statement separators/delimiters in Matlab are:
+    #   - EOL
+    #   - line comment (because they eat the EOL at the end)
+    #   - block comments
+    #   - semicolon
+    #   - comma
+    # We handle EOL implicitly in most cases by leaving PyParsing's default
+    # whitespace definition as-is, which marks EOL as an ignored whitespace
+    # character. However, sometimes Matlab syntax requires special care with
+    # EOL, so in those cases, EOL is handled explicitly.
+
+    _line_comment  = Group(MatlabComment(_tokens) + _EOL)
+    _block_comment = Group(MatlabComment(_tokens, block=True))
+    _comment       = _block_comment('comment') | _line_comment('comment')
+
+    _delimiter     = _COMMA | _SEMI
+    _noncontent    = _delimiter | _comment | _EOL
+
+    # Comma-separated arguments to matrix/array/cell arrays can have ':'
+    # in arguments, but arguments to function calls can't.  Parameter lists in
+    # some other situations (like function return values) can have '~', but
+    # the other elements can only be identifiers, not expressions.  The
+    # following are the different versions used in different places later on.
+    #
+    # For array parsing to work, the next bunch of grammar objects have to be
+    # constructed with different whitespace-handling rules: they must not eat
+    # line breaks, because we need to match EOL explicitly, or else we can't
+    # properly parse a matrix like the following as consisting of 2 rows:
+    #    a = [1 2
+    #         3 4]
+    # That's the reason for the next call to setDefaultWhitespaceChars().
+    # This is turned off again further below.
+    #
+    # Also, the definitions of the array contents grammars below explicitly
+    # include references to _WHITE, which normally would not be necessary and
+    # considered redundant, *except* that in order to deal with some other
+    # problems with array parsing, the definition of expressions used as
+    # array contents explicitly turn off the regular whitespace rules.  This
+    # is why whitespace appears in the next several terms.  So, if you find
+    # yourself looking at these and thinking that the business involving
+    # Optional(_WHITE) is useless and can be removed: no, they have to stay
+    # in order to work properly inside other definitions later.
+    #
+    # Important note about _one_sub: handling MATLAB whitespace behavior
+    # inside and outside of arrays is extremely challenging in this parsing
+    # framework.  Here are examples of cases to be dealt with.  Suppose that
+    # "a" is an array of one item:
+    #
+    #    a(1)        => one item, the value inside the array "a" at location 1
+    #    a (1)       => one item, the value inside the array "a" at location 1
+    #    [a (1)]     => an array of TWO items, the value of a and 1
+    #    [(a (1))]   => an array of ONE item, a(1)
+    #
+    # Notice how in the 3rd example, the handling of whitespace changes inside
+    # the array context, yet wrapping the same expression in parentheses once
+    # again reverts the behavior of whitespace handling to how it is outside
+    # the array context.  (Aside: WTF, MATLAB!?)  The solution implemented here
+    # is rooted in the definition of _one_sub below, which references two
+    # different expression grammar terms.  The first one, _expr_in_array,
+    # handles the third example above.  The definition of _expr_in_array is a
+    # variant of _expr that changes whitespace behavior such that whitespace
+    # is not ignored.  This lets us handle the case where "a (1)" is
+    # interpreted as two subscript items in the array context.  But, this
+    # then screws up interpretation of the fourth example above, in which we
+    # now want to revert handling of whitespace to what it is outside of an
+    # array context.  That's the reason for the introduction of the separate
+    # reference to _LPAR + _expr + _RPAR in the definition of _one_sub: it
+    # lets us use the normal _expr to handle whitespace inside parenthesized
+    # expressions as if they were outside the array context.
+
+    ParserElement.setDefaultWhitespaceChars(' \t')
+
+    _one_sub       = Group(_COLON('colon')) | _expr_in_array | _LPAR + _expr + _RPAR
+    _comma_subs    = Optional(_one_sub) \
+                     + ZeroOrMore(Optional(_WHITE) + _COMMA + Optional(_WHITE) + Optional(_one_sub))
+    _space_subs    = _one_sub + ZeroOrMore(OneOrMore(_WHITE) + _one_sub)
+
+    _call_args     = delimitedList(_expr)
+
+    _opt_arglist   = Optional(_call_args('argument list'))
+
+    _one_param     = Group(_TILDE) | Group(_id)
+    _paramlist     = delimitedList(_one_param)
+    _opt_paramlist = Optional(_paramlist('parameter list'))
+
+    # Bare matrices.  This is a cheat because it doesn't check that all the
+    # element contents have the same data type.  But again, since we expect our
+    # input to be valid Matlab, we don't expect to have to verify that property.
+
+    _row_sep       = Optional(_WHITE) + _SEMI + Optional(_WHITE) + Optional(_comment) \
+                     | Optional(_WHITE) + _comment | _EOL
+    _one_row       = _comma_subs('subscript list') ^ _space_subs('subscript list')
+    _rows          = Optional(_WHITE) + Optional(Group(_one_row.leaveWhitespace())) \
+                     + ZeroOrMore(_row_sep + Optional(Group(_one_row))) + Optional(_WHITE)
+    _bare_array    = Group(_LBRACKET + _rows('row list') + _RBRACKET)('array')
+
+    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
+
+    # Cell arrays.  You can write {} by itself, but a reference has to have at
+    # least one subscript: "somearray{}" is not valid.  Newlines don't
+    # seem to be allowed in args to references, but a bare ':' is allowed.
+    # Some tricky parts:
+    # - The following parses as a cell reference:        a{1}
+    # - The following parses as a function call:         a {1}
+    # - The following parses as an array of 3 elements:  [a {1} a]
+    # - Cell array references can be nested: a{2}{3}
+
+    _bare_cell     = Group(_LBRACE + Optional(_WHITE) + _rows('row list')
+                           + Optional(_WHITE) + _RBRACE)('cell array')
+    _cell_args     = Optional(_WHITE) + Group(_comma_subs)('subscript list') + Optional(_WHITE)
+    _cell_base     = Group(_name + _LBRACE + _cell_args + _RBRACE)('cell array')
+    _cell_nested   = Group(Group(_cell_base)('cell array')
+                           + _LBRACE + _cell_args + _RBRACE)('cell array')
+    _cell_access   = _cell_nested | _cell_base
+    _cell_array    = _cell_access | _bare_cell
+
+    # Named array references.  Note: this interacts with the definition of
+    # function calls later below.  (See _funcall_or_array.)
+
+    _array_args    = Group(_comma_subs)
+    _array_base    = Group(_cell_access | _name)('array base')
+    _array_access  = Group(_array_base
+                           + _LPAR + _array_args('subscript list') + _RPAR
+                          ).setResultsName('array')  # noqa
+
+    # Function handles.
+    #
+    # See http://mathworks.com/help/matlab/ref/function_handle.html
+    # In all function arguments, you can use a bare tilde to indicate a value
+    # that can be ignored.  This is not obvious from the functional
+    # documentation, but it seems to be the case when I try it.  (It's the
+    # case for function defs and function return values too.)
+
+    _named_handle  = Group('@' + _name)
+    _anon_handle   = Group('@' + _LPAR + _opt_paramlist + _RPAR
+                           + _expr('function definition'))  # noqa
+    _fun_handle    = (_named_handle | _anon_handle).setResultsName('function handle')
+
+    # Struct array references.  This is incomplete: in Matlab, the LHS can
+    # actually be a full expression that yields a struct.  Here, to avoid an
+    # infinitely recursive grammar, we only allow a specific set of objects
+    # and exclude a full expr.  (Doing the obvious thing, expr + "." + _id,
+    # results in an infinitely-recursive grammar.)  Also note _bare_array is
+    # deliberately not part of the following because [1].foo is not legal.
+    #
+    # Dynamic field access means that 'str' in
+    #    a.(str)
+    # needs to be interpreted as something to be evaluated, not a static
+    # identifier.  Thus, we can't return Identifier(name='str') alone, or
+    # the caller will not be able to distinguish that from a static access,
+    #    a.str
+    # The solution here is to detect the use of ".()" and explicitly label
+    # the type of field found (as either 'static field' or 'dynamic field').
+    #
+    # Note: BE VERY CAREFUL about the ordering of the terms in _struct_base.
+    # A change to the order can lead to infinite recursion on some inputs.
+    # The current order was determined by trial and error to work on our
+    # various test cases.  (And no, I'm not proud of the hackiness.)
+
+    _funcall_or_array   = Forward()
+    _struct_field       = _id('static field') | _LPAR + _expr('dynamic field') + _RPAR
+    _simple_struct_base = Group(_array_access | _id)
+    _simple_struct      = Group(_simple_struct_base('struct base')
+                                + Optional(_WHITE) + _DOT + Optional(_WHITE) 
+                                + _struct_field)('struct')
+    _struct_bases       = [_simple_struct + Optional(_WHITE) + FollowedBy(_DOT),
+                           _fun_handle, _funcall_or_array, _cell_access,
+                           _array_access, _id]
+    _struct_base        = Group(MatlabDispatch(_tokens, _struct_bases,
+                                               {'@': [_fun_handle]},
+                                               _struct_bases[:1] + _struct_bases[2:]))
+    _struct_access      = Group(_struct_base('struct base')
+                                + Optional(_WHITE) + _DOT + Optional(_WHITE)
+                                + _struct_field)('struct')
+
+    # "Function syntax" function calls.
+    #
+    # Unfortunately, the function call forms using parentheses look identical
+    # to matrix/array accesses, and in fact in MATLAB there's no way to tell
+    # them apart except by determining whether the first name is a function
+    # or command.  This means it's ultimately run-time dependent, and depends
+    # on the functions and scripts that the user has defined.
+    #
+    # We don't have access to the user's MATLAB environment, so we are left
+    # to resort to various heuristics to try to guess what we have.  For
+    # instance, if something comes through in "command syntax", we can assume
+    # it's a function call.  (Handled by _funcall_cmd_style below.)  Another
+    # one is that in arrays, you can use bare ':' in the argument list.  This
+    # means that if a ':' is found, it's an array reference for sure.  (This
+    # case is handled in the definition of _opt_arglist) Beyond that, we call
+    # all cases we can't resolve syntactically as "array or function", and
+    # then in post-processing, attempt to apply other heuristics to figure
+    # out which ones are in fact functions.
+    #
+    # There are complications.  You can put function names or arrays inside a
+    # cell array or struct, reference into that to get the function, and hand
+    # it arguments.  E.g.:
+    #    x = somearray{1}(x, 3)
+    # or even
+    #    somestruct(2).somefieldname = str2func('functionname')
+    #    somestruct(2).somefieldname(42)
+    #
+    # The following definition is incomplete w.r.t. what MATLAB allows, since
+    # MATLAB would probably let you use the full range of expressions as the
+    # base for the function.
+
+    _fun_access         = Group(_cell_access('cell array')) \
+                          ^ Group(_simple_struct) \
+                          ^ Group(_id)
+    _funcall_or_array <<= Group(_fun_access('name')
+                                + _LPAR + _opt_arglist + _RPAR
+                               ).setResultsName('array or function')  # noqa
+
+    # "Command syntax" function calls and array references.
+    #
+    # Matlab functions can be called with arguments either surrounded with
+    # parentheses or not.  This is called "command vs. function syntax".
+    # Here are examples of command syntax:
+    #    clear x y z
+    #    format long
+    #    print -dpng magicsquare.png
+    #    save /tmp/foo
+    #    save relative/path.m
+    # etc.  As the MATLAB docs say, the following are equivalent:
+    #    load durer.mat        % Command syntax
+    #    load('durer.mat')     % Function syntax
+    # Note the way that the first form treats the arguments as (unquoted)
+    # strings.  Also note that spaces are allowed in the second form but
+    # do not turn the result into command-style syntax.  I.e.,
+    #    load ('durer.mat')
+    # is not the same as
+    #    load '(\'durer.mat\')'
+    #
+    # The syntactic rules are explained in the following MATLAB document:
+    # http://mathworks.com/help/matlab/matlab_prog/command-vs-function-syntax.html
+    # The grammar below for command-style syntax is not fully compliant.  One
+    # known failure: it requires an argument.  We deal with command-syntax
+    # function calls *without* arguments separately in post-processing.
+
+    ParserElement.setDefaultWhitespaceChars(' \t')
+
+    _most_ops          = Group(_PLUS ^ _MINUS ^ _TIMES ^ _ELTIMES ^ _MRDIVIDE
+                               ^ _MLDIVIDE ^ _RDIVIDE ^ _LDIVIDE ^ _MPOWER
+                               ^ _ELPOWER ^ _LT ^ _LE ^ _GT ^ _GE ^ _EQ ^ _NE
+                               ^ _AND ^ _OR ^ _SHORT_AND ^ _SHORT_OR ^ _COLON
+                               ^ _NC_TRANSP)
+    _noncmd_arg_start  = _EQUALS | _LPAR | _most_ops + _WHITE | _delimiter | _comment
+    _dash_term         = Combine(Literal('-') + Word(alphas, alphanums + '_'))
+    _fun_cmd_arg       = _STRING | _dash_term | CharsNotIn(" ,;\t\n\r")
+    _fun_cmd_arglist   = _fun_cmd_arg + ZeroOrMore(NotAny(_noncontent)
+                                                   + Optional(_WHITE)
+                                                   + _fun_cmd_arg)
+    _funcall_cmd_style = Group(_name + NotAny(_EOL)
+                               + _WHITE + NotAny(_noncmd_arg_start)
+                               + _fun_cmd_arglist('arguments')
+                              )('command statement')
+
+    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
+
+    # Function calls without parentheses.
+    #
+    # A final bit of nastiness in MATLAB is the ability to invoke a function
+    # without using parenthese, such as this example:
+    #
+    #   if (rand > 0.50)
+    #       A=1;
+    #   end;
+    #
+    # Currently, we only recognize this case if the function involved is a
+    # known MATLAB function or a function defined somewhere in the file.
+    # This is done in post processing, but we tag the possible cases during
+    # the initial parse by looking for _ambiguous_id instead of a plain _id.
+    # This is why the following seemingly-pointless definition exists, and is
+    # used instead of using _id directly in _operand and other similar places
+    # later.
+
+    _ambiguous_id = Group(_identifier)('ambiguous id')
+
+    # And now, general expressions and operators outside of arrays.
+
+    _operand = Group(_funcall_or_array \
+                     | _struct_access  \
+                     | _array_access   \
+                     | _cell_array     \
+                     | _bare_array     \
+                     | _fun_handle     \
+                     | _ambiguous_id   \
+                     | _NUMBER         \
+                     | _STRING)
+
+    # Expressions are parsed by an operator-precedence parser (see
+    # expression.py), which calls back into the grammar for the operands.
+    # The operator precedence rules in MATLAB are listed here:
+    # http://www.mathworks.com/help/matlab/matlab_prog/operator-precedence.html
+
+    _expr        <<= MatlabExpression(_tokens, _operand, _to_node.visit)
+
+    # The 'end' keyword is special because of its many meanings.  One applies
+    # when indexing arrays.  This next definition is so we can detect that.
+
+    _end_op        = MatlabToken(_tokens, KEYWORD, ['end'])('end operator')
+
+    # MATLAB does something evil: the parsing behavior changes inside array
+    # expressions.  This can be seen by typing the following expressions into
+    # the MATLAB interpreter:
+    #
+    # 1 -1          result: 0
+    # [1 -1]        result: array of 2 elements, [1, -1]
+    # [1 - 1]       result: array of 1 element, [0]
+    # [1 -1 - 1]    result: array of 2 elements, [1, -2]
+    # 1 - 1         result: 0
+    # 1-1           result: 0
+    # [1- 1]        result: array of 1 element, [0]
+    # [1 2 -3 + 4]  result: array of 3 elements, [1, 2, 1]
+    # [1 2 -3 +4]   result: array of 4 elements, [1, 2, -3, 4]
+    #
+    # Another example was mentioned earlier in this file, involving the
+    # definition of _one_sub.  Suppose that "a" is an array of one item:
+    #
+    #    a(1)        => one item, the value inside the array "a" at location 1
+    #    a (1)       => one item, the value inside the array "a" at location 1
+    #    [a (1)]     => an array of TWO items, the value of a and 1
+    #    [(a (1))]   => an array of ONE item, a(1)
+    #
+    # The only solution I have found is to define the expression grammar
+    # differently for the case of array contents.  This is the reason for
+    # _expr_in_array, _funcall_or_array_in_array, and _operand_in_array
+    # below; these versions change the interpretation of whitespace to make
+    # it significant, to cause matching to prefer different interpretations
+    # when used inside arrays.  Along with this, the definitions of arrays
+    # and their subscripts earlier in this file also have explicit uses of
+    # _WHITE in them, which wouldn't be necessary except for the fact that
+    # _operand_in_array below uses leaveWhitespace() to cause whitespace to
+    # be significant.  The rules for the '+' and '-' operators illustrated
+    # above are implemented by the expression parser when it is told that
+    # it's working inside an array.
+    #
+    # Look, I know it's ugly.
+
+    _funcall_or_array_in_array = Group(_fun_access('name')
+                                       + _LPAR.copy().leaveWhitespace() + _opt_arglist + _RPAR
+                                      ).setResultsName('array or function')  # noqa
+
+    _operand_in_array = Group(_end_op
+                              | _TILDE
+                              | _funcall_or_array_in_array
+                              | _struct_access
+                              | _array_access
+                              | _cell_array
+                              | _bare_array
+                              | _fun_handle
+                              | _ambiguous_id
+                              | _NUMBER
+                              | _STRING
+                             ).leaveWhitespace()
+
+    _expr_in_array <<= MatlabExpression(_tokens, _operand_in_array,
+                                        _to_node.visit, array=True)
+
+    # Assignments.
+    #
+    # We tag the LHS with 'lhs' whether it's a single variable or an array,
+    # because we can distinguish the cases by examining the parsed object.
+
+    _lhs_var        = Group(_id)
+    _simple_assign  = Group(_lhs_var('lhs') + _EQUALS + _expr('rhs'))
+    _lhs_array      = Group(_struct_access | _array_access | _cell_access | _bare_array)
+    _other_assign   = Group(_lhs_array('lhs') + _EQUALS + _expr('rhs'))
+    _assignment     = (_other_assign | _simple_assign).setResultsName('assignment')
+
+    # Commands.
+    #
+    # Shell commands don't respect ellipses or delimiters, so we use EOL
+    # explicitly here and match _shell_cmd at the _matlab_syntax level.
+
+    _shell_cmd_cmd  = Group(restOfLine)('command')
+    _shell_cmd_line = Group('!' + _shell_cmd_cmd + _EOL)('shell command')
+    _shell_cmd      = Group(_shell_cmd_line)
+
+    # Control-flow statements.
+
+    _control_stmt   = Forward()
+    _stmt_list      = Forward()
+
+    _single_expr    = _expr('expression') + Optional(FollowedBy(_noncontent))
+    _test_expr      = _single_expr
+    _body           = Group(_stmt_list)                    ('body')
+    _break_stmt     = _BREAK                               ('break statement')
+    _return_stmt    = _RETURN                              ('return statement')
+    _continue_stmt  = _CONTINUE                            ('continue statement')
+
+    _while_stmt     = Group(_WHILE + _test_expr
+                            + _body
+                            + _END)                        ('while statement')
+
+    _loop_var       = Group(_id)                           ('loop variable')
+    _for_version1   = _FOR + _loop_var + _EQUALS + _test_expr \
+                      + _body \
+                      + _END
+    _for_version2   = _FOR + _LPAR + _loop_var + _EQUALS + _expr('expression') + _RPAR \
+                      + _body \
+                      + _END
+    _for_stmt       = Group(_for_version2 | _for_version1) ('for statement')
+
+    _catch_var      = Group(_id)                           ('catch variable')
+    ParserElement.setDefaultWhitespaceChars(' \t')
+    _catch_term     = _CATCH + Optional(NotAny(_noncontent) + _catch_var) + _noncontent
+    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
+    _catch_body     = Group(_stmt_list)                    ('catch body')
+    _try_stmt       = Group(_TRY
+                            + _body
+                            + Optional(_catch_term)
+                            + _catch_body
+                            + _END)                        ('try statement')
+
+    _else_stmt      = Group(_ELSE + _body)                 ('else statement')
+    _elseif_stmt    = Group(_ELSEIF + _test_expr + _body)
+    _if_stmt        = Group(_IF + _test_expr
+                            + _body
+                            + ZeroOrMore(_elseif_stmt)     ('elseif statements')
+                            + Optional(_else_stmt)
+                            + _END).setResultsName         ('if statement')
+
+    _case_stmt      = Group(_CASE + _test_expr + _body)
+    _switch_other   = Group(_OTHERWISE + _body)            ('otherwise statement')
+    _switch_stmt    = Group(_SWITCH + _test_expr
+                            + ZeroOrMore(_case_stmt)       ('case statements')
+                            + Optional(_switch_other)
+                            + _END)                        ('switch statement')
+
+    # Each kind of control statement starts with its own keyword (see
+    # MatlabDispatch in grammar_utils.py).
+
+    _control_kinds  = [('while',    _while_stmt),
+                       ('if',       _if_stmt),
+                       ('switch',   _switch_stmt),
+                       ('for',      _for_stmt),
+                       ('try',      _try_stmt),
+                       ('continue', _continue_stmt),
+                       ('break',    _break_stmt),
+                       ('return',   _return_stmt)]
+    _control_stmt  <<= Group(MatlabDispatch(_tokens,
+                                            [stmt for _, stmt in _control_kinds],
+                                            dict((keyword, [stmt]) for keyword, stmt
+                                                 in _control_kinds),
+                                            [], longest=False)
+                            ).setResultsName('control statement')  # noqa
+
+    # Global and persistent declarations.
+
+    _scope_type     = Group(_PERSISTENT | _GLOBAL)         ('type')
+    ParserElement.setDefaultWhitespaceChars(' \t')
+    _scope_var_list = Group(_id) + ZeroOrMore(_WHITE + Group(_id)).leaveWhitespace()
+    _scope_args     = _scope_var_list                      ('variables list')
+    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
+    _scope_stmt     = Group(_scope_type + _scope_args)     ('scope declaration')
+
+    # Standalone expressions.
+    #
+    # If an expression is written on a line outside of another construct,
+    # it needs to be separated from other expressions by commas or newlines.
+
+    ParserElement.setDefaultWhitespaceChars(' \t')
+    _standalone_expr = _expr('standalone expression') + FollowedBy(_noncontent)
+    ParserElement.setDefaultWhitespaceChars(' \t\n\r')
+
+    # Statements and statement lists.
+    #
+    # Statement lists are almost the full _matlab_syntax, except that
+    # they don't include function definitions.
+    #
+    # The alternatives are chosen by the token ahead (see MatlabDispatch in
+    # grammar_utils.py).  Control statements and scope declarations start
+    # with keywords, which the other kinds of statements can't start with.
+    # Comments and delimiters are the only things that can start with '%',
+    # ',' and ';', shell commands the only ones that start with '!', and
+    # everything else is a statement, but _noncontent can also match a line
+    # ending ahead of any of them.
+
+    _stmt_kinds     = [_control_stmt, _scope_stmt, _assignment,
+                       _funcall_cmd_style, _standalone_expr]
+    _stmt_choices   = dict.fromkeys([keyword for keyword, _ in _control_kinds],
+                                    [_control_stmt])
+    _stmt_choices.update({'global': [_scope_stmt], 'persistent': [_scope_stmt]})
+    _stmt           = Group(MatlabDispatch(_tokens, _stmt_kinds, _stmt_choices,
+                                           _stmt_kinds[2:], longest=False))
+
+    _noncontent_choices = {'%': [_noncontent], ',': [_noncontent],
+                           ';': [_noncontent], '!': [_shell_cmd]}
+    _stmt_list    <<= ZeroOrMore(MatlabDispatch(_tokens,
+                                                [_stmt, _shell_cmd, _noncontent],
+                                                _noncontent_choices, [_stmt],
+                                                [_noncontent]))
+
+    # Function definitions.
+    #
+    # When a function returns multiple values and the LHS is an array
+    # expression in square brackets, a bare tilde can be put in place of an
+    # argument value to indicate that the value is to be ignored.
+
+    _fun_body       = Forward()
+
+    _single_value   = Group(_id) | Group(_TILDE)
+    _comma_values   = delimitedList(_single_value)
+    _space_values   = OneOrMore(_single_value)
+    _multi_values   = _LBRACKET + Optional(_comma_values ^ _space_values) + _RBRACKET
+    _fun_outputs    = Group(_multi_values) | Group(_single_value)
+    _fun_paramslist = _LPAR + _opt_paramlist + _RPAR
+
+    # The 'end' in a function definition is optional in some cases and not in
+    # others.  The use of 'end' is required for nested function definitions,
+    # which means that we need two variants of function bodies too.  This
+    # leads to our final grammatical indiginity: two expressions for function
+    # definitions, which are used in the overall definition of _matlab_file
+    # such that _matlab_file tries first one variant and then the other.
+    # In the following two definitions, note that both the use of 'end' and
+    # the definition of the body are different.
+
+    _fun_without_end = Group(_FUNCTION
+                             + Optional(_fun_outputs('output list') + _EQUALS())
+                             + Optional(_WHITE) + _name
+                             + Optional(_fun_paramslist)
+                             + Group(_stmt_list)('body')
+                            ).setResultsName('function definition')
+
+    _fun_with_end   = Group(_FUNCTION
+                            + Optional(_fun_outputs('output list') + _EQUALS())
+                            + Optional(_WHITE) + _name
+                            + Optional(_fun_paramslist)
+                            + Group(_fun_body)('body')
+                            + _END
+                           ).setResultsName('function definition')
+
+    # The next two definitions are only used to make the grouping level the
+    # same as other statements in the overall grammar.
+
+    _fun_def_shallow = Group(_fun_without_end)
+    _fun_def_deep    = Group(_fun_with_end)
+
+    # And now, the function body for function definitions that permit nesting.
+    # (Bodies that don't allow function nesting simply use _stmt_list.)
+
+    _fun_body <<= ZeroOrMore(MatlabDispatch(_tokens,
+                                            [_fun_def_deep, _stmt, _shell_cmd, _noncontent],
+                                            dict(_noncontent_choices,
+                                                 function=[_fun_def_deep]),
+                                            [_stmt], [_noncontent]))
+
+    # The complete MATLAB file syntax.
+    #
+    # Since a file cannot mix the style of function definitions that use ends
+    # (either they all have to have 'end', or none do), we have two forms of
+    # MATLAB files.  (parse_chunks() doesn't use _matlab_file directly; see
+    # there for the reason.)
+
+    _file_item_shallow = MatlabDispatch(_tokens,
+                                        [_fun_def_shallow, _stmt, _shell_cmd, _noncontent],
+                                        dict(_noncontent_choices,
+                                             function=[_fun_def_shallow]),
+                                        [_stmt], [_noncontent])
+    _file_item_deep    = MatlabDispatch(_tokens,
+                                        [_fun_def_deep, _stmt, _shell_cmd, _noncontent],
+                                        dict(_noncontent_choices,
+                                             function=[_fun_def_deep]),
+                                        [_stmt], [_noncontent])
+
+    _matlab_file = ZeroOrMore(_file_item_shallow) ^ ZeroOrMore(_file_item_deep)
+
+    # Parse actions.
+    #
+    # Statements, function definitions, shell commands and comments are
+    # converted into MatlabNode objects by parse actions.  So the result of
+    # parsing a file is a list of MatlabNode objects, and the ParseResults
+    # structures for its parts are dropped as the parse goes along instead
+    # of being kept until the end and then walked over.  The actions are
+    # called even when PyParsing is only trying out an alternative
+    # (callDuringTry), so that the packrat cache keeps the MatlabNode
+    # objects and doesn't have to convert anything more than once.  The
+    # Group objects around statements get an action that takes the node out
+    # of the Group.
+
+    for _element, _visitor in [(_comment,           _to_node.visit_comment),
+                               (_assignment,        _to_node.visit_assignment),
+                               (_break_stmt,        _to_node.visit_break_statement),
+                               (_continue_stmt,     _to_node.visit_continue_statement),
+                               (_return_stmt,       _to_node.visit_return_statement),
+                               (_while_stmt,        _to_node.visit_while_statement),
+                               (_for_stmt,          _to_node.visit_for_statement),
+                               (_try_stmt,          _to_node.visit_try_statement),
+                               (_if_stmt,           _to_node.visit_if_statement),
+                               (_switch_stmt,       _to_node.visit_switch_statement),
+                               (_control_stmt,      _to_node.visit_control_statement),
+                               (_scope_stmt,        _to_node.visit_scope_declaration),
+                               (_funcall_cmd_style, _to_node.visit_command_statement),
+                               (_shell_cmd_line,    _to_node.visit_shell_command),
+                               (_fun_without_end,   _to_node.visit_function_definition),
+                               (_fun_with_end,      _to_node.visit_function_definition)]:
+        _element.setParseAction(_node_action(_visitor), callDuringTry=True)
+    for _element in [_stmt, _shell_cmd, _fun_def_shallow, _fun_def_deep]:
+        _element.setParseAction(_ungroup_action, callDuringTry=True)
+    del _element, _visitor
+
+
+    # Debugging.
+    # .........................................................................
+
+    # Name each grammar object after itself, so that when PyParsing prints
+    # debugging output, it uses the name rather than a generic regexp term.
+
+    _to_name = [ _AND, _COLON, _COMMA, _DOT, _ELLIPSIS, _ELPOWER,
+                 _ELTIMES, _END, _EOL, _EQ, _EQUALS,
+                 _FUNCTION, _GE, _GT, _LBRACE, _LBRACKET, _LDIVIDE,
+                 _LE, _LPAR, _LT, _MINUS, _MLDIVIDE, _MPOWER, _MRDIVIDE,
+                 _NC_TRANSP, _NE, _NUMBER, _OR, _PLUS, _RBRACE, _RBRACKET,
+                 _RDIVIDE, _RPAR, _SEMI, _SHORT_AND, _SHORT_OR, _SOL,
+                 _STRING, _TILDE, _TIMES, _WHITE,
+                 _ambiguous_id, _anon_handle, _array_access, _array_args,
+                 _array_base, _assignment, _bare_array, _bare_cell,
+                 _block_comment, _body,
+                 _break_stmt, _call_args, _case_stmt, _catch_body,
+                 _catch_term, _catch_var, _cell_access, _cell_args,
+                 _cell_array, _cell_base, _cell_nested,
+                 _comma_subs, _comma_values, _comment, _continue_stmt,
+                 _control_stmt, _control_stmt, _dash_term, _delimiter,
+                 _else_stmt, _elseif_stmt, _end_op, _expr, _expr_in_array,
+                 _expr_in_array, _for_stmt, _for_version1, _for_version2,
+                 _fun_access, _fun_body, _fun_cmd_arg, _fun_cmd_arglist,
+                 _fun_def_deep, _fun_def_shallow, _fun_handle, _fun_outputs,
+                 _fun_paramslist, _fun_with_end, _fun_without_end,
+                 _funcall_cmd_style, _funcall_or_array, _id , _identifier,
+                 _if_stmt, _lhs_array, _lhs_var,
+                 _file_item_deep, _file_item_shallow,
+                 _line_comment, _loop_var, _matlab_file,
+                 _most_ops, _multi_values, _name, _named_handle,
+                 _noncmd_arg_start, _noncontent, _one_param,
+                 _one_row, _one_sub, _operand, _operand_in_array,
+                 _opt_arglist, _opt_paramlist, _other_assign, _paramlist,
+                 _return_stmt, _row_sep, _rows, _scope_args, _scope_stmt,
+                 _scope_type, _scope_var_list, _shell_cmd, _shell_cmd_cmd,
+                 _simple_assign, _simple_struct, _simple_struct_base,
+                 _single_expr, _single_value, _space_subs, _space_values,
+                 _standalone_expr, _stmt, _stmt_list, _stmt_list,
+                 _struct_access, _struct_base, _struct_field, _switch_other,
+                 _switch_stmt, _test_expr, _try_stmt, _while_stmt]
+
+    # The next variable is for printing low-level PyParsing matches (see
+    # MatlabGrammar._print_debug()).  You can reduce the amount of output by
+    # changing the value (which is _to_name by default) to a list of
+    # specific objects.  E.g.:
+    #    _to_print_debug = [_cell_access, _cell_array, _bare_cell, _expr]
+
+    _to_print_debug = _to_name # [_fun_body, _fun_def_deep, _fun_def_shallow, _stmt, _matlab_file]
+
+
+    # Packrat caching and statement recording.
+    # .........................................................................
+
+    # The grammar elements above are shared by all MatlabGrammar objects,
+    # and so is their packrat cache (see PackratCache in grammar_utils.py).
+    # Each parse sets the cache size to that of the MatlabGrammar object
+    # doing the parsing.
+    #
+    # Simple statements are parsed by a StatementFastPath (see fastpath.py)
+    # without going through the grammar at all.  Likewise, statements are
+    # matched through a StatementRecorder (see incremental.py) on behalf of
+    # MatlabGrammar.reparse().  Each of these has to be installed after the
+    # previous one, so that the fast path bypasses the packrat cache, and
+    # recorded results bypass both.  They're installed below, once the
+    # class exists.
+
+    _packrat   = PackratCache()
+    _fast_path = StatementFastPath()
+    _recorder  = StatementRecorder()
+
+
+def _object_name(obj):
+    # Returns the name of a given grammar object.
+    for name, thing in vars(GrammarRules).items():
+        if thing is obj:
+            return name
+
+
+for _obj in GrammarRules._to_name:
+    _obj.setName(_object_name(_obj))
+del _obj
+
+# PyParsing streamlines the elements of a grammar before parsing with them.
+# parse_chunks() doesn't go through parseString(), so that is done here,
+# once, rather than at the start of every parse, where threads would
+# rearrange the elements under each other's feet.
+
+GrammarRules._file_item_shallow.streamline()
+GrammarRules._file_item_deep.streamline()
+
+GrammarRules._packrat.install([GrammarRules._matlab_file,
+                               GrammarRules._file_item_shallow,
+                               GrammarRules._file_item_deep])
+GrammarRules._fast_path.install(GrammarRules._stmt)
+GrammarRules._recorder.install(GrammarRules._stmt)
+
+# The packrat cache, the fast path, the statement recorder and the token
+# table keep their state per thread, so any number of threads can parse at
+# the same time.  Profiling (see profiler.py) wraps the shared elements,
+# though, so only one profiled parse runs at a time.
+
+_profile_lock = threading.Lock()
+
+
+
+# The 'pyparsing' engine.
+# .............................................................................
+
+def parse_chunks(input, cache_size=None, previous_statements=None,
+                 profile=None, record=False):
+    """Parses `input` with the grammar and returns a tuple (nodes, stats,
+    statements): the list of MatlabNode objects for the top-level items of
+    the input, the PackratStats of the packrat cache (which also counts
+    the statements that took the fast path; see fastpath.py), and the
+    StatementTable of the statements parsed if `record` is True, or None.
+    `cache_size` is the maximum size of the packrat cache (None for no
+    limit), and `previous_statements` is a StatementTable from an earlier
+    version of the input whose results may be reused (see incremental.py).
+    If `profile` is a RuleProfile, the matches of the grammar's rules are
+    counted in it (see profiler.py).  Raises ParseException if the input
+    can't be parsed.
+    """
+    # This does the same as _matlab_file.parseString(input, parseAll=True),
+    # but the packrat cache is cleared each time the parse moves on to a
+    # new top-level chunk of the input (see prescan.py), so that the
+    # cache doesn't grow with the size of the file.  The cache is emptied
+    # again at the end, and its statistics are handed back with the results.
+    #
+    # _matlab_file is a choice between two styles of files, and the
+    # longest match wins.  The second style is skipped when there can't be
+    # any function definitions, since the two are the same otherwise.  If
+    # function_style() can tell the style, that one is tried on its own
+    # first, and if it gets to the end, the other can't do better.
+    # Otherwise, both are tried (see _parse_styles()).  The grammar's parse
+    # actions are called even during lookahead (see the end of the
+    # grammar), so we don't ask PyParsing to run parse actions; that would
+    # make it parse everything twice in the "^" choices.
+    rules = GrammarRules
+    text = input.expandtabs()
+    starts = chunk_starts(text)
+    items = [rules._file_item_shallow]
+    attempts = [items]
+    if has_functions(text):
+        items.append(rules._file_item_deep)
+        deep = function_style(text)
+        if deep is not None:
+            attempts = [[items[deep]], items]
+    rules._packrat.start(cache_size)
+    statements = None
+    if record:
+        statements = StatementTable(text, previous_statements)
+    rules._recorder.table = statements
+    rules._fast_path.start(text)
+    profiler = None
+    if profile is not None:
+        _profile_lock.acquire()
+        profiler = RuleProfiler(profile, rules._packrat)
+        profiler.install(rules._to_name)
+    try:
+        for styles in attempts:
+            results, end = _parse_styles(text, starts, styles)
+            if end >= len(text):
+                break
+    finally:
+        if profiler is not None:
+            profiler.uninstall()
+            _profile_lock.release()
+        rules._recorder.table = None
+        rules._fast_path.stop()
+        rules._packrat.clear()
+    stats = rules._packrat.stats
+    stats.statements, stats.fast_statements = rules._fast_path.counts()
+    if end < len(text):
+        raise ParseException(text, end, 'Expected end of text')
+    return results, stats, statements
+
+
+def _parse_styles(text, starts, items):
+    # Parses `text` with each of the grammar elements in `items` (the
+    # styles of files) repeatedly, in step with each other, one top-level
+    # item at a time, so that they share the packrat cache.  Returns a
+    # tuple (nodes, end) for the style that got the furthest (the first of
+    # them in case of a tie), where `end` is where the parse stopped,
+    # after any trailing whitespace.
+    rules = GrammarRules
+    results = [[] for item in items]
+    ends = [0 for item in items]
+    active = list(range(len(items)))
+    chunk = 1
+    rules._packrat.clear()
+    while active:
+        style = min(active, key=lambda i: ends[i])
+        if chunk < len(starts) and ends[style] >= starts[chunk]:
+            rules._packrat.clear()
+            while chunk < len(starts) and ends[style] >= starts[chunk]:
+                chunk += 1
+        try:
+            ends[style], found = items[style]._parse(text, ends[style],
+                                                     doActions=False)
+            results[style].extend(found)
+        except (ParseException, IndexError):
+            active.remove(style)
+    best = ends.index(max(ends))
+    return results[best], rules._matlab_file.preParse(text, ends[best])
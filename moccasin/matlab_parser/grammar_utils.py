@@ -20,40 +20,450 @@
 # available online at https://github.com/sbmlteam/moccasin/.
 # ------------------------------------------------------------------------- -->
 
+import collections
 import functools
 import inspect
 import sys
+import threading
 import six
-from pyparsing import ParseResults
+from pyparsing import ParseBaseException, ParseException, ParseExpression, \
+    Token
+try:
+    from lexer import STRING, KEYWORD, OPERATOR, COMMENT
+    from expression import ExpressionParser
+except:
+    from .lexer import STRING, KEYWORD, OPERATOR, COMMENT
+    from .expression import ExpressionParser
 
 #
 # Parsing helpers.
 # .............................................................................
 
-# makeLRlike -- function used in the definition of our grammar in grammar.py
+# MatlabToken -- matching lexer tokens from the grammar.
+#
+# MatlabGrammar does not match numbers, strings, identifiers, keywords,
+# comments and transpose operators character by character.  Instead, the
+# input is run through MatlabLexer once, and the grammar's terminals for
+# those things are MatlabToken objects that look up the token starting at
+# the current parse location in a TokenTable (see lexer.py).  The lookup
+# table is rebuilt automatically whenever PyParsing hands a MatlabToken a
+# different input string, so the grammar elements can still be used
+# directly on arbitrary strings (e.g.,
+# GrammarRules._expr.parseString('a + b')).
 
-def makeLRlike(numterms):
-    """Parse action that will take flat lists of tokens and nest them
-    as if parsed left-recursively.  Originally written by Paul McGuire as
-    a StackOverflow answer here: http://stackoverflow.com/a/4589920/743730
-    """
-    initlen = {0: 1, 1: 2, 2: 3, 3: 5}[numterms]
-    incr = {0: 1, 1: 1, 2: 2, 3: 4}[numterms]
+class MatlabToken(Token):
+    """PyParsing terminal that matches one token of a given kind, and
+    optionally, one of a set of given values."""
+
+    # PyParsing's QuotedString (which used to define strings in our grammar)
+    # converts escaped whitespace characters inside strings.  We keep doing
+    # the same so that the parse results stay the same.
+
+    _ws_escapes = [(r'\t', '\t'), (r'\n', '\n'), (r'\f', '\f'), (r'\r', '\r')]
+
+    def __init__(self, table, kind, values=None):
+        super(MatlabToken, self).__init__()
+        self.table = table
+        self.kind = kind
+        self.values = frozenset(values) if values else None
+        if values:
+            self.name = ' | '.join('"{}"'.format(v) for v in values)
+        else:
+            self.name = kind
+        self.errmsg = 'Expected ' + self.name
+        self.mayReturnEmpty = False
+        self.mayIndexError = False
+
+
+    def parseImpl(self, instring, loc, doActions=True):
+        token = self.table.token_at(instring, loc, self.kind)
+        if token is None or (self.values and token.value not in self.values):
+            raise ParseException(instring, loc, self.errmsg, self)
+        value = token.value
+        if self.kind == STRING and '\\' in value:
+            for escape, char in self._ws_escapes:
+                value = value.replace(escape, char)
+        return token.end, value
+
+
+class MatlabComment(MatlabToken):
+    """PyParsing terminal for either block comments or line comments."""
+
+    def __init__(self, table, block=False):
+        super(MatlabComment, self).__init__(table, COMMENT)
+        self.block = block
+        self.name = 'block comment' if block else 'line comment'
+        self.errmsg = 'Expected ' + self.name
+
+
+    def parseImpl(self, instring, loc, doActions=True):
+        token = self.table.token_at(instring, loc, COMMENT)
+        if token is None or self.block != self._is_block(instring, token):
+            raise ParseException(instring, loc, self.errmsg, self)
+        if self.block:
+            # PyParsing's SkipTo, which we used to use for block comments,
+            # skipped the whitespace that follows the opening '%{'.
+            return token.end, token.value.lstrip(' \t\n\r')
+        return token.end, token.value
+
+
+    def _is_block(self, instring, token):
+        # An unterminated '%{' is lexed as a line comment.
+        return (instring.startswith('%{', token.start)
+                and instring.endswith('%}', token.start + 2, token.end))
+
+
+# MatlabExpression -- matching complete expressions from the grammar.
+#
+# Expressions are not defined in terms of PyParsing elements.  Instead, the
+# grammar uses a MatlabExpression element, which runs ExpressionParser (see
+# expression.py) at the current parse location.  The operands are still
+# matched by the grammar: ExpressionParser calls back into the grammar
+# element given as `operand` and converts the ParseResults it produces into
+# MatlabNode objects using the function given as `convert`.  The result of
+# a MatlabExpression is therefore a single MatlabNode object rather than a
+# ParseResults structure.
+
+class MatlabExpression(Token):
+    """PyParsing element that matches a complete MATLAB expression."""
+
+    def __init__(self, table, operand, convert, array=False):
+        super(MatlabExpression, self).__init__()
+        self.table = table
+        self.operand = operand
+        self.convert = convert
+        self.array = array
+        self.name = 'expression'
+        self.errmsg = 'Expected ' + self.name
+        self.mayReturnEmpty = False
+        self.mayIndexError = False
+
+
+    def parseImpl(self, instring, loc, doActions=True):
+        parser = _GrammarExpressionParser(self, instring, doActions)
+        result = parser._expression(loc, self.array)
+        if result is None:
+            raise ParseException(instring, loc, self.errmsg, self)
+        return result[1], [result[0]]
+
+
+class _GrammarExpressionParser(ExpressionParser):
+    # ExpressionParser whose operands come from a MatlabExpression's grammar.
+
+    def __init__(self, element, text, doActions):
+        self._element = element
+        self._text = text
+        self._len = len(text)
+        self._doActions = doActions
+
+
+    def _operand(self, pos, array):
+        try:
+            end, tokens = self._element.operand._parse(self._text, pos,
+                                                       self._doActions)
+        except ParseException:
+            return None
+        return self._element.convert(tokens[0]), end
+
+
+    def _expr(self, pos, array):
+        # Going through the element lets the packrat cache remember
+        # parenthesized subexpressions.
+        try:
+            end, tokens = self._element._parse(self._text, pos, self._doActions)
+        except ParseException:
+            return None
+        return tokens[0], end
+
+
+    def _transpose(self, pos):
+        token = self._element.table.token_at(self._text, pos, OPERATOR)
+        if token is not None and token.value in ("'", ".'"):
+            return token.value, token.end
+        return None
+
+
+# MatlabDispatch -- choosing alternatives by the token ahead.
+#
+# PyParsing's Or ("^") tries every alternative and keeps the longest match,
+# and MatchFirst ("|") tries the alternatives in order until one matches.
+# In most places in our grammar, only one of the alternatives can possibly
+# match, and which one is plain from the first token: a statement starting
+# with 'if' is an if statement, one starting with '%' is a comment, and so
+# on.  A MatlabDispatch looks at that token (the "lead") and only tries the
+# alternatives listed for it.  The lead is the keyword at the parse location
+# if there is one, and the first character otherwise, after skipping any
+# whitespace.  `choices` maps leads to lists of alternatives, and `others`
+# is the list for leads not in `choices`.  If several alternatives are left,
+# they are tried as Or does when `longest` is True, and as MatchFirst does
+# otherwise.  At the end of the input, all the alternatives are tried, and
+# past it, only those that can match nothing.
+#
+# The alternatives do their own skipping of whitespace, and some of them
+# match line endings (which PyParsing normally treats as whitespace), so
+# the lead may not be where they start.  The alternatives in `line_end`
+# are also tried whenever a line ending comes before the lead.
+#
+# It's up to the grammar to list every alternative that can match for a
+# given lead; the results are then exactly the same as with Or or
+# MatchFirst.  Leaving an alternative out where it's truly ambiguous
+# changes what the grammar accepts, so when in doubt, list it.
+
+class MatlabDispatch(ParseExpression):
+    """PyParsing element that chooses among alternatives by the first token
+    or character at the parse location."""
+
+    def __init__(self, table, exprs, choices, others, line_end=(),
+                 longest=True):
+        super(MatlabDispatch, self).__init__(exprs)
+        self.table = table
+        self.choices = choices
+        self.others = others
+        self.line_end = line_end
+        self.longest = longest
+        self.mayReturnEmpty = any(e.mayReturnEmpty for e in self.exprs)
+        # PyParsing's copy() and leaveWhitespace() replace the alternatives
+        # with copies, in the same order, so they are kept by position.
+        self._choices = dict((lead, self._positions(wanted))
+                             for lead, wanted in choices.items())
+        self._others = self._positions(others)
+        self._line_end = self._positions(line_end)
+        self._candidates = {}
 
-    # Create a closure.  This defines a parse action for this number of
-    # terms, to convert flat list of tokens into nested list.
-    def pa(s, l, t):
-        t = t[0]
-        if len(t) > initlen:
-            ret = ParseResults(t[:initlen])
-            i = initlen
-            while i < len(t):
-                ret = ParseResults([ret] + t[i:i + incr])
-                i += incr
-            return ParseResults([ret])
 
-    # Return the closure.
-    return pa
+    def copy(self):
+        result = super(MatlabDispatch, self).copy()
+        result._candidates = {}
+        return result
+
+
+    def leaveWhitespace(self):
+        super(MatlabDispatch, self).leaveWhitespace()
+        self._candidates = {}
+        return self
+
+
+    def parseImpl(self, instring, loc, doActions=True):
+        candidates = self._lookup(instring, loc)
+        if len(candidates) == 1:
+            return candidates[0]._parse(instring, loc, doActions)
+        # The rest is the same as in Or.parseImpl() and MatchFirst.parseImpl().
+        maxExcLoc = -1
+        maxException = None
+        maxMatchLoc = -1
+        maxMatchExp = None
+        for e in candidates:
+            try:
+                if not self.longest:
+                    return e._parse(instring, loc, doActions)
+                loc2 = e.tryParse(instring, loc)
+            except ParseException as err:
+                err.__traceback__ = None
+                if err.loc > maxExcLoc:
+                    maxException = err
+                    maxExcLoc = err.loc
+            except IndexError:
+                if len(instring) > maxExcLoc:
+                    maxException = ParseException(instring, len(instring),
+                                                  e.errmsg, self)
+                    maxExcLoc = len(instring)
+            else:
+                if loc2 > maxMatchLoc:
+                    maxMatchLoc = loc2
+                    maxMatchExp = e
+        if maxMatchExp is not None:
+            return maxMatchExp._parse(instring, loc, doActions)
+        if maxException is not None:
+            raise maxException
+        raise ParseException(instring, loc, self.errmsg, self)
+
+
+    def _lookup(self, instring, loc):
+        # Returns the alternatives to try at `loc`, in their original order.
+        length = len(instring)
+        start = loc
+        while loc < length and instring[loc] in ' \t\n\r':
+            loc += 1
+        if loc > length:
+            # PyParsing's LineEnd moves past the end of the input when it
+            # matches there.  Nothing but an empty match can follow.
+            return [e for e in self.exprs if e.mayReturnEmpty]
+        elif loc == length:
+            return self.exprs
+        token = self.table.token_at(instring, loc, KEYWORD)
+        lead = token.value if token is not None else instring[loc]
+        if lead not in self._choices:
+            lead = None
+        line_end = ('\n' in instring[start:loc] or '\r' in instring[start:loc])
+        key = (lead, line_end)
+        candidates = self._candidates.get(key)
+        if candidates is None:
+            wanted = self._choices[lead] if lead is not None else self._others
+            if line_end:
+                wanted = wanted | self._line_end
+            candidates = [e for i, e in enumerate(self.exprs) if i in wanted]
+            self._candidates[key] = candidates
+        return candidates
+
+
+    def _positions(self, wanted):
+        # The positions in self.exprs of the elements in `wanted`.
+        return frozenset(i for i, e in enumerate(self.exprs)
+                         if any(e is w for w in wanted))
+
+
+    def __str__(self):
+        if hasattr(self, 'name'):
+            return self.name
+        if self.strRepr is None:
+            separator = ' ^ ' if self.longest else ' | '
+            self.strRepr = '{' + separator.join(str(e) for e in self.exprs) + '}'
+        return self.strRepr
+
+
+    def checkRecursion(self, parseElementList):
+        subRecCheckList = parseElementList[:] + [self]
+        for e in self.exprs:
+            e.checkRecursion(subRecCheckList)
+
+
+# PackratCache -- memoizing the results of grammar elements.
+#
+# The grammar can't do without packrat parsing, but PyParsing's own version
+# (ParserElement.enablePackrat()) is switched on for every PyParsing grammar
+# in the process, including ones that have nothing to do with us (e.g., the
+# one in evaluate_formula.py), and its cache has no size limit and can't be
+# observed.  PackratCache does the same job for the elements of one grammar
+# only: install() replaces the _parse() method of every element reachable
+# from the given ones with a function that looks up the result in the cache
+# before calling the element's uncached _parseNoCache().  What is cached,
+# and how, is the same as in PyParsing's _parseCache(), so the results are
+# the same too.
+#
+# A size of None means no limit; a size of 0 turns caching off.  When the
+# cache is full, the oldest entries are evicted first.  The statistics of
+# the current parse are kept in a PackratStats object, which start() starts
+# afresh.
+#
+# The cache is shared by all the threads that parse with the grammar, but
+# its entries, size and statistics are kept per thread (it is a
+# threading.local), so each parse has a cache of its own.
+#
+# Note that install() must be called after the grammar is complete:
+# PyParsing copies elements when, e.g., setResultsName() is used, and the
+# copies would share the original element's cached _parse().
+
+class PackratStats(object):
+    """Counts of what happened in a PackratCache during one parse.  The
+    number of statements parsed, and how many of them took the fast path
+    (see fastpath.py), are filled in at the end of the parse."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.peak_entries = 0
+        self.statements = 0
+        self.fast_statements = 0
+
+
+    @property
+    def fast_fraction(self):
+        """The fraction of the statements that took the fast path."""
+        if not self.statements:
+            return 0.0
+        return float(self.fast_statements) / self.statements
+
+
+    def __repr__(self):
+        return ('<PackratStats: {} hits, {} misses, {} evictions, {} peak entries,'
+                ' {} of {} statements fast>'
+                .format(self.hits, self.misses, self.evictions,
+                        self.peak_entries, self.fast_statements,
+                        self.statements))
+
+
+class PackratCache(threading.local):
+    """Packrat cache for the PyParsing elements of one grammar."""
+
+    def __init__(self, size=None):
+        self.stats = PackratStats()
+        self._entries = {}
+        self.start(size)
+
+
+    def install(self, elements):
+        """Makes every element reachable from `elements` use this cache."""
+        seen = set()
+        todo = list(elements)
+        while todo:
+            element = todo.pop()
+            if element is None or id(element) in seen:
+                continue
+            seen.add(id(element))
+            self._memoize(element)
+            todo.append(getattr(element, 'expr', None))
+            todo.extend(getattr(element, 'exprs', []))
+            todo.append(getattr(element, 'operand', None))
+
+
+    def start(self, size=None):
+        """Empties the cache, sets its size, and resets the statistics."""
+        self.size = size
+        if size:
+            self._entries = collections.OrderedDict()
+        else:
+            self._entries = {}
+        self.stats = PackratStats()
+
+
+    def clear(self):
+        """Empties the cache without resetting the statistics."""
+        # The cache only ever grows between clearings (when it's full, each
+        # new entry replaces an old one), so this is where it peaks.
+        if len(self._entries) > self.stats.peak_entries:
+            self.stats.peak_entries = len(self._entries)
+        self._entries.clear()
+
+
+    def _memoize(self, element):
+        # This is called a great many times, hence the local variables.
+        parse = element._parseNoCache
+        def _parse(instring, loc, *args, **kwargs):
+            options = parse_options(args, kwargs)
+            key = (element, instring, loc, options)
+            entries = self._entries
+            value = entries.get(key)
+            if value is not None:
+                self.stats.hits += 1
+                if isinstance(value, Exception):
+                    raise value
+                return value[0], value[1].copy()
+            self.stats.misses += 1
+            try:
+                value = parse(instring, loc, *options)
+            except ParseBaseException as err:
+                err.__traceback__ = None
+                if self.size is None:
+                    entries[key] = err
+                else:
+                    self._store(key, err)
+                raise
+            if self.size is None:
+                entries[key] = (value[0], value[1].copy())
+            else:
+                self._store(key, (value[0], value[1].copy()))
+            return value
+        element._parse = _parse
+
+
+    def _store(self, key, value):
+        if self.size == 0:
+            return
+        if len(self._entries) >= self.size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+        self._entries[key] = value
 
 
 # From http://pyparsing.wikispaces.com/share/view/41237655
@@ -131,3 +541,18 @@ def num_keys(d):
 
 def empty_dict(d):
     return not (d.keys() and len(list(d.keys())) > 0)
+
+
+def parse_options(args, kwargs):
+    # Returns (doActions, callPreParse) from the arguments after `instring`
+    # and `loc` given to ParserElement._parse().  PyParsing 3 calls the
+    # first one do_actions, so wrappers of _parse() take *args and **kwargs
+    # and pass the two on by position.
+    if len(args) == 2:
+        return args
+    options = list(args) + [None, None][len(args):]
+    if options[0] is None:
+        options[0] = kwargs.get('do_actions', kwargs.get('doActions', True))
+    if options[1] is None:
+        options[1] = kwargs.get('callPreParse', True)
+    return tuple(options)
@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+#
+# @file    incremental.py
+# @brief   Re-using statement parse results after edits to MATLAB input
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of incremental parsing
+# ---------------------------------------
+#
+# When the PyParsing grammar parses some input with incremental=True (or
+# for reparse()), a StatementTable records the result of every statement
+# (_stmt in the grammar) it matches, indexed by the position where the
+# statement starts.  The table is kept in the MatlabContext returned for
+# the input.  MatlabGrammar.reparse() hands that
+# table to the parse of an edited version of the input.  Whenever the
+# grammar tries to match a statement at a position where the table has an
+# unaffected result, the result is returned without parsing anything.
+# Statements are also the bodies of functions, loops and conditionals, so
+# most of the work of parsing an edited file is skipped, no matter where the
+# edit is.
+#
+# Which results are unaffected is decided by comparing the old and the new
+# text: they have a common prefix and a common suffix, and the edit lies
+# between the two.  The result of a statement depends on its own text and on
+# what the parser looked at after it, which is never beyond the line with
+# the next non-whitespace character (e.g., to see whether the statement
+# continues with an operator on the next line), or the end of the text if
+# that comes first.  It does not depend on what comes before, provided that
+# the statement starts after whitespace or a delimiter (otherwise the lexer
+# might read a leading quote differently).
+# A result is reused if all of that text, plus the character in front of
+# the statement, lies in the common prefix or in the common suffix.
+#
+# The results are pickled as soon as they are produced, because the later
+# passes of MatlabGrammar modify the MatlabNode objects in them.  That
+# costs time, which is why statements are only recorded when asked for.
+# A statement nested too deeply for pickle (e.g., a sum of thousands of
+# terms) is not recorded, and is parsed again by reparse().
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+import re
+import threading
+from pyparsing import ParseException, ParseResults
+try:
+    from grammar_utils import parse_options
+except:
+    from .grammar_utils import parse_options
+
+
+# Text after the end of a statement that the parser may have looked at.
+
+_lookahead = re.compile(r'[ \t\r\n]*[^\n]*\n?')
+
+# Characters that may come in front of a statement whose result is recorded.
+
+_separators = frozenset(' \t\r\n;,')
+
+
+class StatementTable(object):
+    """Parse results of the statements in `text`, by position.  If
+    `previous` is the StatementTable for an earlier version of the text, its
+    results are reused where possible."""
+
+    def __init__(self, text, previous=None):
+        self.text = text
+        self.entries = {}
+        self.reused = 0
+        self._reusable = {}
+        self._loaded = {}
+        self._unrecorded = set()
+        if previous is not None:
+            self._carry_over(previous)
+
+
+    def parse(self, parse, element, instring, loc, doActions, callPreParse):
+        """Calls parse(instring, loc, doActions, callPreParse), the _parse()
+        method of the statement element `element`, unless its result is
+        already known."""
+        start = element.preParse(instring, loc) if callPreParse else loc
+        if start in self._loaded:
+            end, tokens = self._loaded[start]
+            return end, tokens.copy()
+        entry = self._reusable.get(start)
+        if entry is not None:
+            self.entries[start] = entry
+            self.reused += 1
+            end, extent, data = entry
+            if data is None:
+                raise ParseException(instring, start, element.errmsg, element)
+            tokens = ParseResults(pickle.loads(data))
+            self._loaded[start] = (end, tokens)
+            return end, tokens.copy()
+        if instring.startswith((';', ','), start):
+            # A statement tried in front of a delimiter fails whatever the
+            # text around it.  (The grammar's statement lists don't try
+            # them there; see MatlabDispatch in grammar_utils.py.)  These
+            # failures are recorded too, as entries without data.
+            self.entries[start] = (start, start + 1, None)
+            return parse(instring, loc, doActions, callPreParse)
+        if start > 0 and instring[start - 1] not in _separators:
+            return parse(instring, loc, doActions, callPreParse)
+        end, tokens = parse(instring, loc, doActions, callPreParse)
+        if start not in self.entries and start not in self._unrecorded:
+            extent = _lookahead.match(instring, end).end()
+            if extent == len(instring):
+                # The end of the text counts as being looked at, too.
+                extent += 1
+            # The tokens are MatlabNode objects (see the parse actions in
+            # grammar_rules.py), so the ParseResults around them is not
+            # needed.
+            try:
+                data = pickle.dumps(list(tokens), pickle.HIGHEST_PROTOCOL)
+            except (RuntimeError, pickle.PicklingError):
+                self._unrecorded.add(start)
+                return end, tokens
+            self.entries[start] = (end, extent, data)
+        return end, tokens
+
+
+    def _carry_over(self, previous):
+        old = previous.text
+        new = self.text
+        prefix = _common_prefix(old, new)
+        suffix = _common_suffix(old[prefix:], new[prefix:])
+        unchanged_from = len(old) - suffix
+        delta = len(new) - len(old)
+        for start, (end, extent, data) in previous.entries.items():
+            if extent <= prefix:
+                self._reusable[start] = (end, extent, data)
+            elif start - 1 >= unchanged_from:
+                self._reusable[start + delta] = (end + delta, extent + delta,
+                                                 data)
+
+
+class StatementRecorder(threading.local):
+    """Routes the matching of statements through the StatementTable in
+    `table`, if it's for the text being parsed.  Each thread has its own
+    `table`."""
+
+    def __init__(self):
+        self.table = None
+
+
+    def install(self, element):
+        parse = element._parse
+        def _parse(instring, loc, *args, **kwargs):
+            table = self.table
+            if table is None or instring is not table.text:
+                return parse(instring, loc, *args, **kwargs)
+            return table.parse(parse, element, instring, loc,
+                               *parse_options(args, kwargs))
+        element._parse = _parse
+
+
+# Helper functions.
+# .............................................................................
+
+def _common_prefix(a, b):
+    # Length of the longest common prefix of strings `a` and `b`.  Comparing
+    # halves of the strings is much faster than comparing characters.
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _common_suffix(a, b):
+    # Length of the longest common suffix of strings `a` and `b`.
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[len(a) - middle:len(a) - low] == b[len(b) - middle:len(b) - low]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
@@ -0,0 +1,355 @@
+#!/usr/bin/env python
+#
+# @file    inference.py
+# @brief   Propagating inferences about types until they settle
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of type inference
+# ----------------------------------
+#
+# Whether "a" in "a(1)" is an array or a function, and so whether an
+# Ambiguous node becomes an ArrayRef or a FunCall, is inferred by the
+# NodeTransformer in grammar.py from what is known about "a" at that point:
+# its type, the value assigned to it, the calls of the function it is a
+# parameter of, and so on.  What is learned further down in the input can
+# change the meaning of what came before it, so one walk over the nodes
+# isn't always enough, and how many are needed depends on how long the
+# chains of inferences in the input are.
+#
+# TypeInference drives the NodeTransformer over the input one "unit" at a
+# time.  A unit is a statement in the body of a script or a function, or
+# the signature of a function definition (its name and parameters).  For
+# every unit, it keeps a log of the facts the unit looked up, with the
+# answers it got, and of the facts it recorded (types, assignments and
+# calls), in order:
+#
+# 1) The first pass visits every unit.  A lookup could only have been
+#    answered differently if the fact it looked up was changed later in
+#    the pass.  If no lookup is in that situation, which is the case for
+#    most inputs, the inference is done after this single pass.
+#
+# 2) Otherwise, more passes are made over the units in order.  A unit
+#    whose lookups get the same answers as in the pass before would do the
+#    same things again, so it isn't visited; the facts in its log are
+#    recorded again instead, which is cheap.  The other units are visited
+#    again.  This goes on until a pass visits no unit, which means the
+#    inferences have settled, or until max_passes passes have visited
+#    units, in case two inferences keep undoing each other.
+#
+# Every pass that visits units counts in `passes`, which MatlabGrammar puts
+# in the MatlabContext of the input (as inference_passes).
+#
+# The calls of a unit are taken out of the contexts before the unit is
+# visited or its log recorded again, so that a call is listed once however
+# many passes are made.  Whether a later fact may change an earlier answer
+# (in step 1) is decided by names: a lookup of the type of "a" depends on
+# the types recorded for "a" in any context, a lookup of the calls of "f"
+# on the calls of "f" anywhere, etc.  That may find changes that make no
+# difference, which only costs a pass that visits nothing.
+
+from collections import namedtuple
+try:
+    from matlab import FunDef, FuncHandle, Identifier
+except:
+    from .matlab import FunDef, FuncHandle, Identifier
+
+
+# The methods of MatlabGrammar that look up facts.  The others in the logs
+# record facts.
+
+_lookups = frozenset(['_get_type', '_get_assignment', '_get_direct_calls',
+                      '_get_indirect_calls'])
+
+_missing = object()
+
+# A call as it was recorded: the name and the list of arguments, which the
+# FunCall node may have replaced since then.
+
+_Call = namedtuple('_Call', ['name', 'args'])
+
+
+class TypeInference(object):
+    """Runs the inference of types over a list of MatlabNode objects.
+    `parser` is the MatlabGrammar object whose methods are used to look up
+    and record facts in the contexts, and `transformer` is the class that
+    does the inference for a node (NodeTransformer).  After infer(),
+    `passes` is the number of passes that visited nodes."""
+
+    def __init__(self, parser, transformer, max_passes=10):
+        self.passes      = 0
+        self._parser     = parser
+        self._visitor    = transformer(self)
+        self._max_passes = max_passes
+        self._units      = []
+        self._log        = None         # Log of the unit being visited.
+        self._time       = 0            # Count of lookups and changes.
+        self._changes    = {}           # Key -> time of the last change.
+
+
+    def infer(self, nodes):
+        """Infers the types of things in `nodes`, a list of statements in
+        the current context of the parser, and returns the list of nodes
+        that results."""
+        if not nodes:
+            return nodes
+        nodes = _statements(nodes)
+        context = self._parser._context
+        self._collect(nodes, context)
+        for unit in self._units:
+            self._visit(unit)
+        self.passes = 1
+        unsettled = any(self._stale(entry) for unit in self._units
+                        for entry in unit.log if entry[0] in _lookups)
+        while unsettled and self.passes < self._max_passes:
+            unsettled = False
+            for unit in self._units:
+                if not self._replay(unit):
+                    self._visit(unit)
+                    unsettled = True
+            if unsettled:
+                self.passes += 1
+        self._parser._context = context
+        self._compact()
+        return nodes
+
+
+    def _collect(self, body, context):
+        for index, node in enumerate(body):
+            if isinstance(node, FunDef):
+                self._units.append(_Unit(context, fundef=node))
+                if node.body:
+                    node.body = _statements(node.body)
+                    node.context.nodes = node.body
+                    self._collect(node.body, node.context)
+            else:
+                self._units.append(_Unit(context, body, index))
+
+
+    def _compact(self):
+        # Visiting a statement can turn it into None, which drops it from
+        # its body (as it does when MatlabNodeVisitor visits a list).
+        bodies = dict((id(unit.body), unit.body) for unit in self._units
+                      if unit.body is not None and unit.body[unit.index] is None)
+        for body in bodies.values():
+            body[:] = _statements(body)
+
+
+    def _visit(self, unit):
+        self._forget_calls(unit)
+        unit.log = self._log = []
+        self._parser._context = unit.context
+        if unit.fundef:
+            self._visitor.infer_signature(unit.fundef)
+        elif unit.body[unit.index] is not None:
+            unit.body[unit.index] = self._visitor.visit(unit.body[unit.index])
+        self._log = None
+        self._drop_empty_calls(unit)
+
+
+    def _replay(self, unit):
+        # Records the facts in the log of `unit` again and returns True if
+        # its lookups get the answers they got before, else returns False.
+        # A lookup is only done again if what it depends on has changed.
+        self._forget_calls(unit)
+        parser = self._parser
+        for entry in unit.log:
+            parser._context = entry[1]
+            if entry[0] in _lookups:
+                if (self._stale(entry)
+                        and getattr(parser, entry[0])(*entry[2]) != entry[3]):
+                    return False
+                self._time += 1
+                entry[5] = self._time
+            else:
+                self._apply(entry[0], entry[2], entry[3])
+        self._drop_empty_calls(unit)
+        return True
+
+
+    def _stale(self, entry):
+        # True if a fact that the lookup in `entry` depends on has changed
+        # since the lookup was made.
+        changes = self._changes
+        for key in entry[4]:
+            if changes.get(key, 0) > entry[5]:
+                return True
+        return False
+
+
+    def _apply(self, method, args, keys):
+        # Records a fact with `method` of the parser, and notes the change,
+        # if it is one, under `keys`.  Returns the keys.  A type that is
+        # already known isn't recorded again.
+        parser = self._parser
+        context = parser._context
+        if method == '_save_type':
+            if dict.get(context.types, args[0]) == args[1]:
+                return keys
+            changed = True
+        elif method == '_save_assignment':
+            node = args[0]
+            value = dict.get(context.assignments, node.lhs, _missing)
+            changed = not (value is node.rhs or value == node.rhs)
+        elif method == '_drop_function_calls':
+            keys = _call_keys(args[0], dict.get(context.calls, args[0]))
+            changed = bool(keys)
+        else:
+            changed = True
+        if changed:
+            self._changed(keys)
+        getattr(parser, method)(*args)
+        return keys
+
+
+    def _changed(self, keys):
+        self._time += 1
+        for key in keys:
+            self._changes[key] = self._time
+
+
+    def _forget_calls(self, unit):
+        for entry in unit.log:
+            if entry[0] == '_save_function_call':
+                call = entry[2][0]
+                if self._parser._forget_function_call(entry[1], call.name,
+                                                      call.args):
+                    self._changed(entry[3])
+
+
+    def _drop_empty_calls(self, unit):
+        for entry in unit.log:
+            if entry[0] == '_save_function_call':
+                self._parser._prune_function_calls(entry[1], entry[2][0].name)
+
+
+    def _look_up(self, method, args, keys):
+        parser = self._parser
+        answer = getattr(parser, method)(*args)
+        self._time += 1
+        self._log.append([method, parser._context, args, answer, keys,
+                          self._time])
+        return answer
+
+
+    def _record(self, method, args, keys):
+        keys = self._apply(method, args, keys)
+        self._log.append((method, self._parser._context, args, keys))
+
+
+    # The methods of MatlabGrammar that NodeTransformer uses.
+
+    @property
+    def _context(self):
+        return self._parser._context
+
+
+    def _push_context(self, newcontext):
+        self._parser._push_context(newcontext)
+
+
+    def _pop_context(self):
+        self._parser._pop_context()
+
+
+    def _get_type(self, thing, context):
+        return self._look_up('_get_type', (thing, context),
+                             [_key('type', thing)])
+
+
+    def _get_assignment(self, node, context, recursive=False):
+        # This depends on the assignments to every name in the chain of
+        # names assigned to each other that is followed.
+        names = [node]
+        if recursive:
+            value = self._parser._get_assignment(node, context)
+            while isinstance(value, Identifier) and value not in names:
+                names.append(value)
+                value = self._parser._get_assignment(value, context)
+        return self._look_up('_get_assignment', (node, context, recursive),
+                             [_key('assignment', name) for name in names])
+
+
+    def _get_direct_calls(self, name, context, anywhere=False, recursive=False):
+        return self._look_up('_get_direct_calls',
+                             (name, context, anywhere, recursive),
+                             [_key('call', name)])
+
+
+    def _get_indirect_calls(self, name, context, anywhere=False, recursive=False):
+        return self._look_up('_get_indirect_calls',
+                             (name, context, anywhere, recursive),
+                             [_key('handle', name)])
+
+
+    def _save_type(self, thing, type):
+        self._record('_save_type', (thing, type), [_key('type', thing)])
+
+
+    def _save_assignment(self, node):
+        self._record('_save_assignment', (node,),
+                     [_key('assignment', node.lhs)])
+
+
+    def _save_function_call(self, node):
+        call = _Call(node.name, node.args)
+        self._record('_save_function_call', (call,),
+                     _call_keys(call.name, [call.args]))
+
+
+    def _drop_function_calls(self, name):
+        self._record('_drop_function_calls', (name,), None)
+
+
+class _Unit(object):
+    # A statement in `body` at `index`, or the signature of `fundef`, and
+    # the context it is in.  The log holds lists [method, context, args,
+    # answer, keys, time] for lookups, and tuples (method, context, args,
+    # keys) for facts recorded.
+
+    def __init__(self, context, body=None, index=None, fundef=None):
+        self.context = context
+        self.body    = body
+        self.index   = index
+        self.fundef  = fundef
+        self.log     = []
+
+
+def _statements(body):
+    return [node for node in body if node is not None]
+
+
+def _key(kind, thing):
+    # Identifiers, the most common things by far, are told apart by their
+    # names, which is quicker than hashing them.
+    if isinstance(thing, Identifier):
+        return (kind, thing.name)
+    return (kind, hash(thing))
+
+
+def _call_keys(name, arglists):
+    # The keys of the facts changed by adding or removing the calls of
+    # `name` with the arguments in `arglists`.
+    if not arglists:
+        return []
+    keys = [_key('call', name)]
+    for args in arglists:
+        for arg in (args or []):
+            if isinstance(arg, FuncHandle):
+                keys.append(_key('handle', arg.name))
+    return keys
@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+#
+# @file    lexer.py
+# @brief   Single-pass tokenizer for MATLAB input
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of the lexer
+# -----------------------------
+#
+# MatlabLexer turns MATLAB text into a stream of Token objects in one pass
+# over the input.  Each token records its kind (one of the constants defined
+# below), its value, its span in the input text (as character offsets), and
+# two flags describing what came before it: whether there was whitespace
+# immediately in front of it, and whether a line break occurred between it
+# and the previous token.  Those two flags are what MATLAB's peculiar
+# whitespace rules inside arrays depend on, and they are also what lets a
+# parser find statement boundaries without having to see newlines as tokens.
+#
+# MATLAB cannot be tokenized with a completely context-free lexer, because
+# the single quote character is both the string delimiter and the
+# complex-conjugate transpose operator.  The rule applied here is the one
+# MATLAB itself uses: a quote is a transpose operator if it comes
+# *immediately* after something that can end a value (an identifier, a
+# number, a closing bracket or another transpose operator); otherwise, it
+# starts a string.  The same rule is used by the PyParsing grammar, which
+# only accepts a transpose when there is no whitespace in front of it.
+#
+# Some things are deliberately left to the parsers:
+#
+# * Command-syntax arguments (e.g., "print -dpng foo.png") are lexed as
+#   ordinary tokens.  Whether a line is in command syntax depends on what
+#   comes after the first identifier, so parsers that need the raw text of
+#   the arguments can use the token spans to go back to the input.
+#
+# * Continuations ("...") are normally removed by MatlabGrammar's
+#   preprocessor before the input is lexed.  If one is encountered anyway,
+#   it is treated like whitespace, which is how MATLAB interprets it.
+#
+# The lexer never raises an exception on bad input.  Characters that cannot
+# start any token (and unterminated strings) are returned as tokens of kind
+# INVALID, so that the caller can decide what to do about them.
+
+from __future__ import print_function
+import re
+import threading
+from bisect import bisect_right
+
+
+# Token kinds.
+# .............................................................................
+
+NUMBER     = 'number'
+STRING     = 'string'
+IDENTIFIER = 'identifier'
+KEYWORD    = 'keyword'
+OPERATOR   = 'operator'
+COMMENT    = 'comment'
+SHELL      = 'shell command'
+INVALID    = 'invalid'
+
+
+# Language definitions shared with the grammar.
+# .............................................................................
+# The keyword list is based on what the command 'iskeyword' returns in
+# MATLAB 2014b.  The patterns for numbers and identifiers are the same as
+# what MatlabGrammar used to build out of PyParsing Word/Combine objects; in
+# particular, a number may end in a bare period ("2."), and imaginary numbers
+# are knowingly not supported because they're not used in our domain.
+
+reserved_words = frozenset(['break', 'case', 'catch', 'classdef', 'continue',
+                            'else', 'elseif', 'end', 'for', 'function',
+                            'global', 'if', 'otherwise', 'parfor',
+                            'persistent', 'return', 'spmd', 'switch', 'try',
+                            'while'])
+
+number_pattern     = r'(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[EeDd][+-]?[0-9]+)?'
+identifier_pattern = r'[A-Za-z][A-Za-z0-9_]*'
+string_pattern     = r"'(?:[^'\n\r]|'')*'"
+
+# Operators and punctuation, longest first so that the regexp alternation
+# matches greedily.
+
+_operators = ['.^', '.*', './', '.\\', ".'", '==', '~=', '<=', '>=', '&&',
+              '||', '+', '-', '*', '/', '\\', '^', '<', '>', '&', '|', '~',
+              '=', ':', ',', ';', '(', ')', '[', ']', '{', '}', '.', '@', "'"]
+
+# Tokens after which a quote character (with no whitespace in between) is a
+# transpose operator rather than the start of a string.
+
+_value_enders = frozenset([')', ']', '}', "'", ".'"])
+
+
+class Token(object):
+    """A lexical token.
+
+    The attributes are:
+
+      kind:           One of the token kind constants in this module.
+
+      value:          The text of the token.  For strings, this is the
+                      content between the quotes, with doubled quotes
+                      replaced by single ones.  For comments, it is the text
+                      after the '%' (or between '%{' and '%}' for block
+                      comments).  For shell commands, it is the text after
+                      the '!'.
+
+      start, end:     The span of the token in the input, as offsets.
+
+      space_before:   True if whitespace immediately precedes this token.
+
+      newline_before: True if a line break separates this token from the
+                      previous one.
+    """
+
+    __slots__ = ('kind', 'value', 'start', 'end', 'space_before',
+                 'newline_before')
+
+    def __init__(self, kind, value, start, end, space_before=False,
+                 newline_before=False):
+        self.kind           = kind
+        self.value          = value
+        self.start          = start
+        self.end            = end
+        self.space_before   = space_before
+        self.newline_before = newline_before
+
+
+    def __repr__(self):
+        return 'Token({}, {}, {}:{}{}{})'.format(
+            self.kind, repr(self.value), self.start, self.end,
+            ', space' if self.space_before else '',
+            ', newline' if self.newline_before else '')
+
+
+    def __eq__(self, other):
+        return (isinstance(other, Token)
+                and self.kind == other.kind and self.value == other.value
+                and self.start == other.start and self.end == other.end)
+
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+    def is_op(self, *values):
+        """Returns True if this is an operator token with one of `values`."""
+        return self.kind == OPERATOR and self.value in values
+
+
+    def is_keyword(self, *values):
+        """Returns True if this is a keyword token with one of `values`."""
+        return self.kind == KEYWORD and self.value in values
+
+
+    def ends_value(self):
+        """Returns True if this token can be the last token of a value."""
+        if self.kind in (IDENTIFIER, NUMBER, STRING):
+            return True
+        elif self.kind == OPERATOR:
+            return self.value in _value_enders
+        elif self.kind == KEYWORD:
+            return self.value == 'end'
+        return False
+
+
+class MatlabLexer(object):
+    """Tokenizer for MATLAB text.
+
+    Typical usage is either to get the whole list of tokens at once,
+
+        tokens = MatlabLexer(text).tokenize()
+
+    or to pull tokens one at a time using next_token(), which is what a
+    parser wants when it may have to skip over parts of the input (for
+    example, the arguments of command-syntax function calls).
+    """
+
+    _space_re  = re.compile(r'[ \t]+|\.\.\.[^\n\r]*(?:\r\n|\r|\n)?')
+    _token_re  = re.compile('|'.join([
+        r'(?P<block>%\{)',
+        r'(?P<comment>%[^\n\r]*)',
+        r'(?P<number>' + number_pattern + ')',
+        r'(?P<name>' + identifier_pattern + ')',
+        r'(?P<shell>![^\n\r]*)',
+        r'(?P<op>' + '|'.join(re.escape(op) for op in _operators) + ')',
+        ]))
+    _string_re = re.compile(string_pattern)
+    _line_re   = re.compile(r'%[^\n\r]*')
+
+    def __init__(self, text):
+        self.text = text
+        self._line_starts = None
+
+
+    def tokenize(self, start=0):
+        """Returns a list of all the tokens in the text from `start` onward."""
+        return list(self.tokens(start))
+
+
+    def tokens(self, start=0):
+        """Generator yielding the tokens in the text from `start` onward."""
+        pos = start
+        previous = None
+        while True:
+            token = self.next_token(pos, previous)
+            if token is None:
+                return
+            yield token
+            pos = token.end
+            previous = token
+
+
+    def next_token(self, pos, previous=None):
+        """Returns the first token at or after offset `pos`, or None if the
+        end of the text has been reached.  `previous` is the token that
+        came before `pos`, if any; it's used to tell a transpose operator
+        from the start of a string.
+        """
+        text = self.text
+        length = len(text)
+        space = newline = False
+        space_re = self._space_re
+        while pos < length:
+            char = text[pos]
+            if char == '\n' or char == '\r':
+                space = newline = True
+                pos += 1
+                continue
+            m = space_re.match(text, pos)
+            if not m:
+                break
+            space = True
+            pos = m.end()
+        if pos >= length:
+            return None
+
+        if text[pos] == "'":
+            if previous is not None and not space and previous.ends_value():
+                return Token(OPERATOR, "'", pos, pos + 1, space, newline)
+            m = self._string_re.match(text, pos)
+            if m:
+                value = m.group()[1:-1].replace("''", "'")
+                return Token(STRING, value, pos, m.end(), space, newline)
+            return Token(INVALID, "'", pos, pos + 1, space, newline)
+
+        m = self._token_re.match(text, pos)
+        if not m:
+            return Token(INVALID, text[pos], pos, pos + 1, space, newline)
+        kind = m.lastgroup
+        value = m.group()
+        end = m.end()
+        if kind == 'name':
+            if value in reserved_words:
+                return Token(KEYWORD, value, pos, end, space, newline)
+            return Token(IDENTIFIER, value, pos, end, space, newline)
+        elif kind == 'op':
+            if (value == ".'" and not (previous is not None and not space
+                                       and previous.ends_value())):
+                # Not a transpose; it's a dot followed by a string.
+                return Token(OPERATOR, '.', pos, pos + 1, space, newline)
+            return Token(OPERATOR, value, pos, end, space, newline)
+        elif kind == 'number':
+            return Token(NUMBER, value, pos, end, space, newline)
+        elif kind == 'comment':
+            return Token(COMMENT, value[1:], pos, end, space, newline)
+        elif kind == 'block':
+            close = text.find('%}', end)
+            if close < 0:
+                # Unterminated block comment: MATLAB treats it as a line.
+                m = self._line_re.match(text, pos)
+                return Token(COMMENT, m.group()[1:], pos, m.end(), space, newline)
+            return Token(COMMENT, text[end:close], pos, close + 2, space, newline)
+        else:
+            return Token(SHELL, value[1:], pos, end, space, newline)
+
+
+    def location(self, offset):
+        """Returns a tuple (line, column) for the character at `offset`.
+        Both numbers start at 1, as they do in PyParsing's lineno() and col().
+        """
+        if self._line_starts is None:
+            starts = [0]
+            for m in re.finditer(r'\r\n|\r|\n', self.text):
+                starts.append(m.end())
+            self._line_starts = starts
+        index = bisect_right(self._line_starts, offset) - 1
+        return (index + 1, offset - self._line_starts[index] + 1)
+
+
+# TokenTable -- looking up tokens by position.
+#
+# The PyParsing grammar (see MatlabToken in grammar_utils.py) and the
+# recursive-descent parser (see descent.py) both look up the token that
+# starts at a given offset in the text.  The lexer decides between strings
+# and transpose operators using the preceding token, but PyParsing can end
+# up trying a terminal at a position the lexer never saw as the start of a
+# token (e.g., in the middle of the arguments of a command-syntax function
+# call, which the grammar matches as raw text).  In those cases, the token
+# at that position is lexed again without any preceding context, which is
+# exactly what the old character-level terminals did.
+#
+# The grammar's TokenTable is shared by all the threads that parse with it,
+# so its contents are kept per thread (it is a threading.local).
+
+class TokenTable(threading.local):
+    """Tokens of the text currently being parsed by the current thread,
+    indexed by offset."""
+
+    def __init__(self):
+        self.text = None
+        self._tokens = {}
+        self._unanchored = {}
+
+
+    def reset(self, text):
+        self.text = text
+        self._tokens = dict((t.start, t) for t in MatlabLexer(text).tokens())
+        self._unanchored = {}
+
+
+    def token_at(self, instring, loc, kind):
+        """Returns the token of the given `kind` that starts at offset `loc`
+        in `instring`, or None if there isn't one."""
+        if instring is not self.text:
+            self.reset(instring)
+        token = self._tokens.get(loc)
+        if token is None or (kind == STRING and token.kind != STRING):
+            # Not a token start as far as the lexer is concerned, or a quote
+            # that the lexer took to be a transpose operator.
+            if loc in self._unanchored:
+                token = self._unanchored[loc]
+            else:
+                token = MatlabLexer(instring).next_token(loc)
+                if token is not None and token.start != loc:
+                    token = None
+                self._unanchored[loc] = token
+        if token is not None and token.kind == kind:
+            return token
+        return None
+
+
+def tokenize(text):
+    """Convenience function: returns the list of tokens for `text`."""
+    return MatlabLexer(text).tokenize()
@@ -25,7 +25,8 @@ import inspect
 import sys
 import pdb
 import collections
-from collections import defaultdict
+import six
+from six.moves import copyreg
 
 
 # MatlabNode -- base class for all parse tree nodes.
@@ -77,9 +78,36 @@ from collections import defaultdict
 # |
 # +--ShellCommand
 # |
-# `- Comment
+# +--Comment
+# |
+# `- ParseError         # A statement that couldn't be parsed (recovery.py).
+
+# Node classes are made by _NodeClass, which gives each one __slots__ for the
+# attributes named in its _attr_names that its superclasses don't already
+# have, so that nodes have no __dict__ and take much less memory.  It also
+# gives the class _fields, the tuple of all its attribute names, in order.
+# Equality and ordering of nodes are defined field by field: two nodes are
+# equal if they are of the same class and their attributes are equal, and
+# nodes are ordered by class name and then by their attributes in order,
+# comparing text case-insensitively first.  Both compare trees of nodes
+# without recursion, like fold_tree() below.  Classes defined elsewhere as
+# subclasses of node classes get __slots__ too, unless they define their own.
+
+class _NodeClass(type):
+    def __new__(meta, name, bases, namespace):
+        if '_attr_names' in namespace:
+            fields = tuple(namespace['_attr_names'] or ())
+        else:
+            fields = tuple(getattr(bases[0], '_attr_names', None) or ())
+        if '__slots__' not in namespace:
+            inherited = set(a for base in bases for cls in base.__mro__
+                            for a in cls.__dict__.get('__slots__', ()))
+            namespace['__slots__'] = tuple(a for a in fields if a not in inherited)
+        namespace['_fields'] = fields
+        return super(_NodeClass, meta).__new__(meta, name, bases, namespace)
+
 
-class MatlabNode(object):
+class MatlabNode(six.with_metaclass(_NodeClass, object)):
     '''Base class of nodes used to represent MATLAB statements as an AST.'''
 
     _attr_names = None                 # Default set of node attributes.
@@ -116,9 +144,72 @@ class MatlabNode(object):
         return '{MatlabNode}'
 
 
+    def __getstate__(self):
+        # Nodes have no __dict__, so pickle and copy need to be told what
+        # to save.  Attributes that were never set are left out.
+        state = {}
+        for name in self._fields:
+            value = getattr(self, name, _unset)
+            if value is not _unset:
+                state[name] = value
+        return state
+
+
+    def __setstate__(self, state):
+        if isinstance(state, tuple):    # See __reduce_ex__() below.
+            state = state[0]
+        for name, value in state.items():
+            setattr(self, name, value)
+
+
+    def __reduce_ex__(self, protocol):
+        # Pickle and deepcopy save the attributes of a node before they
+        # finish with the node itself, so they recurse once per level of
+        # the tree.  To avoid that in deep trees, the first node they reach
+        # has all the nodes below it saved first, deepest first, so that
+        # none of them has any nodes left to save but ones already saved.
+        # See the notes about _saved_first below.
+        cls = self.__class__
+        state = self.__getstate__()
+        if _saved_first.pop(id(self), None) is not self:
+            below, deep = _nodes_below(self)
+            if below:
+                for node in below:
+                    _saved_first[id(node)] = node
+                state = (state, _Forget(below))
+                if deep:
+                    return (_new_node, (cls, below), state)
+        return (copyreg.__newobj__, (cls,), state)
+
+
+    def __copy__(self):
+        node = self.__class__.__new__(self.__class__)
+        node.__setstate__(self.__getstate__())
+        return node
+
+
     def __eq__(self, other):
-        return (isinstance(other, self.__class__)
-                and self.__dict__ == other.__dict__)
+        # The attributes of the two nodes are compared here, and the trees
+        # of nodes in them, if any, by _equal_trees().
+        if self is other:
+            return True
+        elif not isinstance(other, self.__class__):
+            return False
+        elif other.__class__ is not self.__class__ and other._fields != self._fields:
+            return False
+        deeper = None
+        for name in self._fields:
+            mine = getattr(self, name, _unset)
+            theirs = getattr(other, name, _unset)
+            if mine is theirs:
+                continue
+            elif isinstance(mine, _trees):
+                if deeper is None:
+                    deeper = []
+                deeper.append((mine, theirs))
+            elif not mine == theirs:
+                return False
+        return deeper is None or _equal_trees(deeper)
 
 
     def __ne__(self, other):
@@ -126,41 +217,24 @@ class MatlabNode(object):
 
 
     def __gt__(self, other):
-        return not __le__(self, other)
+        return _order_key(self) > _order_key(other)
 
 
     def __ge__(self, other):
-        return not __lt__(self, other)
+        return _order_key(self) >= _order_key(other)
 
 
     def __lt__(self, other):
-        # Subclasses may need to override this.
-        if hasattr(self, 'name') and hasattr(other, 'name'):
-            return self.name.lower() < other.name.lower()
-        elif hasattr(self, 'value') and hasattr(other, 'value'):
-            return self.value < other.value
-        else:
-            return repr(self) < repr(other)
+        return _order_key(self) < _order_key(other)
 
 
     def __le__(self, other):
-        # Subclasses may need to override this.
-        if hasattr(self, 'name') and hasattr(other, 'name'):
-            return self.name.lower() <= other.name.lower()
-        elif hasattr(self, 'value') and hasattr(other, 'value'):
-            return self.value <= other.value
-        else:
-            return repr(self) <= repr(other)
+        return _order_key(self) <= _order_key(other)
 
 
     def __cmp__(self, other):
-        # Subclasses may need to override this.
-        if hasattr(self, 'name') and hasattr(other, 'name'):
-            return cmp(self.name.lower(), other.name.lower())
-        elif hasattr(self, 'value') and hasattr(other, 'value'):
-            return cmp(self.value, other.value)
-        else:
-            return cmp(repr(self), repr(other))
+        mine, theirs = _order_key(self), _order_key(other)
+        return (mine > theirs) - (mine < theirs)
 
 
     def __hash__(self):
@@ -170,72 +244,18 @@ class MatlabNode(object):
     @staticmethod
     def as_string(thing):
         """Turns a node structure into a canonical text string form.
-        This is a recursive function, and is meant to be used to convert simple
-        node structures (such as array accesses) into dictionary hash keys.
-        It is unlikely to yield useful results for more complicated node trees.
+        This is meant to be used to convert simple node structures (such as
+        array accesses) into dictionary hash keys.  It is unlikely to yield
+        useful results for more complicated node trees.
         """
-        def row_to_string(row):
-            list = [MatlabNode.as_string(item) for item in row]
-            return ','.join(list)
-
         if isinstance(thing, str):
             return thing
         elif isinstance(thing, Primitive):
             return str(thing.value)
         elif isinstance(thing, Identifier):
             return str(thing.name)
-        elif isinstance(thing, FunCall) or isinstance(thing, Ambiguous):
-            base = MatlabNode.as_string(thing.name)
-            if thing.args == None:
-                maybe_args = ''
-            elif thing.args == []:
-                maybe_args = '()'
-            else:
-                maybe_args = '(' + row_to_string(thing.args) + ')'
-            return base + maybe_args
-        elif isinstance(thing, ArrayRef):
-            base  = MatlabNode.as_string(thing.name)
-            left  = '{' if thing.is_cell else '('
-            right = '}' if thing.is_cell else ')'
-            arg_list = row_to_string(thing.args) if thing.args else ''
-            return base + left + arg_list + right
-        elif isinstance(thing, StructRef):
-            base = MatlabNode.as_string(thing.name)
-            return base + '.' + MatlabNode.as_string(thing.field)
-        elif isinstance(thing, Array):
-            rowlist = [row_to_string(row) for row in thing.rows]
-            return '[' + ';'.join(rowlist) + ']'
-        elif isinstance(thing, Operator):
-            if isinstance(thing, UnaryOp):
-                return thing.op + MatlabNode.as_string(thing.operand)
-            elif isinstance(thing, BinaryOp):
-                left = MatlabNode.as_string(thing.left)
-                right = MatlabNode.as_string(thing.right)
-                return left + thing.op + right
-            elif isinstance(thing, ColonOp):
-                left = MatlabNode.as_string(thing.left)
-                right = MatlabNode.as_string(thing.right)
-                if thing.middle:
-                    middle = MatlabNode.as_string(thing.middle)
-                    return left + ':' + middle + ':' + right
-                else:
-                    return left + ':' + right
-            elif isinstance(thing, Transpose):
-                return MatlabNode.as_string(thing.operand) + thing.op
-        elif isinstance(thing, FuncHandle):
-            return str(thing)
-        elif isinstance(thing, AnonFun):
-            arg_list = row_to_string(thing.args) if thing.args else ''
-            body = MatlabNode.as_string(thing.body)
-            return '@(' + arg_list + ')' + body
-        elif isinstance(thing, Comment) or isinstance(thing, FunDef) \
-             or isinstance(thing, Command):
-            # No reason for as_string called for these things, but must catch
-            # random mayhem before falling through to the final case.
-            return None
         else:
-            # Something must be wrong if we get here.  Unclear what to do.
-            return None
+            return fold_tree(thing, _string_parts)
 
 
 # Expressions -- parent class of operators and other things in expressions.
@@ -765,6 +785,24 @@ class Comment(MatlabNode):
         return '{{comment: {}}}'.format(self.content)
 
 
+# Parse errors.
+# .........................................................................
+
+class ParseError(MatlabNode):
+    '''Statement that could not be parsed, in the results of parsing with
+    recovery (see recovery.py).  The rule is the name of the grammar rule
+    the statement should have matched.'''
+    _attr_names = ['text', 'rule', 'message', 'line', 'column']
+
+    def __repr__(self):
+        return 'ParseError(rule={}, line={}, column={}, text={})'.format(
+            repr(self.rule), self.line, self.column, repr(self.text))
+
+    def __str__(self):
+        return '{{parse error: {} at line {}, column {}}}'.format(
+            self.rule, self.line, self.column)
+
+
 # Visitor.
 # .........................................................................
 # This is a visitor class with special powers:
@@ -806,49 +844,55 @@ class Comment(MatlabNode):
 
 class MatlabNodeVisitor(object):
     def __init__(self):
-        def catalog(this_class, classes):
-            # Note it doesn't help to put MatlabNode in the path because it
-            # bloats the list and complicates processing later, so we skip it.
-            for subclass in this_class.__subclasses__():
-                if this_class in classes:
-                    classes[subclass] = [this_class] + classes[this_class]
-                elif this_class is not MatlabNode:
-                    classes[subclass] = [this_class]
-                catalog(subclass, classes)
-
-        # Cache the superclass path for every subclass, so that we don't have
-        # to keep walking up the class hierarchy at every call to visit().
-        self._parent_classes = defaultdict(list)
-        catalog(MatlabNode, self._parent_classes)
+        # Which methods get called is worked out once for each class of
+        # visitor, and shared by all its instances; see _Dispatch below.
+        self._dispatch = _Dispatch.of(type(self))
 
 
     def visit(self, node):
         if not node:
             return node
+        # The walk is done with fold_tree() rather than by recursion, so
+        # that long chains of operators don't exhaust the Python stack.
+        return fold_tree(node, self._visit_parts)
+
+
+    def _visit_parts(self, node):
+        # Says what visit() should do with `node`, in the form fold_tree()
+        # wants: either the result, or the things to visit first and a
+        # function that makes the result from theirs.  User-defined methods
+        # are simply called; only the default walk is done by fold_tree().
+        if not node:
+            return node, None
         elif isinstance(node, list):
-            meth = getattr(self, 'visit_list', None)
-            if meth is None:
-                meth = self.default_visit_list
-            return meth(node)
+            dispatch = self._dispatch
+            if dispatch.visit_list is not None:
+                return dispatch.visit_list(self, node), None
+            elif dispatch.custom_list_walk:
+                return self.default_visit_list(node), None
+            return node, _visited_list
         elif isinstance(node, tuple):
-            return (self.visit(node[0]), self.visit(node[1]))
+            return node[:2], tuple
         else:
             # If the user has defined a method for this class of object, call
             # that; else, look for a method for a superclass, and failing all
             # that, default to walking the visitable attributes.
-            methname = 'visit_' + type(node).__name__
-            meth = getattr(self, methname, None)
-            if meth:
-                return meth(node)
-            else:
-                for superclass in self._parent_classes[node.__class__]:
-                    methname = 'visit_' + superclass.__name__
-                    meth = getattr(self, methname, None)
-                    if meth:
-                        return meth(node)
-                # We got 'nothin.  We do the default walk.
-                meth = self.default_visit
-                return meth(node)
+            dispatch = self._dispatch
+            meth = dispatch.methods.get(node.__class__, _unknown)
+            if meth is _unknown:
+                meth = dispatch.find(node.__class__)
+            if meth is not None:
+                return meth(self, node), None
+            # We got 'nothin.  We do the default walk.
+            if dispatch.custom_walk:
+                return self.default_visit(node), None
+            attrs = [a for a in type(node)._visitable_attr
+                     if getattr(node, a, None)]
+            def set_visited(values):
+                for a, value in zip(attrs, values):
+                    setattr(node, a, value)
+                return node
+            return [getattr(node, a) for a in attrs], set_visited
 
 
     def default_visit(self, node):
@@ -869,6 +913,276 @@ class MatlabNodeVisitor(object):
 # General helpers.
 # .........................................................................
 
+# fold_tree() computes a value for a node tree from the bottom up, without
+# recursion.  MATLAB files produced by other software can contain
+# expressions with thousands of operators in a row (e.g., rate laws with
+# thousands of terms), and those produce node trees thousands of levels
+# deep, which recursive functions can't handle.  The caller provides a
+# function `parts`, which is given one item of the tree and returns either
+# (value, None) if the value of the item is known, or (children, combine)
+# if it depends on the values of the items in the list `children`; in that
+# case, combine() is later called with the list of their values.  The
+# children are processed in order, depth first, as a recursive function
+# would do it.
+
+class _Pending(object):
+    __slots__ = ('combine', 'count')
+
+    def __init__(self, combine, count):
+        self.combine = combine
+        self.count = count
+
+
+def fold_tree(thing, parts):
+    """Returns the value for `thing` computed using the function `parts`;
+    see the notes above."""
+    values = []
+    stack = [thing]
+    while stack:
+        item = stack.pop()
+        if item.__class__ is _Pending:
+            if item.count:
+                args = values[-item.count:]
+                del values[-item.count:]
+            else:
+                args = []
+            values.append(item.combine(args))
+        else:
+            value, combine = parts(item)
+            if combine is None:
+                values.append(value)
+            else:
+                stack.append(_Pending(combine, len(value)))
+                stack.extend(reversed(value))
+    return values[0]
+
+
+def _string_parts(thing):
+    # Parts of MatlabNode.as_string(thing), for fold_tree().
+    if isinstance(thing, str):
+        return thing, None
+    elif isinstance(thing, Primitive):
+        return str(thing.value), None
+    elif isinstance(thing, Identifier):
+        return str(thing.name), None
+    elif isinstance(thing, FunCall) or isinstance(thing, Ambiguous):
+        if thing.args == None:
+            return [thing.name], lambda s: s[0]
+        elif thing.args == []:
+            return [thing.name], lambda s: s[0] + '()'
+        else:
+            return ([thing.name] + thing.args,
+                    lambda s: s[0] + '(' + ','.join(s[1:]) + ')')
+    elif isinstance(thing, ArrayRef):
+        left  = '{' if thing.is_cell else '('
+        right = '}' if thing.is_cell else ')'
+        return ([thing.name] + (thing.args or []),
+                lambda s: s[0] + left + ','.join(s[1:]) + right)
+    elif isinstance(thing, StructRef):
+        return [thing.name, thing.field], lambda s: s[0] + '.' + s[1]
+    elif isinstance(thing, Array):
+        lengths = [len(row) for row in thing.rows]
+        def join_rows(s):
+            rows = []
+            for length in lengths:
+                rows.append(','.join(s[:length]))
+                s = s[length:]
+            return '[' + ';'.join(rows) + ']'
+        return [item for row in thing.rows for item in row], join_rows
+    elif isinstance(thing, UnaryOp):
+        return [thing.operand], lambda s: thing.op + s[0]
+    elif isinstance(thing, BinaryOp):
+        return [thing.left, thing.right], lambda s: s[0] + thing.op + s[1]
+    elif isinstance(thing, ColonOp):
+        if thing.middle:
+            return ([thing.left, thing.middle, thing.right],
+                    lambda s: s[0] + ':' + s[1] + ':' + s[2])
+        else:
+            return [thing.left, thing.right], lambda s: s[0] + ':' + s[1]
+    elif isinstance(thing, Transpose):
+        return [thing.operand], lambda s: s[0] + thing.op
+    elif isinstance(thing, FuncHandle):
+        return str(thing), None
+    elif isinstance(thing, AnonFun):
+        args = thing.args or []
+        return (args + [thing.body],
+                lambda s: '@(' + ','.join(s[:-1]) + ')' + s[-1])
+    else:
+        # Includes comments, function definitions, and commands, for which
+        # there is no reason for as_string() to be called.
+        return None, None
+
+
+def _visited_list(values):
+    return [x for x in values if x is not None]
+
+
+# Value of attributes that were never set.
+_unset = object()
+
+
+# Values that MatlabNode.__eq__() leaves to _equal_trees().
+_trees = (MatlabNode, list, tuple)
+
+
+# MatlabNode.__reduce_ex__() lists the nodes below a node using fold_tree(),
+# and puts them in _saved_first, keyed by id, until they have been saved;
+# saving one of them then takes no more than its own attributes, and does
+# not list the nodes below it again.  If the tree is at least _deep_tree
+# levels deep, the list itself is saved before the node's attributes.
+# Nodes that were saved before, through another path, are never asked to
+# save themselves again, so a _Forget object saved last, with the node's
+# attributes, takes what's left out of _saved_first.  It is read back as an
+# empty tuple.
+
+_saved_first = {}
+_deep_tree = 50
+
+
+class _Forget(object):
+    __slots__ = ('nodes',)
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+
+    def __reduce__(self):
+        for node in self.nodes:
+            if _saved_first.get(id(node)) is node:
+                del _saved_first[id(node)]
+        return (tuple, ())
+
+
+def _new_node(cls, saved_first):
+    return cls.__new__(cls)
+
+
+def _nodes_below(node):
+    # The nodes in the tree of `node`, except `node`, deepest first, and
+    # whether the tree is at least _deep_tree levels deep.  Like fold_tree(),
+    # this walks the tree with a stack; nodes come before the nodes below
+    # them in the walk, so the list is reversed at the end.
+    found = []
+    deepest = 0
+    stack = [(node, 0)]
+    while stack:
+        thing, depth = stack.pop()
+        if isinstance(thing, MatlabNode):
+            found.append(thing)
+            values = [getattr(thing, name, None) for name in thing._fields]
+        else:
+            values = thing
+        depth += 1
+        for value in values:
+            if isinstance(value, _trees):
+                stack.append((value, depth))
+                if depth > deepest:
+                    deepest = depth
+    found.reverse()
+    found.pop()
+    return found, deepest >= _deep_tree
+
+
+def _equal_trees(pending):
+    # True if the two things in every pair in the list `pending` are equal.
+    while pending:
+        a, b = pending.pop()
+        if a is b:
+            continue
+        elif isinstance(a, MatlabNode):
+            if not isinstance(b, a.__class__) or a._fields != b._fields:
+                return False
+            for name in a._fields:
+                pending.append((getattr(a, name, _unset), getattr(b, name, _unset)))
+        elif isinstance(a, (list, tuple)) and type(a) is type(b):
+            if len(a) != len(b):
+                return False
+            pending.extend(zip(a, b))
+        elif not a == b:
+            return False
+    return True
+
+
+def _order_key(thing):
+    # A key that sorts like `thing`, which can be a node, a list or tuple,
+    # or a value of an attribute of a node, and can be compared with the
+    # key of anything else.  Values that have no natural order compare as
+    # equal to each other.
+    return fold_tree(thing, _order_key_parts)
+
+
+def _order_key_parts(thing):
+    # Parts of _order_key(thing), for fold_tree().
+    if thing is None:
+        return (0,), None
+    elif isinstance(thing, six.integer_types + (float,)):
+        return (1, thing), None
+    elif isinstance(thing, six.string_types):
+        return (2, thing.lower(), thing), None
+    elif isinstance(thing, (list, tuple)):
+        return list(thing), lambda keys: (3, tuple(keys))
+    elif isinstance(thing, MatlabNode):
+        fields = [getattr(thing, name, None) for name in thing._fields]
+        return fields, lambda keys: (4, thing.__class__.__name__, tuple(keys))
+    else:
+        return (5,), None
+
+
+# Dispatch tables.
+#
+# The method that MatlabNodeVisitor.visit() calls for a node depends only on
+# the class of the visitor and the class of the node: it's visit_CLASS() for
+# the class of the node or the nearest of its superclasses, short of
+# MatlabNode.  A _Dispatch holds the methods found for a class of visitor,
+# by class of node, as plain functions; each is looked for the first time a
+# node of that class is visited, and after that, finding it takes one
+# dictionary lookup.  Methods added to a visitor class after it was first
+# used are not seen.
+
+_unknown = object()
+
+
+class _Dispatch(object):
+    _tables = {}                        # Visitor class -> _Dispatch.
+
+    def __init__(self, cls):
+        self.cls = cls
+        self.methods = {}               # Node class -> function or None.
+        self.visit_list = _function(getattr(cls, 'visit_list', None))
+        self.custom_walk = _overrides(cls, 'default_visit')
+        self.custom_list_walk = _overrides(cls, 'default_visit_list')
+
+
+    @classmethod
+    def of(cls, visitor_class):
+        dispatch = cls._tables.get(visitor_class)
+        if dispatch is None:
+            dispatch = cls._tables.setdefault(visitor_class, cls(visitor_class))
+        return dispatch
+
+
+    def find(self, node_class):
+        meth = None
+        for superclass in node_class.__mro__:
+            if superclass is MatlabNode or superclass is object:
+                break
+            meth = _function(getattr(self.cls, 'visit_' + superclass.__name__, None))
+            if meth is not None:
+                break
+        self.methods[node_class] = meth
+        return meth
+
+
+def _function(method):
+    # The plain function of `method`, which may be an unbound method.
+    return getattr(method, '__func__', method)
+
+
+def _overrides(cls, name):
+    # True if class `cls` redefines the MatlabNodeVisitor method `name`.
+    return (_function(getattr(cls, name))
+            is not _function(getattr(MatlabNodeVisitor, name)))
+
+
 def _str_format(thing, no_parens=False):
     if isinstance(thing, list):
         formatted = ' '.join([_str_format(item) for item in thing])
@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+#
+# @file    passes.py
+# @brief   Passes over MatlabNode trees, run together in one walk
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of passes
+# --------------------------
+#
+# Each MatlabNodeVisitor walks the whole node tree it is given, so doing
+# several things to the results of a parse, one visitor after another,
+# means walking the nodes once for each, and an analysis done with a new
+# visitor for each of many names walks them once for every name.
+#
+# A MatlabPass does one thing to a tree, like a visitor, but leaves the
+# walking to a PassPipeline, which runs a list of passes together in a
+# single walk over the nodes.  A pass says which nodes it handles by
+# defining methods named after their classes:
+#
+#   enter_CLASS(node, context)   Called when the walk gets to a node, before
+#                                its parts are walked.
+#   leave_CLASS(node, context)   Called after the parts have been walked.
+#
+# As with visit_CLASS() in MatlabNodeVisitor, the method for the nearest
+# superclass of a node is used when there is none for its own class, and
+# nodes no method applies to are just walked.  Both methods return the
+# node, or what to put in its place in the tree (None removes it); a node
+# that has been replaced is not walked further, and the passes after the
+# one that replaced it don't see it.  `context` is the MatlabContext the
+# node is in: the walk starts in the context given to run() and moves into
+# the context of a FunDef to walk its parts.
+#
+# A pass can leave parts of some nodes out of its walk: its `walks`
+# dictionary maps node classes (again, the nearest superclass counts) to
+# the names of the attributes to walk, and the other attributes of those
+# nodes are not walked for that pass.  The pipeline walks a part if any
+# pass wants it, and runs only the passes that want it on what is in it.
+#
+# The passes are run in the order of the list given to the PassPipeline,
+# node by node: at each node, the enter_CLASS() methods are called in that
+# order, then the parts are walked, and then the leave_CLASS() methods are
+# called, again in that order.  So a pass sees each node as the passes
+# before it in the list have left it, and before the passes after it have
+# seen it; for a pass that removes nodes, followed by one that collects
+# facts about the nodes and one that rewrites them, the result is the same
+# as running the three one after the other, as long as each looks at no
+# more of the tree than the node it is called for and its parts.  (Facts
+# about the whole tree are only known when the walk is finished.)
+#
+# Which methods are called for a class of node, and which parts are walked,
+# are worked out once for each list of classes of passes, and shared by
+# all pipelines with the same list.  The walk is done with fold_tree(), so
+# it copes with trees of any depth, and a list or node is only replaced by
+# a new one if one of its parts has been replaced.
+
+try:
+    from matlab import MatlabNode, FunDef, fold_tree
+except:
+    from .matlab import MatlabNode, FunDef, fold_tree
+
+
+class MatlabPass(object):
+    """Base class for passes run by a PassPipeline.  Subclasses define
+    methods enter_CLASS() and leave_CLASS() for the classes of nodes they
+    handle, and may restrict what they walk with `walks`; see the notes at
+    the top of passes.py."""
+
+    # Node class -> names of the attributes of its nodes that this pass
+    # walks.  Nodes of classes not in here have all their parts walked.
+    walks = {}
+
+
+    def start(self, context):
+        """Called by the pipeline before every walk it makes, with the
+        context the walk starts in."""
+        pass
+
+
+    def run(self, nodes, context=None):
+        """Runs this pass alone over `nodes`, which may be a MatlabNode or
+        a list of them, and returns what should replace `nodes`."""
+        return PassPipeline([self]).run(nodes, context)
+
+
+class PassPipeline(object):
+    """Runs a list of MatlabPass objects together, in one walk over a tree
+    of nodes, in the order they are listed."""
+
+    _plans = {}                         # (Pass classes, class, passes) -> _Plan
+
+    def __init__(self, passes):
+        self.passes = list(passes)
+        self._classes = tuple(type(p) for p in self.passes)
+
+
+    def run(self, nodes, context=None):
+        """Walks `nodes`, which may be a MatlabNode or a list of them,
+        starting in `context`, and returns what should replace `nodes`."""
+        for p in self.passes:
+            p.start(context)
+        if not nodes:
+            return nodes
+        everyone = (1 << len(self.passes)) - 1
+        return fold_tree((nodes, everyone, context), self._walk_parts)
+
+
+    def _walk_parts(self, item):
+        # Says what to do with one item of the walk, in the form fold_tree()
+        # wants.  An item is (thing, passes, context), where `passes` is a
+        # bit mask of the passes that walk `thing`.
+        thing, active, context = item
+        if not thing:
+            return thing, None
+        elif isinstance(thing, list):
+            return ([(x, active, context) for x in thing],
+                    lambda values: _rebuilt_list(thing, values))
+        elif isinstance(thing, tuple):
+            return ([(x, active, context) for x in thing[:2]],
+                    lambda values: _rebuilt_tuple(thing, values))
+        elif not isinstance(thing, MatlabNode):
+            return thing, None
+        key = (self._classes, thing.__class__, active)
+        plan = PassPipeline._plans.get(key)
+        if plan is None:
+            plan = PassPipeline._plans[key] = _Plan(self._classes, thing.__class__, active)
+        passes = self.passes
+        for index, enter in plan.enters:
+            node = enter(passes[index], thing, context)
+            if node is not thing:
+                return node, None
+        attrs = [(a, mask) for a, mask in plan.parts if getattr(thing, a, None)]
+        if not attrs and not plan.leaves:
+            return thing, None
+        if plan.scoped and getattr(thing, 'context', None) is not None:
+            inner = thing.context
+        else:
+            inner = context
+        def combine(values):
+            for (a, _), value in zip(attrs, values):
+                if value is not getattr(thing, a):
+                    setattr(thing, a, value)
+            for index, leave in plan.leaves:
+                node = leave(passes[index], thing, context)
+                if node is not thing:
+                    return node
+            return thing
+        return [(getattr(thing, a), mask, inner) for a, mask in attrs], combine
+
+
+class _Plan(object):
+    # What a pipeline does with a node of class `cls` walked by the passes
+    # in the bit mask `active`: the enter and leave methods to call, as
+    # (index of the pass, method) pairs, and the parts to walk, as
+    # (attribute, mask of the passes that walk it) pairs.
+
+    def __init__(self, classes, cls, active):
+        self.enters = []
+        self.leaves = []
+        self.scoped = issubclass(cls, FunDef)
+        walked = {}
+        for index, pcls in enumerate(classes):
+            bit = 1 << index
+            if not active & bit:
+                continue
+            enter = _method(pcls, 'enter_', cls)
+            if enter is not None:
+                self.enters.append((index, enter))
+            leave = _method(pcls, 'leave_', cls)
+            if leave is not None:
+                self.leaves.append((index, leave))
+            for a in _walked(pcls, cls):
+                walked[a] = walked.get(a, 0) | bit
+        self.parts = [(a, walked[a]) for a in cls._visitable_attr if a in walked]
+
+
+def _superclasses(cls):
+    # `cls` and its superclasses, nearest first, short of MatlabNode.
+    for c in cls.__mro__:
+        if c is MatlabNode or c is object:
+            break
+        yield c
+
+
+def _method(pcls, prefix, cls):
+    for c in _superclasses(cls):
+        meth = getattr(pcls, prefix + c.__name__, None)
+        if meth is not None:
+            return meth
+    return None
+
+
+def _walked(pcls, cls):
+    for c in _superclasses(cls):
+        if c in pcls.walks:
+            return pcls.walks[c]
+    return cls._visitable_attr
+
+
+def _rebuilt_list(original, values):
+    # As MatlabNodeVisitor does, items that were removed are left out.
+    values = [x for x in values if x is not None]
+    if len(values) == len(original) and all(map(_same, values, original)):
+        return original
+    return values
+
+
+def _rebuilt_tuple(original, values):
+    if len(values) == len(original) and all(map(_same, values, original)):
+        return original
+    return tuple(values)
+
+
+def _same(a, b):
+    return a is b
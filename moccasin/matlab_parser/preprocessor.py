@@ -0,0 +1,248 @@
+#!/usr/bin/env python
+#
+# @file    preprocessor.py
+# @brief   Removal of line continuations from MATLAB input
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of the preprocessor
+# ------------------------------------
+#
+# MatlabGrammar runs its input through preprocess() before parsing it.  This
+# turns DOS-style line endings ("\r\n") into plain line feeds, and replaces
+# every continuation -- an ellipsis ("...") together with the rest of its
+# line and the line break -- by a single space, which is how MATLAB
+# interprets continuations.  (See the notes about continuations in
+# grammar.py for why the grammar can't simply ignore them.)
+#
+# MATLAB does not recognize continuations inside strings, comments, block
+# comments and shell command lines, so the preprocessor has to know where
+# those are.  It finds them the same way as MatlabLexer (see lexer.py),
+# including the rule that tells a quote that starts a string from a
+# transpose operator, but it does so without producing tokens: it jumps
+# from one character that can start any of those things (or a continuation
+# or a line ending) to the next, and copies the text in between as it is.
+# The whole input is processed in a single pass.
+#
+# Removing continuations and carriage returns changes the positions of the
+# characters that follow them, so preprocess() also returns an OffsetMap
+# object, which converts offsets in the preprocessed text back into offsets
+# (and line and column numbers) in the original text.  MatlabGrammar uses it
+# to report the locations of parse errors.
+
+import re
+import string
+from bisect import bisect_right
+try:
+    from lexer import MatlabLexer, reserved_words, string_pattern
+except:
+    from .lexer import MatlabLexer, reserved_words, string_pattern
+
+
+# Regular expressions and character sets used by preprocess().
+# .............................................................................
+
+# The characters that may start something the preprocessor has to deal with.
+
+_special_re      = re.compile(r"\.\.\.|['%!]|\r\n")
+
+# A continuation.  The rest of the line is a comment.  The same definition
+# is used by MatlabLexer, which treats any continuation it sees as spaces.
+
+_continuation_re = re.compile(r'\.\.\.[^\n\r]*(?:\r\n|\r|\n)?')
+
+_string_re       = re.compile(string_pattern)
+_line_end_re     = re.compile(r'[\n\r]')
+
+# Characters of identifiers and numbers, and characters that end a value
+# when they come just before a quote (see _ends_value()).
+
+_word_chars      = frozenset(string.ascii_letters + string.digits + '_')
+_closers         = frozenset(")]}'")
+
+
+# Main entry point.
+# .............................................................................
+
+def preprocess(text):
+    """Returns a tuple (result, offsets), where `result` is the MATLAB input
+    `text` with line endings normalized and continuations replaced by
+    spaces, and `offsets` is an OffsetMap from `result` back to `text`."""
+    offsets  = OffsetMap(text)
+    pieces   = []
+    copied   = 0                # Offset in text up to which pieces has it.
+    length   = 0                # Length of the text in pieces.
+    block    = 0                # End of the last block comment.
+    after    = -1               # End of the last string, comment, etc.
+    is_value = False            # Whether that thing was a string.
+    pos      = 0
+    search   = _special_re.search
+    while True:
+        m = search(text, pos)
+        if m is None:
+            break
+        start = m.start()
+        char = text[start]
+        if char == '\r':
+            pieces.append(text[copied:start])
+            pieces.append('\n')
+            length += start - copied
+            offsets._add(length, start + 1)
+            length += 1
+            copied = pos = start + 2
+        elif start < block:
+            # Inside a block comment.  Only line endings matter there.
+            pos = m.end()
+        elif char == '.':
+            end = _continuation_re.match(text, start).end()
+            pieces.append(text[copied:start])
+            pieces.append(' ')
+            length += start - copied
+            offsets._add(length, start)
+            length += 1
+            offsets._add(length, end)
+            copied = pos = after = end
+            is_value = False
+        elif char == "'":
+            if _ends_value(text, start, after, is_value):
+                # A transpose operator.
+                pos = start + 1
+            else:
+                literal = _string_re.match(text, start)
+                # An unterminated string is just a stray quote to the lexer.
+                pos = after = literal.end() if literal else start + 1
+                is_value = literal is not None
+        elif char == '%' and text.startswith('%{', start) and '%}' in text[start + 2:]:
+            # Skip over it, but keep looking for line endings inside it.
+            block = after = text.find('%}', start + 2) + 2
+            pos = start + 2
+            is_value = False
+        else:
+            # A line comment or a shell command, which go to the end of the
+            # line.  (An unterminated block comment is a line comment.)
+            end = _line_end_re.search(text, start)
+            pos = after = end.start() if end else len(text)
+            is_value = False
+    pieces.append(text[copied:])
+    offsets.text = ''.join(pieces)
+    return offsets.text, offsets
+
+
+# Offset maps.
+# .............................................................................
+
+class OffsetMap(object):
+    """Converts offsets in the text produced by preprocess() into offsets
+    in the `original` text given to it.  The produced text is available as
+    the attribute `text`."""
+
+    def __init__(self, original):
+        self.original = original
+        self.text     = None
+        self._lexer   = None
+        # Offsets in the preprocessed text at which the difference to the
+        # original offsets changes, and the original offsets there.
+        self._starts  = [0]
+        self._origins = [0]
+
+
+    def _add(self, offset, origin):
+        if self._starts[-1] == offset:
+            self._origins[-1] = origin
+        else:
+            self._starts.append(offset)
+            self._origins.append(origin)
+
+
+    def original_offset(self, offset):
+        """Returns the offset in the original text of the character at
+        `offset` in the preprocessed text.  The space that replaces a
+        continuation maps to the start of the continuation."""
+        index = bisect_right(self._starts, offset) - 1
+        return self._origins[index] + offset - self._starts[index]
+
+
+    def location(self, offset):
+        """Returns a tuple (line, column) for the character at `offset` in
+        the preprocessed text, giving its position in the original text.
+        Both numbers start at 1."""
+        return self.location_of(self.original_offset(offset))
+
+
+    def location_of(self, original_offset):
+        """Returns a tuple (line, column) for `original_offset`, an offset in
+        the original text."""
+        if self._lexer is None:
+            self._lexer = MatlabLexer(self.original)
+        return self._lexer.location(original_offset)
+
+
+# Helper functions.
+# .............................................................................
+
+def _ends_value(text, pos, after, is_value):
+    # Returns True if the quote at `pos` in `text` comes immediately after
+    # something that can end a value, which makes it a transpose operator.
+    # `after` is where the last string, comment, etc. ended, and `is_value`
+    # tells whether it was a string.  This is the rule of MatlabLexer, which
+    # looks at the previous token; here, we look at the previous characters.
+    if pos == after:
+        return is_value
+    prev = text[pos - 1] if pos > 0 else ''
+    if prev == '.':
+        # The operator ".'" is also a transpose only if it follows a value;
+        # otherwise, it is a period followed by a string.
+        pos -= 1
+        if pos == after:
+            return is_value
+        prev = text[pos - 1] if pos > 0 else ''
+        if prev == '.':
+            return False
+    if prev in _closers:
+        return True
+    if prev in _word_chars:
+        start = pos - 1
+        while start > 0 and text[start - 1] in _word_chars:
+            start -= 1
+        word = text[start:pos]
+        return word == 'end' or word not in reserved_words
+    return False
+
+
+def unexpand_offset(text, offset):
+    """Converts `offset`, an offset in text.expandtabs(), into the offset of
+    the same character in `text`.  (PyParsing expands tabs before parsing,
+    and so does the recursive-descent engine.)"""
+    if '\t' not in text:
+        return offset
+    line_start = expanded_start = 0
+    while True:
+        line_end = text.find('\n', line_start)
+        if line_end < 0:
+            line_end = len(text)
+        expanded_end = expanded_start + len(text[line_start:line_end].expandtabs())
+        if offset <= expanded_end or line_end == len(text):
+            break
+        line_start = line_end + 1
+        expanded_start = expanded_end + 1
+    column = 0
+    pos = line_start
+    while pos < line_end and expanded_start + column < offset:
+        column = column + 8 - column % 8 if text[pos] == '\t' else column + 1
+        pos += 1
+    return pos + max(0, offset - expanded_start - column)
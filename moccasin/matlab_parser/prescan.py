@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+#
+# @file    prescan.py
+# @brief   Fast pre-scanner splitting MATLAB input into top-level chunks
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# The parsers don't need to remember anything about one top-level statement
+# once they have moved on to the next one, but the memo tables they use
+# (the grammar's packrat cache, and the one in the recursive-descent engine)
+# keep growing until the whole file is parsed.  The functions in this file
+# find the places where the memo tables can be cleared: the starts of
+# top-level statements and of function definitions.  They work on the
+# token stream produced by MatlabLexer, so strings, comments, block
+# comments and shell commands are taken care of, and they keep track of
+# bracket nesting and of the keywords that open and close blocks.
+#
+# The chunks found this way are a matter of efficiency, not correctness.
+# The parsers still decide where statements end.  (They have to, because
+# MATLAB lets some statements continue past a line break; e.g., a sum whose
+# second line starts with '+'.)  If a statement runs past the start of a
+# chunk, the parser simply carries on until it reaches the start of a
+# following chunk.
+#
+# MatlabGrammar.iter_parse() needs something stronger: places where the
+# input can be cut so that the part in front can be parsed on its own,
+# before the rest of the input has even been read.  last_cut() finds the
+# last such place in a piece of text.  It is the start of a line that
+# begins a top-level chunk outside of any block (so function definitions
+# are never cut), provided the line doesn't start with an operator, which
+# could continue the statement on the line before.  The text may end in
+# the middle of something, so nothing after an unterminated block comment
+# counts: the rest of the comment may simply not have been read yet.  (If
+# a cut turns out to be wrong anyway, the part in front of it won't parse;
+# iter_parse() then parses it again together with the rest of the input.)
+#
+# Files come in two styles: either all of their function definitions end
+# with 'end', or none of them do.  The grammar can't tell which until it
+# has parsed the whole file, so it used to parse every file with function
+# definitions both ways.  function_style() guesses the style by counting
+# the keywords that open blocks and the 'end's that close them.  The
+# guess only decides which style is tried first; if that style doesn't
+# get to the end of the file, the parsers try both as before.
+
+try:
+    from lexer import MatlabLexer, COMMENT, KEYWORD, OPERATOR
+except:
+    from .lexer import MatlabLexer, COMMENT, KEYWORD, OPERATOR
+
+
+# Keywords that open a block closed by 'end'.
+
+_block_keywords = frozenset(['classdef', 'for', 'function', 'if', 'parfor',
+                             'spmd', 'switch', 'try', 'while'])
+
+_openers = frozenset(['(', '[', '{'])
+_closers = frozenset([')', ']', '}'])
+
+
+def chunk_starts(text):
+    """Returns a sorted list of the offsets in `text` at which top-level
+    chunks start.  The first chunk always starts at offset 0.  The other
+    offsets are all just past a line break."""
+    starts = [0]
+    depth = 0                           # Nesting of brackets.
+    blocks = []                         # Keywords of the open blocks.
+    for token in MatlabLexer(text).tokens():
+        if token.newline_before and depth == 0 and not blocks:
+            starts.append(_line_start(text, token.start))
+        if token.kind == OPERATOR:
+            if token.value in _openers:
+                depth += 1
+            elif token.value in _closers and depth > 0:
+                depth -= 1
+        elif token.kind == KEYWORD and depth == 0:
+            if token.value == 'function' and all(b == 'function' for b in blocks):
+                # A function definition at the top level of the file.  In
+                # files whose functions don't end with 'end', this is also
+                # the end of the previous function.
+                if blocks:
+                    starts.append(_line_start(text, token.start))
+                blocks = ['function']
+            elif token.value in _block_keywords:
+                blocks.append(token.value)
+            elif token.value == 'end' and blocks:
+                blocks.pop()
+    return sorted(set(starts))
+
+
+def last_cut(text):
+    """Returns the offset of the last place where `text` can be cut so that
+    the part before it parses the same on its own as it does followed by
+    the rest of the text, whatever that turns out to be.  Returns 0 if there
+    is no such place.  The offset is always just past a line break."""
+    cut = 0
+    depth = 0                           # Nesting of brackets.
+    blocks = 0                          # Number of open blocks.
+    at_start = True                     # Whether a statement starts here.
+    for token in MatlabLexer(text).tokens():
+        if token.newline_before:
+            at_start = True
+            if depth == 0 and blocks == 0 and token.kind != OPERATOR:
+                cut = _line_start(text, token.start)
+        if token.kind == OPERATOR:
+            if token.value in _openers:
+                depth += 1
+            elif token.value in _closers and depth > 0:
+                depth -= 1
+        elif token.kind == KEYWORD and depth == 0 and at_start:
+            if token.value in _block_keywords:
+                blocks += 1
+            elif token.value == 'end' and blocks:
+                blocks -= 1
+        elif (token.kind == COMMENT and text.startswith('%{', token.start)
+              and text.find('%}', token.start + 2) < 0):
+            break
+        # Keywords only open or close blocks at the start of a statement,
+        # or right after another keyword there (as in "else if").  Anywhere
+        # else, they're the arguments of a command-syntax function call.
+        at_start = ((token.kind == KEYWORD and at_start)
+                    or token.is_op(';', ','))
+    return cut
+
+
+def function_style(text):
+    """Returns True if the function definitions in `text` appear to end with
+    'end' (so that the file has to be parsed with _file_item_deep), False
+    if they appear not to (_file_item_shallow), and None if there are no
+    function definitions or it can't tell."""
+    functions = 0                       # Function definitions.
+    blocks = 0                          # Other blocks.
+    ends = 0
+    depth = 0                           # Nesting of brackets.
+    at_start = True                     # Whether a statement starts here.
+    for token in MatlabLexer(text).tokens():
+        if token.newline_before:
+            at_start = True
+        if token.kind == OPERATOR:
+            if token.value in _openers:
+                depth += 1
+            elif token.value in _closers and depth > 0:
+                depth -= 1
+        elif token.kind == KEYWORD and depth == 0 and at_start:
+            if token.value == 'function':
+                functions += 1
+            elif token.value in _block_keywords:
+                blocks += 1
+            elif token.value == 'end':
+                ends += 1
+        at_start = ((token.kind == KEYWORD and at_start)
+                    or token.is_op(';', ','))
+    if not functions:
+        return None
+    if ends == blocks + functions:
+        return True
+    if ends == blocks:
+        return False
+    return None
+
+
+def has_functions(text):
+    """Returns True if `text` may contain function definitions."""
+    # This is deliberately crude: any occurrence of the word counts.
+    return 'function' in text
+
+
+def _line_start(text, offset):
+    return max(text.rfind('\n', 0, offset), text.rfind('\r', 0, offset)) + 1
@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+#
+# @file    profiler.py
+# @brief   Counting and timing the matches of the grammar's rules
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Profiling the grammar
+# ---------------------
+#
+# A RuleProfile is handed to MatlabGrammar.parse_string() or parse_file()
+# to find out which rules of the PyParsing grammar (see grammar_rules.py)
+# the time goes into.  For the duration of the parse, a RuleProfiler wraps
+# the _parse() method of every element in GrammarRules._to_name, outside of
+# the packrat cache, the fast path and the statement recorder, and counts
+# for each rule:
+#
+# * attempts: how many times the rule was tried;
+# * successes and failures: how those attempts turned out;
+# * cache_hits: how many of the attempts were answered by the packrat cache;
+# * time: the time spent in the rule, including the rules it called.  When a
+#   rule calls itself (an expression inside an expression), only the
+#   outermost call counts, so that time isn't counted twice;
+# * own_time: the time spent in the rule, minus the time spent in the
+#   other profiled rules it called.
+#
+# A RuleProfile made with positions=True also charges the time to the
+# places in the input where the rules were tried.  Each attempt starts at an
+# offset in the text that PyParsing is given (the same offsets it hands to
+# parse actions); the own time of the attempt and whether it failed are
+# added up by offset, and when the parse is over, MatlabGrammar turns the
+# offsets into lines and columns of the original input (see _location() in
+# grammar.py).  A position where many attempts failed is one where the
+# parser backtracked a lot.  hot_lines() and annotate() then tell which
+# lines of a file are slow to parse, which is what the command
+# "moccasin explain-timing FILE.m" prints.  Since the positions are those
+# of one input, such a profile should be given to one parse only.
+#
+# The wrappers are removed when the parse is over, so parsing without a
+# profile costs nothing extra.  The grammar's elements are shared by all
+# threads, so the wrappers only count the matches made by the thread that
+# installed them, and parse_chunks() in grammar_rules.py only lets one
+# profiled parse run at a time.  The same RuleProfile can be given to any
+# number of parses, and adds up the counts of all of them.  Timing every
+# match makes the parse several times slower, so the times are only good
+# for comparing rules with each other.
+#
+# This module doesn't import PyParsing (see grammar_rules.py for why that
+# matters); the wrappers don't need to know what exceptions PyParsing
+# raises.
+
+from __future__ import print_function
+import json
+import timeit
+from six.moves import _thread
+
+
+class RuleStats(object):
+    """The counts for one rule in a RuleProfile."""
+
+    _fields = ['attempts', 'successes', 'failures', 'cache_hits', 'time',
+               'own_time']
+
+    def __init__(self, name):
+        self.name       = name
+        self.attempts   = 0
+        self.successes  = 0
+        self.failures   = 0
+        self.cache_hits = 0
+        self.time       = 0.0
+        self.own_time   = 0.0
+        self._active    = 0             # Calls of the rule in progress.
+
+
+    def as_dict(self):
+        return dict((field, getattr(self, field)) for field in self._fields)
+
+
+    def __repr__(self):
+        return ('<RuleStats {}: {} attempts, {} successes, {} failures,'
+                ' {} cache hits, {:.6f} s, {:.6f} s own>'
+                .format(self.name, self.attempts, self.successes,
+                        self.failures, self.cache_hits, self.time,
+                        self.own_time))
+
+
+class PositionStats(object):
+    """The counts for one position or line of the input in a RuleProfile:
+    the rules tried there (attempts), the ones that failed (backtracks),
+    and the time spent in them, not counting the rules they called."""
+
+    def __init__(self, line, column=None):
+        self.line       = line
+        self.column     = column
+        self.attempts   = 0
+        self.backtracks = 0
+        self.time       = 0.0
+
+
+    def _add(self, attempts, backtracks, time):
+        self.attempts += attempts
+        self.backtracks += backtracks
+        self.time += time
+
+
+    def __repr__(self):
+        return ('<PositionStats {}:{}: {} attempts, {} backtracks, {:.6f} s>'
+                .format(self.line, self.column, self.attempts,
+                        self.backtracks, self.time))
+
+
+class RuleProfile(object):
+    """The counts and times of the grammar's rules, by rule name, over all
+    the parses it was given to.  `rules` is a dictionary mapping the names
+    of the rules to RuleStats objects, and `parses` is the number of parses
+    profiled.  If `positions` is True, `positions` is a dictionary mapping
+    tuples (line, column) of the input to PositionStats objects; otherwise
+    it is None."""
+
+    def __init__(self, positions=False):
+        self.rules = {}
+        self.parses = 0
+        self.positions = {} if positions else None
+        self._offsets = {}              # Offset -> [attempts, failures, time]
+
+
+    def sorted(self, key='time'):
+        """Returns a list of the RuleStats objects, in decreasing order of
+        `key`, which is one of the fields of RuleStats ('time' by default).
+        Rules that were never tried are left out."""
+        if key not in RuleStats._fields:
+            raise ValueError('Unknown field "{}"; expected one of {}'
+                             .format(key, ', '.join(RuleStats._fields)))
+        stats = [s for s in self.rules.values() if s.attempts]
+        return sorted(stats, key=lambda s: (-getattr(s, key), s.name))
+
+
+    def report(self, key='time', limit=None):
+        """Returns a table of the rules as a string, sorted as by sorted(),
+        with at most `limit` rows.  Times are in milliseconds."""
+        lines = ['{:<22} {:>10} {:>10} {:>10} {:>10} {:>11} {:>11}'.format(
+            'rule', 'attempts', 'successes', 'failures', 'cache hits',
+            'time (ms)', 'own (ms)')]
+        for s in self.sorted(key)[:limit]:
+            lines.append('{:<22} {:>10} {:>10} {:>10} {:>10} {:>11.2f} {:>11.2f}'
+                         .format(s.name, s.attempts, s.successes, s.failures,
+                                 s.cache_hits, s.time * 1000, s.own_time * 1000))
+        return '\n'.join(lines)
+
+
+    def to_json(self, indent=2):
+        """Returns the profile as a JSON string.  Times are in seconds."""
+        return json.dumps({'parses': self.parses,
+                           'rules': dict((name, s.as_dict()) for name, s
+                                         in self.rules.items() if s.attempts)},
+                          indent=indent, separators=(',', ': '),
+                          sort_keys=True)
+
+
+    def hot_lines(self, limit=None):
+        """Returns a list of PositionStats objects for the lines of the
+        input, in decreasing order of time, with at most `limit` items.
+        Their `column` is the column of the line where the most time was
+        spent."""
+        lines = {}
+        hottest = {}
+        for (line, column), stats in self.positions.items():
+            if line not in lines:
+                lines[line] = PositionStats(line)
+            lines[line]._add(stats.attempts, stats.backtracks, stats.time)
+            if line not in hottest or stats.time > hottest[line].time:
+                hottest[line] = stats
+        for line, stats in lines.items():
+            stats.column = hottest[line].column
+        return sorted(lines.values(), key=lambda s: (-s.time, s.line))[:limit]
+
+
+    def annotate(self, source, limit=20):
+        """Returns a listing of the `limit` lines of `source` (the input
+        that was parsed) that took the most time to parse, in the order of
+        the input, with the time, attempts and backtracks for each, and a
+        mark under the column where most of the time went."""
+        total = sum(s.time for s in self.positions.values())
+        lines = source.splitlines()
+        rows = ['{:>6} {:>10} {:>6} {:>9} {:>10}  {}'.format(
+            'line', 'time (ms)', '%', 'attempts', 'backtracks', 'source')]
+        for s in sorted(self.hot_lines(limit), key=lambda s: s.line):
+            text = lines[s.line - 1] if s.line <= len(lines) else ''
+            rows.append('{:>6} {:>10.2f} {:>6.1f} {:>9} {:>10}  {}'.format(
+                s.line, s.time * 1000, 100 * s.time / total if total else 0,
+                s.attempts, s.backtracks, text.expandtabs()))
+            indent = 6 + 1 + 10 + 1 + 6 + 1 + 9 + 1 + 10 + 2
+            column = len(text[:s.column - 1].expandtabs())
+            rows.append(' ' * (indent + column) + '^')
+        return '\n'.join(rows)
+
+
+    def _locate(self, location, text):
+        # Moves the counts by offset in `text` (the text PyParsing parsed)
+        # to self.positions, using `location`, a function that returns a
+        # tuple (offset, line, column) in the original input for an offset
+        # in `text`.  Attempts start before the whitespace that PyParsing
+        # skips, so that is skipped here.
+        length = len(text)
+        for loc, (attempts, failures, time) in self._offsets.items():
+            while loc < length and text[loc] in ' \t\n\r':
+                loc += 1
+            _, line, column = location(min(loc, max(length - 1, 0)))
+            key = (line, column)
+            if key not in self.positions:
+                self.positions[key] = PositionStats(line, column)
+            self.positions[key]._add(attempts, failures, time)
+        self._offsets = {}
+
+
+    def _stats(self, name):
+        if name not in self.rules:
+            self.rules[name] = RuleStats(name)
+        return self.rules[name]
+
+
+class RuleProfiler(object):
+    """Records the matches of grammar elements in `profile`, a RuleProfile.
+    `packrat` is the PackratCache the elements use."""
+
+    def __init__(self, profile, packrat):
+        self.profile = profile
+        self._packrat = packrat
+        self._offsets = profile._offsets if profile.positions is not None else None
+        self._installed = []
+        self._frames = []               # Time spent in called rules.
+
+
+    def install(self, elements):
+        """Wraps the _parse() methods of `elements`, which must have names."""
+        seen = set()
+        for element in elements:
+            if id(element) not in seen:
+                seen.add(id(element))
+                self._wrap(element, self.profile._stats(element.name))
+        self.profile.parses += 1
+
+
+    def uninstall(self):
+        """Puts back the _parse() methods that install() wrapped."""
+        for element, parse in reversed(self._installed):
+            element._parse = parse
+        self._installed = []
+
+
+    def _wrap(self, element, stats):
+        # This is called a great many times, hence the local variables.
+        parse = element._parse
+        packrat = self._packrat
+        frames = self._frames
+        offsets = self._offsets
+        clock = timeit.default_timer
+        get_ident = _thread.get_ident
+        owner = get_ident()
+        def _parse(instring, loc, *args, **kwargs):
+            if get_ident() != owner:
+                return parse(instring, loc, *args, **kwargs)
+            counts = packrat.stats
+            hits, misses = counts.hits, counts.misses
+            stats.attempts += 1
+            stats._active += 1
+            frames.append(0.0)
+            failed = 0
+            start = clock()
+            try:
+                value = parse(instring, loc, *args, **kwargs)
+                stats.successes += 1
+                return value
+            except Exception:
+                stats.failures += 1
+                failed = 1
+                raise
+            finally:
+                elapsed = clock() - start
+                own = elapsed - frames.pop()
+                stats.own_time += own
+                if frames:
+                    frames[-1] += elapsed
+                stats._active -= 1
+                if not stats._active:
+                    stats.time += elapsed
+                # A cache hit is a hit with nothing else looked up.
+                if counts.hits == hits + 1 and counts.misses == misses:
+                    stats.cache_hits += 1
+                if offsets is not None:
+                    here = offsets.get(loc)
+                    if here is None:
+                        offsets[loc] = [1, failed, own]
+                    else:
+                        here[0] += 1
+                        here[1] += failed
+                        here[2] += own
+        self._installed.append((element, parse))
+        element._parse = _parse
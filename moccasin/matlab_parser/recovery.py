@@ -0,0 +1,396 @@
+#!/usr/bin/env python
+#
+# @file    recovery.py
+# @brief   Finding the statements that keep the input from being parsed
+# @author  Michael Hucka
+#
+# <!---------------------------------------------------------------------------
+# This software is part of MOCCASIN, the Model ODE Converter for Creating
+# Automated SBML INteroperability. Visit https://github.com/sbmlteam/moccasin/.
+#
+# Copyright (C) 2014-2016 jointly by the following organizations:
+#  1. California Institute of Technology, Pasadena, CA, USA
+#  2. Icahn School of Medicine at Mount Sinai, New York, NY, USA
+#  3. Boston University, Boston, MA, USA
+#
+# This is free software; you can redistribute it and/or modify it under the
+# terms of the GNU Lesser General Public License as published by the Free
+# Software Foundation.  A copy of the license agreement is provided in the
+# file named "COPYING.txt" included with this software distribution and also
+# available online at https://github.com/sbmlteam/moccasin/.
+# ------------------------------------------------------------------------- -->
+
+# Basic principles of error recovery
+# ----------------------------------
+#
+# When the parsers fail, they report the place where the top-level item
+# they were working on started, such as the 'if' of a 50-line if statement,
+# and nothing more.  To report every statement in a file that can't be
+# parsed, recover() works on the statements of the input as found in the
+# token stream produced by MatlabLexer (see statement_spans() below):
+#
+# 1) It parses the text.  If that works, it's done.
+#
+# 2) Otherwise, it looks at the statements of the item at the place of the
+#    error, which is either a single statement or a whole block up to its
+#    matching 'end'.  The first of these statements that doesn't parse on
+#    its own is the culprit.  (Lines such as 'else' or 'case 1' are checked
+#    inside a made-up block of the right kind.)  If they all parse, the
+#    problem is the structure of the blocks, such as a missing 'end', and
+#    the first statement of the item is taken as the culprit.
+#
+# 3) It replaces the culprit by a marker, a string with a value that can't
+#    occur in the input, which parses as a statement anywhere a statement
+#    can be.  If the culprit doesn't parse and starts with a keyword such
+#    as 'if' or 'case', the keyword is kept and the marker replaces the
+#    rest, as a condition or as the first statement of a body, so that the
+#    block stays as it is.  Otherwise, if the culprit opens a block, its
+#    'end' is blanked out as well, so that the statements inside the block
+#    still get parsed.  Then it starts over at 1).
+#
+# Every round replaces at least one statement of the input, so this ends
+# after at most as many rounds as there are statements with errors in
+# them (plus a few for blocks whose structure is wrong).  The caller gets
+# the results of the final parse, in which the markers show up as String
+# nodes in the place of the statements that couldn't be parsed, and a list
+# of Failure objects that say what they were.
+#
+# Statements are split at line breaks, semicolons and commas outside of
+# brackets.  An opening parenthesis can't be continued onto the next line
+# (continuations have been removed by the preprocessor), so a line break
+# always ends a statement with unclosed parentheses.  Square brackets and
+# braces can span lines, so one left unclosed makes the rest of the input
+# a single statement.
+
+try:
+    from lexer import MatlabLexer, COMMENT, KEYWORD, OPERATOR, SHELL
+    from prescan import chunk_starts
+except:
+    from .lexer import MatlabLexer, COMMENT, KEYWORD, OPERATOR, SHELL
+    from .prescan import chunk_starts
+
+
+# Keywords that open a block closed by 'end'.
+
+_block_keywords = frozenset(['classdef', 'for', 'function', 'if', 'parfor',
+                             'spmd', 'switch', 'try', 'while'])
+
+# The text put around statements starting with these keywords to check
+# whether they parse.
+
+_surroundings = {
+    'elseif':    'if 1\n',
+    'else':      'if 1\n',
+    'case':      'switch 1\n',
+    'otherwise': 'switch 1\n',
+    'catch':     'try\n',
+}
+
+# The names of the grammar rules (see grammar_rules.py) for the statements
+# that start with these keywords.
+
+_rule_names = {
+    'break':      'break statement',
+    'case':       'switch statement',
+    'catch':      'try statement',
+    'classdef':   'class definition',
+    'continue':   'continue statement',
+    'else':       'if statement',
+    'elseif':     'if statement',
+    'end':        'end of block',
+    'for':        'for statement',
+    'function':   'function definition',
+    'global':     'scope declaration',
+    'if':         'if statement',
+    'otherwise':  'switch statement',
+    'parfor':     'for statement',
+    'persistent': 'scope declaration',
+    'return':     'return statement',
+    'spmd':       'spmd block',
+    'switch':     'switch statement',
+    'try':        'try statement',
+    'while':      'while statement',
+}
+
+# What the keyword at the start of a statement that doesn't parse is
+# followed by when the rest of the statement is replaced by a marker (the
+# marker is then a condition or the first statement of a body).
+
+_kept = {
+    'case':      ' ',
+    'catch':     ', ',
+    'else':      ', ',
+    'elseif':    ' ',
+    'if':        ' ',
+    'otherwise': ', ',
+    'switch':    ' ',
+    'try':       ', ',
+    'while':     ' ',
+}
+
+_openers = frozenset(['(', '[', '{'])
+_closers = frozenset([')', ']', '}'])
+
+
+class Failure(object):
+    """A statement that could not be parsed.  `marker` is the value of the
+    String that took its place in the results, `start` and `end` are its
+    offsets in the text, `text` is the statement itself, `rule` is the name
+    of the grammar rule it should have matched, and `message` is the
+    parser's error message."""
+
+    def __init__(self, marker, start, end, text, rule, message):
+        self.marker  = marker
+        self.start   = start
+        self.end     = end
+        self.text    = text
+        self.rule    = rule
+        self.message = message
+
+
+    def __repr__(self):
+        return 'Failure(start={}, rule={}, text={})'.format(
+            self.start, repr(self.rule), repr(self.text))
+
+
+def recover(text, parse, errors):
+    """Calls `parse` on `text`, replacing the statements that keep it from
+    being parsed by markers until it succeeds, as described above.  `parse`
+    must raise one of the exception classes in the tuple `errors` if its
+    argument can't be parsed.  Returns a tuple (result, failures): the
+    value returned by `parse`, and a list of Failure objects in the order
+    of the statements in `text`.  If even the markers don't help, the last
+    exception raised by `parse` is raised again.
+    """
+    work = text
+    edits = _Edits()
+    failures = []
+    prefix = _marker_prefix(text)
+    markers = set()
+    checked = {}
+    def parses(statement, span):
+        # The statements in front of an error get checked again in every
+        # round, so the answers are kept.
+        if statement not in checked:
+            checked[statement] = _parses(statement, span, parse, errors)
+        return checked[statement]
+    while True:
+        try:
+            result = parse(work)
+            failures.sort(key=lambda failure: failure.start)
+            return result, failures
+        except errors as err:
+            error = err
+        loc = getattr(error, 'loc', None)
+        if loc is None:
+            raise error
+        culprit, invalid = _culprit(work, statement_spans(work), loc,
+                                    markers, parses)
+        if culprit is None:
+            # Nothing left to blame but whatever comes after the error.
+            if not work[loc:].strip() or work[loc:].strip() in markers:
+                raise error
+            start, end, rule = loc, len(work), 'statement'
+        else:
+            start, end, rule = culprit.start, culprit.end, culprit.rule
+        marker = "'" + prefix + str(len(failures)) + "'"
+        original = (edits.original(start), edits.original(end, True))
+        failures.append(Failure(marker[1:-1], original[0], original[1],
+                                text[original[0]:original[1]], rule,
+                                error.msg))
+        keyword = culprit and len(culprit.keywords) == 1 and culprit.keywords[0]
+        if invalid and keyword in _kept:
+            # Keep the keyword, so that the block stays as it is.
+            work = edits.replace(work, start, end, keyword + _kept[keyword]
+                                 + marker)
+            continue
+        closing = culprit and _closing(statement_spans(work), culprit)
+        if closing:
+            work = edits.replace(work, closing.start, closing.end,
+                                 ' ' * (closing.end - closing.start))
+        markers.add(marker)
+        work = edits.replace(work, start, end, marker)
+
+
+def statement_spans(text):
+    """Returns a list of _Span objects for the statements in `text`, at any
+    level of nesting, in order.  Comments are not included."""
+    spans = []
+    span = None
+    brackets = []                       # The open brackets.
+    for token in MatlabLexer(text).tokens():
+        if token.newline_before:
+            brackets = [b for b in brackets if b != '(']
+            if span is not None and not brackets:
+                spans.append(span)
+                span = None
+        if token.kind == COMMENT:
+            continue
+        if token.is_op(';', ',') and not brackets:
+            if span is not None:
+                spans.append(span)
+                span = None
+            continue
+        if span is None:
+            span = _Span(token.start)
+        span.add(token, not brackets)
+        if token.kind == OPERATOR:
+            if token.value in _openers:
+                brackets.append(token.value)
+            elif token.value in _closers and brackets:
+                brackets.pop()
+    if span is not None:
+        spans.append(span)
+    return spans
+
+
+class _Span(object):
+    # A statement: its start and end offsets, the keywords at its start (as
+    # in "else if"), and the name of the grammar rule it should match.
+
+    def __init__(self, start):
+        self.start    = start
+        self.end      = start
+        self.keywords = []
+        self.rule     = None
+        self._count   = 0
+
+
+    def add(self, token, top):
+        if token.kind == KEYWORD and len(self.keywords) == self._count:
+            self.keywords.append(token.value)
+        if self.rule is None:
+            if self._count == 0 and token.kind == SHELL:
+                self.rule = 'shell command'
+            elif self.keywords:
+                self.rule = _rule_names.get(self.keywords[0], 'statement')
+            elif top and token.is_op('='):
+                self.rule = 'assignment'
+        self._count += 1
+        self.end = token.end
+
+
+    def finish(self):
+        if self.rule is None:
+            self.rule = 'standalone expression'
+        return self
+
+
+    def opens(self):
+        # How many blocks the keywords at the start of this open, minus how
+        # many they close.
+        return sum(1 if k in _block_keywords else -1 if k == 'end' else 0
+                   for k in self.keywords)
+
+
+# Helper functions.
+# .............................................................................
+
+def _culprit(text, spans, loc, markers, parses):
+    # Returns (span, invalid): the statement to blame for an error at
+    # `loc`, and whether it was found not to parse on its own.
+    spans = [span.finish() for span in spans]
+    first = next((i for i, span in enumerate(spans) if span.end > loc), None)
+    if first is None:
+        return None, False
+    for i in range(first, _item_end(text, spans, first)):
+        span = spans[i]
+        statement = text[span.start:span.end]
+        if (statement not in markers
+                and not parses(statement, span)):
+            return span, True
+    if text[spans[first].start:spans[first].end] in markers:
+        return None, False
+    return spans[first], False
+
+
+def _item_end(text, spans, first):
+    # The index after the last statement of the item that starts with
+    # spans[first]: a block up to its 'end', or the statement by itself.
+    # A block without an 'end' runs to the next top-level chunk.
+    if spans[first].opens() <= 0:
+        return first + 1
+    limit = next((s for s in chunk_starts(text) if s > spans[first].start),
+                 len(text))
+    closing = _closing(spans, spans[first])
+    if closing is not None and closing.start < limit:
+        return spans.index(closing) + 1
+    return next((i for i in range(first, len(spans))
+                 if spans[i].start >= limit), len(spans))
+
+
+def _closing(spans, opener):
+    # The statement that is the 'end' of the block opened by `opener`, or
+    # None.
+    index = next((i for i, span in enumerate(spans)
+                  if span.start == opener.start), None)
+    if index is None or spans[index].opens() <= 0:
+        return None
+    depth = spans[index].opens()
+    for span in spans[index + 1:]:
+        depth += span.opens()
+        if depth <= 0:
+            if depth == 0 and span.keywords == ['end'] and span._count == 1:
+                return span
+            return None
+    return None
+
+
+def _parses(statement, span, parse, errors):
+    # Whether the statement parses on its own, in the block it belongs in.
+    keywords = span.keywords
+    if keywords and keywords[0] == 'end':
+        # Whether an 'end' is right depends on the rest of the input.
+        return True
+    before = _surroundings.get(keywords[0], '') if keywords else ''
+    ends = max(0, span.opens()) + (1 if before else 0)
+    try:
+        parse(before + statement + '\nend' * ends + '\n')
+        return True
+    except errors:
+        return False
+
+
+def _marker_prefix(text):
+    prefix = 'moccasin:parse-error:'
+    while prefix in text:
+        prefix += '#'
+    return prefix
+
+
+class _Edits(object):
+    # The replacements made by recover(), for finding offsets in the text it
+    # was given from offsets in the text after the replacements.  Each entry
+    # in _edits is [start, length, original start, original length].
+
+    def __init__(self):
+        self._edits = []
+
+
+    def original(self, offset, end=False):
+        # The original offset for `offset`.  An offset inside a replacement
+        # is taken to its start, or to its end if `end` is true.
+        shift = 0
+        for start, length, ostart, olength in self._edits:
+            if offset < start or (offset == start and end):
+                break
+            if offset < start + length or (offset == start + length and end):
+                return ostart + olength if end else ostart
+            shift = ostart + olength - start - length
+        return offset + shift
+
+
+    def replace(self, text, start, end, new):
+        ostart = self.original(start)
+        oend = self.original(end, True)
+        delta = len(new) - (end - start)
+        edits = []
+        for edit in self._edits:
+            if edit[0] + edit[1] <= start:
+                edits.append(edit)
+            elif edit[0] >= end:
+                edits.append([edit[0] + delta] + edit[1:])
+        edits.append([start, len(new), ostart, oend - ostart])
+        edits.sort()
+        self._edits = edits
+        return text[:start] + new + text[end:]
@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pytest
+import sys
+sys.path.append('moccasin/converter/')
+sys.path.append('../moccasin/converter/')
+sys.path.append('../../moccasin/converter/')
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+libsbml = pytest.importorskip('libsbml')
+from converter import *
+
+# Node trees as deep as this must be handled without hitting Python's
+# recursion limit, which the tests set to its usual default.  Parsing and
+# walking deep trees is tested in tests/syntax_test/test_deepNestingModule.py.
+
+DEPTH = 10000
+
+def chain(depth=DEPTH):
+    # The tree for "x0 + x1 + ... + xN", which is left-associative.
+    node = Identifier(name='x0')
+    for i in range(1, depth + 1):
+        node = BinaryOp(op='+', left=node, right=Identifier(name='x%d' % i))
+    return node
+
+
+@pytest.fixture
+def default_limit():
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(1000)
+    yield
+    sys.setrecursionlimit(limit)
+
+
+def test_finder(default_limit):
+    rhs = BinaryOp(op='*', left=Number(value='2'), right=chain())
+    context = MatlabContext()
+    context.nodes = [Assignment(lhs=Identifier(name='y'), rhs=rhs)]
+    assert MatlabFinder(context).find_use(Identifier(name='x0'))
+    assert not MatlabFinder(context).find_use(Identifier(name='z'))
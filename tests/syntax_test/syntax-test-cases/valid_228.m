@@ -0,0 +1,5 @@
+dy(1) = -k1*y(1)*y(2) + k2*y(3) - k3*y(1)^2/(K + y(1)) + v1 - v2*y(4)' ...
+        + k4*y(2)*y(3)/V - k5*y(5)^-2 .* y(6) ./ (1 + y(7)^n) + 2^-3^2;
+x = a:b:c:d:e
+y = [1 -2 +3 a - b c -d - e -f']
+z = a < b & c ~= d | ~e && f >= g || h
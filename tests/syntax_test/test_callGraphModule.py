@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import glob
+import os
+import pickle
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+from matlab_parser.callgraph import CallGraph
+
+here = os.path.dirname(os.path.abspath(__file__))
+paths = sorted(glob.glob(os.path.join(here, 'syntax-test-cases', '*.m')))
+
+text = '''function main()
+x = solve(@rhs, 1);
+y = solve(@rhs, x, @rhs);
+z = helper(x);
+end
+function r = solve(f, x, g)
+r = f(x);
+end
+function r = helper(a)
+r = sin(a) + helper(a - 1);
+end
+function r = rhs(t)
+r = t(1);
+end
+'''
+
+
+def contexts(context):
+    yield context
+    for child in context.functions.values():
+        for nested in contexts(child):
+            yield nested
+
+
+def entries(graph):
+    # What the index says, to compare with an index built from scratch.
+    return (sorted((repr(name), sorted(map(id, callers)))
+                   for name, callers in graph._callers.items()),
+            sorted((repr(name), sorted((id(c), sorted(map(repr, callees.items())))
+                                       for c, callees in uses.items()))
+                   for name, uses in graph._handles.items()))
+
+
+def test_queries():
+    context = MatlabGrammar().parse_string(text)
+    graph = context.call_graph
+    main = context.functions[Identifier(name='main')]
+    solve = Identifier(name='solve')
+    assert sorted(c.name for c in graph.callees()) == ['f', 'helper', 'sin', 'solve']
+    assert [(site.context, len(site.args)) for site in graph.calls_of(solve)] \
+        == [(main, 2), (main, 3)]
+    uses = graph.handle_uses(Identifier(name='rhs'))
+    assert [(s.callee.name, len(s.args)) for s in uses] == [('solve', 2), ('solve', 3), ('solve', 3)]
+    assert len(graph.direct_calls(solve, context, anywhere=True)) == 2
+    assert graph.direct_calls(solve, context) == []
+    helper = Identifier(name='helper')
+    assert len(graph.direct_calls(helper, context, anywhere=True)) == 1
+    calls = graph.indirect_calls(Identifier(name='rhs'), context, anywhere=True)
+    assert list(calls.keys()) == [solve] and len(calls[solve]) == 3
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'descent'])
+def test_index_agrees(engine):
+    for path in paths[::5]:
+        try:
+            context = MatlabGrammar().parse_file(path, engine=engine)
+        except Exception:
+            continue
+        assert entries(context.call_graph) == entries(CallGraph.build(context))
+        for c in contexts(context):
+            assert all(c.calls.values())
+
+
+def test_dropped_calls():
+    # "f" is only known to be an array on the last line, so its call is
+    # dropped when the first line is looked at again.
+    context = MatlabGrammar().parse_string('a = f(1);\nf = [4 5];\n')
+    assert Identifier(name='f') not in context.calls
+    assert context.call_graph.calls_of(Identifier(name='f')) == []
+    assert entries(context.call_graph) == entries(CallGraph.build(context))
+
+
+def test_built_when_missing():
+    context = MatlabGrammar().parse_string(text)
+    copy = pickle.loads(pickle.dumps(context, pickle.HIGHEST_PROTOCOL))
+    assert copy._call_graph is None
+    assert entries(copy.call_graph) == entries(CallGraph.build(copy))
+    copy.call_graph = None
+    main = copy.functions[Identifier(name='main')]
+    assert len(call_graph(main).calls_of(Identifier(name='solve'))) == 2
+    assert copy.call_graph is not None
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import copy
+import pickle
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+
+# Node trees as deep as this must be handled without hitting Python's
+# recursion limit, which the tests set to its usual default.
+
+DEPTH = 10000
+
+def identifier(i):
+    return Identifier(name='x%d' % i)
+
+
+def number(i):
+    return Number(value=str(i))
+
+
+def chain(depth=DEPTH, leaf=identifier):
+    # The tree for "x0 + x1 + ... + xN", which is left-associative.
+    node = leaf(0)
+    for i in range(1, depth + 1):
+        node = BinaryOp(op='+', left=node, right=leaf(i))
+    return node
+
+
+def text(depth=DEPTH):
+    # The input for chain(depth, number).
+    return 'y = ' + ' + '.join(str(i) for i in range(depth + 1)) + ';\n'
+
+
+@pytest.fixture
+def default_limit():
+    # The grammar is built first, since building it raises the limit.
+    MatlabGrammar().parse_string('x = 1;')
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(1000)
+    yield
+    sys.setrecursionlimit(limit)
+
+
+class IdentifierCounter(MatlabNodeVisitor):
+    def __init__(self):
+        super(IdentifierCounter, self).__init__()
+        self.names = []
+
+    def visit_Identifier(self, node):
+        self.names.append(node.name)
+        return node
+
+
+@pytest.mark.parametrize('engine, incremental', [('pyparsing', False),
+                                                 ('pyparsing', True),
+                                                 ('descent', False)])
+def test_parse(default_limit, engine, incremental):
+    context = MatlabGrammar().parse_string(text(), engine=engine,
+                                           incremental=incremental)
+    expected = Assignment(lhs=Identifier(name='y'), rhs=chain(leaf=number))
+    assert context.nodes == [expected]
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'descent'])
+def test_parse_function(default_limit, engine):
+    input = 'function y = f(x)\n' + text() + 'end\n'
+    context = MatlabGrammar().parse_string(input, engine=engine)
+    function = context.functions[Identifier(name='f')]
+    expected = Assignment(lhs=Identifier(name='y'), rhs=chain(leaf=number))
+    assert function.nodes == [expected]
+
+
+def test_visitor(default_limit):
+    counter = IdentifierCounter()
+    tree = chain()
+    assert counter.visit(tree) is tree
+    assert counter.names == ['x%d' % i for i in range(DEPTH + 1)]
+
+
+@pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+def test_pickle(default_limit, protocol):
+    tree = chain()
+    copied = pickle.loads(pickle.dumps([tree, tree.left], protocol))
+    assert copied[0] == tree
+    assert copied[0].left is copied[1]
+    assert copy.deepcopy(tree) == tree
+
+
+def test_as_string(default_limit):
+    expected = '+'.join('x%d' % i for i in range(DEPTH + 1))
+    assert MatlabNode.as_string(chain()) == expected
+
+
+def test_make_formula(default_limit):
+    formula = MatlabGrammar.make_formula(chain(), spaces=False)
+    assert formula.startswith('(' * DEPTH + 'x0+x1)+x2)')
+    assert formula.endswith('+x%d)' % DEPTH)
+    small = MatlabGrammar.make_formula(chain(2))
+    assert small == '((x0 + x1) + x2)'
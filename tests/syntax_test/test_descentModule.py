@@ -0,0 +1,86 @@
+#!/usr/bin/env python2.7
+#
+# Differential tests for the recursive-descent parsing engine: every MATLAB
+# file in the syntax and converter test cases is parsed with both engines,
+# and the printed results (or error messages) must be identical.
+
+from __future__ import print_function
+import pytest
+import sys
+import glob
+import os
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import MatlabGrammar
+
+#Generates (multiple) parametrized calls to a test function
+def pytest_generate_tests(metafunc):
+    # called once per test function
+    if metafunc.function.__name__ not in metafunc.cls.params:
+        return
+    funcarglist = metafunc.cls.params[metafunc.function.__name__]
+    argnames = list(funcarglist[0])
+    metafunc.parametrize(argnames, [[funcargs[name] for name in argnames]
+            for funcargs in funcarglist],scope='module')
+
+#Parses the file with the given engine and prints the result
+def build_model(path, engine):
+    try:
+        with MatlabGrammar() as parser:
+            results = parser.parse_file(path, fail_soft=True, engine=engine)
+            if results:
+                parser.print_parse_results(results, print_raw=True)
+    except Exception as e:
+        print(e)
+
+# Constructs the params dictionary for test function parametrization
+def obtain_params():
+    if os.path.isdir('tests'):
+        path = ['tests']
+    elif os.path.isdir('syntax_test'):
+        path = ['.']
+    else:
+        path = ['..']
+    m_paths = [path + ['syntax_test', 'syntax-test-cases', '*.m'],
+               path + ['converter_test', 'converter-test-cases', '*.m']]
+    models = []
+    for m_path in m_paths:
+        models += sorted(glob.glob(os.path.join(*m_path)))
+    cases = [dict(model = model) for model in models]
+    strings = [dict(text = text) for text in [
+        'x = [1 -2]', 'x = [1 - 2]', 'x = [1 -1 - 1]', 'x = [a\n(1)]',
+        'x = [a (1)]', 'x = [(a (1))]', 'x = [1 \n2]', 'x = 1 * 2\n* 3',
+        'x = a:b\n:c', 'x = a:b:c:d:e:f', 'x = -2^2', 'x = 2^-3',
+        "x = a''", 'print -dpng foo.png', 'x = a.b.c.d', '! ls &',
+        'try\n a\ncatch\n b\nend', 'for (i = 1:3)\n x(i) = i;\nend']]
+    parameters = {'test_descentFiles'   : cases,
+                  'test_descentStrings' : strings}
+    return parameters
+
+class TestClass:
+    # a map specifying multiple argument sets for a test method
+    params = obtain_params()
+
+    def test_descentFiles(self, capsys, model):
+        build_model(model, 'pyparsing')
+        from_pyparsing, err = capsys.readouterr()
+        build_model(model, 'descent')
+        from_descent, err = capsys.readouterr()
+        assert from_descent == from_pyparsing
+
+    def test_descentStrings(self, capsys, text):
+        with MatlabGrammar() as parser:
+            results = parser.parse_string(text, fail_soft=True)
+            if results:
+                parser.print_parse_results(results, print_raw=True)
+            from_pyparsing, err = capsys.readouterr()
+            results = parser.parse_string(text, fail_soft=True, engine='descent')
+            if results:
+                parser.print_parse_results(results, print_raw=True)
+            from_descent, err = capsys.readouterr()
+        assert from_descent == from_pyparsing
+
+    def test_unknownEngine(self):
+        with pytest.raises(ValueError):
+            MatlabGrammar().parse_string('x = 1', engine='bogus')
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from pyparsing import Literal, ParseException, Word, alphas
+from matlab_parser import MatlabGrammar, RuleProfile
+from matlab_parser.grammar_utils import MatlabDispatch
+from matlab_parser.lexer import TokenTable
+
+table = TokenTable()
+name  = Word(alphas)
+short = Literal('if')
+long  = Literal('if') + Literal('x')
+semi  = Literal(';')
+
+
+@pytest.mark.parametrize('longest, expected', [(True, ['if', 'x']),
+                                               (False, ['if'])])
+def test_semantics(longest, expected):
+    dispatch = MatlabDispatch(table, [short, long, semi],
+                              {'if': [short, long], ';': [semi]}, [],
+                              longest=longest)
+    assert list(dispatch.parseString('if x')) == expected
+    assert list(dispatch.parseString(' ;')) == [';']
+    with pytest.raises(ParseException):
+        dispatch.parseString('y')
+
+
+def test_line_end():
+    dispatch = MatlabDispatch(table, [name, semi], {}, [name], [semi])
+    assert list(dispatch.parseString('abc')) == ['abc']
+    with pytest.raises(ParseException):
+        dispatch.parseString(';')
+
+
+def test_grammar_dispatch():
+    # Control statements are only tried where their keyword is, except at
+    # the end of the input, where everything is tried once.
+    profile = RuleProfile()
+    text = 'if x\n  y = 1;  % c\nend\n!ls\nz = 2, w = 3;\nwhile 1, end'
+    MatlabGrammar().parse_string(text, profile=profile)
+    rules = profile.rules
+    assert rules['_if_stmt'].attempts == 2
+    assert rules['_while_stmt'].attempts == 2
+    assert rules['_for_stmt'].attempts == 1
+
+
+def test_copies():
+    # Copies made by leaveWhitespace() have copies of the alternatives.
+    dispatch = MatlabDispatch(table, [name, semi], {';': [semi]}, [name])
+    copied = dispatch.copy().leaveWhitespace()
+    assert list(copied.parseString('abc')) == ['abc']
+    assert list(dispatch.parseString('  abc')) == ['abc']
+    with pytest.raises(ParseException):
+        copied.parseString('  abc')
+
+
+def test_struct_in_array():
+    # Struct references inside brackets go through such a copy, and mustn't
+    # affect those outside them, in the same parse or later ones.
+    texts = ['if f(a,b)\n y = z.a\nend\n', 'x = [s.a s.b];\ny = z.a\n',
+             'y = z.a\n']
+    for text in texts:
+        expected = MatlabGrammar().parse_string(text, engine='descent')
+        result = MatlabGrammar().parse_string(text)
+        assert [repr(n) for n in result.nodes] == \
+            [repr(n) for n in expected.nodes]
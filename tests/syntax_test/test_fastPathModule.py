@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import MatlabGrammar
+from matlab_parser.grammar_rules import GrammarRules
+
+# Each case is a pair: a line of input, and how many of its statements
+# should take the fast path.  Whatever the fast path does, the results must
+# be the same as without it.
+
+cases = [
+    ('k1 = 0.5;', 1),
+    ('x0 = [1 2 3];', 1),
+    ('y(3) = a*x(1) - b*x(2);', 1),
+    ('y(i, 2) = -k1^-2 + (a + b)*c;', 1),
+    ('x = [1 -2; 3,4; ];', 1),
+    ('x = [];', 1),
+    ('x = f() .* g(1:3, a);', 1),
+    ('x =\n 1;', 1),
+    ('x = 1, y = 2;', 2),
+    ('% k1 = 0.5;', 0),
+    ('k1 = 0.5', 0),
+    ('k1 = 0.5 % no semicolon', 0),
+    ('x = a +\n b;', 1),
+    ('x = [1 - 2];', 0),
+    ('x = [1 2] * 3;', 0),
+    ('x = [a 1];', 0),
+    ("x = 'a;b';", 0),
+    ("x = a';", 0),
+    ('x = a.b;', 0),
+    ('x = c{1};', 0),
+    ('x = y(end);', 0),
+    ('a.b = 1;', 0),
+    ('y(end) = 1;', 0),
+    ('y (1) = 1;', 0),
+    ('x == 1;', 0),
+]
+
+
+def parse(text, fast):
+    GrammarRules._fast_path.enabled = fast
+    try:
+        context = MatlabGrammar().parse_string(text)
+    finally:
+        GrammarRules._fast_path.enabled = True
+    return [repr(node) for node in context.nodes], context.parse_stats
+
+
+@pytest.mark.parametrize('text, fast', cases)
+def test_fast_path(text, fast):
+    text = 'function f()\n' + text + '\n'
+    nodes, stats = parse(text, True)
+    expected, slow_stats = parse(text, False)
+    assert nodes == expected
+    assert stats.fast_statements == fast
+    assert stats.statements == slow_stats.statements
+    assert slow_stats.fast_statements == 0
+
+
+def test_stats():
+    text = 'k1 = 0.5;\nk2 = 2;\n% comment\nif k1\n  x = k2;\nend\ndisp(x)\n'
+    stats = MatlabGrammar().parse_string(text).parse_stats
+    assert stats.statements == 5
+    assert stats.fast_statements == 3
+    assert stats.fast_fraction == 3.0 / 5
+
+
+def test_descent_agrees():
+    text = '\n'.join(case for case, _ in cases if not case.startswith('x ==')) + '\n'
+    nodes, _ = parse(text, True)
+    context = MatlabGrammar().parse_string(text, engine='descent')
+    assert nodes == [repr(node) for node in context.nodes]
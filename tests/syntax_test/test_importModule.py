@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import os
+import subprocess
+import sys
+
+# Importing the package, or creating a parser, must not build the PyParsing
+# grammar or even import PyParsing.  This is checked in a fresh Python
+# process, since other tests will have imported everything already.
+
+top = os.path.abspath(os.path.join(os.path.dirname(__file__), '../..'))
+
+def modules_after(code):
+    probe = ('import sys\n'
+             'sys.path.append({0!r})\n'.format(os.path.join(top, 'moccasin'))
+             + code + '\n'
+             'print(" ".join(sorted(sys.modules)))\n')
+    output = subprocess.check_output([sys.executable, '-c', probe], cwd=top)
+    return output.decode('utf-8').split()
+
+
+def test_import_without_pyparsing():
+    modules = modules_after('from matlab_parser import *\n'
+                            'from matlab_parser.matlab import MatlabNodeVisitor\n'
+                            'from matlab_parser.functions import matlab_function_or_command\n'
+                            'MatlabGrammar()')
+    assert 'pyparsing' not in modules
+    assert 'matlab_parser.grammar_rules' not in modules
+
+
+def test_grammar_loaded_on_parse():
+    modules = modules_after('from matlab_parser import MatlabGrammar\n'
+                            'MatlabGrammar().parse_string("x = 1;")')
+    assert 'matlab_parser.grammar_rules' in modules
+
+
+def test_descent_without_pyparsing():
+    modules = modules_after('from matlab_parser import MatlabGrammar\n'
+                            'MatlabGrammar().parse_string("x = 1;", engine="descent")')
+    assert 'pyparsing' not in modules
@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import io
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+from matlab_parser.grammar import NodeTransformer
+from matlab_parser.inference import TypeInference
+
+engines = ['pyparsing', 'descent']
+
+# Each array is only known to be one from the line after the line that
+# uses it, so each line takes one more pass than the one after it.
+
+chain = 'z = q3(1);\nq3 = q2(1);\nq2 = q1(1);\nq1 = [1 2 3];\n'
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_one_pass(engine):
+    text = 'x = [1 2];\ny = x(2) + sin(x(1));\nz = y(1);\n'
+    context = MatlabGrammar().parse_string(text, engine=engine)
+    assert context.inference_passes == 1
+    assert isinstance(context.nodes[1].rhs.left, ArrayRef)
+    assert isinstance(context.nodes[1].rhs.right, FunCall)
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_used_before_assigned(engine):
+    text = 'y = x(2);\nx = [1 2];\n'
+    context = MatlabGrammar().parse_string(text, engine=engine)
+    assert context.inference_passes == 2
+    assert context.nodes[0].rhs == ArrayRef(name=Identifier(name='x'),
+                                            args=[Number(value='2')],
+                                            is_cell=False)
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_chain(engine):
+    context = MatlabGrammar().parse_string(chain, engine=engine)
+    assert context.inference_passes == 4
+    for node in context.nodes[:3]:
+        assert isinstance(node.rhs, ArrayRef)
+    for name in ['z', 'q1', 'q2', 'q3']:
+        assert context.types[Identifier(name=name)] == 'variable'
+
+
+def test_max_passes():
+    parser = MatlabGrammar()
+    nodes = parser.parse_string(chain).nodes
+    parser._reset()
+    # Starting over, with two passes, which is where the inference used
+    # to stop.
+    for node in nodes[:3]:
+        node.rhs = Ambiguous(name=node.rhs.name, args=node.rhs.args)
+    inference = TypeInference(parser, NodeTransformer, max_passes=2)
+    nodes = inference.infer(nodes)
+    assert inference.passes == 2
+    assert [type(node.rhs) for node in nodes[:3]] == [Ambiguous, Ambiguous, ArrayRef]
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_calls_listed_once(engine):
+    text = 'a = f(1);\nb = sin(a(1));\nf = [4 5];\n'
+    context = MatlabGrammar().parse_string(text, engine=engine)
+    assert context.inference_passes == 2
+    assert context.calls == {Identifier(name='sin'): [[ArrayRef(
+        name=Identifier(name='a'), args=[Number(value='1')], is_cell=False)]]}
+
+
+@pytest.mark.parametrize('engine', engines)
+def test_function_parameters(engine):
+    text = ('function r = main()\nr = apply(@helper, 2);\nend\n'
+            'function y = helper(v)\ny = v(1);\nend\n'
+            'function y = apply(g, v)\ny = g(v);\nend\n')
+    context = MatlabGrammar().parse_string(text, engine=engine)
+    apply = context.functions[Identifier(name='apply')]
+    assert apply.types[Identifier(name='g')] == 'function'
+    assert apply.types[Identifier(name='v')] == 'variable'
+    assert isinstance(apply.nodes[0].rhs, FunCall)
+
+
+def test_iter_parse():
+    parser = MatlabGrammar()
+    nodes = list(parser.iter_parse(io.StringIO(u'' + chain), block_size=16))
+    assert parser.context.inference_passes >= 1
+    assert len(nodes) == 4
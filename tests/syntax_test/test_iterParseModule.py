@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import io
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+from matlab_parser.grammar import MatlabParsingException
+
+# The input of iter_parse() is read in small blocks here, so that it gets
+# parsed in many parts.
+
+script = ''.join('k{0} = {0};\nif k{0} > 2\n  x(k{0}) = f(k{0});\nend\n'
+                 '% comment {0}\n'.format(i) for i in range(20))
+
+functions = ('function y = main(x)\n  y = helper(x);\nend\n\n'
+             'function z = helper(w)\n  z = w*2;\nend\n')
+
+
+def reprs(nodes):
+    return [repr(node) for node in nodes]
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'descent'])
+def test_same_as_parse_string(engine, tmpdir):
+    path = tmpdir.join('script.m')
+    path.write(script)
+    expected = reprs(MatlabGrammar().parse_string(script, engine=engine).nodes)
+    parser = MatlabGrammar()
+    assert reprs(parser.iter_parse(str(path), engine=engine, block_size=16)) == expected
+    assert parser.context.file == str(path)
+    assert reprs(parser.context.nodes) == expected
+    text = u'' + script
+    expected = reprs(MatlabGrammar().parse_string(text, engine=engine).nodes)
+    stream = io.StringIO(text)
+    assert reprs(MatlabGrammar().iter_parse(stream, engine=engine, block_size=16)) == expected
+
+
+def test_yields_early():
+    stream = io.StringIO(u'x = 1;\n' * 1000)
+    nodes = MatlabGrammar().iter_parse(stream, block_size=64)
+    assert isinstance(next(nodes), Assignment)
+    assert stream.tell() < 1000
+
+
+def test_functions():
+    parser = MatlabGrammar()
+    nodes = list(parser.iter_parse(io.StringIO(u'' + functions), block_size=8))
+    assert [type(node) for node in nodes] == [FunDef, FunDef]
+    assert parser.context.name.name == 'main'
+    assert sorted(f.name for f in parser.context.functions) == ['helper', 'main']
+
+
+def test_contexts():
+    # The chains of parents are the same as for parse_string().
+    parser = MatlabGrammar()
+    list(parser.iter_parse(io.StringIO(u'' + functions), block_size=8))
+    context = MatlabGrammar().parse_string(functions)
+    assert parser.context.topmost and parser.context.parent is None
+    helper = parser.context.functions[Identifier(name='helper')]
+    assert helper.parent is parser.context
+    assert context.functions[Identifier(name='helper')].parent is context
+    assert context.parent is None
+
+
+def test_command_syntax_keywords():
+    text = u'function a\ncmd end function end\nend\n'
+    expected = reprs(MatlabGrammar().parse_string(text).nodes)
+    assert reprs(MatlabGrammar().iter_parse(io.StringIO(text), block_size=4)) == expected
+
+
+def test_error_location(capsys):
+    text = u'x = 1;\n' * 50 + u'y = (1;\n'
+    parser = MatlabGrammar()
+    nodes = list(parser.iter_parse(io.StringIO(text), fail_soft=True, block_size=32))
+    assert len(nodes) == 50
+    assert 'line:51' in capsys.readouterr().out
+    with pytest.raises(MatlabParsingException):
+        list(MatlabGrammar().iter_parse(io.StringIO(text), block_size=32))
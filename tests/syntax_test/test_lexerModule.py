@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser.lexer import *
+
+# Each case is an input string and the expected list of (kind, value) pairs.
+
+cases = [
+    ("a = 1",
+     [(IDENTIFIER, 'a'), (OPERATOR, '='), (NUMBER, '1')]),
+    ("x = 2.5e-3 + .5 - 3. + 1D4",
+     [(IDENTIFIER, 'x'), (OPERATOR, '='), (NUMBER, '2.5e-3'), (OPERATOR, '+'),
+      (NUMBER, '.5'), (OPERATOR, '-'), (NUMBER, '3.'), (OPERATOR, '+'),
+      (NUMBER, '1D4')]),
+    ("y = 2.^x .* z",
+     [(IDENTIFIER, 'y'), (OPERATOR, '='), (NUMBER, '2.'), (OPERATOR, '^'),
+      (IDENTIFIER, 'x'), (OPERATOR, '.*'), (IDENTIFIER, 'z')]),
+    ("endx = end_1",
+     [(IDENTIFIER, 'endx'), (OPERATOR, '='), (IDENTIFIER, 'end_1')]),
+    ("if a ~= b, end",
+     [(KEYWORD, 'if'), (IDENTIFIER, 'a'), (OPERATOR, '~='), (IDENTIFIER, 'b'),
+      (OPERATOR, ','), (KEYWORD, 'end')]),
+    ("a = b' + c.'",
+     [(IDENTIFIER, 'a'), (OPERATOR, '='), (IDENTIFIER, 'b'), (OPERATOR, "'"),
+      (OPERATOR, '+'), (IDENTIFIER, 'c'), (OPERATOR, ".'")]),
+    ("a = [x' 'it''s']",
+     [(IDENTIFIER, 'a'), (OPERATOR, '='), (OPERATOR, '['), (IDENTIFIER, 'x'),
+      (OPERATOR, "'"), (STRING, "it's"), (OPERATOR, ']')]),
+    ("disp 'hello' % greet",
+     [(IDENTIFIER, 'disp'), (STRING, 'hello'), (COMMENT, ' greet')]),
+    ("%{\nblock\n%}\nx",
+     [(COMMENT, '\nblock\n'), (IDENTIFIER, 'x')]),
+    ("%{ not closed\nx",
+     [(COMMENT, '{ not closed'), (IDENTIFIER, 'x')]),
+    ("!ls -l\nx",
+     [(SHELL, 'ls -l'), (IDENTIFIER, 'x')]),
+    ("s = 'open",
+     [(IDENTIFIER, 's'), (OPERATOR, '='), (INVALID, "'"), (IDENTIFIER, 'open')]),
+    ("f = @(x) x.^2 ... square\n + 1",
+     [(IDENTIFIER, 'f'), (OPERATOR, '='), (OPERATOR, '@'), (OPERATOR, '('),
+      (IDENTIFIER, 'x'), (OPERATOR, ')'), (IDENTIFIER, 'x'), (OPERATOR, '.^'),
+      (NUMBER, '2'), (OPERATOR, '+'), (NUMBER, '1')]),
+]
+
+@pytest.mark.parametrize('text, expected', cases)
+def test_token_kinds_and_values(text, expected):
+    assert [(t.kind, t.value) for t in tokenize(text)] == expected
+
+
+def test_spans_and_flags():
+    text = "a = [1 2\n  3]"
+    tokens = tokenize(text)
+    assert [text[t.start:t.end] for t in tokens] == \
+        ['a', '=', '[', '1', '2', '3', ']']
+    assert [t.space_before for t in tokens] == \
+        [False, True, True, False, True, True, False]
+    assert [t.newline_before for t in tokens] == \
+        [False, False, False, False, False, True, False]
+
+
+def test_location():
+    lexer = MatlabLexer("a = 1\nbb = 2\n")
+    token = lexer.tokenize()[3]
+    assert token.value == 'bb'
+    assert lexer.location(token.start) == (2, 1)
+    assert lexer.location(token.end) == (2, 3)
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import copy
+import pickle
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+
+
+def call(name, *args):
+    return FunCall(name=Identifier(name=name), args=list(args))
+
+
+def test_slots():
+    node = call('f', Number(value='1'))
+    assert not hasattr(node, '__dict__')
+    assert FunCall._fields == ('name', 'args')
+    assert FunCall.__slots__ == ('args',)
+    with pytest.raises(AttributeError):
+        node.color = 'blue'
+    class Name(Identifier):
+        pass
+    assert not hasattr(Name(name='x'), '__dict__')
+
+
+def test_equality():
+    assert call('f', Number(value='1')) == call('f', Number(value='1'))
+    assert call('f', Number(value='1')) != call('f', Number(value='2'))
+    assert call('f', Number(value='1')) != call('f', String(value='1'))
+    assert call('f') != Ambiguous(name=Identifier(name='f'), args=[])
+    assert Identifier(name='f') != 'f'
+    deep, other = Identifier(name='x'), Identifier(name='x')
+    for i in range(10000):
+        deep = UnaryOp(op='-', operand=deep)
+        other = UnaryOp(op='-', operand=other)
+    assert deep == other
+
+
+def test_ordering():
+    names = [Identifier(name=n) for n in ['b', 'A', 'a', 'C']]
+    assert [n.name for n in sorted(names)] == ['A', 'a', 'b', 'C']
+    assert Number(value='10') < Number(value='9')
+    assert Identifier(name='z') < Number(value='1')
+    assert call('f', Number(value='1')) < call('f', Number(value='2'))
+    assert call('f') <= call('f') and call('g') > call('f')
+
+
+@pytest.mark.parametrize('protocol', range(pickle.HIGHEST_PROTOCOL + 1))
+def test_pickle(protocol):
+    context = MatlabGrammar().parse_string('function y = f(x)\ny = [x(1); 2*x];\nend\n')
+    copied = pickle.loads(pickle.dumps(context, protocol))
+    assert repr(copied.nodes) == repr(context.nodes)
+    assert copied.nodes[0].context is copied.functions[Identifier(name='f')]
+    body = context.nodes[0].body
+    assert copy.deepcopy(body) == body
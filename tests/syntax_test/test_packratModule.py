@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from pyparsing import ParserElement
+from matlab_parser import MatlabGrammar, MatlabNode, For, Identifier
+
+text = "x = a + b*(c - d)\ny = f(x, [1 -2 3])\nif x\n z = y'\nend\n"
+
+def printed(parser, context, capsys):
+    capsys.readouterr()
+    parser.print_parse_results(context, print_raw=True)
+    out, err = capsys.readouterr()
+    return out
+
+
+def test_stats():
+    stats = MatlabGrammar().parse_string(text).parse_stats
+    assert stats.hits > 0
+    assert stats.misses > 0
+    assert stats.evictions == 0
+    assert stats.peak_entries > 0
+
+
+def test_bounded(capsys):
+    unbounded = MatlabGrammar()
+    expected = printed(unbounded, unbounded.parse_string(text), capsys)
+    for size in [0, 1, 20]:
+        parser = MatlabGrammar(cache_size=size)
+        context = parser.parse_string(text)
+        assert printed(parser, context, capsys) == expected
+        assert context.parse_stats.peak_entries <= size
+        if size == 0:
+            assert context.parse_stats.hits == 0
+        else:
+            assert context.parse_stats.evictions > 0
+
+
+def test_environment(monkeypatch):
+    monkeypatch.setenv('MOCCASIN_PACKRAT_CACHE_SIZE', '10')
+    stats = MatlabGrammar().parse_string(text).parse_stats
+    assert stats.peak_entries == 10
+    stats = MatlabGrammar(cache_size=5).parse_string(text).parse_stats
+    assert stats.peak_entries == 5
+    monkeypatch.setenv('MOCCASIN_PACKRAT_CACHE_SIZE', 'lots')
+    with pytest.raises(ValueError):
+        MatlabGrammar()
+
+
+def test_invalid_size():
+    with pytest.raises(ValueError):
+        MatlabGrammar(cache_size=-1)
+
+
+def test_pyparsing_untouched():
+    MatlabGrammar().parse_string(text)
+    # PyParsing's own packrat parsing stays off for other grammars.
+    assert (ParserElement.__dict__['_parse']
+            is ParserElement.__dict__['_parseNoCache'])
+
+
+def test_parse_actions(capsys):
+    parser = MatlabGrammar()
+    loop = 'for i = 1:3\n  y(i) = i;\nend\n'
+    nodes = parser._parse_chunks(parser._preprocess(text + loop))
+    assert all(isinstance(node, MatlabNode) for node in nodes)
+    # The loop variable is only disambiguated in the final results, not in
+    # the nodes that parse actions produced.
+    assert not isinstance(nodes[-1].body[0].rhs, Identifier)
+    first = parser.parse_string(text + loop)
+    assert isinstance(first.nodes[-1], For)
+    assert isinstance(first.nodes[-1].body[0].rhs, Identifier)
+    second = parser.parse_string(text + loop)
+    assert printed(parser, second, capsys) == printed(parser, first, capsys)
+
+
+def test_descent_engine():
+    context = MatlabGrammar().parse_string(text, engine='descent')
+    assert context.parse_stats is None
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import os
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import MatlabGrammar, ParseCache
+
+text = "function y = f(x)\ny = g(x) * 2 + a(1, :)';\n"
+
+def printed(context):
+    return [repr(node) for node in context.nodes]
+
+
+def test_hit(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    first = MatlabGrammar(parse_cache=cache).parse_string(text)
+    assert first.parse_stats is not None
+    assert len(cache.entries()) == 1
+    second = MatlabGrammar(parse_cache=cache).parse_string(text)
+    assert second.parse_stats is None
+    assert printed(second) == printed(first)
+    assert list(second.functions) == list(first.functions)
+
+
+def test_parse_file(tmpdir):
+    cache = ParseCache(str(tmpdir.join('cache')))
+    paths = [tmpdir.join('a.m'), tmpdir.join('b.m')]
+    for path in paths:
+        path.write(text)
+    parser = MatlabGrammar(parse_cache=cache)
+    contexts = [parser.parse_file(str(path)) for path in paths]
+    assert len(cache.entries()) == 1
+    assert [c.file for c in contexts] == [str(path) for path in paths]
+
+
+def test_keys(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    assert cache.key(text, 'pyparsing') == cache.key(text, 'pyparsing')
+    assert cache.key(text, 'pyparsing') != cache.key(text, 'descent')
+    assert cache.key(text, 'pyparsing') != cache.key(text + ' ', 'pyparsing')
+
+
+def test_prune(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    parser = MatlabGrammar(parse_cache=cache)
+    for i in range(3):
+        parser.parse_string('x = {}'.format(i))
+    keys = [entry[0] for entry in cache.entries()]
+    for age, key in enumerate(reversed(keys)):
+        os.utime(cache._path(key), (1000 - age, 1000 - age))
+    assert cache.get(keys[-1]) is not None      # Now the most recently used.
+    size = cache.entries()[0][1]
+    assert cache.prune(2*size) == 1
+    assert [entry[0] for entry in cache.entries()] == [keys[1], keys[2]]
+    assert cache.clear() == 2
+    assert cache.entries() == []
+
+
+def test_max_size(tmpdir):
+    cache = ParseCache(str(tmpdir), max_size=1)
+    MatlabGrammar(parse_cache=cache).parse_string('x = 1')
+    assert cache.entries() == []
+
+
+def test_damaged_entry(tmpdir):
+    cache = ParseCache(str(tmpdir))
+    MatlabGrammar(parse_cache=cache).parse_string(text)
+    key = cache.entries()[0][0]
+    with open(cache._path(key), 'wb') as file:
+        file.write(b'garbage')
+    assert cache.get(key) is None
+    assert cache.entries() == []
+
+
+def test_environment(tmpdir, monkeypatch):
+    monkeypatch.setenv('MOCCASIN_PARSE_CACHE_DIR', str(tmpdir))
+    MatlabGrammar().parse_string(text)
+    assert len(ParseCache().entries()) == 1
+    assert ParseCache().directory == str(tmpdir)
+
+
+def test_running_size(tmpdir, monkeypatch):
+    cache = ParseCache(str(tmpdir))
+    listed = []
+    entries = cache.entries
+    def counted():
+        listed.append(1)
+        return entries()
+    monkeypatch.setattr(cache, 'entries', counted)
+    parser = MatlabGrammar(parse_cache=cache)
+    for i in range(20):
+        parser.parse_string('x = {}'.format(i))
+    assert len(listed) == 1
+    assert cache._size == sum(entry[1] for entry in entries())
+    cache.max_size = cache._size
+    parser.parse_string('x = 20')
+    assert len(listed) == 2
+    assert 0 < len(entries()) < 21
+    assert cache._size == sum(entry[1] for entry in entries())
+    assert not [name for name in os.listdir(str(tmpdir))
+                if not name.endswith('.pickle')]
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'descent'])
+def test_deep_input(tmpdir, engine):
+    # Results that can't be pickled are returned, just not cached.
+    deep = 'y = ' + ' + '.join(str(i) for i in range(3000)) + ';\n'
+    cache = ParseCache(str(tmpdir))
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(5000)
+    try:
+        context = MatlabGrammar(parse_cache=cache).parse_string(deep, engine=engine)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert context.nodes[0].lhs.name == 'y'
+    assert not [name for name in os.listdir(str(tmpdir))
+                if name.endswith('.tmp')]
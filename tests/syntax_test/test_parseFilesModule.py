@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pickle
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import MatlabGrammar
+from matlab_parser.grammar import MatlabParsingException
+from matlab_parser.matlab import FunDef
+
+script = "x = 1;\ny = f(x) + a(2, :)';\n"
+functions = ("function y = f(x)\ny = g(x) * 2;\n"
+             "function z = g(w)\nz = [w w'];\n")
+
+def write_files(tmpdir):
+    paths = []
+    for name, text in [('script.m', script), ('functions.m', functions),
+                       ('broken.m', 'x = (\n')]:
+        path = tmpdir.join(name)
+        path.write(text)
+        paths.append(str(path))
+    return paths
+
+
+def printed(context):
+    return [repr(node) for node in context.nodes]
+
+
+def test_pickle():
+    context = MatlabGrammar().parse_string(functions)
+    copy = pickle.loads(pickle.dumps(context, pickle.HIGHEST_PROTOCOL))
+    assert printed(copy) == printed(context)
+    assert len(copy.functions) == 2
+    for fundef in copy.nodes:
+        assert isinstance(fundef, FunDef)
+        assert fundef.context.parent is copy
+        assert copy.functions[fundef.name] is fundef.context
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parse_files(tmpdir, workers):
+    paths = write_files(tmpdir)
+    parser = MatlabGrammar()
+    results = dict((path, (result, timings)) for path, result, timings
+                   in parser.parse_files(paths, workers=workers, fail_soft=True))
+    assert sorted(results) == sorted(paths)
+    for path in paths[:2]:
+        result, timings = results[path]
+        assert printed(result) == printed(parser.parse_file(path))
+        assert result.file == path
+        assert timings['parse'] >= 0 and timings['elapsed'] >= timings['parse']
+    assert isinstance(results[paths[2]][0], MatlabParsingException)
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_parse_files_deep(tmpdir, workers):
+    path = tmpdir.join('deep.m')
+    path.write('y = ' + ' + '.join(str(i) for i in range(10001)) + ';\n')
+    parser = MatlabGrammar()
+    [(_, result, _)] = parser.parse_files([str(path)], workers=workers)
+    assert not isinstance(result, MatlabParsingException)
+    assert result.nodes == parser.parse_file(str(path)).nodes
+
+
+def test_parse_files_fail_hard(tmpdir):
+    paths = write_files(tmpdir)
+    with pytest.raises(MatlabParsingException):
+        list(MatlabGrammar().parse_files(paths, workers=2))
+
+
+def test_parse_files_workers():
+    with pytest.raises(ValueError):
+        MatlabGrammar().parse_files([], workers=0)
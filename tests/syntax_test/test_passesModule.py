@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+
+text = '''y = sin(x) + g(2);
+plot(y);
+function r = g(a)
+r = a * pi;
+end
+'''
+
+
+class Remover(MatlabPass):
+    # Removes the calls of plot(), without looking at arguments.
+    walks = {FunCall: []}
+
+    def enter_FunCall(self, node, context):
+        return None if node.name.name == 'plot' else node
+
+
+class Recorder(MatlabPass):
+    # Notes the identifiers it sees, in order, with their contexts.
+    walks = {Assignment: ['rhs'], FunDef: ['body']}
+
+    def __init__(self):
+        self.seen = []
+
+    def enter_Identifier(self, node, context):
+        self.seen.append((node.name, context.name))
+        return node
+
+
+class Renamer(MatlabPass):
+    # Replaces the calls of g() by h(), after their arguments are walked.
+    def leave_FunCall(self, node, context):
+        if node.name.name == 'g':
+            return FunCall(name=Identifier(name='h'), args=node.args)
+        return node
+
+
+def test_fused():
+    context = MatlabGrammar().parse_string(text)
+    recorder = Recorder()
+    nodes = PassPipeline([Remover(), recorder, Renamer()]).run(context.nodes, context)
+    assert len(nodes) == 2
+    assert nodes[0].rhs.right.name == Identifier(name='h')
+    g = Identifier(name='g')
+    assert recorder.seen == [('sin', None), ('x', None), ('g', None),
+                             ('a', g), ('pi', g)]
+
+
+def test_ordering():
+    # The recorder walks the arguments of calls that the remover leaves out
+    # of its walk, but doesn't see the nodes that the remover has removed.
+    context = MatlabGrammar().parse_string('z = max(plot(1), q);\nplot(w);\n')
+    recorder = Recorder()
+    nodes = PassPipeline([Remover(), recorder]).run(context.nodes, context)
+    assert [name for name, _ in recorder.seen] == ['max', 'plot', 'q']
+    assert len(nodes) == 1
+
+
+def test_unchanged():
+    context = MatlabGrammar().parse_string(text)
+    nodes = context.nodes
+    args = nodes[0].rhs.left.args
+    assert Recorder().run(nodes, context) is nodes
+    assert nodes[0].rhs.left.args is args
+
+
+def test_deep():
+    node = Identifier(name='x0')
+    for i in range(1, 10000):
+        node = BinaryOp(op='+', left=node, right=Identifier(name='x%d' % i))
+    recorder = Recorder()
+    assert recorder.run(node, MatlabContext()) is node
+    assert len(recorder.seen) == 10000
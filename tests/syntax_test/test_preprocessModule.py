@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import MatlabGrammar
+from matlab_parser.preprocessor import preprocess, unexpand_offset
+
+# Each case is a pair of strings: the input, and what preprocess() should
+# turn it into.
+
+cases = [
+    ('a = 1;\n', 'a = 1;\n'),
+    ('a = 1;\r\nb = 2;\r\n', 'a = 1;\nb = 2;\n'),
+    ('a = [1 ...\n 2];', 'a = [1   2];'),
+    ('a = [1 ... first\n 2];', 'a = [1   2];'),
+    ('a = [1 ...\r\n 2];', 'a = [1   2];'),
+    ('a = f(1, ...\n ...\n 2);', 'a = f(1,     2);'),
+    ('a = 1 ...', 'a = 1  '),
+    ("s = 'x...';\n", "s = 'x...';\n"),
+    ("s = 'it''s...';\n", "s = 'it''s...';\n"),
+    ("s = ['a' ...\n 'b'];", "s = ['a'   'b'];"),
+    ('% a comment ...\nb = 1;', '% a comment ...\nb = 1;'),
+    ('%{\na ...\n%}\nb = 1;', '%{\na ...\n%}\nb = 1;'),
+    ('%{\r\na ...\r\n%}\r\nb = 1;', '%{\na ...\n%}\nb = 1;'),
+    ('%{ unterminated ...\nb = 1;', '%{ unterminated ...\nb = 1;'),
+    ('!echo ...\nb = 1;', '!echo ...\nb = 1;'),
+    # Transposes are not the start of strings.
+    ("a = b' + c' ...\n + d';", "a = b' + c'   + d';"),
+    ("a = b.' ...\n + 1;", "a = b.'   + 1;"),
+    ("a = x(1)' ...\n + 'y...';", "a = x(1)'   + 'y...';"),
+    ("a = 'x''' ...\n + 1;", "a = 'x'''   + 1;"),
+    # After a keyword, a quote starts a string.
+    ("case 'a...'\n", "case 'a...'\n"),
+    ("a = [b' 'c...'];", "a = [b' 'c...'];"),
+]
+
+
+@pytest.mark.parametrize('text, expected', cases)
+def test_preprocess(text, expected):
+    result, offsets = preprocess(text)
+    assert result == expected
+    assert offsets.text == result
+
+
+def test_offsets():
+    text = 'a = [1 ... first\r\n 2];\r\nb = 3;'
+    result, offsets = preprocess(text)
+    assert result == 'a = [1   2];\nb = 3;'
+    for char in '[1]b3':
+        assert text[offsets.original_offset(result.index(char))] == char
+    # The space that replaces the continuation is where the ellipsis was.
+    assert offsets.original_offset(7) == text.index('...')
+    assert offsets.location(result.index('b')) == (3, 1)
+    assert offsets.location(result.index('3')) == (3, 5)
+
+
+def test_unexpand_offset():
+    text = 'a\tb\n\tc'
+    expanded = text.expandtabs()
+    for char in 'abc':
+        assert unexpand_offset(text, expanded.index(char)) == text.index(char)
+    assert unexpand_offset('abc', 2) == 2
+
+
+def test_error_location(capsys):
+    text = 'x = 1;\r\ny = [1 ...\r\n\t2 ...\r\n];\r\n\tz = (;\n'
+    for engine in ['pyparsing', 'descent']:
+        MatlabGrammar().parse_string(text, fail_soft=True, engine=engine)
+        out, _ = capsys.readouterr()
+        assert '(line:5, col:2)' in out
+        assert '(at char {0})'.format(text.index('z')) in out
@@ -0,0 +1,59 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser.prescan import *
+
+# Each case is an input string and the expected text of its chunks.
+
+cases = [
+    ("a = 1\nb = 2\n",
+     ["a = 1\n", "b = 2\n"]),
+    ("a = [1 2\n 3 4]\nb = 2",
+     ["a = [1 2\n 3 4]\n", "b = 2"]),
+    ("if a\n b = 1\nelse\n b = 2\nend\nc = f(x(end))",
+     ["if a\n b = 1\nelse\n b = 2\nend\n", "c = f(x(end))"]),
+    ("s = 'end'\n% if\nt = 1",
+     ["s = 'end'\n", "% if\n", "t = 1"]),
+    ("%{\nif\n%}\nx",
+     ["%{\nif\n%}\n", "x"]),
+    ("function a\nx = 1\nfunction b\ny = 2\n",
+     ["function a\nx = 1\n", "function b\ny = 2\n"]),
+    ("function a\nif x\n y\nend\nend\nfunction b\nend\n",
+     ["function a\nif x\n y\nend\nend\n", "function b\nend\n"]),
+]
+
+@pytest.mark.parametrize('text, expected', cases)
+def test_chunks(text, expected):
+    starts = chunk_starts(text)
+    ends = starts[1:] + [len(text)]
+    assert [text[s:e] for s, e in zip(starts, ends)] == expected
+
+
+def test_has_functions():
+    assert has_functions('function y = f(x)\ny = x;\n')
+    assert not has_functions('y = x;\n')
+
+
+def test_last_cut():
+    assert last_cut('a = 1\nb = [1\n2') == len('a = 1\n')
+    assert last_cut('if a\n b = 1\nend\nc') == len('if a\n b = 1\nend\n')
+    assert last_cut('if a\n b = 1\n') == 0
+    assert last_cut('x\n%{\nif\n') == len('x\n')
+    # Keywords in command syntax don't open or close blocks.
+    assert last_cut('function a\ncmd end function end\nend') == 0
+    assert last_cut('if a\nelse if b\nend\nx\n') == 0
+
+
+def test_function_style():
+    assert function_style('x = 1\n') is None
+    assert function_style('function a\nif x\n y\nend\nend\n') is True
+    assert function_style('function a\nif x, y, end\nfunction b\n') is False
+    assert function_style('function a\n x = y(end);\n[1 end]\n') is False
+    assert function_style('function a\nwhile x\nend\nend\nend\n') is None
+    # Keywords in command syntax don't open or close blocks.
+    assert function_style('function a\ncmd end function end\nend\n') is True
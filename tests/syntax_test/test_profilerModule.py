@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import json
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import MatlabGrammar, RuleProfile
+from matlab_parser.grammar_rules import GrammarRules
+
+text = '''function y = f(x, k)
+% A comment.
+k1 = 0.5;
+if x > 1 && k(2) ~= 0
+  y = [x, k1; 2 -3];
+else
+  y = {x.a, 'str'};
+end
+for i = 1:3
+  disp(sprintf('%d', i))
+end
+end
+'''
+
+
+def elements():
+    return [(element, element._parse) for element in GrammarRules._to_name]
+
+
+def test_counts():
+    profile = RuleProfile()
+    MatlabGrammar().parse_string(text, profile=profile)
+    assert profile.parses == 1
+    assert profile.rules['_stmt'].successes > 0
+    assert profile.rules['_expr'].attempts > 0
+    for stats in profile.rules.values():
+        assert stats.attempts == stats.successes + stats.failures
+        assert stats.cache_hits <= stats.attempts
+        assert 0 <= stats.own_time <= stats.time + 1e-9
+
+
+def test_accumulates():
+    profile = RuleProfile()
+    MatlabGrammar().parse_string(text, profile=profile)
+    attempts = profile.rules['_stmt'].attempts
+    MatlabGrammar().parse_string(text, profile=profile)
+    assert profile.parses == 2
+    assert profile.rules['_stmt'].attempts == 2 * attempts
+
+
+def test_same_results():
+    before = elements()
+    profile = RuleProfile()
+    profiled = MatlabGrammar().parse_string(text, profile=profile)
+    plain = MatlabGrammar().parse_string(text)
+    assert repr(profiled.nodes) == repr(plain.nodes)
+    assert elements() == before
+
+
+def test_failed_parse():
+    before = elements()
+    profile = RuleProfile()
+    with pytest.raises(Exception):
+        MatlabGrammar().parse_string('x = (1;\n', profile=profile)
+    assert profile.rules['_stmt'].failures > 0
+    assert elements() == before
+
+
+def test_report():
+    profile = RuleProfile()
+    MatlabGrammar().parse_string(text, profile=profile)
+    rows = profile.report(key='attempts', limit=5).splitlines()
+    assert len(rows) == 6
+    counts = [int(row.split()[1]) for row in rows[1:]]
+    assert counts == sorted(counts, reverse=True)
+    with pytest.raises(ValueError):
+        profile.report(key='bogus')
+    data = json.loads(profile.to_json())
+    assert data['parses'] == 1
+    assert data['rules']['_stmt']['attempts'] == profile.rules['_stmt'].attempts
+
+
+def test_descent():
+    profile = RuleProfile()
+    MatlabGrammar().parse_string(text, engine='descent', profile=profile)
+    assert profile.rules == {}
+
+
+def test_positions():
+    source = 'a = 1;\n\tb = [1 2 ...\n  3];  % comment\nc = f(a, ...\n      b);\n'
+    profile = RuleProfile(positions=True)
+    MatlabGrammar().parse_string(source, profile=profile)
+    lines = source.splitlines()
+    for (line, column), stats in profile.positions.items():
+        # Past the end of a line is where the end of the input was tried.
+        assert lines[line - 1][column - 1:column] not in (' ', '\t')
+        assert stats.attempts >= stats.backtracks
+    assert (2, 2) in profile.positions
+    assert (4, 1) in profile.positions
+    total = sum(s.time for s in profile.positions.values())
+    own = sum(s.own_time for s in profile.rules.values())
+    assert abs(total - own) < 1e-6
+    hot = profile.hot_lines(2)
+    assert len(hot) == 2 and hot[0].time >= hot[1].time
+    listing = profile.annotate(source, 2).splitlines()
+    assert len(listing) == 5
+    assert listing[1].endswith(lines[hot[0].line - 1].expandtabs()) or \
+        listing[3].endswith(lines[hot[0].line - 1].expandtabs())
+
+
+def test_positions_failed_parse():
+    profile = RuleProfile(positions=True)
+    with pytest.raises(Exception):
+        MatlabGrammar().parse_string('x = 1;\ny = (2;\n', profile=profile)
+    assert 2 in [line for line, column in profile.positions]
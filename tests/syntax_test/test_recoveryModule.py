@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pickle
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+from matlab_parser.grammar import MatlabParsingException
+from matlab_parser.recovery import statement_spans
+
+# Each case is an input string and the diagnostics expected for it, as
+# tuples (rule, line, column, text).
+
+cases = [
+    ('x = 1;\ny = (2;\nz = 3;\n',
+     [('assignment', 2, 1, 'y = (2;')]),
+    ('x = 1 +* 2\ny = 1\nz = [1 2}\n',
+     [('assignment', 1, 1, 'x = 1 +* 2'), ('assignment', 3, 1, 'z = [1 2}')]),
+    ('function f\nx = 1;\nif x\n y = (2;\nend\nz = 3;\nend\n',
+     [('assignment', 4, 2, 'y = (2;')]),
+    ('if x)\n a = 1\nend\nb = 2\n',
+     [('if statement', 1, 1, 'if x)')]),
+    ('switch x\ncase (1\n a = 1\notherwise\n b = 2\nend\n',
+     [('switch statement', 2, 1, 'case (1')]),
+    ('for i =\n a = 1\nend\nb = 2\n',
+     [('for statement', 1, 1, 'for i =')]),
+    ('x = 1\nend\ny = 2\n',
+     [('end of block', 2, 1, 'end')]),
+    ('if x\n a = 1\n',
+     [('if statement', 1, 1, 'if x')]),
+    ("x = 'abc\ny = 2\n",
+     [('assignment', 1, 1, "x = 'abc")]),
+    ('a = 1\n\tb = 2 +* 3 ...\n  + 4;\nc = 3\n',
+     [('assignment', 2, 2, 'b = 2 +* 3 ...\n  + 4')]),
+    ('f(1, 2]\ng = 1\n',
+     [('standalone expression', 1, 1, 'f(1, 2]')]),
+]
+
+
+def diagnostics(context):
+    return [(d.rule, d.line, d.column, d.text) for d in context.diagnostics]
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'descent'])
+@pytest.mark.parametrize('text, expected', cases)
+def test_recovery(text, expected, engine):
+    with pytest.raises(MatlabParsingException):
+        MatlabGrammar().parse_string(text, engine=engine)
+    context = MatlabGrammar().parse_string(text, engine=engine, recover=True)
+    assert diagnostics(context) == expected
+    for error in context.diagnostics:
+        assert error.message
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'descent'])
+def test_partial_results(engine):
+    text = 'a = 1;\nif a\n  b = (2;\n  c = 3;\nelse\n  d = 4 +* 5;\nend\ne = 5;\n'
+    context = MatlabGrammar().parse_string(text, engine=engine, recover=True)
+    errors = context.diagnostics
+    assert len(errors) == 2
+    a, branch, e = context.nodes
+    assert isinstance(branch, If)
+    assert branch.body[0] is errors[0]
+    assert branch.body[1] == Assignment(lhs=Identifier(name='c'),
+                                        rhs=Number(value='3'))
+    assert branch.else_body == [errors[1]]
+    assert e.lhs == Identifier(name='e')
+    assert Identifier(name='e') in context.assignments
+
+
+def test_no_errors():
+    text = 'x = 1;\ny = x + 2;\n'
+    context = MatlabGrammar().parse_string(text, recover=True)
+    assert context.diagnostics == []
+    assert context.nodes == MatlabGrammar().parse_string(text).nodes
+
+
+def test_pickle():
+    context = MatlabGrammar().parse_string('x = (1;\ny = 2;\n', recover=True)
+    copy = pickle.loads(pickle.dumps(context, pickle.HIGHEST_PROTOCOL))
+    assert copy.diagnostics == context.diagnostics
+    assert copy.nodes[0] is copy.diagnostics[0]
+
+
+def test_parse_files(tmpdir):
+    path = tmpdir.join('broken.m')
+    path.write('x = (\ny = 1;\n')
+    results = list(MatlabGrammar().parse_files([str(path)], workers=1,
+                                               recover=True))
+    context = results[0][1]
+    assert diagnostics(context) == [('assignment', 1, 1, 'x = (')]
+
+
+def test_statement_spans():
+    text = 'a = 1; b = [1\n 2], c(1\nif x % comment\n else if y, end'
+    assert [text[s.start:s.end] for s in statement_spans(text)] == \
+        ['a = 1', 'b = [1\n 2]', 'c(1', 'if x', 'else if y', 'end']
+    assert [s.keywords for s in statement_spans(text)][3:] == \
+        [['if'], ['else', 'if'], ['end']]
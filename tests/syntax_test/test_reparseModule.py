@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import pickle
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import MatlabGrammar
+from matlab_parser.incremental import _common_prefix, _common_suffix
+
+text = '''function dy = f(t, y)
+% The right-hand side.
+k1 = 0.5;
+k2 = g(k1);
+dy = zeros(2, 1);
+dy(1) = -k1*y(1)
+        + k2*y(2);
+if t > 1
+    dy(2) = k1*y(1);
+else
+    dy(2) = 0;
+end
+
+function z = g(w)
+z = w';
+'''
+
+# Each case is a pair of strings: a piece of the text above, and what it is
+# replaced with.
+
+edits = [
+    ('k1 = 0.5;', 'k1 = 0.7;'),
+    ('k1 = 0.5;', 'k1 = [0.5 1];'),
+    ('k2 = g(k1);\n', ''),
+    ('dy = zeros(2, 1);\n', 'dy = zeros(2, 1);\nhold on\n'),
+    ('        + k2*y(2);', 'k2 = k2*y(2);'),
+    ('dy(1) = -k1*y(1)\n', 'dy(1) = -k1*y(1);\n'),
+    ('    dy(2) = 0;', '    dy(2) = 1;'),
+    ("z = w';", "z = 'w';"),
+    ('% The right-hand side.', '%{'),
+    ('function z = g(w)', 'end\nfunction z = g(w)'),
+    ('end\n', ''),
+]
+
+def printed(context):
+    return [repr(node) for node in context.nodes]
+
+
+@pytest.mark.parametrize('old, new', edits)
+def test_reparse(old, new):
+    parser = MatlabGrammar()
+    context = parser.parse_string(text, incremental=True)
+    edited = text.replace(old, new, 1)
+    try:
+        expected = printed(MatlabGrammar().parse_string(edited))
+    except Exception as err:
+        with pytest.raises(type(err)):
+            parser.reparse(context, edited)
+        return
+    result = parser.reparse(context, edited)
+    assert printed(result) == expected
+    assert result._statements.reused > 0
+
+
+def test_reparse_twice():
+    parser = MatlabGrammar()
+    context = parser.parse_string(text, incremental=True)
+    for old, new in edits[:3]:
+        edited = text.replace(old, new, 1)
+        context = parser.reparse(context, edited)
+        assert printed(context) == printed(MatlabGrammar().parse_string(edited))
+
+
+def test_reparse_at_end():
+    parser = MatlabGrammar()
+    context = parser.parse_string('x = 1;\nhold', incremental=True)
+    edited = 'x = 1;\nhold on'
+    result = parser.reparse(context, edited)
+    assert printed(result) == printed(MatlabGrammar().parse_string(edited))
+
+
+def test_reparse_descent():
+    parser = MatlabGrammar()
+    context = parser.parse_string(text, engine='descent')
+    edited = text.replace('k1 = 0.5;', 'k1 = 0.7;')
+    result = parser.reparse(context, edited)
+    assert printed(result) == printed(MatlabGrammar().parse_string(edited))
+    assert result._statements.reused == 0
+
+
+def test_not_recorded():
+    parser = MatlabGrammar()
+    context = parser.parse_string(text)
+    assert context._statements is None
+    edited = text.replace('k1 = 0.5;', 'k1 = 0.7;')
+    result = parser.reparse(context, edited)
+    assert printed(result) == printed(MatlabGrammar().parse_string(edited))
+    assert result._statements.reused == 0
+    again = parser.reparse(result, text)
+    assert printed(again) == printed(MatlabGrammar().parse_string(text))
+    assert again._statements.reused > 0
+
+
+def test_reparse_pickled():
+    parser = MatlabGrammar()
+    context = parser.parse_string(text, incremental=True)
+    copy = pickle.loads(pickle.dumps(context, pickle.HIGHEST_PROTOCOL))
+    assert copy._statements is None
+    edited = text.replace('k1 = 0.5;', 'k1 = 0.7;')
+    result = parser.reparse(copy, edited)
+    assert printed(result) == printed(MatlabGrammar().parse_string(edited))
+    assert result._statements.reused == 0
+
+
+def test_reparse_deep():
+    # The sum is nested more deeply than the recursion limit that
+    # grammar_rules.py sets would allow pickle to recurse, but it is
+    # recorded and reused all the same.
+    deep = 'y = ' + ' + '.join('a{}'.format(i) for i in range(3000)) + ';\n'
+    parser = MatlabGrammar()
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(5000)
+    try:
+        context = parser.parse_string('x = 1;\n' + deep, incremental=True)
+        result = parser.reparse(context, 'x = 2;\n' + deep)
+    finally:
+        sys.setrecursionlimit(limit)
+    assert result.nodes[1] == context.nodes[1]
+    assert result._statements.reused == 1
+
+
+def test_common():
+    assert _common_prefix('abcdef', 'abcxef') == 3
+    assert _common_suffix('abcdef', 'abcxef') == 2
+    assert _common_prefix('abc', 'abc') == 3
+    assert _common_suffix('', 'abc') == 0
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import copy
+import pickle
+import pytest
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+
+x, y, z = Identifier(name='x'), Identifier(name='y'), Identifier(name='z')
+
+
+def nest():
+    top = MatlabContext(topmost=True)
+    middle = MatlabContext(name=y, parent=top)
+    inner = MatlabContext(name=z, parent=middle)
+    top.functions[y] = middle
+    middle.functions[z] = inner
+    return top, middle, inner
+
+
+def test_lookup():
+    top, middle, inner = nest()
+    top.types[x] = 'function'
+    assert inner.lookup('types', x) == 'function'
+    assert inner.lookup('types', y) is None
+    assert inner.lookup('types', y, 'none') == 'none'
+    assert top.lookup('functions', z) is None
+    assert middle.lookup('functions', z) is inner
+    assert top.scope('types') is top.types
+
+
+def test_views_follow_writes():
+    top, middle, inner = nest()
+    top.types[x] = 'function'
+    assert inner.scope('types') == {x: 'function'}
+    middle.types[x] = 'variable'
+    assert inner.lookup('types', x) == 'variable'
+    assert inner.scope('types') == {x: 'variable'}
+    del middle.types[x]
+    assert inner.lookup('types', x) == 'function'
+    top.types.update({y: 'variable'})
+    assert inner.scope('types') == {x: 'function', y: 'variable'}
+    top.types.pop(x)
+    top.types.setdefault(z, 'function')
+    assert inner.scope('types') == {y: 'variable', z: 'function'}
+    top.types.clear()
+    assert inner.scope('types') == {}
+
+
+def test_views_follow_parent():
+    top, middle, inner = nest()
+    other = MatlabContext(topmost=True)
+    top.assignments[x] = Number(value='1')
+    other.assignments[x] = Number(value='2')
+    assert inner.lookup('assignments', x) == Number(value='1')
+    middle.parent = other
+    assert inner.lookup('assignments', x) == Number(value='2')
+
+
+def test_copies():
+    top, middle, inner = nest()
+    top.types[x] = 'function'
+    inner.scope('types')
+    for context in [pickle.loads(pickle.dumps(top, pickle.HIGHEST_PROTOCOL)),
+                    copy.deepcopy(top)]:
+        inner = context.functions[y].functions[z]
+        assert inner._scopes == {}
+        assert inner.lookup('types', x) == 'function'
+        context.types[x] = 'variable'
+        assert inner.lookup('types', x) == 'variable'
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'descent'])
+def test_assignment_in_parent(engine):
+    # "g" is assigned a handle in the function around the one using it.
+    text = ('function main()\ng = @sin;\n'
+            'function r = inner(x)\nr = g(x);\nend\nend\n')
+    context = MatlabGrammar().parse_string(text, engine=engine)
+    main = context.functions[Identifier(name='main')]
+    inner = main.functions[Identifier(name='inner')]
+    assert isinstance(inner.nodes[0].rhs, FunCall)
+    assert inner.lookup('assignments', Identifier(name='g')) == \
+        FuncHandle(name=Identifier(name='sin'))
+
+
+def test_assignment_cycle():
+    context = MatlabGrammar().parse_string('a = 1;\nb = a;\na = b;\nc = a(1);\n')
+    assert isinstance(context.nodes[3].rhs, ArrayRef)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import glob
+import io
+import os
+import pytest
+import sys
+import threading
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import MatlabGrammar, RuleProfile
+
+here = os.path.dirname(os.path.abspath(__file__))
+paths = sorted(glob.glob(os.path.join(here, 'syntax-test-cases', '*.m')))[:48]
+threads = 16
+
+
+def summary(parser, path, engine):
+    try:
+        context = parser.parse_file(path, engine=engine)
+    except Exception as err:
+        return 'error: {}'.format(err)
+    stats = context.parse_stats
+    return (repr(context.nodes), repr(context.assignments),
+            stats and (stats.hits, stats.misses))
+
+
+def run_threads(work, count=threads):
+    # Runs work(n) in `count` threads and returns the results by n.
+    results = [None] * count
+    errors = []
+    def run(n):
+        try:
+            results[n] = work(n)
+        except Exception as err:
+            errors.append(err)
+    workers = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert errors == []
+    return results
+
+
+@pytest.mark.parametrize('engine', ['pyparsing', 'descent'])
+@pytest.mark.parametrize('shared', [True, False])
+def test_threads(engine, shared):
+    serial = [summary(MatlabGrammar(), path, engine) for path in paths]
+    parser = MatlabGrammar()
+    def work(n):
+        mine = parser if shared else MatlabGrammar()
+        return [summary(mine, path, engine) for path in paths[n::threads]]
+    results = run_threads(work)
+    for n in range(threads):
+        assert results[n] == serial[n::threads]
+
+
+def test_iter_parse():
+    parser = MatlabGrammar()
+    texts = [u'x{0} = {0};\ny = x{0} + 1;\n'.format(n) for n in range(threads)]
+    def work(n):
+        nodes = [repr(node) for node in parser.iter_parse(io.StringIO(texts[n]),
+                                                          block_size=8)]
+        return nodes, parser.context.nodes
+    results = run_threads(work)
+    for n in range(threads):
+        expected = MatlabGrammar().parse_string(texts[n]).nodes
+        assert results[n][0] == [repr(node) for node in expected]
+        assert results[n][1] == expected
+
+
+def test_profiled():
+    text = 'if x > 1\n  y = [x, 2];\nend\n'
+    alone = RuleProfile()
+    MatlabGrammar().parse_string(text, profile=alone)
+    parser = MatlabGrammar()
+    profiles = [RuleProfile() for n in range(4)]
+    def work(n):
+        if n < len(profiles):
+            parser.parse_string(text, profile=profiles[n])
+        else:
+            parser.parse_string(text)
+    run_threads(work)
+    for profile in profiles:
+        assert profile.parses == 1
+        assert profile.rules['_stmt'].attempts == alone.rules['_stmt'].attempts
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+from __future__ import print_function
+import sys
+sys.path.append('moccasin/')
+sys.path.append('../moccasin')
+sys.path.append('../../moccasin')
+from matlab_parser import *
+
+tree = [Assignment(lhs=Identifier(name='x'),
+                   rhs=BinaryOp(op='+', left=Number(value='1'),
+                                right=FunCall(name=Identifier(name='f'),
+                                              args=[String(value='s')])))]
+
+
+class Recorder(MatlabNodeVisitor):
+    def __init__(self):
+        super(Recorder, self).__init__()
+        self.seen = []
+
+    def visit_Identifier(self, node):
+        self.seen.append(('Identifier', node))
+        return node
+
+    def visit_Reference(self, node):
+        self.seen.append(('Reference', node))
+        return self.default_visit(node)
+
+    def visit_Primitive(self, node):
+        self.seen.append(('Primitive', node))
+        return node
+
+
+class Lister(Recorder):
+    def visit_list(self, node):
+        self.seen.append(('list', len(node)))
+        return [self.visit(item) for item in node]
+
+    def visit_Number(self, node):
+        self.seen.append(('Number', node))
+        return node
+
+
+def test_nearest_method():
+    visitor = Recorder()
+    visitor.visit(tree)
+    assert [kind for kind, node in visitor.seen] == \
+        ['Identifier', 'Primitive', 'Reference', 'Identifier', 'Primitive']
+
+
+def test_tables_shared():
+    first, second = Recorder(), Recorder()
+    assert first._dispatch is second._dispatch
+    first.visit(tree)
+    second.visit(tree)
+    assert first.seen == second.seen
+    lister = Lister()
+    assert lister._dispatch is not first._dispatch
+    lister.visit(tree)
+    assert lister.seen[0] == ('list', 1)
+    assert ('Number', Number(value='1')) in lister.seen
+    assert ('Number', Number(value='1')) not in first.seen
+
+
+def test_new_node_class():
+    visitor = Recorder()
+    visitor.visit(tree)
+    class Name(Identifier):
+        pass
+    visitor.visit([Name(name='y')])
+    assert visitor.seen[-1] == ('Identifier', Name(name='y'))